@@ -18,7 +18,7 @@ list(APPEND CMAKE_MODULE_PATH ${PROJECT_SOURCE_DIR}/cmake/Modules)
 FIND_PACKAGE(AVX)
 
 IF (NOT C_AVX512_FOUND AND NOT CXX_AVX512_FOUND)
-  message(FATAL_ERROR "Please build IPEX on Machines that support AVX512.")
+  message(FATAL_ERROR "Please build IPEX with a compiler that supports AVX512.")
 ENDIF()
 
 # Define build type
@@ -66,15 +66,17 @@ endif()
 set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -Wno-error=pedantic")
 set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -Wno-error=redundant-decls")
 set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -Wno-error=old-style-cast")
+# The library targets the baseline ISA. The vector kernels are built for AVX2,
+# AVX-512, AVX512_BF16 and AMX-BF16 by function attributes and dispatched at
+# runtime, see torch_ipex/csrc/cpu/isa/cpu_feature.hpp.
 IF (C_AVX512_FOUND OR CXX_AVX512_FOUND)
   set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -DAVX512")
-  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -mavx512f")
-  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -mavx512bw")
-  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -mavx512vl")
-  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -mf16c")
 ENDIF()
 IF (C_AVX512_BF16_FOUND OR CXX_AVX512_BF16_FOUND)
-  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -mavx512bf16 -DAVX512_BF16")
+  set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -DAVX512_BF16")
+  IF (C_AMX_BF16_FOUND OR CXX_AMX_BF16_FOUND)
+    set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -DAMX_BF16")
+  ENDIF()
 ENDIF()
 set(CMAKE_CXX_FLAGS "${CMAKE_CXX_FLAGS} -fopenmp")
 # These flags are not available in GCC-4.8.5. Set only when using clang.
@@ -163,7 +165,6 @@ ExternalProject_Add(xsmm
   CONFIGURE_COMMAND ""
   BUILD_COMMAND
     make
-    "AVX=3"
     "-j"
   INSTALL_COMMAND ""
   )
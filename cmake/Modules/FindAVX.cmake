@@ -1,5 +1,5 @@
-INCLUDE(CheckCSourceRuns)
-INCLUDE(CheckCXXSourceRuns)
+INCLUDE(CheckCSourceCompiles)
+INCLUDE(CheckCXXSourceCompiles)
 
 SET(AVX512_CODE "
   #include <stdint.h>
@@ -27,6 +27,19 @@ SET(AVX512_BF16_CODE "
   }
 ")
 
+SET(AMX_BF16_CODE "
+  #include <stdint.h>
+  #include <immintrin.h>
+
+  int main() {
+    // detect amx-tile and amx-bf16
+    _tile_zero(0);
+    _tile_dpbf16ps(0, 1, 2);
+    _tile_release();
+    return 0;
+  }
+")
+
 MACRO(CHECK_SSE lang type flags)
   SET(__FLAG_I 1)
   SET(CMAKE_REQUIRED_FLAGS_SAVE ${CMAKE_REQUIRED_FLAGS})
@@ -34,9 +47,9 @@ MACRO(CHECK_SSE lang type flags)
     IF(NOT ${lang}_${type}_FOUND)
       SET(CMAKE_REQUIRED_FLAGS ${__FLAG})
       IF(lang STREQUAL "CXX")
-        CHECK_CXX_SOURCE_RUNS("${${type}_CODE}" ${lang}_HAS_${type}_${__FLAG_I})
+        CHECK_CXX_SOURCE_COMPILES("${${type}_CODE}" ${lang}_HAS_${type}_${__FLAG_I})
       ELSE()
-        CHECK_C_SOURCE_RUNS("${${type}_CODE}" ${lang}_HAS_${type}_${__FLAG_I})
+        CHECK_C_SOURCE_COMPILES("${${type}_CODE}" ${lang}_HAS_${type}_${__FLAG_I})
       ENDIF()
       IF(${lang}_HAS_${type}_${__FLAG_I})
         SET(${lang}_${type}_FOUND TRUE CACHE BOOL "${lang} ${type} support")
@@ -60,3 +73,6 @@ CHECK_SSE(CXX "AVX512" " ;-mavx512f -mavx512bw -mavx512vl")
 
 CHECK_SSE(C "AVX512_BF16" " ;-mavx512f -mavx512bf16")
 CHECK_SSE(CXX "AVX512_BF16" " ;-mavx512f -mavx512bf16")
+
+CHECK_SSE(C "AMX_BF16" " ;-mamx-tile -mamx-bf16")
+CHECK_SSE(CXX "AMX_BF16" " ;-mamx-tile -mamx-bf16")
@@ -1,5 +1,8 @@
 import os
+import copy
 import json
+import tempfile
+import types
 import warnings
 import torch
 from .version import __version__
@@ -34,6 +37,48 @@ class AmpConf(object):
         with open(configure_file, 'w') as fp:
             json.dump(configures, fp, indent = 4)
 
+def _int8_scoped_forward(module, *args, **kwargs):
+    # the scope is exited even if the forward raises, so that a failed forward
+    # does not leave its frames on the scope stack of the thread
+    core.enter_int8_scope(module._int8_scope)
+    try:
+        return type(module).forward(module, *args, **kwargs)
+    finally:
+        core.exit_int8_scope()
+
+class _Int8ScopeHandle(object):
+    def __init__(self, module):
+        self.module = module
+
+    def remove(self):
+        self.module.__dict__.pop('forward', None)
+        self.module.__dict__.pop('_int8_scope', None)
+
+def register_int8_scopes(model):
+    r""" Identify the int8 operators of the model by the module calling them.
+
+    By default the int8 operators are identified by their name and execution
+    order. After registering the scopes, every operator is identified by the
+    path of the module running it, its name and its occurrence in that module,
+    which is saved as ``key`` in the configuration file. The configures then no
+    longer depend on the control flow of the model, and a calibrated model can
+    run inference from many threads at the same time. The operators which are
+    not run during calibration, e.g. in a branch not taken, run in fp32.
+
+    Args:
+        model(torch.nn.Module): the model, the scopes have to be registered before
+            both the calibration and the inference steps.
+
+    Returns:
+        The handles of the registered scopes, whose ``remove()`` unregisters them.
+    """
+    handles = []
+    for name, module in model.named_modules():
+        module._int8_scope = name
+        module.forward = types.MethodType(_int8_scoped_forward, module)
+        handles.append(_Int8ScopeHandle(module))
+    return handles
+
 class _DecoratorContextManager:
     """Allow a context manager to be used as a decorator, copy form pytorch FW"""
 
@@ -140,3 +185,84 @@ class AutoMixPrecision(_DecoratorContextManager):
             core.disable_mix_int8_fp32()
             core.disable_mix_bf16_fp32()
         core.set_execution_mode(train = self.pre_running_mode)
+
+def _evaluate_int8_configures(model, eval_func, configures):
+    fd, configure_file = tempfile.mkstemp(suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(configures, f)
+        conf = AmpConf(torch.int8, configure_file)
+        # the inference step quantizes the weights of the model in place, so
+        # every configuration has to be evaluated on a copy of the fp32 model.
+        with AutoMixPrecision(conf, running_mode='inference'):
+            return eval_func(copy.deepcopy(model))
+    finally:
+        os.remove(configure_file)
+
+def int8_fallback_search(model, eval_func, configure_file, output_file, accuracy_loss = 0.01):
+    r""" Search which operators of a calibrated model have to stay in fp32.
+
+    Starting from the configuration file of the calibration step, every
+    quantized operator falls back to fp32 alone to measure how much accuracy its
+    quantization costs. The most sensitive operators are then greedily flipped
+    to fp32 until the accuracy is within the budget, and the flips which are not
+    needed any more are undone, so that as many operators as possible stay int8.
+
+    Args:
+        model(torch.nn.Module): the fp32 model on the Extension device.
+        eval_func(callable): takes a model and returns its accuracy, higher is better.
+            It is run under int8 inference ``AutoMixPrecision``.
+        configure_file(str): the configuration file saved by the calibration step.
+        output_file(str): where to save the resulting configuration file, which can
+            be loaded by ``AmpConf``.
+        accuracy_loss(float): the allowed accuracy drop from the fp32 model.
+
+    Returns:
+        The accuracy of the resulting configuration.
+    """
+    with open(configure_file, 'r') as f:
+        configures = json.load(f)
+
+    def evaluate(quantized):
+        for configure, status in zip(configures, quantized):
+            configure['quantized'] = status
+        return _evaluate_int8_configures(model, eval_func, configures)
+
+    fp32_accuracy = evaluate([False] * len(configures))
+    target = fp32_accuracy - accuracy_loss
+    quantized = [configure['quantized'] for configure in configures]
+    accuracy = evaluate(quantized)
+
+    if accuracy < target:
+        # sensitivity of each quantized operator: the accuracy gained by running it in fp32
+        candidates = [i for i, status in enumerate(quantized) if status]
+        sensitivity = {}
+        for i in candidates:
+            quantized[i] = False
+            sensitivity[i] = evaluate(quantized) - accuracy
+            quantized[i] = True
+        candidates.sort(key=lambda i: sensitivity[i], reverse=True)
+
+        fallback = []
+        for i in candidates:
+            quantized[i] = False
+            fallback.append(i)
+            accuracy = evaluate(quantized)
+            if accuracy >= target:
+                break
+
+        # quantize again the operators which are not needed to meet the budget,
+        # the least sensitive ones first
+        for i in reversed(fallback[:-1]):
+            quantized[i] = True
+            new_accuracy = evaluate(quantized)
+            if new_accuracy >= target:
+                accuracy = new_accuracy
+            else:
+                quantized[i] = False
+
+    for configure, status in zip(configures, quantized):
+        configure['quantized'] = status
+    with open(output_file, 'w') as fp:
+        json.dump(configures, fp, indent = 4)
+    return accuracy
@@ -1,5 +1,9 @@
 from .interaction import interaction
 from .embeddingbag import embeddingbag
+from .embeddingbag import batched_embeddingbag
+from .embeddingbag import quantize_embedding_table, QuantizedEmbeddingBag
+from .embeddingbag import TieredEmbeddingBag
+from .tiered_embedding import TieredEmbeddingStorage
 from .linear import *
 from .pooling import *
 from .mlp import *
@@ -8,6 +12,8 @@ from .save import *
 from .to import *
 from .roi_align import ROIAlign
 from .roi_align import roi_align
+from .roi_align import MultiLevelROIAlign
+from .roi_align import multilevel_roi_align
 from .nms import *
 from .lstm import *
 from .rnn import *
@@ -2,13 +2,116 @@ import torch
 from torch import nn
 from torch.autograd import Function
 import _torch_ipex as core
+from .tiered_embedding import TieredEmbeddingStorage
 
 # # extension for BF16 fast path only
 
 
 def embeddingbag(weights, indices, offsets, scale_grad_by_freq, mode, sparse, per_sample_weights, include_last_offset):
+    if isinstance(weights, TieredEmbeddingStorage):
+        # pool the cached rows, the indices are remapped to their cache slots
+        indices = weights.lookup(indices)
+        weights = weights.weight
     ret = torch.ops.torch_ipex.embedding_bag(weights, indices, offsets, scale_grad_by_freq, mode, sparse, per_sample_weights, include_last_offset)
     if len(ret)==1:
         ret += [torch.Tensor(), torch.Tensor(), torch.Tensor()]
     return ret
 torch.embedding_bag = embeddingbag
+
+def _batched_fast_path(weights):
+    if not core.get_auto_dnnl() or len(weights) == 0:
+        return False
+    for w in weights:
+        if w.device.type != 'xpu' or w.dtype not in (torch.float, torch.bfloat16) or w.stride(1) != 1:
+            return False
+        if w.dtype != weights[0].dtype or w.size(1) != weights[0].size(1):
+            return False
+    return True
+
+def batched_embeddingbag(weights, indices, offsets, sparse=False, include_last_offset=False):
+    r"""Sum pooling of several embedding tables at once.
+
+    The bags of all the tables are reduced in one op and written to a single
+    ``{batch, len(weights) * dim}`` tensor, the pooled output of every table
+    side by side, which can be passed to :func:`interaction` as one input.
+    It falls back to one ``torch.embedding_bag`` per table when the tables are
+    not fp32/bf16 tables of the same dim on the extension device.
+    """
+    if not _batched_fast_path(weights):
+        return torch.cat([torch.embedding_bag(w, i, o, False, 0, sparse, None, include_last_offset)[0]
+                          for w, i, o in zip(weights, indices, offsets)], dim=1)
+    if torch.is_grad_enabled() and any(w.requires_grad for w in weights):
+        return BatchedEmbeddingBagFunc.apply(sparse, include_last_offset, len(weights), *weights, *indices, *offsets)
+    return torch.ops.torch_ipex.embedding_bag_batched_forward(weights, indices, offsets, include_last_offset)
+
+class BatchedEmbeddingBagFunc(Function):
+    @staticmethod
+    def forward(ctx, sparse, include_last_offset, num_tables, *args):
+        weights = args[:num_tables]
+        indices = args[num_tables:2 * num_tables]
+        offsets = args[2 * num_tables:]
+        ctx.sparse = sparse
+        ctx.num_tables = num_tables
+        ctx.save_for_backward(*args)
+        return torch.ops.torch_ipex.embedding_bag_batched_forward(weights, indices, offsets, include_last_offset)
+
+    @staticmethod
+    def backward(ctx, grad_out):
+        args = ctx.saved_tensors
+        n = ctx.num_tables
+        weight_grads = torch.ops.torch_ipex.embedding_bag_batched_backward(
+            grad_out.contiguous(), args[:n], args[n:2 * n], args[2 * n:], ctx.sparse)
+        return (None, None, None) + tuple(weight_grads) + (None,) * (2 * n)
+
+_rowwise_modes = {'sum': 0, 'mean': 1}
+
+def quantize_embedding_table(weight, bit_rate=8):
+    r"""Convert a fp32 or bf16 embedding table to a smaller format.
+
+    ``bit_rate`` 8 and 4 quantize every row to 8-bit or 4-bit values with the
+    fp32 scale and bias of the row appended, 16 converts the table to fp16.
+    """
+    return torch.ops.torch_ipex.embedding_bag_rowwise_quantize(weight, bit_rate)
+
+class QuantizedEmbeddingBag(nn.Module):
+    r"""Inference EmbeddingBag over a table converted by
+    :func:`quantize_embedding_table`, the rows are dequantized while they are
+    pooled and the output is fp32. Supports the sum and the mean modes."""
+
+    def __init__(self, qweight, bit_rate=8, mode='sum', include_last_offset=False):
+        super(QuantizedEmbeddingBag, self).__init__()
+        if mode not in _rowwise_modes:
+            raise ValueError("Invalid mode for QuantizedEmbeddingBag: {}".format(mode))
+        self.register_buffer("qweight", qweight)
+        self.bit_rate = bit_rate
+        self.mode = mode
+        self.include_last_offset = include_last_offset
+
+    @classmethod
+    def from_float(cls, emb, bit_rate=8):
+        return cls(quantize_embedding_table(emb.weight.detach(), bit_rate), bit_rate, emb.mode, emb.include_last_offset)
+
+    def forward(self, input, offsets, per_sample_weights=None):
+        return torch.ops.torch_ipex.embedding_bag_rowwise_quantized(
+            self.qweight, self.bit_rate, input, offsets, _rowwise_modes[self.mode], per_sample_weights, self.include_last_offset)
+
+_modes = {'sum': 0, 'mean': 1, 'max': 2}
+
+class TieredEmbeddingBag(nn.Module):
+    r"""EmbeddingBag over a :class:`TieredEmbeddingStorage`, only the hot rows
+    of the table are kept in memory. Pass ``storage.weight`` to the optimizer,
+    with ``sparse=True`` it only updates the rows of the batch."""
+
+    def __init__(self, storage, mode='sum', sparse=True, include_last_offset=False):
+        super(TieredEmbeddingBag, self).__init__()
+        if mode not in _modes:
+            raise ValueError("Invalid mode for TieredEmbeddingBag: {}".format(mode))
+        self.storage = storage
+        self.weight = storage.weight
+        self.mode = mode
+        self.sparse = sparse
+        self.include_last_offset = include_last_offset
+
+    def forward(self, input, offsets, per_sample_weights=None):
+        return embeddingbag(self.storage, input, offsets, False, _modes[self.mode], self.sparse,
+                            per_sample_weights, self.include_last_offset)[0]
@@ -7,14 +7,20 @@ from torch import _VF
 VF_gru = _VF.gru
 
 def ipex_gru(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first):
-    if input.device.type == 'xpu' and (dropout == 0 or training == False):
+    if input.device.type == 'xpu':
         return torch.ops.torch_ipex.gru(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
     else:
         return VF_gru(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
 
+def ipex_gru_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional):
+    if data.device.type == 'xpu':
+        return torch.ops.torch_ipex.gru_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+    else:
+        return VF_gru(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+
 def gru(*args):
     if isinstance(args[2], torch.Tensor):
-        return VF_gru(*args)
+        return ipex_gru_packed(*args)
     else:
         return ipex_gru(*args)
 
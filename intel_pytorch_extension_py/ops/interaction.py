@@ -1,26 +1,12 @@
 import torch
-from torch import nn
-from torch.autograd import Function
-import _torch_ipex as core
 
-def interaction(*args):
-    # Current pytorch dose not support vector<Tensor> input for c++ custom function
-    # So we preserve python custom function while need backward
-    # Since python custom function will meet GIL when run multi-thread in one process
-    # We will drop python custom function after c++ are supported
-    if torch.is_grad_enabled():
-        return InteractionFunc.apply(*args)
-    return torch.ops.torch_ipex.interaction_forward(args)
+def interaction(*args, triangle_only=False):
+    r"""Concatenate the first input with the strict lower triangle of the
+    pairwise dot products of all the inputs, the DLRM feature interaction.
+    With ``triangle_only`` the output is the strict lower triangle alone.
 
-class InteractionFunc(Function):
-    @staticmethod
-    def forward(ctx, *args):
-        ctx.save_for_backward(*args)
-        output = torch.ops.torch_ipex.interaction_forward(args)
-        return output
-
-    @staticmethod
-    def backward(ctx, grad_out):
-        args = ctx.saved_tensors
-        grad_in = torch.ops.torch_ipex.interaction_backward(grad_out.contiguous(), args)
-        return tuple(grad_in)
+    The backward is a C++ autograd node, so it does not take the GIL. In a
+    scripted model call ``torch.ops.torch_ipex.interaction`` with the list of
+    the inputs instead.
+    """
+    return torch.ops.torch_ipex.interaction(args, triangle_only)
@@ -1,4 +1,5 @@
 import math
+import collections
 import torch
 from torch import nn
 from torch.nn.parameter import Parameter
@@ -54,11 +55,46 @@ class IpexMLPFC(Function):
         #print("XsmmFCBWD: q=%.3f w=%.3f" % ((t2-t1)*1000.0, (t3-t2)*1000.0))
         return (grad_input, grad_weight, grad_bias, None)
 
+class IpexMLPLinearFC(Function):
+    r"""IpexMLPFC over the cached blocked weight and bias of an IpexMLPLinear,
+    whose gradients are unblocked back to the layout of its parameters"""
+    @staticmethod
+    def forward(ctx, input, weight, bias, blocked_weight, blocked_bias, handle, module):
+        input = input.contiguous()
+        output = core.mlp_forward(handle.handle, input, blocked_weight, blocked_bias)
+        ctx.ipex_mlp_handle = handle
+        ctx.module = module
+        ctx.weight_dtype = weight.dtype
+        ctx.bias_dtype = None if bias is None else bias.dtype
+        ctx.save_for_backward(input, blocked_weight)
+        return output
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        handle = ctx.ipex_mlp_handle
+        module = ctx.module
+        del ctx.ipex_mlp_handle
+        del ctx.module
+        input, blocked_weight = ctx.saved_tensors
+        grad_output = grad_output.contiguous()
+        grad_input, grad_weight, grad_bias = core.mlp_backward(handle.handle, grad_output, input, blocked_weight)
+        grad_weight = module.get_unblocked_weight(grad_weight, blocked_weight.dtype).to(ctx.weight_dtype)
+        grad_bias = None if ctx.bias_dtype is None else grad_bias.to(ctx.bias_dtype)
+        return (grad_input, grad_weight, grad_bias, None, None, None, None)
+
 class IpexMLPLinear(nn.Module):
-    r"""PCL Linear module for using libxsmm blocked GEMM"""
+    r"""PCL Linear module for using libxsmm blocked GEMM
+
+    The blocked weight and bias of every input dtype are cached until the
+    version counters of the parameters change, e.g. by an optimizer step, and
+    the libxsmm handles of the last ``handle_cache_size`` (N, bn, dtype) are
+    kept.
+    """
 
     __constants__ = ['bias', 'C', 'K']
 
+    handle_cache_size = 4
+
     def __init__(self, C, K, bias=True, act_type=None, output_stays_blocked=True, default_blocking=None):
         super(IpexMLPLinear, self).__init__()
         self.C = C
@@ -74,6 +110,8 @@ class IpexMLPLinear(nn.Module):
         self.bn = 0
         self.default_blocking = default_blocking
         self.ipex_mlp_handle = None
+        self.ipex_mlp_handles = collections.OrderedDict()
+        self.blocked_weight_cache = {}
         self.set_activation_type(act_type)
         self.output_stays_blocked = output_stays_blocked
         self.weight = Parameter(torch.Tensor(K, C))
@@ -172,6 +210,50 @@ class IpexMLPLinear(nn.Module):
 
         return new_weight
 
+    def get_unblocked_weight(self, blocked_weight, block_for_dtype):
+        # the inverse of get_blocked_weight, back to the layout of self.weight
+        if self.weight.dim() == 2:
+            if block_for_dtype == torch.bfloat16:
+                weight = blocked_weight.permute(0, 3, 1, 2, 4)
+            else:
+                weight = blocked_weight.permute(0, 3, 1, 2)
+            weight = weight.reshape(self.K, self.padded_C)
+            if self.padded_C != self.C:
+                weight = weight[:, :self.C]
+        elif self.weight.dim() == 4:
+            weight = blocked_weight
+            if block_for_dtype == torch.bfloat16:
+                weight = weight.permute(0, 1, 2, 4, 3).reshape(self.weight.size())
+        else:
+            weight = blocked_weight
+            if block_for_dtype == torch.float32:
+                weight = weight.view(self.nbk, self.nbc, self.bc // 2, 2, self.bk).permute(0, 1, 2, 4, 3)
+        return weight.contiguous()
+
+    def get_cached_blocked_weight(self, dtype):
+        # the cache of a dtype is valid until the parameters are replaced or updated in place
+        weight_key = (self.weight.data_ptr(), self.weight._version)
+        bias_key = None if self.bias is None else (self.bias.data_ptr(), self.bias._version)
+        cached = self.blocked_weight_cache.get(dtype)
+        if cached is None or cached[0] != (weight_key, bias_key):
+            with torch.no_grad():
+                blocked_weight = self.get_blocked_weight(to_dtype=dtype)
+                blocked_bias = None if self.bias is None else self.bias.to(dtype).contiguous()
+            cached = ((weight_key, bias_key), blocked_weight, blocked_bias)
+            self.blocked_weight_cache[dtype] = cached
+        return cached[1], cached[2]
+
+    def get_handle(self, N, bn, dtype):
+        key = (N, bn, dtype)
+        handle = self.ipex_mlp_handles.pop(key, None)
+        if handle is None:
+            handle = IpexMLPHandle(N, self.padded_C, self.K, bn, self.bc, self.bk, dtype, 0 if self.bias is None else 1, self.act_type)
+            if len(self.ipex_mlp_handles) >= self.handle_cache_size:
+                self.ipex_mlp_handles.popitem(last=False)
+        # the most recently used handle is the last one
+        self.ipex_mlp_handles[key] = handle
+        return handle
+
     def update_blocking(self, dtype):
         if dtype == torch.bfloat16 and self.padded_C % 2 != 0:
             self.C_pad = 1
@@ -187,6 +269,7 @@ class IpexMLPLinear(nn.Module):
         #    block_for_dtype = torch.float32
         #self.update_bc(block_for_dtype)
         self.weight = Parameter(self.get_blocked_weight(block_for_dtype=block_for_dtype))
+        self.blocked_weight_cache = {}
         
     def reset_parameters(self):
         init.kaiming_uniform_(self.weight, a=math.sqrt(5))
@@ -216,16 +299,13 @@ class IpexMLPLinear(nn.Module):
 
         input = input.contiguous()    
 
-        if N != self.N or bn != self.bn:
-            # print("Create handle: ", N, self.padded_C, self.K, bn, self.bc, self.bk, input.dtype, 0 if self.bias is None else 1, self.act_type)
-            self.ipex_mlp_handle = IpexMLPHandle(N, self.padded_C, self.K, bn, self.bc, self.bk, input.dtype, 0 if self.bias is None else 1, self.act_type)
-            self.N = N
-            self.bn = bn
-            self.nbn = N // bn
-        
-        wtensor = self.get_blocked_weight(to_dtype=input.dtype)
-        btensor = self.bias.to(input.dtype)
-        output =  IpexMLPFC.apply(input, wtensor, btensor, self.ipex_mlp_handle)
+        self.ipex_mlp_handle = self.get_handle(N, bn, input.dtype)
+        self.N = N
+        self.bn = bn
+        self.nbn = N // bn
+
+        wtensor, btensor = self.get_cached_blocked_weight(input.dtype)
+        output = IpexMLPLinearFC.apply(input, self.weight, self.bias, wtensor, btensor, self.ipex_mlp_handle, self)
         if not self.output_stays_blocked:
             #output = output.permute(0, 2, 1, 3).view(self.N, self.K).contiguous()
             output = output.permute(0, 2, 1, 3).reshape(self.N, self.K).contiguous()
@@ -236,3 +316,131 @@ class IpexMLPLinear(nn.Module):
         return 'C={}, K={}, bias={}'.format(
             self.C, self.K, self.bias is not None
         )
+
+class IpexMLPTowerFC(Function):
+    r"""The layers of an IpexMLP over their cached blocked weights, run by one
+    forward and one backward call"""
+    @staticmethod
+    def forward(ctx, input, module, buffers, *params):
+        handles, weights, biases = [], [], []
+        for layer, handle in zip(module.layers, buffers.handles):
+            weight, bias = layer.get_cached_blocked_weight(input.dtype)
+            handles.append(handle.handle)
+            weights.append(weight)
+            biases.append(torch.Tensor() if bias is None else bias)
+        nbn, bn = input.size(0), input.size(2)
+        last = module.layers[-1]
+        output = input.new_empty([nbn, last.nbk, bn, last.bk])
+        core.mlp_forward_layers(handles, input, weights, biases, buffers.activations, output)
+        buffers.generation += 1
+        ctx.module = module
+        ctx.buffers = buffers
+        ctx.generation = buffers.generation
+        ctx.weights = weights
+        ctx.save_for_backward(input, output)
+        return output
+
+    @staticmethod
+    def backward(ctx, grad_output):
+        module, buffers = ctx.module, ctx.buffers
+        del ctx.module
+        del ctx.buffers
+        if ctx.generation != buffers.generation:
+            raise RuntimeError("IpexMLP: the activations of this forward were overwritten by a later forward "
+                               "of the same batch size, run backward before the next forward")
+        input, output = ctx.saved_tensors
+        grads = core.mlp_backward_layers([handle.handle for handle in buffers.handles], grad_output.contiguous(),
+                                         input, ctx.weights, buffers.activations, output, buffers.grad_activations)
+        num_layers = len(module.layers)
+        grad_params = []
+        for l, layer in enumerate(module.layers):
+            grad_params.append(layer.get_unblocked_weight(grads[1 + l], input.dtype).to(layer.weight.dtype))
+            if layer.bias is not None:
+                grad_params.append(grads[1 + num_layers + l].to(layer.bias.dtype))
+        return (grads[0], None, None) + tuple(grad_params)
+
+class IpexMLPBuffers:
+    r"""The libxsmm handles of the layers of an IpexMLP for a batch, with the
+    activations between the layers and their gradients"""
+    def __init__(self, module, N, bn, dtype, device):
+        self.handles = [layer.get_handle(N, bn, dtype) for layer in module.layers]
+        self.activations = [torch.empty([N // bn, layer.nbk, bn, layer.bk], dtype=dtype, device=device)
+                            for layer in module.layers[:-1]]
+        self.grad_activations = [torch.empty_like(activation) for activation in self.activations]
+        self.generation = 0
+
+class IpexMLP(nn.Module):
+    r"""A tower of libxsmm fully connected layers, e.g. the bottom or the top
+    MLP of DLRM.
+
+    ``sizes`` are the input size followed by the output sizes of the layers,
+    ``activations`` the activation of every layer, or of all of them, among
+    None, 'relu' and 'sigmoid'. The activations stay in the blocked layout
+    between the layers, in buffers reused by every batch of the same size,
+    and all the layers run in one parallel region for the forward and one
+    for the backward. So a forward must be followed by its backward before
+    the next forward of the same batch size.
+    """
+
+    def __init__(self, sizes, activations='relu', bias=True, output_stays_blocked=False, default_blocking=None):
+        super(IpexMLP, self).__init__()
+        if len(sizes) < 2:
+            raise RuntimeError("IpexMLP: expects the input size and at least one layer size")
+        if activations is None or isinstance(activations, str):
+            activations = [activations] * (len(sizes) - 1)
+        if len(activations) != len(sizes) - 1:
+            raise RuntimeError("IpexMLP: expects an activation per layer")
+        self.sizes = list(sizes)
+        self.output_stays_blocked = output_stays_blocked
+        self.layers = nn.ModuleList([
+            IpexMLPLinear(C, K, bias=bias, act_type=act_type, default_blocking=default_blocking)
+            for C, K, act_type in zip(sizes[:-1], sizes[1:], activations)])
+        self.buffers_cache = collections.OrderedDict()
+
+    def update_blocking(self, dtype):
+        for layer in self.layers:
+            if layer.bc == 0 or layer.bk == 0:
+                layer.update_blocking(dtype)
+        for prev, layer in zip(self.layers[:-1], self.layers[1:]):
+            if layer.padded_C != prev.K or layer.bc != prev.bk:
+                raise RuntimeError("IpexMLP: the output of a layer of size %d can't be chained blocked, "
+                                   "try another size or default_blocking" % prev.K)
+
+    def get_buffers(self, N, bn, dtype, device):
+        key = (N, bn, dtype, device)
+        buffers = self.buffers_cache.pop(key, None)
+        if buffers is None:
+            buffers = IpexMLPBuffers(self, N, bn, dtype, device)
+            if len(self.buffers_cache) >= IpexMLPLinear.handle_cache_size:
+                self.buffers_cache.popitem(last=False)
+        self.buffers_cache[key] = buffers
+        return buffers
+
+    def forward(self, input):
+        input_type = input.dtype
+        self.update_blocking(input_type)
+        first, last = self.layers[0], self.layers[-1]
+        if input.dim() == 2:
+            input = first.maybe_pad_input(input)
+            N = input.size(0)
+            bn = first.get_blocking_factor(N, 48)
+            input = input.view(N // bn, bn, first.nbc, first.bc).permute(0, 2, 1, 3)
+        elif input.dim() == 4:
+            N = input.size(0) * input.size(2)
+            bn = input.size(2)
+        else:
+            raise RuntimeError("IpexMLP: invalid input dimensions (%d)" % input.dim())
+        input = input.contiguous()
+
+        params = []
+        for layer in self.layers:
+            params.append(layer.weight)
+            if layer.bias is not None:
+                params.append(layer.bias)
+        output = IpexMLPTowerFC.apply(input, self, self.get_buffers(N, bn, input.dtype, input.device), *params)
+        if not self.output_stays_blocked:
+            output = output.permute(0, 2, 1, 3).reshape(N, last.K).contiguous()
+        return output.to(input_type)
+
+    def extra_repr(self):
+        return 'sizes={}'.format(self.sizes)
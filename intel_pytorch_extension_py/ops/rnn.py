@@ -10,17 +10,29 @@ from torch.nn import init
 from torch import _VF
 
 def rnn_tanh(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first):
-    if input.device.type == 'xpu' and (dropout == 0 or training == False):
+    if input.device.type == 'xpu':
         return torch.ops.torch_ipex.rnn_tanh(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
     else:
         return _VF.rnn_tanh(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
 
 def rnn_relu(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first):
-    if input.device.type == 'xpu' and (dropout == 0 or training == False):
+    if input.device.type == 'xpu':
         return torch.ops.torch_ipex.rnn_relu(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
     else:
         return _VF.rnn_relu(input, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional, batch_first)
 
+def rnn_tanh_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional):
+    if data.device.type == 'xpu':
+        return torch.ops.torch_ipex.rnn_tanh_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+    else:
+        return _VF.rnn_tanh(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+
+def rnn_relu_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional):
+    if data.device.type == 'xpu':
+        return torch.ops.torch_ipex.rnn_relu_packed(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+    else:
+        return _VF.rnn_relu(data, batch_sizes, hx, _flat_weights, bias, num_layers, dropout, training, bidirectional)
+
 _rnn_impls = {
     'RNN_TANH': _VF.rnn_tanh,
     'RNN_RELU': _VF.rnn_relu,
@@ -31,6 +43,11 @@ ipex_rnn_impls = {
     'RNN_RELU': rnn_relu,
 }
 
+ipex_rnn_packed_impls = {
+    'RNN_TANH': rnn_tanh_packed,
+    'RNN_RELU': rnn_relu_packed,
+}
+
 
 def apply_permutation(tensor, permutation, dim=1):
     # type: (Tensor, Tensor, int) -> Tensor
@@ -239,13 +256,13 @@ class RNNBase(Module):
             hx = self.permute_hidden(hx, sorted_indices)
 
         self.check_forward_args(input, hx, batch_sizes)
-        _impl = _rnn_impls[self.mode]
-        ipex_impl = ipex_rnn_impls[self.mode]
         if batch_sizes is None:
+            ipex_impl = ipex_rnn_impls[self.mode]
             result = ipex_impl(input, hx, self._flat_weights, self.bias, self.num_layers,
                            self.dropout, self.training, self.bidirectional, self.batch_first)
         else:
-            result = _impl(input, batch_sizes, hx, self._flat_weights, self.bias,
+            ipex_impl = ipex_rnn_packed_impls[self.mode]
+            result = ipex_impl(input, batch_sizes, hx, self._flat_weights, self.bias,
                            self.num_layers, self.dropout, self.training, self.bidirectional)
         output = result[0]
         hidden = result[1]
@@ -1,5 +1,4 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
-import torch
 from torch import nn
 from torch.autograd import Function
 from torch.autograd.function import once_differentiable
@@ -66,3 +65,78 @@ class ROIAlign(nn.Module):
         tmpstr += ", sampling_ratio=" + str(self.sampling_ratio)
         tmpstr += ")"
         return tmpstr
+
+
+class _MultiLevelROIAlign(Function):
+    @staticmethod
+    def forward(ctx, rois, output_size, scales, sampling_ratio, canonical_scale, canonical_level, *inputs):
+        ctx.save_for_backward(rois)
+        ctx.output_size = _pair(output_size)
+        ctx.scales = scales
+        ctx.sampling_ratio = sampling_ratio
+        ctx.canonical_scale = canonical_scale
+        ctx.canonical_level = canonical_level
+        ctx.input_shapes = [input.size() for input in inputs]
+        output = core.roi_align_multilevel_forward(
+            list(inputs), rois, scales, ctx.output_size[0], ctx.output_size[1],
+            sampling_ratio, canonical_scale, canonical_level
+        )
+        return output
+
+    @staticmethod
+    @once_differentiable
+    def backward(ctx, grad_output):
+        rois, = ctx.saved_tensors
+        output_size = ctx.output_size
+        bs, ch = ctx.input_shapes[0][:2]
+        grad_inputs = core.roi_align_multilevel_backward(
+            grad_output,
+            rois,
+            ctx.scales,
+            output_size[0],
+            output_size[1],
+            bs,
+            ch,
+            [shape[2] for shape in ctx.input_shapes],
+            [shape[3] for shape in ctx.input_shapes],
+            ctx.sampling_ratio,
+            ctx.canonical_scale,
+            ctx.canonical_level,
+        )
+        return (None,) * 6 + tuple(grad_inputs)
+
+
+def multilevel_roi_align(inputs, rois, output_size, scales, sampling_ratio, canonical_scale=224, canonical_level=4):
+    return _MultiLevelROIAlign.apply(
+        rois, output_size, scales, sampling_ratio, canonical_scale, canonical_level, *inputs
+    )
+
+
+class MultiLevelROIAlign(nn.Module):
+    """
+    Pools each ROI from the feature map of the level of the pyramid the FPN rule
+    assigns it to, the feature maps being of the scales in increasing strides.
+    """
+    def __init__(self, output_size, scales, sampling_ratio, canonical_scale=224, canonical_level=4):
+        super(MultiLevelROIAlign, self).__init__()
+        self.output_size = output_size
+        self.scales = scales
+        self.sampling_ratio = sampling_ratio
+        self.canonical_scale = canonical_scale
+        self.canonical_level = canonical_level
+
+    def forward(self, inputs, rois):
+        return multilevel_roi_align(
+            inputs, rois, self.output_size, self.scales, self.sampling_ratio,
+            self.canonical_scale, self.canonical_level
+        )
+
+    def __repr__(self):
+        tmpstr = self.__class__.__name__ + "("
+        tmpstr += "output_size=" + str(self.output_size)
+        tmpstr += ", scales=" + str(self.scales)
+        tmpstr += ", sampling_ratio=" + str(self.sampling_ratio)
+        tmpstr += ", canonical_scale=" + str(self.canonical_scale)
+        tmpstr += ", canonical_level=" + str(self.canonical_level)
+        tmpstr += ")"
+        return tmpstr
@@ -0,0 +1,258 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from torch import nn
+
+# # hot-row cache of an embedding table kept in a memory-mapped file
+
+_policies = ('lru', 'lfu')
+
+def _split_fp32(rows):
+    # the high and low 16 bits of fp32 values, the split bf16 layout of SplitSGD
+    bits = rows.view(torch.int32)
+    top = (bits >> 16).to(torch.int16).view(torch.bfloat16)
+    bottom = (bits & 0xffff).to(torch.int16).view(torch.bfloat16)
+    return top, bottom
+
+# the prefetches pending at the same time, e.g. of the next two batches when
+# the next batch is prefetched before the lookup of the current one
+_max_prefetches = 2
+
+class _Prefetch(object):
+    def __init__(self, batch_rows, rows, future):
+        self.batch_rows = batch_rows
+        self.rows = rows
+        self.future = future
+        # rows written back since the prefetch started, its copy of them is stale
+        self.written_back = []
+
+def _pack_fp32(top, bottom):
+    bits = (top.view(torch.int16).to(torch.int32) << 16) | (bottom.view(torch.int16).to(torch.int32) & 0xffff)
+    return bits.view(torch.float)
+
+class TieredEmbeddingStorage(object):
+    r"""An embedding table stored in a fp32 memory-mapped file with its hot
+    rows cached in memory.
+
+    :attr:`weight` is the ``{cache_rows, embedding_dim}`` cache, every
+    :meth:`lookup` maps the table rows of a batch to cache slots, loading the
+    missing rows and evicting the least recently (``'lru'``) or the least
+    frequently (``'lfu'``) used ones. The storage can be passed as the weight of
+    :func:`embeddingbag` or wrapped in :class:`TieredEmbeddingBag`.
+
+    In training the looked up rows are written back to the file when they are
+    evicted or on :meth:`flush`, so a step of the optimizer on :attr:`weight`
+    has to follow every lookup before the next one. For a bf16 cache updated by
+    :class:`SplitSGD`, :meth:`attach_optimizer` keeps the bottom halves of the
+    cached rows in the optimizer state so that the file keeps the fp32 values.
+    The other per-row state of the attached optimizer, e.g. momentum buffers or
+    Adagrad sums, is reset for the slots taken by newly loaded rows.
+
+    :meth:`prefetch` reads the rows of an upcoming batch missing from the cache
+    in a background thread, e.g. while the current batch is computed. The
+    :meth:`lookup` of that batch waits for them, the lookups before it only take
+    the rows already read.
+    """
+
+    def __init__(self, path, num_embeddings, embedding_dim, cache_rows, policy='lru',
+                 dtype=torch.float, device='xpu:0'):
+        if policy not in _policies:
+            raise ValueError("Invalid policy for TieredEmbeddingStorage: {}".format(policy))
+        if dtype not in (torch.float, torch.bfloat16):
+            raise ValueError("Invalid dtype for TieredEmbeddingStorage: {}".format(dtype))
+        if cache_rows <= 0 or cache_rows > num_embeddings:
+            raise ValueError("Invalid cache_rows value: {}".format(cache_rows))
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        self.table = np.memmap(path, dtype=np.float32, mode=mode, shape=(num_embeddings, embedding_dim))
+        self.num_embeddings = num_embeddings
+        self.embedding_dim = embedding_dim
+        self.cache_rows = cache_rows
+        self.policy = policy
+        self.weight = nn.Parameter(torch.zeros(cache_rows, embedding_dim, dtype=dtype).to(device))
+        self.optimizer = None
+
+        self._slot_of_row = torch.full((num_embeddings,), -1, dtype=torch.long)
+        self._row_of_slot = torch.full((cache_rows,), -1, dtype=torch.long)
+        self._dirty = torch.zeros(cache_rows, dtype=torch.bool)
+        # recency (lru) or frequency (lfu) of the slots, free slots go first
+        self._priority = torch.full((cache_rows,), -1, dtype=torch.long)
+        self._clock = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._prefetches = []
+        self.reset_stats()
+
+    @classmethod
+    def from_tensor(cls, path, weight, cache_rows, policy='lru', dtype=torch.float, device='xpu:0'):
+        r"""Write a ``{num_embeddings, embedding_dim}`` table to ``path`` and cache it."""
+        weight = weight.detach().to('cpu').float()
+        table = np.memmap(path, dtype=np.float32, mode='w+', shape=tuple(weight.size()))
+        table[:] = weight.numpy()
+        table.flush()
+        del table
+        return cls(path, weight.size(0), weight.size(1), cache_rows, policy, dtype, device)
+
+    def attach_optimizer(self, optimizer):
+        self.optimizer = optimizer
+
+    def _bottom_half(self):
+        if self.optimizer is None or self.weight.dtype != torch.bfloat16:
+            return None
+        state = self.optimizer.state[self.weight]
+        if 'bottom_half' not in state:
+            state['bottom_half'] = torch.zeros_like(
+                self.weight.data, dtype=torch.bfloat16, device=self.weight.device)
+        return state['bottom_half']
+
+    def _reset_slot_state(self, slots):
+        # the optimizer state of a slot belongs to the row evicted from it
+        if self.optimizer is None:
+            return
+        group = next((g for g in self.optimizer.param_groups
+                      if any(p is self.weight for p in g['params'])), {})
+        slots = slots.to(self.weight.device)
+        for name, value in self.optimizer.state[self.weight].items():
+            if name == 'bottom_half' or not torch.is_tensor(value) or value.dim() == 0 \
+                    or value.size(0) != self.cache_rows:
+                continue
+            initial_value = group.get('initial_accumulator_value', 0) if name == 'sum' else 0
+            value.index_fill_(0, slots, initial_value)
+
+    def _read_rows(self, rows):
+        return torch.from_numpy(self.table[rows.numpy()])
+
+    def _load(self, slots, values):
+        bottom_half = self._bottom_half()
+        if bottom_half is not None:
+            top, bottom = _split_fp32(values)
+            self.weight.data.index_copy_(0, slots.to(self.weight.device), top.to(self.weight.device))
+            bottom_half.index_copy_(0, slots.to(self.weight.device), bottom.to(self.weight.device))
+        else:
+            values = values.to(self.weight.dtype).to(self.weight.device)
+            self.weight.data.index_copy_(0, slots.to(self.weight.device), values)
+
+    def _write_back(self, slots):
+        if slots.numel() == 0:
+            return
+        rows = self._row_of_slot[slots]
+        values = self.weight.data.index_select(0, slots.to(self.weight.device)).to('cpu')
+        bottom_half = self._bottom_half()
+        if bottom_half is not None:
+            values = _pack_fp32(values, bottom_half.index_select(0, slots.to(self.weight.device)).to('cpu'))
+        self.table[rows.numpy()] = values.float().numpy()
+        self._dirty[slots] = False
+        self.write_backs += slots.numel()
+        for prefetch in self._prefetches:
+            prefetch.written_back.append(rows)
+
+    def prefetch(self, indices):
+        r"""Start reading the rows of ``indices`` missing from the cache."""
+        batch_rows = torch.unique(indices.to('cpu'))
+        rows = batch_rows[self._slot_of_row[batch_rows] < 0]
+        self._prefetches.append(_Prefetch(batch_rows, rows, self._executor.submit(self._read_rows, rows)))
+        del self._prefetches[:-_max_prefetches]
+
+    def _take_prefetched(self, prefetch, rows, values, found):
+        # fill the values of the rows read by a prefetch, unless the cache wrote
+        # them back after they were read
+        if prefetch.rows.numel() == 0:
+            return
+        pos = torch.searchsorted(prefetch.rows, rows).clamp(max=prefetch.rows.numel() - 1)
+        staged = (prefetch.rows[pos] == rows) & ~found
+        if not staged.any():
+            return
+        staged_values = prefetch.future.result()
+        if len(prefetch.written_back) > 0:
+            written_back = torch.cat(prefetch.written_back).sort()[0]
+            written_pos = torch.searchsorted(written_back, rows).clamp(max=written_back.numel() - 1)
+            staged &= written_back[written_pos] != rows
+        values[staged] = staged_values[pos[staged]]
+        found |= staged
+        self.prefetched_rows += int(staged.sum())
+
+    def _take_prefetches(self, batch_rows, rows, values):
+        # The lookup of a prefetched batch waits for its prefetch, which is then
+        # done with. The other prefetches stay pending, their rows are only
+        # taken once read.
+        found = torch.zeros(rows.numel(), dtype=torch.bool)
+        for prefetch in list(self._prefetches):
+            if torch.equal(batch_rows, prefetch.batch_rows):
+                self._prefetches.remove(prefetch)
+            elif not prefetch.future.done():
+                continue
+            if rows.numel() > 0:
+                self._take_prefetched(prefetch, rows, values, found)
+        return found
+
+    def lookup(self, indices):
+        r"""Return the cache slots of ``indices``, loading the missing rows."""
+        rows, inverse = torch.unique(indices.to('cpu'), sorted=True, return_inverse=True)
+        counts = torch.bincount(inverse.view(-1), minlength=rows.numel())
+        slots = self._slot_of_row[rows]
+        missing = slots < 0
+        num_missing = int(missing.sum())
+        self.lookups += indices.numel()
+        self.misses += int(counts[missing].sum())
+
+        if num_missing > 0:
+            if rows.numel() > self.cache_rows:
+                raise RuntimeError("TieredEmbeddingStorage: a batch uses {} rows, more than the {} cached rows"
+                                   .format(rows.numel(), self.cache_rows))
+            # the rows of this batch stay cached, the victims are picked among the others
+            priority = self._priority.clone()
+            priority[slots[~missing]] = torch.iinfo(torch.long).max
+            victims = torch.topk(priority, num_missing, largest=False)[1]
+            evicted = self._row_of_slot[victims] >= 0
+            self._write_back(victims[evicted & self._dirty[victims]])
+            self._slot_of_row[self._row_of_slot[victims[evicted]]] = -1
+            self.evictions += int(evicted.sum())
+
+            missing_rows = rows[missing]
+            values = torch.empty(num_missing, self.embedding_dim)
+            found = self._take_prefetches(rows, missing_rows, values)
+            if not found.all():
+                values[~found] = self._read_rows(missing_rows[~found])
+            self._load(victims, values)
+            self._reset_slot_state(victims)
+            self._slot_of_row[missing_rows] = victims
+            self._row_of_slot[victims] = missing_rows
+            self._priority[victims] = 0
+            slots[missing] = victims
+        else:
+            # a prefetched batch may turn out to be fully cached
+            self._take_prefetches(rows, rows[:0], None)
+
+        self._clock += 1
+        if self.policy == 'lru':
+            self._priority[slots] = self._clock
+        else:
+            self._priority[slots] += counts
+        if torch.is_grad_enabled() and self.weight.requires_grad:
+            self._dirty[slots] = True
+        return slots[inverse].to(indices.device)
+
+    def flush(self):
+        r"""Write the updated cached rows back to the file."""
+        self._write_back(self._dirty.nonzero().view(-1))
+        self.table.flush()
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown()
+
+    def reset_stats(self):
+        self.lookups = 0
+        self.misses = 0
+        self.evictions = 0
+        self.write_backs = 0
+        self.prefetched_rows = 0
+
+    def stats(self):
+        r"""Return the lookup, miss, eviction and write-back counts and the hit rate."""
+        hits = self.lookups - self.misses
+        return {'lookups': self.lookups, 'hits': hits, 'misses': self.misses,
+                'hit_rate': float(hits) / self.lookups if self.lookups > 0 else 0.,
+                'evictions': self.evictions, 'write_backs': self.write_backs,
+                'prefetched_rows': self.prefetched_rows}
@@ -1,2 +1,7 @@
 from .split_sgd import is_available
 from .split_sgd import SplitSGD
+from .split_adagrad import SplitAdagrad
+from .split_adam import SplitAdam, SplitAdamW
+from .split_lamb import SplitLamb
+from .split_lars import SplitLars
+from .clip_grad import clip_grad_norm_
@@ -0,0 +1,38 @@
+import torch
+import _torch_ipex as core
+
+def clip_grad_norm_(parameters, max_norm):
+    r"""Clips the gradient 2-norm of an iterable of parameters in place, like
+    :func:`torch.nn.utils.clip_grad_norm_`.
+
+    The norms of all the gradients are taken, and the gradients scaled, by one
+    multi-tensor call each. A sparse gradient is coalesced so its values hold
+    its norm, and a non-contiguous gradient is replaced by a contiguous copy.
+
+    Returns:
+        Total norm of the gradients (viewed as a single vector).
+    """
+    if isinstance(parameters, torch.Tensor):
+        parameters = [parameters]
+    grads = []
+    for p in parameters:
+        if p.grad is None:
+            continue
+        if p.grad.is_sparse:
+            if not p.grad.is_coalesced():
+                p.grad = p.grad.coalesce()
+            if not p.grad._values().is_contiguous():
+                p.grad = torch.sparse_coo_tensor(p.grad._indices(), p.grad._values().contiguous(),
+                                                 p.grad.size())._coalesced_(True)
+            grads.append(p.grad._values())
+        else:
+            if not p.grad.is_contiguous():
+                p.grad = p.grad.contiguous()
+            grads.append(p.grad.data)
+    if len(grads) == 0:
+        return torch.tensor(0.)
+    total_norm = core.multi_tensor_l2norm(grads, []).norm()
+    clip_coef = float(max_norm) / (total_norm.item() + 1e-6)
+    if clip_coef < 1:
+        core.multi_tensor_scale_(grads, clip_coef)
+    return total_norm
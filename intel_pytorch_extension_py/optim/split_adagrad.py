@@ -0,0 +1,72 @@
+import torch
+from torch.optim.optimizer import Optimizer
+from .split_sgd import _bottom_half, _grad
+
+_available = False
+try:
+    from _torch_ipex import adagrad_step
+    _available = True
+except ImportError as e:
+    pass
+
+class SplitAdagrad(Optimizer):
+    r"""Implements Adagrad for fp32 and split bf16 parameters.
+
+    A bf16 parameter is the top half of a fp32 master weight whose low 16 bits
+    are kept in the optimizer state, its sum of squares is kept in fp32. All
+    the parameters of a group are updated by one fused step. With a sparse
+    gradient, e.g. of an embedding table, only the rows of the gradient are
+    updated.
+    """
+
+    def __init__(self, params, lr=1e-2, lr_decay=0, weight_decay=0, initial_accumulator_value=0, eps=1e-10):
+        if not _available:
+            raise ValueError("Module function 'adagrad_step' not available for SplitAdagrad")
+        if not 0.0 <= lr:
+            raise ValueError("Invalid learning rate: {}".format(lr))
+        if not 0.0 <= lr_decay:
+            raise ValueError("Invalid lr_decay value: {}".format(lr_decay))
+        if not 0.0 <= weight_decay:
+            raise ValueError("Invalid weight_decay value: {}".format(weight_decay))
+        if not 0.0 <= initial_accumulator_value:
+            raise ValueError("Invalid initial_accumulator_value value: {}".format(initial_accumulator_value))
+        if not 0.0 <= eps:
+            raise ValueError("Invalid epsilon value: {}".format(eps))
+
+        defaults = dict(lr=lr, lr_decay=lr_decay, eps=eps, weight_decay=weight_decay,
+                        initial_accumulator_value=initial_accumulator_value)
+        super(SplitAdagrad, self).__init__(params, defaults)
+
+    def step(self, closure=None):
+        """Performs a single optimization step.
+
+        Arguments:
+            closure (callable, optional): A closure that reevaluates the model
+                and returns the loss.
+        """
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            # the parameters of a group share the learning rate of their step
+            updates = {}
+            for p in group['params']:
+                if p.grad is None:
+                    continue
+                state = self.state[p]
+                if 'step' not in state:
+                    state['step'] = 0
+                    state['sum'] = torch.full_like(p.data, group['initial_accumulator_value'], dtype=torch.float)
+                state['step'] += 1
+                params, bottom_halves, grads, state_sums = updates.setdefault(state['step'], ([], [], [], []))
+                params.append(p)
+                bottom_halves.append(_bottom_half(state, p))
+                grads.append(_grad(p))
+                state_sums.append(state['sum'])
+
+            for step, (params, bottom_halves, grads, state_sums) in updates.items():
+                clr = group['lr'] / (1 + (step - 1) * group['lr_decay'])
+                adagrad_step(params, bottom_halves, grads, state_sums, clr, group['weight_decay'], group['eps'])
+
+        return loss
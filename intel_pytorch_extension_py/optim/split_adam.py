@@ -0,0 +1,84 @@
+import torch
+from torch.optim.optimizer import Optimizer
+from .split_sgd import _bottom_half, _grad
+
+_available = False
+try:
+    from _torch_ipex import adam_step
+    _available = True
+except ImportError as e:
+    pass
+
+class SplitAdam(Optimizer):
+    r"""Implements Adam for fp32 and split bf16 parameters.
+
+    A bf16 parameter is the top half of a fp32 master weight whose low 16 bits
+    are kept in the optimizer state, its moments are kept in fp32. All the
+    parameters of a group are updated by one fused step. With a sparse
+    gradient only the rows of the gradient are updated, like SparseAdam.
+    """
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8, weight_decay=0):
+        if not _available:
+            raise ValueError("Module function 'adam_step' not available for {}".format(type(self).__name__))
+        if not 0.0 <= lr:
+            raise ValueError("Invalid learning rate: {}".format(lr))
+        if not 0.0 <= eps:
+            raise ValueError("Invalid epsilon value: {}".format(eps))
+        if not 0.0 <= betas[0] < 1.0:
+            raise ValueError("Invalid beta parameter at index 0: {}".format(betas[0]))
+        if not 0.0 <= betas[1] < 1.0:
+            raise ValueError("Invalid beta parameter at index 1: {}".format(betas[1]))
+        if not 0.0 <= weight_decay:
+            raise ValueError("Invalid weight_decay value: {}".format(weight_decay))
+        defaults = dict(lr=lr, betas=betas, eps=eps, weight_decay=weight_decay)
+        super(SplitAdam, self).__init__(params, defaults)
+
+    # AdamW decays the weights directly instead of adding the decay to the gradients
+    _decoupled_weight_decay = False
+
+    def step(self, closure=None):
+        """Performs a single optimization step.
+
+        Arguments:
+            closure (callable, optional): A closure that reevaluates the model
+                and returns the loss.
+        """
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group['betas']
+            # the parameters of a group share the bias corrections of their step
+            updates = {}
+            for p in group['params']:
+                if p.grad is None:
+                    continue
+                state = self.state[p]
+                if 'step' not in state:
+                    state['step'] = 0
+                    state['exp_avg'] = torch.zeros_like(p.data, dtype=torch.float)
+                    state['exp_avg_sq'] = torch.zeros_like(p.data, dtype=torch.float)
+                state['step'] += 1
+                params, bottom_halves, grads, exp_avgs, exp_avg_sqs = updates.setdefault(
+                    state['step'], ([], [], [], [], []))
+                params.append(p)
+                bottom_halves.append(_bottom_half(state, p))
+                grads.append(_grad(p))
+                exp_avgs.append(state['exp_avg'])
+                exp_avg_sqs.append(state['exp_avg_sq'])
+
+            for step, (params, bottom_halves, grads, exp_avgs, exp_avg_sqs) in updates.items():
+                adam_step(params, bottom_halves, grads, exp_avgs, exp_avg_sqs, group['lr'], beta1, beta2,
+                          group['eps'], group['weight_decay'], self._decoupled_weight_decay, step)
+
+        return loss
+
+class SplitAdamW(SplitAdam):
+    r"""Implements AdamW for fp32 and split bf16 parameters, see :class:`SplitAdam`."""
+
+    _decoupled_weight_decay = True
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8, weight_decay=1e-2):
+        super(SplitAdamW, self).__init__(params, lr, betas, eps, weight_decay)
@@ -0,0 +1,74 @@
+import torch
+from torch.optim.optimizer import Optimizer, required
+from .split_sgd import _bottom_half
+
+_available = False
+try:
+    from _torch_ipex import lars_step
+    _available = True
+except ImportError as e:
+    pass
+
+class SplitLars(Optimizer):
+    r"""Implements LARS for fp32 and split bf16 parameters.
+
+    The gradient of every parameter, weight decay included, is scaled by the
+    trust ratio ``trust_coefficient * |param| / (|grad| + weight_decay * |param|)``
+    of the parameter before the SGD momentum step. A bf16 parameter is the top
+    half of a fp32 master weight whose low 16 bits are kept in the optimizer
+    state, its momentum buffer is split the same way. The norms of all the
+    parameters of a group are taken in one parallel region, and a second one
+    applies the updates. Gradients must be dense.
+    """
+
+    def __init__(self, params, lr=required, momentum=0, weight_decay=0, trust_coefficient=0.001, eps=1e-8):
+        if not _available:
+            raise ValueError("Module function 'lars_step' not available for SplitLars")
+        if lr is not required and lr < 0.0:
+            raise ValueError("Invalid learning rate: {}".format(lr))
+        if momentum < 0.0:
+            raise ValueError("Invalid momentum value: {}".format(momentum))
+        if weight_decay < 0.0:
+            raise ValueError("Invalid weight_decay value: {}".format(weight_decay))
+        if trust_coefficient <= 0.0:
+            raise ValueError("Invalid trust_coefficient value: {}".format(trust_coefficient))
+        defaults = dict(lr=lr, momentum=momentum, weight_decay=weight_decay,
+                        trust_coefficient=trust_coefficient, eps=eps)
+        super(SplitLars, self).__init__(params, defaults)
+
+    def step(self, closure=None):
+        """Performs a single optimization step.
+
+        Arguments:
+            closure (callable, optional): A closure that reevaluates the model
+                and returns the loss.
+        """
+        loss = None
+        if closure is not None:
+            loss = closure()
+
+        for group in self.param_groups:
+            momentum = group['momentum']
+            params, bottom_halves, grads, bufs, buf_bottom_halves = [], [], [], [], []
+            for p in group['params']:
+                if p.grad is None:
+                    continue
+                if p.grad.is_sparse:
+                    raise RuntimeError('SplitLars does not support sparse gradients')
+                param_state = self.state[p]
+                params.append(p)
+                bottom_halves.append(_bottom_half(param_state, p))
+                grads.append(p.grad.data)
+                if momentum != 0:
+                    if 'momentum_buffer' not in param_state:
+                        param_state['momentum_buffer'] = torch.zeros_like(p.data)
+                        if p.dtype == torch.bfloat16:
+                            param_state['momentum_buffer_bottom_half'] = torch.zeros_like(p.data)
+                    bufs.append(param_state['momentum_buffer'])
+                    buf_bottom_halves.append(param_state.get('momentum_buffer_bottom_half', torch.Tensor()))
+
+            if len(params) > 0:
+                lars_step(params, bottom_halves, grads, bufs, buf_bottom_halves, group['lr'], momentum,
+                          group['weight_decay'], group['trust_coefficient'], group['eps'])
+
+        return loss
@@ -1,10 +1,9 @@
 import torch
 from torch.optim.optimizer import Optimizer, required
-import _torch_ipex
 
 _available = False
 try:
-    from _torch_ipex import packed_add_ 
+    from _torch_ipex import sgd_step
     _available = True
 except ImportError as e:
     pass
@@ -12,24 +11,45 @@ except ImportError as e:
 def is_available():
     return _available
 
+def _bottom_half(state, p):
+    # the low 16 bits of the fp32 master weight of a bf16 parameter
+    if p.dtype != torch.bfloat16:
+        return torch.Tensor()
+    if 'bottom_half' not in state:
+        state['bottom_half'] = torch.zeros_like(p.data, dtype=torch.bfloat16, device=p.data.device)
+    return state['bottom_half']
+
+def _grad(p):
+    grad = p.grad.data
+    if grad.is_sparse and not grad.is_coalesced():
+        grad = grad.coalesce()
+    return grad
+
 class SplitSGD(Optimizer):
-    r"""Implements low precision stochastic gradient descent with extra state."""
+    r"""Implements low precision stochastic gradient descent with extra state.
+
+    A bf16 parameter is the top half of a fp32 master weight whose low 16 bits
+    are kept in the optimizer state, its momentum buffer is split the same way.
+    All the parameters of a group are updated by one fused step. With a sparse
+    gradient only the rows of the gradient are updated, momentum and weight
+    decay included.
+    """
 
     def __init__(self, params, lr=required, momentum=0, dampening=0,
                  weight_decay=0, nesterov=False):
         if not is_available():
-            raise ValueError("Module function 'packed_add_' not available for SplitSGD")
+            raise ValueError("Module function 'sgd_step' not available for SplitSGD")
         if lr is not required and lr < 0.0:
             raise ValueError("Invalid learning rate: {}".format(lr))
-        if momentum != 0.0:
+        if momentum < 0.0:
             raise ValueError("Invalid momentum value: {}".format(momentum))
-        if weight_decay != 0.0:
+        if weight_decay < 0.0:
             raise ValueError("Invalid weight_decay value: {}".format(weight_decay))
 
         defaults = dict(lr=lr, momentum=momentum, dampening=dampening,
                         weight_decay=weight_decay, nesterov=nesterov)
-        if nesterov:
-            raise ValueError("Invalid nesterov value")
+        if nesterov and (momentum <= 0 or dampening != 0):
+            raise ValueError("Nesterov momentum requires a momentum and zero dampening")
         super(SplitSGD, self).__init__(params, defaults)
 
     def __setstate__(self, state):
@@ -49,23 +69,30 @@ class SplitSGD(Optimizer):
             loss = closure()
 
         for group in self.param_groups:
-            weight_decay = group['weight_decay']
-
+            momentum = group['momentum']
+            # the momentum buffers created by this step start from the gradients
+            updates = {True: ([], [], [], [], []), False: ([], [], [], [], [])}
             for p in group['params']:
                 if p.grad is None:
                     continue
-                d_p = p.grad.data
-                if p.dtype == torch.bfloat16:
-                    param_state = self.state[p]
-                    if 'bottom_half' not in param_state:
-                        b_d = param_state['bottom_half'] = torch.zeros_like(
-                            p.data, dtype=torch.bfloat16, device=p.data.device)
-                    else:
-                        b_d = param_state['bottom_half']
+                param_state = self.state[p]
+                first_step = False
+                if momentum != 0 and 'momentum_buffer' not in param_state:
+                    first_step = True
+                    param_state['momentum_buffer'] = torch.zeros_like(p.data)
+                    if p.dtype == torch.bfloat16:
+                        param_state['momentum_buffer_bottom_half'] = torch.zeros_like(p.data)
+                params, bottom_halves, grads, bufs, buf_bottom_halves = updates[first_step]
+                params.append(p)
+                bottom_halves.append(_bottom_half(param_state, p))
+                grads.append(_grad(p))
+                if momentum != 0:
+                    bufs.append(param_state['momentum_buffer'])
+                    buf_bottom_halves.append(param_state.get('momentum_buffer_bottom_half', torch.Tensor()))
 
-                if p.dtype == torch.bfloat16:
-                    packed_add_(p.data, b_d, d_p, -group['lr'])
-                else:
-                    p.data.add_(d_p, alpha=-group['lr'])
+            for first_step, (params, bottom_halves, grads, bufs, buf_bottom_halves) in updates.items():
+                if len(params) > 0:
+                    sgd_step(params, bottom_halves, grads, bufs, buf_bottom_halves, group['lr'],
+                             momentum, group['dampening'], group['weight_decay'], group['nesterov'], first_step)
 
         return loss
@@ -0,0 +1,79 @@
+from __future__ import print_function
+
+import argparse
+import time
+
+import torch
+import intel_pytorch_extension as ipex
+
+# The ISAs the bf16 kernels dispatch to, the avx512_core ones being the fp32
+# FMA kernels widening bf16 with shifts.
+ISAS = ['avx512_core', 'avx512_core_bf16', 'avx512_core_amx']
+
+
+def time_op(fn, args):
+    with torch.no_grad():
+        for _ in range(args.warmup):
+            fn()
+        start = time.time()
+        for _ in range(args.iterations):
+            fn()
+        elapsed = time.time() - start
+    return elapsed * 1e3 / args.iterations
+
+
+def embedding_bag_case(args, weighted):
+    weight = torch.randn(args.rows, args.dim, dtype=torch.bfloat16)
+    emb = torch.nn.EmbeddingBag(args.rows, args.dim, mode='sum', _weight=weight).to(ipex.DEVICE)
+    num_lookups = args.batch_size * args.pooling
+    indices = torch.randint(0, args.rows, (num_lookups,)).to(ipex.DEVICE)
+    offsets = torch.arange(0, num_lookups, args.pooling, dtype=torch.long).to(ipex.DEVICE)
+    per_sample_weights = torch.rand(num_lookups).bfloat16().to(ipex.DEVICE) if weighted else None
+    return lambda: emb(indices, offsets, per_sample_weights=per_sample_weights)
+
+
+def interaction_case(args):
+    inputs = [torch.randn(args.batch_size, args.dim).bfloat16().to(ipex.DEVICE)
+              for _ in range(args.num_features)]
+    return lambda: ipex.interaction(*inputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bf16 embedding_bag and interaction kernels of IPEX '
+                                                 'on the ISAs the host supports')
+    parser.add_argument('--rows', type=int, default=1000000, help='number of rows of the table')
+    parser.add_argument('--dim', type=int, default=128, help='embedding dimension')
+    parser.add_argument('--batch-size', type=int, default=2048, help='number of bags and samples')
+    parser.add_argument('--pooling', type=int, default=32, help='number of lookups of a bag')
+    parser.add_argument('--num-features', type=int, default=27, help='number of features of interaction')
+    parser.add_argument('--warmup', type=int, default=5, help='warmup iterations')
+    parser.add_argument('--iterations', type=int, default=50, help='timed iterations')
+    args = parser.parse_args()
+
+    host_isa = ipex.core.get_host_cpu_isa()
+    if host_isa not in ISAS:
+        print('the bf16 kernels of {} do not depend on the ISA'.format(host_isa))
+        return
+    isas = ISAS[:ISAS.index(host_isa) + 1]
+    cases = [
+        ('embedding_bag sum', embedding_bag_case(args, False)),
+        ('embedding_bag weighted sum', embedding_bag_case(args, True)),
+        ('interaction forward', interaction_case(args)),
+    ]
+
+    print('{:>28} {:>18} {:>10} {:>8}'.format('op', 'isa', 'ms/iter', 'speedup'))
+    isa = ipex.core.get_cpu_isa()
+    try:
+        for name, fn in cases:
+            baseline = None
+            for case_isa in isas:
+                ipex.core.set_cpu_isa(case_isa)
+                ms = time_op(fn, args)
+                baseline = baseline or ms
+                print('{:>28} {:>18} {:>10.3f} {:>8.2f}'.format(name, case_isa, ms, baseline / ms))
+    finally:
+        ipex.core.set_cpu_isa(isa)
+
+
+if __name__ == '__main__':
+    main()
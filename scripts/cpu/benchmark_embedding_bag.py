@@ -0,0 +1,80 @@
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+import torch
+import intel_pytorch_extension as ipex
+
+
+def generate_indices(distribution, num_rows, num_lookups, alpha, rng):
+    if distribution == 'uniform':
+        indices = rng.randint(0, num_rows, size=num_lookups)
+    else:
+        # zipf samples start from 1 and are unbounded, fold them into the table
+        # and scatter the hot rows over it instead of packing them at the top.
+        ranks = (rng.zipf(alpha, size=num_lookups) - 1) % num_rows
+        indices = (ranks * 2654435761) % num_rows
+    return torch.from_numpy(indices.astype(np.int64))
+
+
+def run(args, num_rows, distribution, prefetch_distance, sort_indices, rng):
+    weight = torch.randn(num_rows, args.dim, dtype=torch.bfloat16 if args.bf16 else torch.float)
+    emb = torch.nn.EmbeddingBag(num_rows, args.dim, mode='sum', _weight=weight).to(ipex.DEVICE)
+    num_lookups = args.batch_size * args.pooling
+    offsets = torch.arange(0, num_lookups, args.pooling, dtype=torch.long).to(ipex.DEVICE)
+    batches = [generate_indices(distribution, num_rows, num_lookups, args.alpha, rng).to(ipex.DEVICE)
+               for _ in range(args.num_batches)]
+
+    ipex.core.set_embedding_bag_prefetch_distance(prefetch_distance)
+    if sort_indices:
+        ipex.core.enable_embedding_bag_sort_indices()
+    else:
+        ipex.core.disable_embedding_bag_sort_indices()
+
+    with torch.no_grad():
+        for indices in batches[:args.warmup]:
+            emb(indices, offsets)
+        start = time.time()
+        for _ in range(args.iterations):
+            for indices in batches:
+                emb(indices, offsets)
+        elapsed = time.time() - start
+    lookups = args.iterations * args.num_batches * num_lookups
+    return elapsed * 1e3 / (args.iterations * args.num_batches), lookups / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the embedding_bag sum gather of IPEX')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 10000000],
+                        help='number of rows of the tables')
+    parser.add_argument('--dim', type=int, default=128, help='embedding dimension')
+    parser.add_argument('--batch-size', type=int, default=2048, help='number of bags')
+    parser.add_argument('--pooling', type=int, default=32, help='number of lookups of a bag')
+    parser.add_argument('--distributions', nargs='+', default=['uniform', 'zipf'],
+                        choices=['uniform', 'zipf'], help='index distributions')
+    parser.add_argument('--alpha', type=float, default=1.05, help='exponent of the zipf distribution')
+    parser.add_argument('--prefetch-distances', type=int, nargs='+', default=[0, 4, 8, 16],
+                        help='prefetch distances to compare, 0 disables prefetching')
+    parser.add_argument('--bf16', action='store_true', help='use bfloat16 tables')
+    parser.add_argument('--num-batches', type=int, default=8, help='distinct index batches')
+    parser.add_argument('--warmup', type=int, default=2, help='warmup batches')
+    parser.add_argument('--iterations', type=int, default=10, help='timed passes over the batches')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('{:>10} {:>8} {:>8} {:>6} {:>10} {:>12}'.format(
+        'rows', 'dist', 'prefetch', 'sort', 'ms/batch', 'Mlookups/s'))
+    for num_rows in args.rows:
+        for distribution in args.distributions:
+            for sort_indices in (False, True):
+                for prefetch_distance in args.prefetch_distances:
+                    rng = np.random.RandomState(args.seed)
+                    ms, throughput = run(args, num_rows, distribution, prefetch_distance, sort_indices, rng)
+                    print('{:>10} {:>8} {:>8} {:>6} {:>10.3f} {:>12.1f}'.format(
+                        num_rows, distribution, prefetch_distance, str(sort_indices), ms, throughput))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import copy
+import os
+import subprocess
+import sys
+import torch
+import torch.nn as nn
+import intel_pytorch_extension as ipex
+import unittest
+from common_utils import TestCase
+
+ISAS = ['scalar', 'avx2', 'avx512_core', 'avx512_core_bf16', 'avx512_core_amx']
+
+class TestCpuIsa(TestCase):
+    def _supported_isas(self):
+        return ISAS[:ISAS.index(ipex.core.get_host_cpu_isa()) + 1]
+
+    def _run_on_each_isa(self, fn):
+        # the outputs of every ISA supported by the host, the last one being of the host ISA
+        outputs = []
+        isa = ipex.core.get_cpu_isa()
+        try:
+            for name in self._supported_isas():
+                ipex.core.set_cpu_isa(name)
+                self.assertEqual(ipex.core.get_cpu_isa(), name)
+                outputs.append(fn())
+        finally:
+            ipex.core.set_cpu_isa(isa)
+        return outputs
+
+    def test_set_cpu_isa(self):
+        self.assertTrue(ipex.core.get_host_cpu_isa() in ISAS)
+        with self.assertRaises(RuntimeError):
+            ipex.core.set_cpu_isa('sse4')
+        host_isa = ipex.core.get_host_cpu_isa()
+        if host_isa != ISAS[-1]:
+            with self.assertRaises(RuntimeError):
+                ipex.core.set_cpu_isa(ISAS[ISAS.index(host_isa) + 1])
+
+    def test_unknown_env_isa(self):
+        # an unknown IPEX_CPU_ISA warns and keeps the host ISA
+        env = dict(os.environ, IPEX_CPU_ISA='sse4')
+        result = subprocess.run(
+            [sys.executable, '-c', 'import intel_pytorch_extension as ipex; print(ipex.core.get_cpu_isa())'],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.strip(), ipex.core.get_host_cpu_isa())
+        self.assertIn('unknown IPEX_CPU_ISA=sse4', result.stderr)
+
+    def test_bf16_conversion(self):
+        # rounded to the nearest even bf16 by every ISA, tails included
+        x = torch.randn(1000)
+        x[7] = float('nan')
+        x[8] = float('inf')
+        ref = x.bfloat16()
+        for y in self._run_on_each_isa(lambda: x.to(ipex.DEVICE).bfloat16().to('cpu')):
+            self.assertEqual(ref[:7], y[:7])
+            self.assertTrue(torch.isnan(y[7]))
+            self.assertEqual(ref[8:], y[8:])
+
+    def test_emb(self):
+        # bags of an odd and an even number of rows, and rows of full vectors and tails
+        cpu_input = torch.randint(0, 100, (50,))
+        cpu_offsets = torch.LongTensor([0, 3, 3, 17, 40])
+        cpu_weights = torch.rand(50)
+        grad = torch.randn(5, 35)
+        for dtype in [torch.float, torch.bfloat16]:
+            for mode, weighted in [('sum', False), ('sum', True), ('mean', False)]:
+                cpu_emb = nn.EmbeddingBag(100, 35, mode=mode)
+                dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE).to(dtype)
+                weights = cpu_weights.to(dtype).float() if weighted else None
+                cpu_out = cpu_emb(cpu_input, cpu_offsets, per_sample_weights=weights)
+
+                def run():
+                    dpcpp_emb.weight.grad = None
+                    dpcpp_weights = weights.to(ipex.DEVICE).to(dtype) if weighted else None
+                    out = dpcpp_emb(cpu_input.to(ipex.DEVICE), cpu_offsets.to(ipex.DEVICE), per_sample_weights=dpcpp_weights)
+                    out.backward(grad.to(ipex.DEVICE).to(dtype))
+                    return out.to('cpu').float(), dpcpp_emb.weight.grad.to('cpu').float()
+
+                outputs = self._run_on_each_isa(run)
+                for out, weight_grad in outputs:
+                    self.assertEqual(cpu_out, out, atol=1e-1, rtol=1e-2)
+                    self.assertEqual(outputs[-1][0], out, atol=1e-1, rtol=1e-2)
+                    self.assertEqual(outputs[-1][1], weight_grad, atol=1e-2, rtol=1e-2)
+
+    def test_quantized_emb(self):
+        cpu_input = torch.randint(0, 100, (50,))
+        cpu_offsets = torch.LongTensor([0, 3, 3, 17, 40])
+        dpcpp_emb = nn.EmbeddingBag(100, 36, mode='mean').to(ipex.DEVICE)
+        for bit_rate in [16, 8, 4]:
+            quantized_emb = ipex.QuantizedEmbeddingBag.from_float(copy.deepcopy(dpcpp_emb), bit_rate)
+            outputs = self._run_on_each_isa(
+                lambda: quantized_emb(cpu_input.to(ipex.DEVICE), cpu_offsets.to(ipex.DEVICE)).to('cpu'))
+            for out in outputs:
+                self.assertEqual(outputs[-1], out, atol=1e-5, rtol=1e-5)
+
+    def test_interaction(self):
+        # the AMX tiles take up to 32 features of a multiple of 32 values
+        for num_features, feature_size in [(27, 32), (27, 128), (40, 48), (5, 16)]:
+            inputs = [torch.randn(128, feature_size) for _ in range(num_features)]
+            for dtype, prec in [(torch.float, 1e-5), (torch.bfloat16, 1e-1)]:
+                dpcpp_inputs = [x.to(ipex.DEVICE).to(dtype) for x in inputs]
+                outputs = self._run_on_each_isa(lambda: ipex.interaction(*dpcpp_inputs).to('cpu').float())
+                for out in outputs:
+                    self.assertEqual(outputs[-1], out, atol=prec, rtol=prec)
+
+    def test_split_sgd(self):
+        weight = torch.randn(37, 19)
+        grads = [torch.randn(37, 19) for _ in range(3)]
+        for dtype in [torch.float, torch.bfloat16]:
+            def run():
+                param = nn.Parameter(weight.to(ipex.DEVICE).to(dtype))
+                optimizer = ipex.SplitSGD([param], lr=0.1, momentum=0.9, weight_decay=1e-2)
+                for grad in grads:
+                    param.grad = grad.to(ipex.DEVICE).to(dtype)
+                    optimizer.step()
+                return param.data.to('cpu').float()
+
+            outputs = self._run_on_each_isa(run)
+            for out in outputs:
+                self.assertEqual(outputs[-1], out, atol=1e-5, rtol=1e-5)
+
+if __name__ == '__main__':
+    test = unittest.main()
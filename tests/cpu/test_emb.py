@@ -3,6 +3,8 @@ import torch.nn as nn
 import intel_pytorch_extension as ipex
 import unittest
 import copy
+import os
+import tempfile
 from common_utils import TestCase
 
 class TestEMB(TestCase):
@@ -31,15 +33,290 @@ class TestEMB(TestCase):
         dpcpp_out.mean().backward()
         bf16_out.float().mean().backward()
 
-        self.assertEqual(cpu_emb.weight.grad.data._nnz(), dpcpp_emb.weight.grad.data._nnz())
-        self.assertEqual(cpu_emb.weight.grad.data.sparse_dim(), dpcpp_emb.weight.grad.data.sparse_dim())
-        self.assertEqual(cpu_emb.weight.grad.data.dense_dim(), dpcpp_emb.weight.grad.data.dense_dim())
-        self.assertEqual(cpu_emb.weight.grad.data.is_coalesced(), dpcpp_emb.weight.grad.data.is_coalesced())
-        self.assertEqual(cpu_emb.weight.grad.data._indices(), dpcpp_emb.weight.grad.data._indices().to('cpu'))
-        self.assertEqual(cpu_emb.weight.grad.data._values(), dpcpp_emb.weight.grad.data._values().to('cpu'))
+        # the row-sparse gradient holds every touched row once
+        cpu_grad = cpu_emb.weight.grad.data.coalesce()
+        dpcpp_grad = dpcpp_emb.weight.grad.data
+        self.assertTrue(dpcpp_grad.is_coalesced())
+        self.assertEqual(cpu_grad._nnz(), dpcpp_grad._nnz())
+        self.assertEqual(cpu_grad.sparse_dim(), dpcpp_grad.sparse_dim())
+        self.assertEqual(cpu_grad.dense_dim(), dpcpp_grad.dense_dim())
+        self.assertEqual(cpu_grad._indices(), dpcpp_grad._indices().to('cpu'))
+        self.assertEqual(cpu_grad._values(), dpcpp_grad._values().to('cpu'))
 
-        self.assertEqual(cpu_emb.weight.grad.data._values(), dpcpp_emb.weight.grad.data._values().to('cpu'), atol=1e-1, rtol=1e-5)
-        self.assertEqual(bf16_emb.weight.grad.data._values().dtype, torch.bfloat16)
+        bf16_grad = bf16_emb.weight.grad.data
+        self.assertEqual(cpu_grad._indices(), bf16_grad._indices().to('cpu'))
+        self.assertEqual(cpu_grad._values(), bf16_grad._values().to('cpu').float(), atol=1e-1, rtol=1e-5)
+        self.assertEqual(bf16_grad._values().dtype, torch.bfloat16)
+
+    def test_emb_row_sparse_grad(self):
+        cpu_emb = nn.EmbeddingBag(1000, 16, mode='sum', sparse=True, include_last_offset=True)
+        dense_emb = nn.EmbeddingBag(1000, 16, mode='sum', sparse=False, include_last_offset=True)
+        dense_emb.weight.data.copy_(cpu_emb.weight.data)
+        dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE)
+        dpcpp_dense_emb = copy.deepcopy(dense_emb).to(ipex.DEVICE)
+        cpu_input = torch.LongTensor([7, 3, 999, 7, 3, 3, 0, 512, 7])
+        cpu_offsets = torch.LongTensor([0, 3, 6, 9])
+        dpcpp_input = cpu_input.clone().to(ipex.DEVICE)
+        dpcpp_offsets = cpu_offsets.clone().to(ipex.DEVICE)
+
+        cpu_emb(cpu_input, cpu_offsets).sum().backward()
+        dense_emb(cpu_input, cpu_offsets).sum().backward()
+        dpcpp_emb(dpcpp_input, dpcpp_offsets).sum().backward()
+        dpcpp_dense_emb(dpcpp_input, dpcpp_offsets).sum().backward()
+
+        cpu_grad = cpu_emb.weight.grad.data.coalesce()
+        dpcpp_grad = dpcpp_emb.weight.grad.data
+        self.assertTrue(dpcpp_grad.is_coalesced())
+        self.assertEqual(dpcpp_grad._nnz(), 5)
+        self.assertEqual(cpu_grad._indices(), dpcpp_grad._indices().to('cpu'))
+        self.assertEqual(cpu_grad._values(), dpcpp_grad._values().to('cpu'))
+        self.assertEqual(dense_emb.weight.grad, dpcpp_dense_emb.weight.grad.to('cpu'))
+
+        # the optimizer updates the touched rows only
+        bf16_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE).bfloat16()
+        bf16_emb.weight.grad = None
+        origin_weight = bf16_emb.weight.data.clone()
+        bf16_emb(dpcpp_input, dpcpp_offsets).float().sum().backward()
+        optimizer = ipex.SplitSGD(bf16_emb.parameters(), lr=0.1)
+        optimizer.step()
+        touched = torch.zeros(1000, dtype=torch.bool)
+        touched[cpu_input] = True
+        updated = bf16_emb.weight.data.to('cpu')
+        self.assertEqual(updated[~touched], origin_weight.to('cpu')[~touched])
+        self.assertNotEqual(updated[touched], origin_weight.to('cpu')[touched])
+
+    def test_emb_backward_many_indices(self):
+        # skewed indices with many duplicates spread over all the threads
+        cpu_emb = nn.EmbeddingBag(5000, 64, mode='sum', sparse=True)
+        dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE)
+        bf16_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE).bfloat16()
+        cpu_input = (torch.rand(20000) ** 4 * 5000).long()
+        cpu_offsets = torch.arange(0, 20000, 10)
+        dpcpp_input = cpu_input.clone().to(ipex.DEVICE)
+        dpcpp_offsets = cpu_offsets.clone().to(ipex.DEVICE)
+
+        cpu_emb(cpu_input, cpu_offsets).sum().backward()
+        dpcpp_emb(dpcpp_input, dpcpp_offsets).sum().backward()
+        bf16_emb(dpcpp_input, dpcpp_offsets).float().sum().backward()
+
+        cpu_grad = cpu_emb.weight.grad.data.coalesce()
+        dpcpp_grad = dpcpp_emb.weight.grad.data
+        bf16_grad = bf16_emb.weight.grad.data
+        self.assertEqual(cpu_grad._indices(), dpcpp_grad._indices().to('cpu'))
+        self.assertEqual(cpu_grad._values(), dpcpp_grad._values().to('cpu'))
+        self.assertEqual(cpu_grad._indices(), bf16_grad._indices().to('cpu'))
+        # the bf16 gradient is accumulated in fp32 and rounded once
+        self.assertEqual(cpu_grad._values(), bf16_grad._values().to('cpu').float(), atol=1e-1, rtol=1e-2)
+
+    def test_batched_emb(self):
+        for dtype, sparse in [(torch.float, False), (torch.float, True), (torch.bfloat16, True)]:
+            cpu_embs = [nn.EmbeddingBag(n, 16, mode='sum', sparse=sparse) for n in (10, 100, 1000)]
+            dpcpp_weights = [nn.Parameter(emb.weight.data.clone().to(ipex.DEVICE).to(dtype)) for emb in cpu_embs]
+            cpu_indices = [torch.randint(0, emb.num_embeddings, (12,)) for emb in cpu_embs]
+            cpu_offsets = [torch.LongTensor([0, 3, 3, 7]) for _ in cpu_embs]
+
+            cpu_out = torch.cat([emb(i, o) for emb, i, o in zip(cpu_embs, cpu_indices, cpu_offsets)], dim=1)
+            dpcpp_out = ipex.batched_embeddingbag(
+                dpcpp_weights,
+                [i.to(ipex.DEVICE) for i in cpu_indices],
+                [o.to(ipex.DEVICE) for o in cpu_offsets],
+                sparse=sparse)
+            self.assertEqual(dpcpp_out.size(), (4, 48))
+            self.assertEqual(cpu_out, dpcpp_out.to('cpu').float(), atol=1e-1, rtol=1e-2)
+
+            # the output feeds interaction as a single input
+            dense = torch.randn(4, 16, requires_grad=True)
+            cpu_inter = ipex.interaction(dense.to(ipex.DEVICE).to(dtype), dpcpp_out)
+            self.assertEqual(cpu_inter.size(), (4, 16 + 6))
+
+            grad = torch.randn(4, 48)
+            cpu_out.backward(grad)
+            dpcpp_out.backward(grad.to(ipex.DEVICE).to(dtype))
+            for emb, weight in zip(cpu_embs, dpcpp_weights):
+                cpu_grad = emb.weight.grad
+                dpcpp_grad = weight.grad
+                if sparse:
+                    cpu_grad = cpu_grad.coalesce()
+                    self.assertTrue(dpcpp_grad.is_coalesced())
+                    self.assertEqual(cpu_grad._indices(), dpcpp_grad._indices().to('cpu'))
+                    cpu_grad = cpu_grad._values()
+                    dpcpp_grad = dpcpp_grad._values()
+                self.assertEqual(cpu_grad, dpcpp_grad.to('cpu').float(), atol=1e-1, rtol=1e-2)
+
+    def test_emb_modes(self):
+        cpu_input = torch.LongTensor([1, 2, 4, 5, 4, 3, 2, 9, 7])
+        cpu_offsets = torch.LongTensor([0, 1, 4, 4, 6])
+        dpcpp_input = cpu_input.clone().to(ipex.DEVICE)
+        dpcpp_offsets = cpu_offsets.clone().to(ipex.DEVICE)
+        for dtype in [torch.float, torch.bfloat16]:
+            for mode, weighted in [('mean', False), ('max', False), ('sum', True)]:
+                for sparse in [False, True]:
+                    if mode == 'max' and sparse:
+                        continue
+                    cpu_emb = nn.EmbeddingBag(10, 35, mode=mode, sparse=sparse)
+                    dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE).to(dtype)
+                    cpu_weights = torch.rand(9, requires_grad=True) if weighted else None
+                    dpcpp_weights = cpu_weights.detach().to(ipex.DEVICE).to(dtype).requires_grad_() if weighted else None
+
+                    cpu_out = cpu_emb(cpu_input, cpu_offsets, per_sample_weights=cpu_weights)
+                    dpcpp_out = dpcpp_emb(dpcpp_input, dpcpp_offsets, per_sample_weights=dpcpp_weights)
+                    self.assertEqual(cpu_out, dpcpp_out.to('cpu').float(), atol=1e-1, rtol=1e-2)
+
+                    grad = torch.randn(cpu_out.size())
+                    cpu_out.backward(grad)
+                    dpcpp_out.backward(grad.to(ipex.DEVICE).to(dtype))
+                    cpu_grad = cpu_emb.weight.grad
+                    dpcpp_grad = dpcpp_emb.weight.grad
+                    if sparse:
+                        cpu_grad = cpu_grad.to_dense()
+                        dpcpp_grad = dpcpp_grad.to('cpu').to_dense()
+                    self.assertEqual(cpu_grad, dpcpp_grad.to('cpu').float(), atol=1e-1, rtol=1e-2)
+                    if weighted:
+                        self.assertEqual(cpu_weights.grad, dpcpp_weights.grad.to('cpu').float(), atol=1e-1, rtol=1e-2)
+
+    def test_emb_max_backward_rows(self):
+        # enough bags and rows that the argmax rows spread over the buckets of every thread
+        cpu_input = torch.randint(0, 500, (4000,))
+        cpu_offsets = torch.arange(0, 4000, 8)
+        cpu_offsets[7] = cpu_offsets[6]
+        cpu_emb = nn.EmbeddingBag(500, 33, mode='max')
+        dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE)
+        cpu_out = cpu_emb(cpu_input, cpu_offsets)
+        dpcpp_out = dpcpp_emb(cpu_input.to(ipex.DEVICE), cpu_offsets.to(ipex.DEVICE))
+        grad = torch.randn(cpu_out.size())
+        cpu_out.backward(grad)
+        dpcpp_out.backward(grad.to(ipex.DEVICE))
+        self.assertEqual(cpu_emb.weight.grad, dpcpp_emb.weight.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+    def test_emb_as_many_offsets_as_indices(self):
+        # as many offsets as indices, but empty bags or an included last offset
+        cpu_input = torch.LongTensor([1, 2, 4, 5, 4])
+        for offsets, include_last_offset in [([0, 0, 2, 3, 3], False), ([0, 2, 2, 3, 5], True)]:
+            cpu_offsets = torch.LongTensor(offsets)
+            for mode, weighted in [('mean', False), ('sum', True)]:
+                cpu_emb = nn.EmbeddingBag(10, 35, mode=mode, include_last_offset=include_last_offset)
+                dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE)
+                cpu_weights = torch.rand(5, requires_grad=True) if weighted else None
+                dpcpp_weights = cpu_weights.detach().to(ipex.DEVICE).requires_grad_() if weighted else None
+
+                cpu_out = cpu_emb(cpu_input, cpu_offsets, per_sample_weights=cpu_weights)
+                dpcpp_out = dpcpp_emb(cpu_input.to(ipex.DEVICE), cpu_offsets.to(ipex.DEVICE), per_sample_weights=dpcpp_weights)
+                self.assertEqual(cpu_out, dpcpp_out.to('cpu'), atol=1e-5, rtol=1e-5)
+
+                grad = torch.randn(cpu_out.size())
+                cpu_out.backward(grad)
+                dpcpp_out.backward(grad.to(ipex.DEVICE))
+                self.assertEqual(cpu_emb.weight.grad, dpcpp_emb.weight.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+                if weighted:
+                    self.assertEqual(cpu_weights.grad, dpcpp_weights.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+    def test_emb_gather_settings(self):
+        # skewed indices so that bags and threads share rows
+        cpu_input = torch.randint(0, 8, (300,)) * torch.randint(1, 125, (300,))
+        cpu_offsets = torch.LongTensor([0, 3, 3, 40, 41, 100, 200, 250])
+        dpcpp_input = cpu_input.clone().to(ipex.DEVICE)
+        dpcpp_offsets = cpu_offsets.clone().to(ipex.DEVICE)
+        cpu_emb = nn.EmbeddingBag(1000, 67, mode='sum')
+        cpu_out = cpu_emb(cpu_input, cpu_offsets)
+        prefetch_distance = ipex.core.get_embedding_bag_prefetch_distance()
+        try:
+            for dtype in [torch.float, torch.bfloat16]:
+                dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE).to(dtype)
+                for sort_indices in [False, True]:
+                    if sort_indices:
+                        ipex.core.enable_embedding_bag_sort_indices()
+                    else:
+                        ipex.core.disable_embedding_bag_sort_indices()
+                    for distance in [0, 1, 8, 1000]:
+                        ipex.core.set_embedding_bag_prefetch_distance(distance)
+                        dpcpp_out = dpcpp_emb(dpcpp_input, dpcpp_offsets)
+                        self.assertEqual(cpu_out, dpcpp_out.to('cpu').float(), atol=1e-1, rtol=1e-2)
+        finally:
+            ipex.core.disable_embedding_bag_sort_indices()
+            ipex.core.set_embedding_bag_prefetch_distance(prefetch_distance)
+
+    def test_quantized_emb(self):
+        cpu_emb = nn.EmbeddingBag(100, 36, mode='mean')
+        cpu_input = torch.randint(0, 100, (20,))
+        cpu_offsets = torch.LongTensor([0, 5, 5, 12])
+        dpcpp_input = cpu_input.clone().to(ipex.DEVICE)
+        dpcpp_offsets = cpu_offsets.clone().to(ipex.DEVICE)
+        cpu_out = cpu_emb(cpu_input, cpu_offsets)
+
+        # the error of a row is at most half a quantization step
+        value_range = (cpu_emb.weight.max() - cpu_emb.weight.min()).item()
+        for bit_rate, atol in [(16, 1e-3), (8, value_range / 255), (4, value_range / 15)]:
+            dpcpp_emb = copy.deepcopy(cpu_emb).to(ipex.DEVICE)
+            quantized_emb = ipex.QuantizedEmbeddingBag.from_float(dpcpp_emb, bit_rate)
+            if bit_rate != 16:
+                self.assertEqual(quantized_emb.qweight.dtype, torch.uint8)
+                self.assertEqual(quantized_emb.qweight.size(), (100, 36 * bit_rate // 8 + 8))
+            dpcpp_out = quantized_emb(dpcpp_input, dpcpp_offsets)
+            self.assertEqual(dpcpp_out.dtype, torch.float)
+            self.assertEqual(cpu_out, dpcpp_out.to('cpu'), atol=atol, rtol=0)
+
+    def test_tiered_emb(self):
+        # the last batch only uses rows which were never cached
+        batches = [torch.randint(0, 88, (12,)) for _ in range(7)] + [torch.arange(88, 100)]
+        offsets = torch.LongTensor([0, 4, 4, 9])
+        for policy in ['lru', 'lfu']:
+            cpu_emb = nn.EmbeddingBag(100, 16, mode='sum', sparse=True)
+            cpu_optimizer = torch.optim.SGD(cpu_emb.parameters(), lr=0.1)
+            with tempfile.TemporaryDirectory() as tmp:
+                storage = ipex.TieredEmbeddingStorage.from_tensor(
+                    os.path.join(tmp, 'table.bin'), cpu_emb.weight, 24, policy=policy, dtype=torch.bfloat16)
+                tiered_emb = ipex.TieredEmbeddingBag(storage, mode='sum')
+                optimizer = ipex.SplitSGD([storage.weight], lr=0.1)
+                storage.attach_optimizer(optimizer)
+                for i, indices in enumerate(batches):
+                    if i + 1 < len(batches):
+                        storage.prefetch(batches[i + 1])
+                    prefetched_rows = storage.stats()['prefetched_rows']
+                    cpu_out = cpu_emb(indices, offsets)
+                    dpcpp_out = tiered_emb(indices.to(ipex.DEVICE), offsets.to(ipex.DEVICE))
+                    self.assertEqual(cpu_out, dpcpp_out.to('cpu').float(), atol=1e-1, rtol=1e-2)
+                    if i + 1 == len(batches):
+                        # the prefetch of the last batch was kept for its lookup
+                        self.assertEqual(storage.stats()['prefetched_rows'] - prefetched_rows, 12)
+                    grad = torch.randn(cpu_out.size())
+                    cpu_out.backward(grad)
+                    dpcpp_out.backward(grad.to(ipex.DEVICE).bfloat16())
+                    cpu_optimizer.step()
+                    optimizer.step()
+                    cpu_optimizer.zero_grad()
+                    optimizer.zero_grad()
+
+                # the file keeps the fp32 weights updated by the split bf16 optimizer
+                storage.flush()
+                self.assertEqual(cpu_emb.weight.data, torch.from_numpy(storage.table), atol=2e-2, rtol=1e-2)
+                stats = storage.stats()
+                self.assertEqual(stats['lookups'], 12 * len(batches))
+                self.assertEqual(stats['hits'] + stats['misses'], stats['lookups'])
+                self.assertGreater(stats['evictions'], 0)
+                self.assertGreater(stats['write_backs'], 0)
+                self.assertGreater(stats['prefetched_rows'], 0)
+                storage.close()
+
+    def test_tiered_emb_optimizer_state(self):
+        # the momentum of an evicted row does not carry over to the row taking its slot
+        weight = torch.randn(100, 16)
+        offsets = torch.LongTensor([0, 4, 4, 9])
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = ipex.TieredEmbeddingStorage.from_tensor(
+                os.path.join(tmp, 'table.bin'), weight, 12, dtype=torch.bfloat16)
+            tiered_emb = ipex.TieredEmbeddingBag(storage, mode='sum')
+            optimizer = ipex.SplitSGD([storage.weight], lr=0.1, momentum=0.9)
+            storage.attach_optimizer(optimizer)
+            out = tiered_emb(torch.arange(0, 12).to(ipex.DEVICE), offsets.to(ipex.DEVICE))
+            out.backward(torch.ones(out.size()).to(ipex.DEVICE).bfloat16())
+            optimizer.step()
+            state = optimizer.state[storage.weight]
+            self.assertGreater(state['momentum_buffer'].to('cpu').float().abs().sum().item(), 0)
+
+            slots = storage.lookup(torch.arange(12, 24)).to('cpu')
+            for name in ['momentum_buffer', 'momentum_buffer_bottom_half']:
+                self.assertEqual(state[name].to('cpu').float()[slots], torch.zeros(12, 16))
+            storage.close()
 
 if __name__ == '__main__':
     test = unittest.main()
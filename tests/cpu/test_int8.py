@@ -9,6 +9,7 @@ import itertools
 import time
 import json
 import sys
+import threading
 
 import torch
 import torch.nn as nn
@@ -73,6 +74,183 @@ class TestQuantizationConfigueTune(TestCase):
         self.assertTrue(ipex.core.is_fp32_dil_tensor(y))
         os.remove('configure.json')
 
+    def test_histogram_algorithms(self):
+        # a few outliers among 1M samples, which the histogram based algorithms
+        # should clip: dropped by percentile, and cheaper to clip than to keep
+        # in the range for kl and mse
+        x = torch.randn((50000, 20), dtype=torch.float32)
+        x[0][0] = 100.
+        x[1][1] = -100.
+        x = x.to(device)
+        model = torch.nn.Linear(20, 10, bias=True).float().to(device)
+
+        conf = ipex.AmpConf(torch.int8)
+        with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+            ref = model(x)
+        conf.save('configure.json')
+        with open('configure.json', 'r') as f:
+            min_max_data = json.load(f)
+
+        for algorithm in ['percentile', 'kl', 'mse']:
+            data = copy.deepcopy(min_max_data)
+            data[0]['algorithm'] = algorithm
+            with open('configure.json', 'w') as f:
+                json.dump(data, f)
+            conf = ipex.AmpConf(torch.int8, 'configure.json')
+            with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+                ref = model(x)
+            conf.save('configure.json')
+            with open('configure.json', 'r') as f:
+                data = json.load(f)
+            self.assertEqual(data[0]['algorithm'], algorithm)
+            # the clipped range gives a larger scale than min_max
+            self.assertGreater(data[0]['inputs_scale'][0], min_max_data[0]['inputs_scale'][0])
+
+            conf = ipex.AmpConf(torch.int8, 'configure.json')
+            with ipex.AutoMixPrecision(conf, running_mode='inference'):
+                y = model(x)
+            self.assertTrue(ipex.core.is_int8_dil_tensor(y))
+        os.remove('configure.json')
+
+    def test_int8_fallback_search(self):
+        x = torch.randn((4, 5), dtype=torch.float32).to(device)
+        model = torch.nn.Sequential(
+            torch.nn.Linear(5, 10), torch.nn.ReLU(), torch.nn.Linear(10, 3)).float().to(device)
+        with torch.no_grad():
+            ref = copy.deepcopy(model)(x).to('cpu')
+
+        calibrated_model = copy.deepcopy(model)
+        conf = ipex.AmpConf(torch.int8)
+        with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+            with torch.no_grad():
+                calibrated_model(x)
+        conf.save('configure.json')
+
+        def eval_func(m):
+            with torch.no_grad():
+                return -(m(x).to('cpu').float() - ref).abs().max().item()
+
+        # a loose budget keeps every operator quantized
+        ipex.int8_fallback_search(model, eval_func, 'configure.json', 'tuned.json', accuracy_loss=1e3)
+        with open('tuned.json', 'r') as f:
+            data = json.load(f)
+        self.assertTrue(all(configure['quantized'] for configure in data))
+
+        # no accuracy loss allowed makes every operator fall back to fp32
+        ipex.int8_fallback_search(model, eval_func, 'configure.json', 'tuned.json', accuracy_loss=0.)
+        with open('tuned.json', 'r') as f:
+            data = json.load(f)
+        self.assertFalse(any(configure['quantized'] for configure in data))
+        os.remove('configure.json')
+        os.remove('tuned.json')
+
+    def test_int8_scopes(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.linear1 = nn.Linear(5, 10)
+                self.linear2 = nn.Linear(5, 10)
+
+            def forward(self, x, branch):
+                return self.linear1(x) if branch else self.linear2(x)
+
+        x = torch.randn((4, 5), dtype=torch.float32).to(device)
+        model = M().float().to(device)
+        # run out of any scope, in the same id space as the scoped ops
+        extra = nn.Linear(5, 5).float().to(device)
+        ipex.register_int8_scopes(model)
+
+        conf = ipex.AmpConf(torch.int8)
+        with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+            h = extra(x)
+            ref1 = model(h, True)
+            ref2 = model(h, False)
+        conf.save('configure.json')
+        with open('configure.json', 'r') as f:
+            data = json.load(f)
+        self.assertEqual([d['key'] for d in data], ['<root>:Linear:0', 'linear1:Linear:0', 'linear2:Linear:0'])
+        self.assertEqual([d['id'] for d in data], [0, 1, 2])
+
+        # the configures are found by key whatever the execution order and thread
+        conf = ipex.AmpConf(torch.int8, 'configure.json')
+        with ipex.AutoMixPrecision(conf, running_mode='inference'):
+            y2 = model(extra(x), False)
+            y1 = model(extra(x), True)
+            self.assertEqual(ref1, y1, atol=1e-1, rtol=1e-5)
+            self.assertEqual(ref2, y2, atol=1e-1, rtol=1e-5)
+
+            # the running mode is process wide, so it is set once for all the threads
+            results = [None] * 4
+            def run(i):
+                results[i] = model(extra(x.clone()), i % 2 == 0).to('cpu')
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        for i in range(4):
+            self.assertEqual(results[i], (y1 if i % 2 == 0 else y2).to('cpu'))
+        os.remove('configure.json')
+
+    def test_int8_scopes_fallback(self):
+        class M(nn.Module):
+            def __init__(self):
+                super(M, self).__init__()
+                self.linear1 = nn.Linear(5, 10)
+                self.linear2 = nn.Linear(5, 10)
+
+            def forward(self, x, branch):
+                if branch is None:
+                    raise RuntimeError('no branch')
+                return self.linear1(x) if branch else self.linear2(x)
+
+        x = torch.randn((4, 5), dtype=torch.float32).to(device)
+        model = M().float().to(device)
+        extra = nn.Linear(5, 5).float().to(device)
+        ipex.register_int8_scopes(model)
+        with torch.no_grad():
+            ref2 = model(x, False)
+
+        conf = ipex.AmpConf(torch.int8)
+        with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+            with self.assertRaises(RuntimeError):
+                model(x, None)
+            # the failed forward left no scope behind
+            extra(x)
+            model(x, True)
+        conf.save('configure.json')
+        with open('configure.json', 'r') as f:
+            data = json.load(f)
+        self.assertEqual([d['key'] for d in data], ['<root>:Linear:0', 'linear1:Linear:0'])
+
+        # the branch not taken during calibration runs in fp32
+        conf = ipex.AmpConf(torch.int8, 'configure.json')
+        with ipex.AutoMixPrecision(conf, running_mode='inference'):
+            with torch.no_grad():
+                y2 = model(x, False)
+        self.assertTrue(ipex.core.is_fp32_dil_tensor(y2))
+        self.assertEqual(ref2, y2)
+        os.remove('configure.json')
+
+    def test_int8_scopes_unscoped_configure(self):
+        model = nn.Sequential(nn.Linear(5, 10), nn.Linear(10, 10)).float().to(device)
+        x = torch.randn((4, 5), dtype=torch.float32).to(device)
+        conf = ipex.AmpConf(torch.int8)
+        with ipex.AutoMixPrecision(conf, running_mode='calibration'):
+            ref = model(x)
+        conf.save('configure.json')
+
+        # a configure calibrated out of any scope counts the ops of the scopes
+        # registered afterwards in the root scope
+        ipex.register_int8_scopes(model)
+        conf = ipex.AmpConf(torch.int8, 'configure.json')
+        with ipex.AutoMixPrecision(conf, running_mode='inference'):
+            for _ in range(2):
+                y = model(x)
+                self.assertTrue(ipex.core.is_int8_dil_tensor(y))
+                self.assertEqual(ref, y, atol=1e-1, rtol=1e-5)
+        os.remove('configure.json')
+
 
 class TestQuantization(TestCase):
     def _compare_fp32_int8(self, model, x):
@@ -89,7 +267,7 @@ class TestQuantization(TestCase):
         self.assertEqual(ref, y, atol=1e-1, rtol=1e-5)
         os.remove('configure.json')
 
-    def _lstm_compare_fp32_int8(self, model, *args):
+    def _rnn_compare_fp32_int8(self, model, *args):
         conf = ipex.AmpConf(torch.int8)
         with ipex.AutoMixPrecision(conf, running_mode='calibration'):
             with torch.no_grad():
@@ -101,12 +279,17 @@ class TestQuantization(TestCase):
             with torch.no_grad():
                 y, hy = model(*args)
 
-        self.assertTrue(ipex.core.is_int8_dil_tensor(y))
+        # the rnn modes oneDNN has no int8 inference for stay in fp32
+        mode = ['RNN_RELU', 'RNN_TANH', 'LSTM', 'GRU'].index(model.mode)
+        self.assertEqual(ipex.core.is_int8_dil_tensor(y), ipex.core.is_int8_rnn_supported(mode))
 
         # self.assertEqual(ref, y, prec=0.1)
         self.assertEqual(ref, y, atol=0.1, rtol=1e-5)
-        self.assertEqual(hy_ref[0], hy[0], atol=0.01, rtol=1e-5)
-        self.assertEqual(hy_ref[1], hy[1], atol=0.01, rtol=1e-5)
+        if isinstance(model, nn.LSTM):
+            self.assertEqual(hy_ref[0], hy[0], atol=0.01, rtol=1e-5)
+            self.assertEqual(hy_ref[1], hy[1], atol=0.01, rtol=1e-5)
+        else:
+            self.assertEqual(hy_ref, hy, atol=0.01, rtol=1e-5)
         os.remove('configure.json')
 
     def test_conv2d(self):
@@ -174,7 +357,7 @@ class TestQuantization(TestCase):
             linear = torch.nn.Linear(in_features, out_features, bias=bias).float().to(device)
             self._compare_fp32_int8(linear, x)
 
-    def _lstm_int8(self, seq_len, batch_size, input_size, hidden_size, num_layers, bidirectional, bias, empty_state):
+    def _rnn_int8(self, rnn, seq_len, batch_size, input_size, hidden_size, num_layers, bidirectional, bias, empty_state, **kwargs):
         rand_seed = int(get_rand_seed())
 
         print("{} rand sed: {}".format(sys._getframe().f_code.co_name, rand_seed))
@@ -185,18 +368,26 @@ class TestQuantization(TestCase):
         input_dpcpp = torch.FloatTensor(seq_len, batch_size, input_size).uniform_(-1, 1).to(device=device)
         h0_dpcpp = torch.FloatTensor(num_layers * num_directions, batch_size, hidden_size).uniform_(-1, 1).to(device=device)
         c0_dpcpp = torch.FloatTensor(num_layers * num_directions, batch_size, hidden_size).uniform_(-1, 1).to(device=device)
-        model_dpcpp = torch.nn.LSTM(input_size=input_size, hidden_size=hidden_size, num_layers=num_layers, bidirectional=bidirectional, bias=bias).to(device=device).eval()
+        model_dpcpp = rnn(input_size=input_size, hidden_size=hidden_size, num_layers=num_layers, bidirectional=bidirectional, bias=bias, **kwargs).to(device=device).eval()
 
-        self._lstm_compare_fp32_int8(model_dpcpp, input_dpcpp)
+        self._rnn_compare_fp32_int8(model_dpcpp, input_dpcpp)
 
     def test_lstm(self):
-        self._lstm_int8(seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=False, bias=True, empty_state=False)
+        self._rnn_int8(nn.LSTM, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=False, bias=True, empty_state=False)
         
-        self._lstm_int8(seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=True, bias=True, empty_state=False)
+        self._rnn_int8(nn.LSTM, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=True, bias=True, empty_state=False)
         
-        self._lstm_int8(seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=False, bias=False, empty_state=False)
+        self._rnn_int8(nn.LSTM, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=False, bias=False, empty_state=False)
         
-        self._lstm_int8(seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=True, bias=False, empty_state=False)
+        self._rnn_int8(nn.LSTM, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=True, bias=False, empty_state=False)
+
+    def test_gru(self):
+        for bidirectional, bias in itertools.product([False, True], [True, False]):
+            self._rnn_int8(nn.GRU, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=bidirectional, bias=bias, empty_state=False)
+
+    def test_rnn(self):
+        for nonlinearity, bidirectional in itertools.product(['tanh', 'relu'], [False, True]):
+            self._rnn_int8(nn.RNN, seq_len=5, batch_size=2, input_size=16, hidden_size=16, num_layers=1, bidirectional=bidirectional, bias=True, empty_state=False, nonlinearity=nonlinearity)
     
 if __name__ == '__main__':
     rand_seed = int(time.time() * 1000000000)
@@ -65,5 +65,76 @@ class TestInteractionCases(TestCase):
             for i in range(0, 26):
                 self.assertEqual(ly1[i].grad, ly2[i].grad)
 
+    def test_interaction_blocked(self):
+        def interact_features(x, ly):
+            (batch_size, d) = x.shape
+            T = torch.cat([x] + ly, dim=1).view((batch_size, -1, d))
+            Z = torch.bmm(T, torch.transpose(T, 1, 2))
+            li, lj = torch.tril_indices(T.size(1), T.size(1), offset=-1)
+            return torch.cat([x, Z[:, li, lj]], dim=1)
+
+        # a batch that is not a multiple of the interaction block
+        for batch_size in [1, 67, 1000]:
+            x = torch.randn([batch_size, 32]).requires_grad_()
+            ly = [torch.randn([batch_size, 32]).requires_grad_() for _ in range(5)]
+            ref = interact_features(x, ly)
+            grad = torch.randn(ref.size())
+            ref.backward(grad)
+            for dtype, prec in [(torch.float32, 1e-5), (torch.bfloat16, 1e-1)]:
+                dpcpp_x = x.detach().to(ipex.DEVICE).to(dtype).requires_grad_()
+                dpcpp_ly = [v.detach().to(ipex.DEVICE).to(dtype).requires_grad_() for v in ly]
+                out = ipex.interaction(dpcpp_x, *dpcpp_ly)
+                self.assertEqual(out.size(), (batch_size, 32 + 15))
+                self.assertEqual(ref, out.to('cpu').float(), atol=prec, rtol=prec)
+                out.backward(grad.to(ipex.DEVICE).to(dtype))
+                self.assertEqual(x.grad, dpcpp_x.grad.to('cpu').float(), atol=prec, rtol=prec)
+                for v, dpcpp_v in zip(ly, dpcpp_ly):
+                    self.assertEqual(v.grad, dpcpp_v.grad.to('cpu').float(), atol=prec, rtol=prec)
+
+    def test_interaction_triangle_only(self):
+        batch_size = 67
+        x = torch.randn([batch_size, 32]).requires_grad_()
+        ly = [torch.randn([batch_size, 32]).requires_grad_() for _ in range(5)]
+        T = torch.cat([x] + ly, dim=1).view((batch_size, -1, 32))
+        Z = torch.bmm(T, torch.transpose(T, 1, 2))
+        li, lj = torch.tril_indices(T.size(1), T.size(1), offset=-1)
+        ref = Z[:, li, lj]
+        grad = torch.randn(ref.size())
+        ref.backward(grad)
+        for dtype, prec in [(torch.float32, 1e-5), (torch.bfloat16, 1e-1)]:
+            dpcpp_x = x.detach().to(ipex.DEVICE).to(dtype).requires_grad_()
+            dpcpp_ly = [v.detach().to(ipex.DEVICE).to(dtype).requires_grad_() for v in ly]
+            out = ipex.interaction(dpcpp_x, *dpcpp_ly, triangle_only=True)
+            self.assertEqual(out.size(), (batch_size, 15))
+            self.assertEqual(ref, out.to('cpu').float(), atol=prec, rtol=prec)
+            out.backward(grad.to(ipex.DEVICE).to(dtype))
+            self.assertEqual(x.grad, dpcpp_x.grad.to('cpu').float(), atol=prec, rtol=prec)
+            for v, dpcpp_v in zip(ly, dpcpp_ly):
+                self.assertEqual(v.grad, dpcpp_v.grad.to('cpu').float(), atol=prec, rtol=prec)
+
+    def test_interaction_script(self):
+        class Interaction(nn.Module):
+            def forward(self, x, ly):
+                # type: (Tensor, List[Tensor]) -> Tensor
+                return torch.ops.torch_ipex.interaction([x] + ly)
+
+        model = torch.jit.script(Interaction())
+        x1 = torch.randn([64, 16], device=ipex.DEVICE).requires_grad_()
+        ly1 = [torch.randn([64, 16], device=ipex.DEVICE).requires_grad_() for _ in range(4)]
+        x2 = x1.clone().detach().requires_grad_()
+        ly2 = [v.clone().detach().requires_grad_() for v in ly1]
+
+        A = model(x1, ly1)
+        B = ipex.interaction(x2, *ly2)
+        self.assertEqual(A, B)
+        self.assertEqual(A.grad_fn.name(), 'InteractionBackward')
+
+        grad = torch.randn(A.size(), device=ipex.DEVICE)
+        A.backward(grad)
+        B.backward(grad)
+        self.assertEqual(x1.grad, x2.grad)
+        for v1, v2 in zip(ly1, ly2):
+            self.assertEqual(v1.grad, v2.grad)
+
 if __name__ == '__main__':
     test = unittest.main()
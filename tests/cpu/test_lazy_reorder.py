@@ -1747,66 +1747,143 @@ class TestRNN(TestCase):
                     hy_dpcpp.sum().backward(retain_graph=True)
                     self.assertEqual(h0_dpcpp.grad.to('cpu'), h_cpu.grad)
 
-    def _test_pack_padded_sequence_lstm(self, training):
+    def _test_pack_padded_sequence(self, cell, training, sent_lens=None):
         rand_seed = int(get_rand_seed())
         print("{} rand sed: {}".format(sys._getframe().f_code.co_name, rand_seed))
         torch.manual_seed(rand_seed)
 
         embedding_dim = 1024
         hidden_dim = 10
-        batch_size = 24
-        num_layers = 1
         bidirectional = True
         num_direc = 2 if bidirectional else 1
-        max_lens = 96
 
-        sent = torch.randn(batch_size, max_lens, embedding_dim)
-        hid_0 = torch.rand(num_layers * num_direc, batch_size, hidden_dim)
-        hid_1 = torch.randn(num_layers * num_direc, batch_size, hidden_dim)
-
-        sentences = sent.clone().requires_grad_(training)
-        sent_lens = torch.Tensor([1, 2, 3, 4, 5, 1, 3, 2, 96, 5, 3, 1, 1, 2, 1, 2, 3, 6, \
-        1, 2, 4, 6, 2, 1])
-
-        sentences_dpcpp = sent.clone().to(device=device).requires_grad_(training)
-        sent_lens_dpcpp = sent_lens.clone().to(device=device)
+        if sent_lens is None:
+            sent_lens = torch.Tensor([1, 2, 3, 4, 5, 1, 3, 2, 96, 5, 3, 1, 1, 2, 1, 2, 3, 6, \
+            1, 2, 4, 6, 2, 1])
+        batch_size = sent_lens.shape[0]
+        max_lens = int(sent_lens.max().item())
+
+        for num_layers in [1, 2]:
+            sent = torch.randn(batch_size, max_lens, embedding_dim)
+            hid_0 = torch.rand(num_layers * num_direc, batch_size, hidden_dim)
+            hid_1 = torch.randn(num_layers * num_direc, batch_size, hidden_dim)
+
+            sentences = sent.clone().requires_grad_(training)
+            sentences_dpcpp = sent.clone().to(device=device).requires_grad_(training)
+            sent_lens_dpcpp = sent_lens.clone().to(device=device)
+
+            hidden_0 = hid_0.clone().requires_grad_(training)
+            hidden_1 = hid_1.clone().requires_grad_(training)
+            embeds = torch.nn.utils.rnn.pack_padded_sequence(sentences, sent_lens, batch_first=True, enforce_sorted=False)
+            if cell == "LSTM":
+                rnn = nn.LSTM(embedding_dim, hidden_dim, num_layers=num_layers, bidirectional=bidirectional, batch_first=True)
+            elif cell == "GRU":
+                rnn = nn.GRU(embedding_dim, hidden_dim, num_layers=num_layers, bidirectional=bidirectional, batch_first=True)
+            else:
+                rnn = nn.RNN(embedding_dim, hidden_dim, num_layers=num_layers, bidirectional=bidirectional, batch_first=True)
 
-        assert sent_lens.shape[0] == batch_size
-        assert sent_lens.max().item() == max_lens
+            hidden_0_dpcpp = hid_0.clone().to(device=device).requires_grad_(training)
+            hidden_1_dpcpp = hid_1.clone().to(device=device).requires_grad_(training)
+            embeds_dpcpp = torch.nn.utils.rnn.pack_padded_sequence(sentences_dpcpp, sent_lens_dpcpp, batch_first=True, enforce_sorted=False)
+            rnn_dpcpp = copy.deepcopy(rnn).to(device=device)
 
-        hidden_0 = hid_0.clone().requires_grad_(training)
-        hidden_1 = hid_1.clone().requires_grad_(training)
-        embeds = torch.nn.utils.rnn.pack_padded_sequence(sentences, sent_lens, batch_first=True, enforce_sorted=False)
-        lstm = nn.LSTM(embedding_dim, hidden_dim, num_layers=num_layers, bidirectional=bidirectional, batch_first=True)
+            if cell == "LSTM":
+                rnn_out, hidden_out = rnn(embeds, (hidden_0, hidden_1))
+            else:
+                rnn_out, hidden_out = rnn(embeds, hidden_0)
+            rnn_out, _ = torch.nn.utils.rnn.pad_packed_sequence(rnn_out, batch_first=True)
+
+            with AutoDNNL(True):
+                if cell == "LSTM":
+                    rnn_out_dpcpp, hidden_out_dpcpp = rnn_dpcpp(embeds_dpcpp, (hidden_0_dpcpp, hidden_1_dpcpp))
+                else:
+                    rnn_out_dpcpp, hidden_out_dpcpp = rnn_dpcpp(embeds_dpcpp, hidden_0_dpcpp)
+                rnn_out_dpcpp, _ = torch.nn.utils.rnn.pad_packed_sequence(rnn_out_dpcpp, batch_first=True)
+
+                self.assertEqual(rnn_out, rnn_out_dpcpp)
+                if cell == "LSTM":
+                    self.assertEqual(hidden_out[0], hidden_out_dpcpp[0])
+                    self.assertEqual(hidden_out[1], hidden_out_dpcpp[1])
+                else:
+                    self.assertEqual(hidden_out, hidden_out_dpcpp)
+
+                if training:
+                    rnn_out.sum().backward()
+                    rnn_out_dpcpp.sum().backward()
+                    self.assertEqual(sentences_dpcpp.grad.to('cpu'), sentences.grad)
+                    for name, param in rnn.named_parameters():
+                        self.assertEqual(getattr(rnn_dpcpp, name).grad.to('cpu'), param.grad)
+
+                    self.assertEqual(hidden_0_dpcpp.grad.to('cpu'), hidden_0.grad)
+                    if cell == "LSTM":
+                        self.assertEqual(hidden_1_dpcpp.grad.to('cpu'), hidden_1.grad)
+
+    def _test_rnn_dropout(self, cell):
+        rand_seed = int(get_rand_seed())
+        print("{} rand sed: {}".format(sys._getframe().f_code.co_name, rand_seed))
 
-        hidden_0_dpcpp = hid_0.clone().to(device=device).requires_grad_(training)
-        hidden_1_dpcpp = hid_1.clone().to(device=device).requires_grad_(training)
-        embeds_dpcpp = torch.nn.utils.rnn.pack_padded_sequence(sentences_dpcpp, sent_lens_dpcpp, batch_first=True, enforce_sorted=False)
-        lstm_dpcpp = copy.deepcopy(lstm).to(device=device)
+        input = torch.randn(5, 8, 32)
+        # a dropout of 0 and of 0.5 between the layers of the same weights
+        models = [getattr(torch.nn, cell)(32, 64, num_layers=3, dropout=p, bidirectional=True) for p in [0, 0.5]]
+        models[1].load_state_dict(models[0].state_dict())
+        models = [copy.deepcopy(model).to(device=device).train() for model in models]
 
-        lstm_out, hidden_out = lstm(embeds, (hidden_0, hidden_1))
-        lstm_out, _ = torch.nn.utils.rnn.pad_packed_sequence(lstm_out, batch_first=True)
+        def run(model):
+            torch.manual_seed(rand_seed)
+            input_dpcpp = input.clone().to(device=device).requires_grad_()
+            model.zero_grad()
+            y, _ = model(input_dpcpp)
+            y.sum().backward()
+            return y.to('cpu'), input_dpcpp.grad.to('cpu'), model.weight_ih_l0.grad.to('cpu')
 
         with AutoDNNL(True):
-            lstm_out_dpcpp, hidden_out_dpcpp = lstm_dpcpp(embeds_dpcpp, (hidden_0_dpcpp, hidden_1_dpcpp))
-            lstm_out_dpcpp, _ = torch.nn.utils.rnn.pad_packed_sequence(lstm_out_dpcpp, batch_first=True)
+            y, grad_input, grad_weight = run(models[1])
+            # the masks are drawn from the seeded generator of torch
+            self.assertEqual(run(models[1]), (y, grad_input, grad_weight))
+            self.assertTrue(torch.isfinite(grad_input).all() and torch.isfinite(grad_weight).all())
+            # the last layer is not dropped, the others are
+            self.assertNotEqual(run(models[0])[0], y)
+
+        # Two layers against the CPU layers on either side of the dropout, the
+        # mask being drawn from the same seed by the dropout of the Extension.
+        p = 0.5
+        model = getattr(torch.nn, cell)(32, 64, num_layers=2, dropout=p).train()
+        layers = [getattr(torch.nn, cell)(32 if l == 0 else 64, 64).train() for l in range(2)]
+        for l, layer in enumerate(layers):
+            for name in ['weight_ih', 'weight_hh', 'bias_ih', 'bias_hh']:
+                getattr(layer, name + '_l0').data.copy_(getattr(model, name + '_l{}'.format(l)).data)
+        model_dpcpp = copy.deepcopy(model).to(device=device)
+        input_cpu = input.clone().requires_grad_()
+        input_dpcpp = input.clone().to(device=device).requires_grad_()
+        with AutoDNNL(True):
+            with torch.no_grad():
+                output_0 = layers[0](input)[0]
+                torch.manual_seed(rand_seed)
+                dropped = F.dropout(output_0.to(device=device), p, training=True).to('cpu')
+            keep = dropped != 0
+            # about 1 - p of the outputs are kept, scaled by 1 / (1 - p)
+            self.assertLess(abs(keep.float().mean().item() - (1 - p)), 0.05)
+            self.assertEqual(dropped[keep], output_0[keep] / (1 - p))
 
-            self.assertEqual(lstm_out, lstm_out_dpcpp)
-            self.assertEqual(hidden_out[0], hidden_out_dpcpp[0])
-            self.assertEqual(hidden_out[1], hidden_out_dpcpp[1])
+            torch.manual_seed(rand_seed)
+            y_dpcpp = model_dpcpp(input_dpcpp)[0]
+            y_dpcpp.sum().backward()
+        y_ref = layers[1](layers[0](input_cpu)[0] * keep.float() / (1 - p))[0]
+        y_ref.sum().backward()
+        self.assertEqual(y_ref, y_dpcpp.to('cpu'))
+        # the backward applies the mask of the forward
+        self.assertEqual(input_cpu.grad, input_dpcpp.grad.to('cpu'))
+        self.assertEqual(layers[0].weight_ih_l0.grad, model_dpcpp.weight_ih_l0.grad.to('cpu'))
+        self.assertEqual(layers[1].weight_ih_l0.grad, model_dpcpp.weight_ih_l1.grad.to('cpu'))
 
-            if training:
-                lstm_out.sum().backward()
-                lstm_out_dpcpp.sum().backward()
-                self.assertEqual(sentences_dpcpp.grad.to('cpu'), sentences.grad)
-                self.assertEqual(lstm_dpcpp.weight_ih_l0.grad.to('cpu'), lstm.weight_ih_l0.grad)
-                self.assertEqual(lstm_dpcpp.weight_hh_l0.grad.to('cpu'), lstm.weight_hh_l0.grad)
+    def test_lstm_dropout_training(self):
+        self._test_rnn_dropout(cell="LSTM")
 
-                self.assertEqual(lstm_dpcpp.bias_ih_l0.grad.to('cpu'), lstm.bias_ih_l0.grad)
-                self.assertEqual(lstm_dpcpp.bias_hh_l0.grad.to('cpu'), lstm.bias_hh_l0.grad)
+    def test_gru_dropout_training(self):
+        self._test_rnn_dropout(cell="GRU")
 
-                self.assertEqual(hidden_0_dpcpp.grad.to('cpu'), hidden_0.grad)
-                self.assertEqual(hidden_1_dpcpp.grad.to('cpu'), hidden_1.grad)
+    def test_rnn_dropout_training(self):
+        self._test_rnn_dropout(cell="RNN")
 
     def test_lstm_inference(self):
         self._test_lstm(training=False)
@@ -1823,14 +1900,52 @@ class TestRNN(TestCase):
     def test_gru_inference(self):
         self._test_rnn(cell="GRU", training=False)
 
+    def test_gru_inference_weight(self):
+        rand_seed = int(get_rand_seed())
+        print("{} rand sed: {}".format(sys._getframe().f_code.co_name, rand_seed))
+        torch.manual_seed(rand_seed)
+        input = torch.randn(5, 3, 10)
+        model_cpu = torch.nn.GRU(10, 20, num_layers=2).eval()
+        model_dpcpp = copy.deepcopy(model_cpu).to(device=device).eval()
+        with AutoDNNL(True):
+            self.assertEqual(model_cpu(input)[0], model_dpcpp(input.to(device=device))[0])
+            # the prepacked GRU weight leaves the parameter in the (r, z, n) order
+            self.assertEqual(model_dpcpp.weight_ih_l0.to('cpu'), model_cpu.weight_ih_l0)
+            self.assertEqual(model_dpcpp.weight_hh_l1.to('cpu'), model_cpu.weight_hh_l1)
+            self.assertEqual(model_cpu(input)[0], model_dpcpp(input.to(device=device))[0])
+
+            # and is packed again once the parameter is modified in place
+            model_cpu.load_state_dict(torch.nn.GRU(10, 20, num_layers=2).state_dict())
+            model_dpcpp.load_state_dict(model_cpu.state_dict())
+            self.assertEqual(model_cpu(input)[0], model_dpcpp(input.to(device=device))[0])
+
     def test_gru_training(self):
         self._test_rnn(cell="GRU", training=True)
 
     def test_pack_padded_sequence_lstm_inference(self):
-        self._test_pack_padded_sequence_lstm(training=False)
+        self._test_pack_padded_sequence(cell="LSTM", training=False)
 
     def test_pack_padded_sequence_lstm_training(self):
-        self._test_pack_padded_sequence_lstm(training=True)
+        self._test_pack_padded_sequence(cell="LSTM", training=True)
+
+    def test_pack_padded_sequence_gru_inference(self):
+        self._test_pack_padded_sequence(cell="GRU", training=False)
+
+    def test_pack_padded_sequence_gru_training(self):
+        self._test_pack_padded_sequence(cell="GRU", training=True)
+
+    def test_pack_padded_sequence_rnn_inference(self):
+        self._test_pack_padded_sequence(cell="RNN", training=False)
+
+    def test_pack_padded_sequence_rnn_training(self):
+        self._test_pack_padded_sequence(cell="RNN", training=True)
+
+    def test_pack_padded_sequence_many_lengths(self):
+        # more batch sizes than oneDNN runs a packed input with, the ATen CPU
+        # kernels take it instead
+        sent_lens = torch.randperm(40).float() + 1
+        for cell, training in itertools.product(["LSTM", "GRU", "RNN"], [False, True]):
+            self._test_pack_padded_sequence(cell=cell, training=training, sent_lens=sent_lens)
 
 class TestInterpolate(TestCase):
     def test_upsample_nearest1d_scale_factor(self):
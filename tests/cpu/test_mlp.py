@@ -67,5 +67,81 @@ class TestMLPCases(TestCase):
       self.assertEqual(weight_grad_ipex.to(torch.float32), weight_grad_cpu.to(torch.float32), atol=1e-1, rtol=1e-5)
       self.assertEqual(bias_grad_ipex.to(torch.float32), bias_grad_cpu.to(torch.float32), atol=1e-1, rtol=1e-5)
 
+  def test_mlp_cache(self):
+    for data_type in [torch.float32, torch.bfloat16]:
+      seed = self.get_rand_seed()
+      ipex_fc = self._ipxex_linear(seed, data_type)
+      cpu_fc = self._cpu_linear(seed, data_type)
+      ipex_optimizer = torch.optim.SGD(ipex_fc.parameters(), lr=0.1)
+      cpu_optimizer = torch.optim.SGD(cpu_fc.parameters(), lr=0.1)
+      for _ in range(3):
+        x = torch.randn(MB, C).to(data_type)
+        y_ipex = ipex_fc(x)
+        blocked_weight = ipex_fc.blocked_weight_cache[data_type][1]
+        # the blocked weight is reused until the weight is updated
+        ipex_fc(x)
+        self.assertTrue(ipex_fc.blocked_weight_cache[data_type][1] is blocked_weight)
+        y_cpu = cpu_fc(x)
+        y_ipex.float().mean().backward()
+        y_cpu.float().mean().backward()
+        ipex_optimizer.step()
+        cpu_optimizer.step()
+        ipex_optimizer.zero_grad()
+        cpu_optimizer.zero_grad()
+        ipex_fc(x)
+        self.assertFalse(ipex_fc.blocked_weight_cache[data_type][1] is blocked_weight)
+        self.assertEqual(ipex_fc.weight.float(), cpu_fc.weight.float(), atol=1e-1, rtol=1e-5)
+
+  def test_mlp_handle_cache(self):
+    ipex_fc = ipex.IpexMLPLinear(C, K)
+    handles = {}
+    for N in [MB, 2 * MB, 3 * MB, 4 * MB, 5 * MB, MB]:
+      ipex_fc(torch.randn(N, C))
+      handles.setdefault(N, ipex_fc.ipex_mlp_handle)
+      self.assertTrue(len(ipex_fc.ipex_mlp_handles) <= ipex_fc.handle_cache_size)
+    # the handle of the first batch size was evicted by the later ones
+    self.assertFalse(ipex_fc.ipex_mlp_handle is handles[MB])
+    ipex_fc(torch.randn(5 * MB, C))
+    self.assertTrue(ipex_fc.ipex_mlp_handle is handles[5 * MB])
+
+  def test_mlp_tower(self):
+    sizes = [64, 128, 64, 32]
+    activations = ['relu', 'relu', 'sigmoid']
+    for data_type in [torch.float32, torch.bfloat16]:
+      seed = self.get_rand_seed()
+      torch.manual_seed(seed)
+      ipex_mlp = ipex.IpexMLP(sizes, activations).to(data_type)
+      layers = []
+      for layer, act in zip(ipex_mlp.layers, activations):
+        linear = torch.nn.Linear(layer.C, layer.K).to(data_type)
+        linear.weight.data.copy_(layer.weight.data)
+        linear.bias.data.copy_(layer.bias.data)
+        layers += [linear, torch.nn.ReLU() if act == 'relu' else torch.nn.Sigmoid()]
+      cpu_mlp = torch.nn.Sequential(*layers)
+
+      # the buffers of a batch size are reused by the next iterations
+      for _ in range(2):
+        x = torch.randn(MB, sizes[0]).to(data_type)
+        x_ipex = x.clone().requires_grad_(True)
+        x_cpu = x.clone().requires_grad_(True)
+        y_ipex = ipex_mlp(x_ipex)
+        y_cpu = cpu_mlp(x_cpu)
+        self.assertEqual(y_ipex.float(), y_cpu.float(), atol=1e-1, rtol=1e-2)
+        y_ipex.float().sum().backward()
+        y_cpu.float().sum().backward()
+        self.assertEqual(x_ipex.grad.float(), x_cpu.grad.float(), atol=1e-1, rtol=1e-2)
+        for layer, linear in zip(ipex_mlp.layers, cpu_mlp[::2]):
+          self.assertEqual(layer.weight.grad.float(), linear.weight.grad.float(), atol=1e-1, rtol=1e-2)
+          self.assertEqual(layer.bias.grad.float(), linear.bias.grad.float(), atol=1e-1, rtol=1e-2)
+      self.assertEqual(len(ipex_mlp.buffers_cache), 1)
+
+  def test_mlp_tower_overwritten(self):
+    ipex_mlp = ipex.IpexMLP([64, 64, 64])
+    y1 = ipex_mlp(torch.randn(MB, 64))
+    y2 = ipex_mlp(torch.randn(MB, 64))
+    with self.assertRaises(RuntimeError):
+      y1.sum().backward()
+    y2.sum().backward()
+
 if __name__ == '__main__':
     test = unittest.main()
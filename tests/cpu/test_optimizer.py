@@ -0,0 +1,233 @@
+import torch
+import torch.nn as nn
+import intel_pytorch_extension as ipex
+import unittest
+from common_utils import TestCase
+
+class TestOptimizer(TestCase):
+    def _run_steps(self, ref_optimizer_fn, ipex_optimizer_fn, dtype, sparse=False, steps=3):
+        # a dense layer and an embedding table, updated by the same gradients
+        sizes = [(37, 19), (23,), (100, 24)]
+        ref_params = [nn.Parameter(torch.randn(size)) for size in sizes]
+        params = [nn.Parameter(p.detach().clone().to(ipex.DEVICE).to(dtype)) for p in ref_params]
+        ref_optimizer = ref_optimizer_fn(ref_params)
+        optimizer = ipex_optimizer_fn(params)
+        for _ in range(steps):
+            for i, (ref_p, p) in enumerate(zip(ref_params, params)):
+                grad = torch.randn(ref_p.size()).to(dtype).float()
+                if sparse and i == 2:
+                    rows = torch.LongTensor([[3, 7, 8, 42, 99]])
+                    grad = torch.sparse_coo_tensor(rows, grad[rows[0]], ref_p.size()).coalesce()
+                ref_p.grad = grad
+                p.grad = grad.to(ipex.DEVICE).to(dtype)
+            ref_optimizer.step()
+            optimizer.step()
+        return ref_params, params, optimizer
+
+    def _check(self, ref_params, params, dtype):
+        prec = 1e-5 if dtype == torch.float else 1e-2
+        for ref_p, p in zip(ref_params, params):
+            self.assertEqual(ref_p.data, p.data.to('cpu').float(), atol=prec, rtol=prec)
+
+    def test_split_sgd(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for momentum, dampening, weight_decay, nesterov in [
+                    (0, 0, 0, False), (0.9, 0, 0, False), (0.9, 0.1, 1e-2, False), (0.9, 0, 1e-2, True)]:
+                kwargs = dict(lr=0.1, momentum=momentum, dampening=dampening, weight_decay=weight_decay, nesterov=nesterov)
+                ref_params, params, optimizer = self._run_steps(
+                    lambda p: torch.optim.SGD(p, **kwargs), lambda p: ipex.SplitSGD(p, **kwargs), dtype)
+                self._check(ref_params, params, dtype)
+                if dtype == torch.bfloat16 and momentum != 0:
+                    # the momentum of a bf16 parameter is split as well
+                    self.assertTrue('momentum_buffer_bottom_half' in optimizer.state[params[0]])
+            ref_params, params, _ = self._run_steps(
+                lambda p: torch.optim.SGD(p, lr=0.1), lambda p: ipex.SplitSGD(p, lr=0.1), dtype, sparse=True)
+            self._check(ref_params, params, dtype)
+
+    def test_split_sgd_sparse_rows(self):
+        emb = nn.EmbeddingBag(1000, 16, mode='sum', sparse=True).to(ipex.DEVICE).bfloat16()
+        origin_weight = emb.weight.data.clone()
+        optimizer = ipex.SplitSGD(emb.parameters(), lr=0.1, momentum=0.9, weight_decay=1e-4)
+        cpu_input = torch.LongTensor([7, 3, 999, 7, 3, 3, 0, 512, 7])
+        emb(cpu_input.to(ipex.DEVICE), torch.LongTensor([0, 3, 6]).to(ipex.DEVICE)).float().sum().backward()
+        optimizer.step()
+        touched = torch.zeros(1000, dtype=torch.bool)
+        touched[cpu_input] = True
+        updated = emb.weight.data.to('cpu')
+        self.assertEqual(updated[~touched], origin_weight.to('cpu')[~touched])
+        self.assertNotEqual(updated[touched], origin_weight.to('cpu')[touched])
+
+    def test_split_adagrad(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for weight_decay, lr_decay in [(0, 0), (1e-2, 1e-3)]:
+                kwargs = dict(lr=0.1, lr_decay=lr_decay, weight_decay=weight_decay, initial_accumulator_value=0.1)
+                ref_params, params, _ = self._run_steps(
+                    lambda p: torch.optim.Adagrad(p, **kwargs), lambda p: ipex.SplitAdagrad(p, **kwargs), dtype)
+                self._check(ref_params, params, dtype)
+            ref_params, params, _ = self._run_steps(
+                lambda p: torch.optim.Adagrad(p, lr=0.1), lambda p: ipex.SplitAdagrad(p, lr=0.1), dtype, sparse=True)
+            self._check(ref_params, params, dtype)
+
+    def test_split_adam(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for ref_cls, cls, weight_decay in [(torch.optim.Adam, ipex.SplitAdam, 0),
+                                               (torch.optim.Adam, ipex.SplitAdam, 1e-2),
+                                               (torch.optim.AdamW, ipex.SplitAdamW, 1e-2)]:
+                kwargs = dict(lr=1e-2, weight_decay=weight_decay)
+                ref_params, params, _ = self._run_steps(
+                    lambda p: ref_cls(p, **kwargs), lambda p: cls(p, **kwargs), dtype)
+                self._check(ref_params, params, dtype)
+
+    def test_split_adam_sparse(self):
+        # the rows of a sparse gradient are updated like SparseAdam
+        ref_param = nn.Parameter(torch.randn(100, 24))
+        param = nn.Parameter(ref_param.detach().clone().to(ipex.DEVICE))
+        ref_optimizer = torch.optim.SparseAdam([ref_param], lr=1e-2)
+        optimizer = ipex.SplitAdam([param], lr=1e-2)
+        for rows in [[3, 7, 8], [7, 42, 99], [3, 99]]:
+            rows = torch.LongTensor([rows])
+            grad = torch.sparse_coo_tensor(rows, torch.randn(rows.size(1), 24), ref_param.size()).coalesce()
+            ref_param.grad = grad
+            param.grad = grad.to(ipex.DEVICE)
+            ref_optimizer.step()
+            optimizer.step()
+        self.assertEqual(ref_param.data, param.data.to('cpu'), atol=1e-5, rtol=1e-5)
+
+    def _run_long(self, ref_optimizer_fn, ipex_optimizer_fn, state_keys, steps=500):
+        # the gradients shrink after the first steps, so the states of the
+        # parameter have to decay by small updates, which bf16 would round away
+        ref_param = nn.Parameter(torch.randn(64, 33))
+        param = nn.Parameter(ref_param.detach().clone().to(ipex.DEVICE).bfloat16())
+        ref_optimizer = ref_optimizer_fn([ref_param])
+        optimizer = ipex_optimizer_fn([param])
+        for step in range(steps):
+            grad = (torch.randn(ref_param.size()) * (1. if step < 50 else 0.1)).bfloat16().float()
+            ref_param.grad = grad
+            param.grad = grad.to(ipex.DEVICE).bfloat16()
+            ref_optimizer.step()
+            optimizer.step()
+
+        state = optimizer.state[param]
+        for key in state_keys:
+            self.assertEqual(state[key].dtype, torch.float)
+            self.assertEqual(ref_optimizer.state[ref_param][key], state[key].to('cpu'), atol=1e-5, rtol=1e-4)
+        # the fp32 master weight, from the bf16 parameter and its bottom half
+        top = param.data.to('cpu').view(torch.int16).to(torch.int32) << 16
+        bottom = state['bottom_half'].to('cpu').view(torch.int16).to(torch.int32) & 0xffff
+        self.assertEqual(ref_param.data, (top | bottom).view(torch.float), atol=1e-4, rtol=1e-4)
+
+    def test_split_adagrad_long_run(self):
+        self._run_long(lambda p: torch.optim.Adagrad(p, lr=1e-2, initial_accumulator_value=0.1),
+                       lambda p: ipex.SplitAdagrad(p, lr=1e-2, initial_accumulator_value=0.1), ['sum'])
+
+    def test_split_adam_long_run(self):
+        for ref_cls, cls in [(torch.optim.Adam, ipex.SplitAdam), (torch.optim.AdamW, ipex.SplitAdamW)]:
+            self._run_long(lambda p: ref_cls(p, lr=1e-3), lambda p: cls(p, lr=1e-3), ['exp_avg', 'exp_avg_sq'])
+
+    def _lamb_reference(self, params, lr, betas, eps, weight_decay):
+        # a plain implementation of LAMB over fp32 parameters
+        class Lamb(torch.optim.Optimizer):
+            def __init__(self, params):
+                super(Lamb, self).__init__(params, dict())
+
+            def step(self):
+                beta1, beta2 = betas
+                for p in self.param_groups[0]['params']:
+                    state = self.state[p]
+                    if len(state) == 0:
+                        state['step'] = 0
+                        state['exp_avg'] = torch.zeros_like(p)
+                        state['exp_avg_sq'] = torch.zeros_like(p)
+                    state['step'] += 1
+                    state['exp_avg'].mul_(beta1).add_(p.grad, alpha=1 - beta1)
+                    state['exp_avg_sq'].mul_(beta2).addcmul_(p.grad, p.grad, value=1 - beta2)
+                    m = state['exp_avg'] / (1 - beta1 ** state['step'])
+                    v = state['exp_avg_sq'] / (1 - beta2 ** state['step'])
+                    update = m / (v.sqrt() + eps) + weight_decay * p.data
+                    p_norm, u_norm = p.data.norm(), update.norm()
+                    trust_ratio = p_norm / u_norm if p_norm > 0 and u_norm > 0 else 1.
+                    p.data.add_(update, alpha=-lr * float(trust_ratio))
+        return Lamb(params)
+
+    def _lars_reference(self, params, lr, momentum, weight_decay, trust_coefficient, eps):
+        # a plain implementation of LARS over fp32 parameters
+        class Lars(torch.optim.Optimizer):
+            def __init__(self, params):
+                super(Lars, self).__init__(params, dict())
+
+            def step(self):
+                for p in self.param_groups[0]['params']:
+                    p_norm, g_norm = p.data.norm(), p.grad.norm()
+                    trust_ratio = trust_coefficient * p_norm / (g_norm + weight_decay * p_norm + eps) \
+                        if p_norm > 0 and g_norm > 0 else 1.
+                    d_p = (p.grad + weight_decay * p.data) * float(trust_ratio)
+                    if momentum != 0:
+                        state = self.state[p]
+                        if 'momentum_buffer' not in state:
+                            state['momentum_buffer'] = torch.zeros_like(p)
+                        d_p = state['momentum_buffer'].mul_(momentum).add_(d_p)
+                    p.data.add_(d_p, alpha=-lr)
+        return Lars(params)
+
+    def test_split_lamb(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for weight_decay in [0, 1e-2]:
+                kwargs = dict(lr=1e-2, betas=(0.9, 0.999), eps=1e-6, weight_decay=weight_decay)
+                ref_params, params, _ = self._run_steps(
+                    lambda p: self._lamb_reference(p, **kwargs), lambda p: ipex.SplitLamb(p, **kwargs), dtype)
+                self._check(ref_params, params, dtype)
+
+    def test_split_lamb_long_run(self):
+        kwargs = dict(lr=1e-3, betas=(0.9, 0.999), eps=1e-6, weight_decay=0)
+        self._run_long(lambda p: self._lamb_reference(p, **kwargs), lambda p: ipex.SplitLamb(p, **kwargs),
+                       ['exp_avg', 'exp_avg_sq'])
+
+    def test_split_lars(self):
+        for dtype in [torch.float, torch.bfloat16]:
+            for momentum, weight_decay in [(0, 0), (0.9, 1e-4)]:
+                kwargs = dict(lr=1.0, momentum=momentum, weight_decay=weight_decay, trust_coefficient=0.02, eps=1e-8)
+                ref_params, params, _ = self._run_steps(
+                    lambda p: self._lars_reference(p, **kwargs), lambda p: ipex.SplitLars(p, **kwargs), dtype)
+                self._check(ref_params, params, dtype)
+
+    def test_multi_tensor_l2norm(self):
+        # small and large tensors share the chunks of the parallel region
+        sizes = [(3,), (4097,), (0,), (129, 65), (1,)]
+        for dtype in [torch.float, torch.bfloat16]:
+            tensors = [torch.randn(size).to(dtype) for size in sizes]
+            norms = ipex.core.multi_tensor_l2norm([t.to(ipex.DEVICE) for t in tensors], [])
+            self.assertEqual(norms, torch.stack([t.float().norm() for t in tensors]), atol=1e-4, rtol=1e-4)
+
+        # the norms of split bf16 tensors are the norms of their fp32 values
+        fp32_tensors = [torch.randn(size) for size in sizes]
+        top_halves = [(t.view(torch.int32) >> 16).to(torch.int16).view(torch.bfloat16) for t in fp32_tensors]
+        bottom_halves = [t.view(torch.int32).to(torch.int16).view(torch.bfloat16) for t in fp32_tensors]
+        norms = ipex.core.multi_tensor_l2norm([t.to(ipex.DEVICE) for t in top_halves],
+                                              [t.to(ipex.DEVICE) for t in bottom_halves])
+        self.assertEqual(norms, torch.stack([t.norm() for t in fp32_tensors]), atol=1e-4, rtol=1e-4)
+
+    def test_clip_grad_norm(self):
+        ref_params = [nn.Parameter(torch.randn(size)) for size in [(37, 19), (23,), (5000,)]]
+        params = [nn.Parameter(p.detach().clone().to(ipex.DEVICE)) for p in ref_params]
+        for ref_p, p in zip(ref_params, params):
+            ref_p.grad = torch.randn(ref_p.size())
+            p.grad = ref_p.grad.clone().to(ipex.DEVICE)
+        ref_norm = torch.nn.utils.clip_grad_norm_(ref_params, 1.0)
+        norm = ipex.clip_grad_norm_(params, 1.0)
+        self.assertEqual(ref_norm, norm, atol=1e-4, rtol=1e-4)
+        for ref_p, p in zip(ref_params, params):
+            self.assertEqual(ref_p.grad, p.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+    def test_clip_grad_norm_non_contiguous(self):
+        ref_param = nn.Parameter(torch.randn(19, 37))
+        param = nn.Parameter(ref_param.detach().clone().to(ipex.DEVICE))
+        ref_param.grad = torch.randn(37, 19).t()
+        param.grad = ref_param.grad.to(ipex.DEVICE).t().contiguous().t()
+        self.assertFalse(param.grad.is_contiguous())
+        ref_norm = torch.nn.utils.clip_grad_norm_([ref_param], 1.0)
+        norm = ipex.clip_grad_norm_([param], 1.0)
+        self.assertEqual(ref_norm, norm, atol=1e-4, rtol=1e-4)
+        self.assertEqual(ref_param.grad, param.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+if __name__ == '__main__':
+    test = unittest.main()
@@ -0,0 +1,136 @@
+import math
+import unittest
+
+import torch
+import torch.nn as nn
+import intel_pytorch_extension as ipex
+from common_utils import TestCase
+from common_ipex_conf import AutoMixPrecision, AutoDNNL
+
+
+def roi_align_ref(x, rois, output_size, spatial_scale, sampling_ratio):
+    # the average of the bilinear samples of each bin, in differentiable ops
+    pooled_height, pooled_width = output_size
+    _, _, height, width = x.shape
+
+    def interpolate(v, size):
+        if v < -1.0 or v > size:
+            return None
+        v = max(v, 0.)
+        low = int(v)
+        if low >= size - 1:
+            return size - 1, size - 1, 1., 0.
+        return low, low + 1, 1. - (v - low), v - low
+
+    outputs = []
+    for roi in rois.tolist():
+        batch = int(roi[0])
+        start_w, start_h, end_w, end_h = [v * spatial_scale for v in roi[1:]]
+        roi_width = max(end_w - start_w, 1.)
+        roi_height = max(end_h - start_h, 1.)
+        bin_h = roi_height / pooled_height
+        bin_w = roi_width / pooled_width
+        grid_h = sampling_ratio if sampling_ratio > 0 else math.ceil(roi_height / pooled_height)
+        grid_w = sampling_ratio if sampling_ratio > 0 else math.ceil(roi_width / pooled_width)
+        bins = []
+        for ph in range(pooled_height):
+            for pw in range(pooled_width):
+                val = torch.zeros(x.size(1))
+                for iy in range(grid_h):
+                    y = interpolate(start_h + ph * bin_h + (iy + .5) * bin_h / grid_h, height)
+                    for ix in range(grid_w):
+                        x_ = interpolate(start_w + pw * bin_w + (ix + .5) * bin_w / grid_w, width)
+                        if y is None or x_ is None:
+                            continue
+                        for yy, wy in [(y[0], y[2]), (y[1], y[3])]:
+                            for xx, wx in [(x_[0], x_[2]), (x_[1], x_[3])]:
+                                val = val + wy * wx * x[batch, :, yy, xx]
+                bins.append(val / (grid_h * grid_w))
+        outputs.append(torch.stack(bins, 1).view(-1, pooled_height, pooled_width))
+    return torch.stack(outputs, 0)
+
+
+class TestROIAlign(TestCase):
+    def _rois(self, num_rois, batch_size, height, width):
+        batch = torch.randint(0, batch_size, (num_rois, 1)).float()
+        x1 = torch.rand(num_rois, 1) * width * 2 - 2
+        y1 = torch.rand(num_rois, 1) * height * 2 - 2
+        x2 = x1 + torch.rand(num_rois, 1) * width * 2
+        y2 = y1 + torch.rand(num_rois, 1) * height * 2
+        return torch.cat([batch, x1, y1, x2, y2], 1)
+
+    def test_roi_align(self):
+        x = torch.randn(2, 21, 13, 17)
+        rois = self._rois(7, 2, 13, 17)
+        grad = torch.randn(7, 21, 4, 3)
+        for sampling_ratio in [0, 2]:
+            x_ref = x.clone().requires_grad_()
+            ref = roi_align_ref(x_ref, rois, (4, 3), 0.5, sampling_ratio)
+            ref.backward(grad)
+
+            x_dpcpp = x.clone().to(ipex.DEVICE).requires_grad_()
+            roi_align = ipex.ops.ROIAlign((4, 3), 0.5, sampling_ratio)
+            y = roi_align(x_dpcpp, rois.to(ipex.DEVICE))
+            y.backward(grad.to(ipex.DEVICE))
+            self.assertEqual(ref, y.to('cpu'), atol=1e-5, rtol=1e-5)
+            self.assertEqual(x_ref.grad, x_dpcpp.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+    def test_roi_align_bf16(self):
+        x = torch.randn(2, 21, 13, 17).bfloat16()
+        rois = self._rois(7, 2, 13, 17)
+        grad = torch.randn(7, 21, 4, 3).bfloat16()
+        x_ref = x.float().requires_grad_()
+        ref = roi_align_ref(x_ref, rois, (4, 3), 0.5, 2)
+        ref.backward(grad.float())
+
+        x_dpcpp = x.clone().to(ipex.DEVICE).requires_grad_()
+        y = ipex.ops.roi_align(x_dpcpp, rois.to(ipex.DEVICE), (4, 3), 0.5, 2)
+        y.backward(grad.to(ipex.DEVICE))
+        self.assertEqual(y.dtype, torch.bfloat16)
+        self.assertEqual(ref, y.to('cpu').float(), atol=1e-2, rtol=1e-2)
+        self.assertEqual(x_ref.grad, x_dpcpp.grad.to('cpu').float(), atol=1e-2, rtol=1e-2)
+
+    def test_roi_align_dil(self):
+        # the blocked f32 and bf16 outputs of a convolution are pooled in place
+        conv = nn.Conv2d(3, 20, 3, padding=1).to(ipex.DEVICE)
+        x = torch.randn(2, 3, 13, 17).to(ipex.DEVICE)
+        rois = self._rois(7, 2, 13, 17).to(ipex.DEVICE)
+        with AutoDNNL(True):
+            for mix_bf16, prec in [(False, 1e-5), (True, 1e-1)]:
+                with AutoMixPrecision(mix_bf16):
+                    with torch.no_grad():
+                        feature = conv(x)
+                        y = ipex.ops.roi_align(feature, rois, (7, 7), 0.25, 0)
+                    self.assertEqual(ipex.core.is_bf16_dil_tensor(y), mix_bf16)
+                ref = roi_align_ref(feature.to('cpu').float(), rois.to('cpu'), (7, 7), 0.25, 0)
+                self.assertEqual(ref, y.to('cpu').float(), atol=prec, rtol=prec)
+
+    def test_multilevel_roi_align(self):
+        # each ROI is pooled from the level of the FPN rule, the levels of an image
+        # being written by different ROIs in the backward
+        scales = [1. / 4, 1. / 8, 1. / 16, 1. / 32]
+        sizes = [(32, 40), (16, 20), (8, 10), (4, 5)]
+        xs = [torch.randn(2, 5, h, w) for h, w in sizes]
+        rois = self._rois(11, 2, 128, 160)
+        grad = torch.randn(11, 5, 7, 7)
+        areas = (rois[:, 3] - rois[:, 1] + 1) * (rois[:, 4] - rois[:, 2] + 1)
+        levels = torch.floor(4 + torch.log2(areas.clamp(min=0).sqrt() / 224 + 1e-6)).clamp(2, 5).long() - 2
+        for sampling_ratio in [0, 2]:
+            xs_ref = [x.clone().requires_grad_() for x in xs]
+            ref = torch.cat([roi_align_ref(xs_ref[level], rois[i:i + 1], (7, 7), scales[level], sampling_ratio)
+                             for i, level in enumerate(levels.tolist())])
+            ref.backward(grad)
+
+            xs_dpcpp = [x.clone().to(ipex.DEVICE).requires_grad_() for x in xs]
+            pooler = ipex.ops.MultiLevelROIAlign((7, 7), scales, sampling_ratio)
+            y = pooler(xs_dpcpp, rois.to(ipex.DEVICE))
+            y.backward(grad.to(ipex.DEVICE))
+            self.assertEqual(ref, y.to('cpu'), atol=1e-5, rtol=1e-5)
+            for x_ref, x_dpcpp in zip(xs_ref, xs_dpcpp):
+                self.assertEqual(x_ref.grad, x_dpcpp.grad.to('cpu'), atol=1e-5, rtol=1e-5)
+
+        y = ipex.ops.multilevel_roi_align([x.to(ipex.DEVICE) for x in xs], rois[:0].to(ipex.DEVICE), (7, 7), scales, 2)
+        self.assertEqual(y.size(), torch.Size([0, 5, 7, 7]))
+
+if __name__ == '__main__':
+    test = unittest.main()
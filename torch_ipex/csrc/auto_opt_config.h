@@ -76,9 +76,25 @@ public:
     return xpu_mode_;
   }
 
+  // embedding_bag
+  inline void set_embedding_bag_prefetch_distance(int64_t value) {
+    embedding_bag_prefetch_distance_ = value;
+  }
+  inline int64_t get_embedding_bag_prefetch_distance() {
+    return embedding_bag_prefetch_distance_;
+  }
+
+  inline void set_embedding_bag_sort_indices(bool value) {
+    embedding_bag_sort_indices_ = value;
+  }
+  inline bool get_embedding_bag_sort_indices() {
+    return embedding_bag_sort_indices_;
+  }
+
 private:
   AutoOptConfig() : auto_dnnl_(true), mix_bf16_fp32_(false), mix_int8_fp32_(false),
-                    jit_fuse_(true), train_(false), calibration_step_(false), xpu_mode_(XPUMode::CPU) {}
+                    jit_fuse_(true), train_(false), calibration_step_(false), xpu_mode_(XPUMode::CPU),
+                    embedding_bag_prefetch_distance_(8), embedding_bag_sort_indices_(false) {}
 
   ~AutoOptConfig() = default;
   AutoOptConfig(const AutoOptConfig&) = default;
@@ -94,6 +110,11 @@ private:
   // the flag for one iteration of calibration step whether end or not
   bool calibration_step_;
   XPUMode xpu_mode_;
+  // embedding_bag
+  // number of lookups ahead the sum kernel prefetches rows for, 0 disables it
+  int64_t embedding_bag_prefetch_distance_;
+  // whether the sum kernel sorts the indices of a thread to load a row once
+  bool embedding_bag_sort_indices_;
 };
 
 } // namespace torch_ipex
@@ -1,6 +1,7 @@
 #pragma once
 
 #include "DevOPs.h"
+#include "ExtendOPs.h"
 #include "aten/aten.hpp"
 #include "dbl/Common.h"
 #include "dil/dil.hpp"
@@ -11,6 +12,8 @@
 #include <c10/util/Optional.h>
 #include <torch/csrc/autograd/custom_function.h>
 #include <torch/csrc/autograd/function.h>
+#include <torch/csrc/autograd/functions/utils.h>
+#include <torch/csrc/autograd/saved_variable.h>
 #include <torch/csrc/autograd/variable.h>
 #include <torch/script.h>
 
@@ -617,15 +620,14 @@ public:
 #endif
     try {
       if (torch_ipex::check_auto_dnnl() &&
-          torch_ipex::cpu::aten::embedding_bag::embedding_bag_fast_path_sum(
+          torch_ipex::cpu::aten::embedding_bag::embedding_bag_fast_path(
               weight, per_sample_weights, mode) &&
           weight.device().type() == c10::DeviceType::XPU &&
           indices.device().type() == c10::DeviceType::XPU &&
           offsets.device().type() == c10::DeviceType::XPU) {
-        auto ret = torch_ipex::cpu::aten::embedding_bag::embedding_bag_impl(
+        return torch_ipex::cpu::aten::embedding_bag::embedding_bag_impl(
             weight, indices, offsets, scale_grad_by_freq, mode, sparse,
             per_sample_weights, include_last_offset);
-        return {ret};
       }
     } catch (std::exception &e) {
 #if defined(_DEBUG)
@@ -718,16 +720,24 @@ public:
     at::Tensor grad = grad_outputs[0];
     if (!sparse)
       grad = grad.contiguous();
+    bool compute_per_sample_weights_grad =
+        per_sample_weights.defined() && per_sample_weights.requires_grad();
 
     try {
       if (torch_ipex::check_auto_dnnl() &&
           (torch_ipex::cpu::aten::embedding_bag::
-               embedding_bag_backward_fast_path_sum(
+               embedding_bag_backward_fast_path(
                    grad, indices, offset2bag, per_sample_weights,
                    scale_grad_by_freq, mode)) &&
           weight.device().type() == c10::DeviceType::XPU &&
           indices.device().type() == c10::DeviceType::XPU &&
           offsets.device().type() == c10::DeviceType::XPU) {
+        auto per_sample_weights_grad =
+            compute_per_sample_weights_grad
+                ? torch_ipex::cpu::aten::embedding_bag::
+                      embedding_bag_per_sample_weights_backward_impl(
+                          grad, weight, indices, offsets, mode)
+                : at::Tensor();
         return {
             torch_ipex::cpu::aten::embedding_bag::embedding_bag_backward_impl(
                 grad, indices, offsets, offset2bag, bag_size, maximum_indices,
@@ -738,15 +748,14 @@ public:
             at::Tensor(),
             at::Tensor(),
             at::Tensor(),
-            at::Tensor()};
+            at::Tensor(),
+            per_sample_weights_grad};
       }
     } catch (std::exception &e) {
 #if defined(_DEBUG)
       TORCH_WARN(e.what());
 #endif
     }
-    bool compute_per_sample_weights_grad =
-        per_sample_weights.defined() && per_sample_weights.requires_grad();
     at::Tensor offset2bag_ =
         torch_ipex::cpu::aten::embedding_bag::embedding_bag_get_offset2bag(
             indices, offsets, offset2bag);
@@ -908,6 +917,41 @@ public:
   }
 };
 
+// The dropout between the layers of an RNN, keeping its mask for the backward.
+class NewDropoutOp : public torch::autograd::Function<NewDropoutOp> {
+public:
+  static at::Tensor _forward(const at::Tensor& input, double ratio) {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("NewDropoutOp::_forward", std::vector<c10::IValue>({}));
+#endif
+    return std::get<0>(torch_ipex::cpu::AtenIpexCPUDev::dil_dropout_forward(input, ratio));
+  }
+
+  static at::Tensor forward(torch::autograd::AutogradContext *ctx, const at::Tensor& input, double ratio) {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("NewDropoutOp::forward", std::vector<c10::IValue>({}));
+#endif
+    ctx->saved_data["ratio"] = ratio;
+    at::Tensor output, mask;
+    std::tie(output, mask) = torch_ipex::cpu::AtenIpexCPUDev::dil_dropout_forward(input, ratio);
+    ctx->save_for_backward({mask});
+    return output;
+  }
+
+  static torch::autograd::tensor_list
+  backward(torch::autograd::AutogradContext *ctx,
+           torch::autograd::tensor_list grad_outputs) {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("NewDropoutOp::backward", std::vector<c10::IValue>({}));
+#endif
+    auto saved = ctx->get_saved_variables();
+    at::Tensor mask = saved[0];
+    double ratio = ctx->saved_data["ratio"].toDouble();
+    at::Tensor grad_output = grad_outputs[0].contiguous();
+    return {torch_ipex::cpu::AtenIpexCPUDev::dil_dropout_backward(grad_output, mask, ratio), at::Tensor()};
+  }
+};
+
 class FrozenBatchNormOp : public torch::autograd::Function<FrozenBatchNormOp> {
 public:
   static at::Tensor _forward(const at::Tensor& input, const at::Tensor& weight, const at::Tensor& bias, const at::Tensor& running_mean, const at::Tensor& running_var) {
@@ -942,3 +986,72 @@ public:
     return {output, at::Tensor(), at::Tensor(), at::Tensor(), at::Tensor()};
   }
 };
+
+// torch::autograd::Function does not take a vector<Tensor> input, so the
+// backward node of interaction is connected to its inputs by hand.
+class InteractionBackward : public torch::autograd::Node {
+public:
+  torch::autograd::variable_list
+  apply(torch::autograd::variable_list &&grad_outputs) override {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("InteractionBackward::apply", std::vector<c10::IValue>({}));
+#endif
+    if (!grad_outputs[0].defined()) {
+      return torch::autograd::variable_list(input_.size());
+    }
+    std::vector<at::Tensor> input;
+    input.reserve(input_.size());
+    for (auto &saved : input_) {
+      input.push_back(saved.unpack());
+    }
+    return torch_ipex::AtenIpexTypeExt::interaction_backward(
+        grad_outputs[0].contiguous(), input, triangle_only_);
+  }
+
+  std::string name() const override { return "InteractionBackward"; }
+
+  void release_variables() override {
+    for (auto &saved : input_) {
+      saved.reset_data();
+    }
+  }
+
+  std::vector<torch::autograd::SavedVariable> input_;
+  bool triangle_only_ = false;
+};
+
+class NewInteractionOp {
+public:
+  static at::Tensor _forward(const std::vector<at::Tensor> &input,
+                             bool triangle_only) {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("NewInteractionOp::_forward", std::vector<c10::IValue>({}));
+#endif
+    return torch_ipex::AtenIpexTypeExt::interaction_forward(input,
+                                                            triangle_only);
+  }
+
+  static at::Tensor apply(const std::vector<at::Tensor> &input,
+                          bool triangle_only) {
+#if defined(IPEX_PROFILE_OP)
+    RECORD_FUNCTION("NewInteractionOp::apply", std::vector<c10::IValue>({}));
+#endif
+    if (!torch::autograd::compute_requires_grad(input)) {
+      return _forward(input, triangle_only);
+    }
+    std::shared_ptr<InteractionBackward> grad_fn(new InteractionBackward(),
+                                                 torch::autograd::deleteNode);
+    grad_fn->set_next_edges(torch::autograd::collect_next_edges(input));
+    for (const auto &in : input) {
+      grad_fn->input_.emplace_back(in, false);
+    }
+    grad_fn->triangle_only_ = triangle_only;
+    at::Tensor output;
+    {
+      at::AutoNonVariableTypeMode g;
+      output = _forward(input, triangle_only);
+    }
+    torch::autograd::set_history(output, grad_fn);
+    return output;
+  }
+};
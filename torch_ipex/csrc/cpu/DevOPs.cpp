@@ -1,5 +1,6 @@
 #include "torch_ipex/csrc/cpu/DevOPs.h"
 
+#include <ATen/CPUGeneratorImpl.h>
 #include <ATen/Context.h>
 #include <ATen/InferSize.h>
 #include <ATen/NamedTensorUtils.h>
@@ -87,10 +88,10 @@ at::Tensor AtenIpexCPUDev::dil_convolution(
   bool quantized = false;
   std::vector<float> output_scale = {};
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("Convolution");
     quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       output_scale.push_back(scales[1][0]);
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
@@ -150,7 +151,7 @@ at::Tensor AtenIpexCPUDev::dil_convolution(
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {aten_output}, "Convolution",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("Convolution"));
   }
 
   return aten_output;
@@ -1044,10 +1045,11 @@ at::Tensor AtenIpexCPUDev::dil_linear(
   std::vector<float> output_scale = {};
   bool quantized = false;
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    auto op_name = attr.get_post_ops().len() == 0 ? "Linear" : "LinearFuseEltwise";
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id(op_name);
     quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {self}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        self, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       output_scale.push_back(scales[1][0]);
       dbl::comm::reorder_to_int8_for_mix_prec(self, scales[0]);
@@ -1104,7 +1106,7 @@ at::Tensor AtenIpexCPUDev::dil_linear(
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     auto op_name = attr.get_post_ops().len() == 0 ? "Linear" : "LinearFuseEltwise";
     insert_or_updata_observer({self}, {aten_output}, op_name,
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id(op_name));
   }
 
   return aten_output;
@@ -1191,13 +1193,21 @@ std::tuple<at::Tensor, at::Tensor> _dil_dropout(
     const at::Tensor& self,
     double ratio) {
   IPEX_CHECK(
-      ratio >= 0 && ratio < 1 && self.numel() != 0,
+      ratio >= 0 && ratio <= 1 && self.numel() != 0,
       "dropout probability has to be between 0 and 1, but got ",
       ratio);
+  // the mask is drawn from a stream seeded by the default generator of
+  // ATen, so that torch.manual_seed reproduces it
+  long seed;
+  {
+    auto gen = at::detail::getDefaultCPUGenerator();
+    std::lock_guard<std::mutex> lock(gen.mutex());
+    seed = at::check_generator<at::CPUGeneratorImpl>(gen)->random();
+  }
   dil::tensor x = dbl::comm::try_gen_dil_tensor(self);
   dil::tensor mask;
   dil::tensor y;
-  dil::dropout_forward::compute(x, ratio, y, mask);
+  dil::dropout_forward::compute(x, ratio, y, mask, seed);
   return std::tuple<at::Tensor, at::Tensor>{
       dbl::comm::gen_aten_tensor_by(std::move(y)),
       dbl::comm::gen_aten_tensor_by(std::move(mask))};
@@ -1212,6 +1222,13 @@ at::Tensor AtenIpexCPUDev::dil_dropout(const at::Tensor& self, double ratio, boo
   return std::get<0>(_dil_dropout(self, ratio));
 }
 
+std::tuple<at::Tensor, at::Tensor> AtenIpexCPUDev::dil_dropout_forward(const at::Tensor& self, double ratio) {
+  DEBUG("AtenIpexCPUDev::dil_dropout_forward\n");
+  CHECK_DNNL_OP_PRE_COND(self);
+
+  return _dil_dropout(self, ratio);
+}
+
 at::Tensor AtenIpexCPUDev::dil_dropout_backward(
     const at::Tensor& grady,
     const at::Tensor& mask,
@@ -1222,8 +1239,8 @@ at::Tensor AtenIpexCPUDev::dil_dropout_backward(
     return grady;
   }
 
+  // the mask of a bf16 input is kept fp32
   dbl::comm::reorder_to_bf16_for_mix_prec(grady, true);
-  dbl::comm::reorder_to_bf16_for_mix_prec(mask, true);
 
   dil::tensor dY = dbl::comm::try_gen_dil_tensor(grady);
   dil::tensor mask_dil = dbl::comm::try_gen_dil_tensor(mask);
@@ -1260,10 +1277,10 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> AtenIpexCPUDev::dil_native_batch_
   std::vector<float> input_scales = {};
   std::vector<float> output_scales = {};
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("BatchNorm");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       input_scales = scales[0];
       output_scales = scales[1];
@@ -1313,7 +1330,7 @@ std::tuple<at::Tensor, at::Tensor, at::Tensor> AtenIpexCPUDev::dil_native_batch_
 
     if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
       insert_or_updata_observer({input}, {aten_output}, "BatchNorm",
-                                Int8OptConfig::fetch_and_add_ops_id());
+                                Int8OptConfig::fetch_and_add_ops_id("BatchNorm"));
     }
 
     return std::make_tuple(aten_output, at::Tensor(), at::Tensor());
@@ -1373,10 +1390,10 @@ at::Tensor AtenIpexCPUDev::dil_frozen_batch_norm(
   std::vector<float> output_scales = {};
   bool quantized = false;
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("BatchNorm");
     quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       input_scales = scales[0];
       output_scales = scales[1];
@@ -1400,7 +1417,7 @@ at::Tensor AtenIpexCPUDev::dil_frozen_batch_norm(
   auto aten_output = dbl::comm::gen_aten_tensor_by(std::move(y));
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {aten_output}, "BatchNorm",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("BatchNorm"));
   }
   return aten_output;
 }
@@ -1443,10 +1460,10 @@ at::Tensor AtenIpexCPUDev::dil_max_pooling(
   DEBUG("AtenIpexCPUDev::dil_max_pooling\n");
   CHECK_DNNL_OP_PRE_COND(input);
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("MaxPooling");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
     } else {
@@ -1458,7 +1475,7 @@ at::Tensor AtenIpexCPUDev::dil_max_pooling(
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {input}, "MaxPooling",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("MaxPooling"));
   }
   return dbl::pool::_dil_pooling(
       input,
@@ -1484,10 +1501,10 @@ at::Tensor AtenIpexCPUDev::dil_avg_pool2d(
            "dil_avg_pooling operator does not support divisor");
 
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("AvgPool2d");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
     } else {
@@ -1499,7 +1516,7 @@ at::Tensor AtenIpexCPUDev::dil_avg_pool2d(
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {input}, "AvgPool2d",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("AvgPool2d"));
   }
 
   return dbl::pool::_dil_pooling(
@@ -1546,10 +1563,10 @@ at::Tensor AtenIpexCPUDev::dil_adaptive_avg_pool2d(
   CHECK_DNNL_OP_PRE_COND(input);
 
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("AdaptiveAvgPool2d");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
     } else {
@@ -1581,7 +1598,7 @@ at::Tensor AtenIpexCPUDev::dil_adaptive_avg_pool2d(
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {input}, "AdaptiveAvgPool2d",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("AdaptiveAvgPool2d"));
   }
   return dbl::pool::_dil_pooling(
       input,
@@ -1729,10 +1746,10 @@ at::Tensor AtenIpexCPUDev::dil_relu(const at::Tensor& input) {
   DEBUG("AtenIpexCPUDev::dil_relu\n");
   CHECK_DNNL_OP_PRE_COND(input);
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("Relu");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ true, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ true, num_ops_id);
     if (quantized) {
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
     } else {
@@ -1749,7 +1766,7 @@ at::Tensor AtenIpexCPUDev::dil_relu(const at::Tensor& input) {
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {input}, "Relu",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("Relu"));
   }
 
   return dbl::comm::gen_aten_tensor_by(std::move(y));
@@ -1760,10 +1777,10 @@ at::Tensor& AtenIpexCPUDev::dil_relu_(at::Tensor& input) {
   CHECK_DNNL_OP_PRE_COND(input);
 
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id("Relu_");
     bool quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ true, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ true, num_ops_id);
     //quantized = false;
     if (quantized) {
       dbl::comm::reorder_to_int8_for_mix_prec(input, scales[0]);
@@ -1776,7 +1793,7 @@ at::Tensor& AtenIpexCPUDev::dil_relu_(at::Tensor& input) {
 
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input}, {input}, "Relu_",
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id("Relu_"));
   }
 
   auto dil_self = dbl::comm::try_gen_dil_tensor(input);
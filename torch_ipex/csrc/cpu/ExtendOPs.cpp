@@ -4,14 +4,17 @@
 #include "DevOPs.h"
 #include "FusionOPs.h"
 #include "dbl/Common.h"
+#include "dbl/RNN.h"
 #include "aten/aten.hpp"
 #include "bf16/vec/bf16_vec_kernel.h"
+#include "isa/cpu_feature.hpp"
 #include "dil/dil.hpp"
 #include "torch_ipex/csrc/cpu/int8/Config.h"
 #include "xsmm/libxsmm_utils.h"
 #include <ATen/Parallel.h>
 #include <ATen/MatrixRef.h>
 #include <algorithm>
+#include <mutex>
 #include <c10/util/Exception.h>
 #include <torch/csrc/autograd/function.h>
 
@@ -39,141 +42,212 @@ void AtenIpexTypeExt::packed_add_(at::Tensor &top_half, at::Tensor &bot_half,
   RECORD_FUNCTION("packed_add_", std::vector<c10::IValue>({}));
 #endif
 
-  if (grad.is_sparse()) {
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(top_half.dim() == 2);
-    auto sparse_nnz = grad._nnz();
-    auto sparse_dim = grad.sparse_dim();
-    auto values = grad._values();
-    auto indices = grad._indices();
-    auto entry_range = top_half.size(0);
-    auto feature_size = values.stride(0);
-    auto indices_accessor = indices.accessor<int64_t, 2>();
-
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(values.is_contiguous());
-    auto value_ptr = values.data_ptr<at::BFloat16>();
-    auto top_half_ptr = top_half.data_ptr<at::BFloat16>();
-    auto bot_half_ptr = bot_half.data_ptr<at::BFloat16>();
-
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(value_ptr != nullptr);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(top_half_ptr != nullptr);
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(bot_half_ptr != nullptr);
-
-    std::vector<int64_t> sparse_stride(sparse_dim);
-    for (int64_t d = 0; d < sparse_dim; d++) {
-      sparse_stride[d] = top_half.stride(d);
-    }
+  // a plain SGD step of the split weight with a learning rate of -alpha
+  cpu::aten::optimizer::sgd_step_impl({top_half}, {bot_half}, {grad}, {}, {},
+                                      -alpha, 0, 0, 0, false, false);
+}
 
-    int32_t max_threads = at::get_num_threads();
-    max_threads = (entry_range < max_threads) ? entry_range : max_threads;
-    int64_t avg_size = entry_range / max_threads;
-    int64_t tail_size = entry_range % max_threads;
-    std::vector<int64_t> chunk_size(max_threads, avg_size);
-    std::transform(chunk_size.begin(), chunk_size.begin() + tail_size,
-                   chunk_size.begin(),
-                   [](int64_t a) -> int64_t { return a + 1; });
-    std::vector<int64_t> acc_chunk_size(max_threads + 1);
-    for (int64_t i = 1; i < max_threads + 1; i++) {
-      acc_chunk_size[i] = acc_chunk_size[i - 1] + chunk_size[i - 1];
+// Dense parameters, gradients and states of the optimizer steps are updated
+// in place through their plain buffers.
+static inline void reorder_dense_to_public(const std::vector<at::Tensor> &tensors) {
+  for (const auto &tensor : tensors) {
+    if (tensor.defined() && !tensor.is_sparse()) {
+      cpu::dbl::comm::reorder_to_public(tensor);
     }
+  }
+}
 
-    at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
-      for (int64_t c = start; c < end; c++) {
-        int64_t chunk_begin = acc_chunk_size[c];
-        int64_t chunk_end = acc_chunk_size[c + 1];
-        for (int64_t n = 0; n < sparse_nnz; n++) {
-          int64_t chunk_offset = indices_accessor[0][n];
-          if (chunk_offset >= chunk_begin && chunk_offset < chunk_end) {
-            int64_t table_offset = 0;
-            for (int64_t d = 0; d < sparse_dim; d++) {
-              table_offset += sparse_stride[d] * indices_accessor[d][n];
-            }
-            auto value_index = value_ptr + n * feature_size;
-            auto top_half_index = top_half_ptr + table_offset;
-            auto bot_half_index = bot_half_ptr + table_offset;
-            packed_bf16_add_ker(top_half_index, bot_half_index, value_index,
-                                feature_size, alpha);
-          }
-        }
-      }
-    });
-  } else {
-    TORCH_INTERNAL_ASSERT_DEBUG_ONLY(grad.is_contiguous());
-    // TODO: vector implementation basing on vector size
-    union packed_bf16 {
-      unsigned short s[2];
-      float f;
-    };
-
-    auto len = top_half.numel();
-    auto value_ptr = grad.data_ptr<at::BFloat16>();
-    auto top_half_ptr = (unsigned short *)top_half.data_ptr();
-    auto bot_half_ptr = (unsigned short *)bot_half.data_ptr();
-
-    at::parallel_for(0, len, 64, [&](int64_t start, int64_t end) {
-      int64_t i = start;
-      auto alpha_vec = _mm512_set1_ps(alpha);
-      for (; i < end - 31; i+=32) {
-        auto bot0 = _mm256_loadu_si256((__m256i *)(bot_half_ptr + i));
-        auto bot1 = _mm256_loadu_si256((__m256i *)(bot_half_ptr + i + 16));
-        auto top0 = _mm256_loadu_si256((__m256i *)(top_half_ptr + i));
-        auto top1 = _mm256_loadu_si256((__m256i *)(top_half_ptr + i + 16));
-        auto value0 = _mm256_loadu_si256((__m256i *)(value_ptr + i));
-        auto value1 = _mm256_loadu_si256((__m256i *)(value_ptr + i + 16));
-        auto pack0_fp32 = pack_bf16_to_fp32(top0, bot0);
-        auto pack1_fp32 = pack_bf16_to_fp32(top1, bot1);
-        auto value0_fp32 = cvt_bf16_to_fp32(value0);
-        auto value1_fp32 = cvt_bf16_to_fp32(value1);
-        auto result0 = _mm512_fmadd_ps(alpha_vec, value0_fp32, pack0_fp32);
-        auto result1 = _mm512_fmadd_ps(alpha_vec, value1_fp32, pack1_fp32);
-        _mm256_storeu_si256((__m256i *)(top_half_ptr + i), trunc_fp32_to_bf16(result0));
-        _mm256_storeu_si256((__m256i *)(top_half_ptr + i + 16), trunc_fp32_to_bf16(result1));
-        _mm256_storeu_si256((__m256i *)(bot_half_ptr + i), _mm512_cvtepi32_epi16(_mm512_castps_si512(result0)));
-        _mm256_storeu_si256((__m256i *)(bot_half_ptr + i + 16), _mm512_cvtepi32_epi16(_mm512_castps_si512(result1)));
-      }
-      for (; i < end; i++) {
-        packed_bf16 p16;
-        p16.s[0] = bot_half_ptr[i];
-        p16.s[1] = top_half_ptr[i];
-        p16.f += alpha * (float)(value_ptr[i]);
-        bot_half_ptr[i] = p16.s[0];
-        top_half_ptr[i] = p16.s[1];
-      }
-    });
+// The parameters updated in place by an optimizer step are new versions, so
+// the caches of their derived tensors, e.g. blocked weights, are refreshed.
+static inline void bump_versions(const std::vector<at::Tensor> &tensors) {
+  for (const auto &tensor : tensors) {
+    tensor.unsafeGetTensorImpl()->bump_version();
   }
 }
 
-template <typename T>
-static inline void cat(const T *in1, const T *in2, T *out, size_t in1_size,
-                       size_t in2_size) {
-  move_ker(out, in1, in1_size);
-  move_ker(&out[in1_size], in2, in2_size);
+void AtenIpexTypeExt::sgd_step(const std::vector<at::Tensor> &params,
+                               const std::vector<at::Tensor> &bottom_halves,
+                               const std::vector<at::Tensor> &grads,
+                               const std::vector<at::Tensor> &momentum_buffers,
+                               const std::vector<at::Tensor> &momentum_bottom_halves,
+                               double lr, double momentum, double dampening,
+                               double weight_decay, bool nesterov, bool first_step) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("sgd_step", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(params);
+  reorder_dense_to_public(grads);
+  reorder_dense_to_public(momentum_buffers);
+  cpu::aten::optimizer::sgd_step_impl(params, bottom_halves, grads, momentum_buffers,
+                                      momentum_bottom_halves, lr, momentum, dampening,
+                                      weight_decay, nesterov, first_step);
+  bump_versions(params);
 }
 
-template <typename T>
-static inline void cat_backward(const T *in, T *out1, T *out2, size_t out1_size,
-                                size_t out2_size) {
-  move_ker(out1, in, out1_size);
-  move_ker(out2, &in[out1_size], out2_size);
+void AtenIpexTypeExt::adagrad_step(const std::vector<at::Tensor> &params,
+                                   const std::vector<at::Tensor> &bottom_halves,
+                                   const std::vector<at::Tensor> &grads,
+                                   const std::vector<at::Tensor> &state_sums,
+                                   double clr, double weight_decay, double eps) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("adagrad_step", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(params);
+  reorder_dense_to_public(grads);
+  reorder_dense_to_public(state_sums);
+  cpu::aten::optimizer::adagrad_step_impl(params, bottom_halves, grads, state_sums,
+                                          clr, weight_decay, eps);
+  bump_versions(params);
+}
+
+void AtenIpexTypeExt::adam_step(const std::vector<at::Tensor> &params,
+                                const std::vector<at::Tensor> &bottom_halves,
+                                const std::vector<at::Tensor> &grads,
+                                const std::vector<at::Tensor> &exp_avgs,
+                                const std::vector<at::Tensor> &exp_avg_sqs,
+                                double lr, double beta1, double beta2, double eps,
+                                double weight_decay, bool adamw, int64_t step) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("adam_step", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(params);
+  reorder_dense_to_public(grads);
+  reorder_dense_to_public(exp_avgs);
+  reorder_dense_to_public(exp_avg_sqs);
+  cpu::aten::optimizer::adam_step_impl(params, bottom_halves, grads, exp_avgs, exp_avg_sqs,
+                                       lr, beta1, beta2, eps, weight_decay, adamw, step);
+  bump_versions(params);
+}
+
+void AtenIpexTypeExt::lamb_step(const std::vector<at::Tensor> &params,
+                                const std::vector<at::Tensor> &bottom_halves,
+                                const std::vector<at::Tensor> &grads,
+                                const std::vector<at::Tensor> &exp_avgs,
+                                const std::vector<at::Tensor> &exp_avg_sqs,
+                                double lr, double beta1, double beta2, double eps,
+                                double weight_decay, int64_t step) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("lamb_step", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(params);
+  reorder_dense_to_public(grads);
+  reorder_dense_to_public(exp_avgs);
+  reorder_dense_to_public(exp_avg_sqs);
+  cpu::aten::optimizer::lamb_step_impl(params, bottom_halves, grads, exp_avgs, exp_avg_sqs,
+                                       lr, beta1, beta2, eps, weight_decay, step);
+  bump_versions(params);
+}
+
+void AtenIpexTypeExt::lars_step(const std::vector<at::Tensor> &params,
+                                const std::vector<at::Tensor> &bottom_halves,
+                                const std::vector<at::Tensor> &grads,
+                                const std::vector<at::Tensor> &momentum_buffers,
+                                const std::vector<at::Tensor> &momentum_bottom_halves,
+                                double lr, double momentum, double weight_decay,
+                                double trust_coefficient, double eps) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("lars_step", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(params);
+  reorder_dense_to_public(grads);
+  reorder_dense_to_public(momentum_buffers);
+  cpu::aten::optimizer::lars_step_impl(params, bottom_halves, grads, momentum_buffers,
+                                       momentum_bottom_halves, lr, momentum, weight_decay,
+                                       trust_coefficient, eps);
+  bump_versions(params);
+}
+
+at::Tensor AtenIpexTypeExt::multi_tensor_l2norm(const std::vector<at::Tensor> &tensors,
+                                                const std::vector<at::Tensor> &bottom_halves) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("multi_tensor_l2norm", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(tensors);
+  return cpu::aten::multi_tensor::l2norm_impl(tensors, bottom_halves);
+}
+
+void AtenIpexTypeExt::multi_tensor_scale_(const std::vector<at::Tensor> &tensors, double scale) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("multi_tensor_scale_", std::vector<c10::IValue>({}));
+#endif
+  reorder_dense_to_public(tensors);
+  cpu::aten::multi_tensor::scale_impl(tensors, scale);
 }
 
+// Samples an interaction block handles at once. The concatenated features,
+// their fp32 transpose and the products of a block stay in L2.
+constexpr int64_t kInteractionBlockBytes = 256 * 1024;
+constexpr int64_t kInteractionMaxBlock = 64;
+// A thread keeps each of its scratch buffers up to this size between calls
+constexpr size_t kInteractionMaxScratch = 4 * 1024 * 1024;
+
+static inline int64_t interaction_block_size(uint32_t vector_nums,
+                                             uint32_t vector_size,
+                                             size_t elem_size) {
+  int64_t sample_bytes = vector_nums * (2 * vector_size * elem_size +
+                                        vector_nums * sizeof(float));
+  return std::max<int64_t>(
+      1, std::min<int64_t>(kInteractionMaxBlock,
+                           kInteractionBlockBytes / sample_bytes));
+}
+
+// Scratch of the interaction kernels, allocated on the heap once per thread
+// and reused by the following calls. N tells the buffers of a thread apart. A
+// buffer grown beyond kInteractionMaxScratch by very wide samples is freed
+// once the thread is done with its samples.
+template <typename T, int N>
+class InteractionScratch {
+public:
+  explicit InteractionScratch(size_t size) {
+    if (buffer().size() < size) {
+      buffer().resize(size);
+    }
+  }
+
+  ~InteractionScratch() {
+    if (buffer().size() * sizeof(T) > kInteractionMaxScratch) {
+      std::vector<T>().swap(buffer());
+    }
+  }
+
+  T *data() { return buffer().data(); }
+
+private:
+  static std::vector<T> &buffer() {
+    static thread_local std::vector<T> buffer;
+    return buffer;
+  }
+};
+
+// Gather the features of the samples [bs_start, bs_end) into consecutive rows
+// of out, walking every input over the whole block.
 template <typename T>
-static inline void cat(T *out, const std::vector<T *> &in,
-                       const std::vector<uint32_t> &feature_sizes, int64_t bs) {
+static inline void cat_block(T *out, const std::vector<T *> &in,
+                             const std::vector<uint32_t> &feature_sizes,
+                             uint32_t total_feature_size, int64_t bs_start,
+                             int64_t bs_end) {
   size_t offset = 0;
   for (int j = 0; j < feature_sizes.size(); j++) {
-    move_ker(&out[offset], &in[j][bs * feature_sizes[j]], feature_sizes[j]);
+    for (int64_t bs = bs_start; bs < bs_end; bs++) {
+      move_ker(&out[(bs - bs_start) * total_feature_size + offset],
+               &in[j][bs * feature_sizes[j]], feature_sizes[j]);
+    }
     offset += feature_sizes[j];
   }
 }
 
 template <typename T>
-static inline void cat_backward(const T *in, std::vector<T *> &out,
-                                const std::vector<uint32_t> &feature_sizes,
-                                int64_t bs) {
+static inline void cat_block_backward(const T *in, std::vector<T *> &out,
+                                      const std::vector<uint32_t> &feature_sizes,
+                                      uint32_t total_feature_size,
+                                      int64_t bs_start, int64_t bs_end) {
   size_t offset = 0;
   for (int j = 0; j < feature_sizes.size(); j++) {
-    //std::memcpy(&out[j][bs * feature_sizes[j]], &in[offset], feature_sizes[j] * sizeof(T));
-    move_ker(&out[j][bs * feature_sizes[j]], &in[offset], feature_sizes[j]);
+    for (int64_t bs = bs_start; bs < bs_end; bs++) {
+      move_ker(&out[j][bs * feature_sizes[j]],
+               &in[(bs - bs_start) * total_feature_size + offset],
+               feature_sizes[j]);
+    }
     offset += feature_sizes[j];
   }
 }
@@ -187,56 +261,281 @@ static inline void flat_triangle(const T *in, T *out, size_t size) {
   }
 }
 
-template <typename T>
-static inline void flat_triangle_backward(const T *in, T *out, size_t size) {
+// the fp32 products are rounded to bf16
+static inline void flat_triangle(const float *in, at::BFloat16 *out,
+                                 size_t size) {
   size_t offset = 0;
-  for (int i = 0; i < size * size; i++) {
-    out[i] = 0.f;
-  }
   for (int i = 1; i < size; i++) {
-    move_ker(&out[i * size], &in[offset], i);
+    cvt_fp32_to_bf16(&out[offset], &in[i * size], i);
+    offset += i;
+  }
+}
+
+// gy + gy' in fp32 of the gradient gy of the products of a sample, of which in
+// holds the strict lower triangle
+template <typename T>
+static inline void flat_triangle_backward(const T *in, float *out,
+                                          size_t size) {
+  size_t offset = 0;
+  for (size_t i = 0; i < size; i++) {
+    for (size_t j = 0; j < i; j++) {
+      out[i * size + j] = out[j * size + i] = static_cast<float>(in[offset + j]);
+    }
+    out[i * size + i] = 0.f;
     offset += i;
   }
 }
 
-static inline void mm_backward(float *out, const float *in1, const float *in2,
-                               uint32_t vector_nums, uint32_t vector_size,
-                               libxsmm_smmfunction mm_ker) {
-  // Calculate gy + gy'
-  float sum_buf[vector_nums * vector_nums];
-  for (int32_t j = 0; j < vector_nums; j++) {
-    for (int32_t k = 0; k < vector_nums; k++) {
-      sum_buf[j * vector_nums + k] =
-          in1[j * vector_nums + k] + in1[k * vector_nums + j];
+// The batched GEMMs run in fp32, the bf16 values of a block go through buf.
+static inline const float *fp32_block(const float *in, float *buf,
+                                      int64_t len) {
+  return in;
+}
+
+static inline const float *fp32_block(const at::BFloat16 *in, float *buf,
+                                      int64_t len) {
+  cvt_bf16_to_fp32(buf, in, len);
+  return buf;
+}
+
+static inline float *fp32_block_out(float *out, float *buf) { return out; }
+
+static inline float *fp32_block_out(at::BFloat16 *out, float *buf) {
+  return buf;
+}
+
+static inline void store_fp32_block(float *out, const float *in, int64_t len) {}
+
+static inline void store_fp32_block(at::BFloat16 *out, const float *in,
+                                    int64_t len) {
+  cvt_fp32_to_bf16(out, in, len);
+}
+
+// c_i = a_i * b_i of the samples of a block, column-major, by one libxsmm
+// batch call. The operands of the sample i start at the elements a_index[i],
+// b_index[i] and c_index[i] of a, b and c.
+static inline void interaction_mm_batch(float *c, const float *a,
+                                        const float *b, libxsmm_blasint m,
+                                        libxsmm_blasint n, libxsmm_blasint k,
+                                        const libxsmm_blasint *a_index,
+                                        const libxsmm_blasint *b_index,
+                                        const libxsmm_blasint *c_index,
+                                        libxsmm_blasint batch) {
+  const float alpha = 1.0f;
+  const float beta = 0.0f;
+  const libxsmm_blasint lda = m, ldb = k, ldc = m;
+  libxsmm_gemm_batch(LIBXSMM_GEMM_PRECISION_F32, LIBXSMM_GEMM_PRECISION_F32,
+                     "N", "N", m, n, k, &alpha, a, &lda, b, &ldb, &beta, c,
+                     &ldc, /*index_base*/ 0,
+                     /*index_stride*/ sizeof(libxsmm_blasint), a_index,
+                     b_index, c_index, batch);
+}
+
+// Element offsets of the samples of a block in the concatenated features and
+// in the products, the indexes of the batched GEMMs.
+static inline void interaction_batch_index(
+    std::vector<libxsmm_blasint> &sample_index,
+    std::vector<libxsmm_blasint> &mm_index, int64_t block_size,
+    uint32_t total_feature_size, uint32_t vector_nums) {
+  sample_index.resize(block_size);
+  mm_index.resize(block_size);
+  for (int64_t i = 0; i < block_size; i++) {
+    sample_index[i] = i * total_feature_size;
+    mm_index[i] = i * vector_nums * vector_nums;
+  }
+}
+
+// Kernels of the products of the features of the forward. The bf16 products
+// run on the AMX tiles or with vdpbf16ps where the host has them, the others
+// on the libxsmm GEMMs.
+enum class InteractionKernel { XSMM, DPBF16, AMX };
+
+template <typename T>
+static inline InteractionKernel interaction_kernel(uint32_t vector_nums,
+                                                   uint32_t vector_size) {
+  return InteractionKernel::XSMM;
+}
+
+template <>
+inline InteractionKernel
+interaction_kernel<at::BFloat16>(uint32_t vector_nums, uint32_t vector_size) {
+#if defined(AMX_BF16)
+  // the features of a sample fit in two row blocks of 16 features
+  if (cpu::isa::has_amx_bf16() && vector_nums <= 32 && vector_size % 32 == 0) {
+    return InteractionKernel::AMX;
+  }
+#endif
+  if (cpu::isa::has_avx512_bf16()) {
+    return InteractionKernel::DPBF16;
+  }
+  return InteractionKernel::XSMM;
+}
+
+namespace vec {
+#if defined(AVX512_BF16)
+namespace avx512_bf16 {
+
+IPEX_TARGET_AVX512_BF16 static inline __m256 add_halves(__m512 x) {
+  auto hi = _mm256_castpd_ps(_mm512_extractf64x4_pd(_mm512_castps_pd(x), 1));
+  return _mm256_add_ps(_mm512_castps512_ps256(x), hi);
+}
+
+// mm = in * in' of the m rows of in, k values each, below the diagonal only.
+// The dot products of a row with four others are reduced together.
+IPEX_TARGET_AVX512_BF16 static inline void
+interaction_mm_ker(float *mm, const at::BFloat16 *in, int m, int k) {
+  for (int i = 1; i < m; i++) {
+    const at::BFloat16 *a = in + i * k;
+    int j = 0;
+    for (; j < i - 3; j += 4) {
+      const at::BFloat16 *b = in + j * k;
+      auto s0 = _mm512_setzero_ps();
+      auto s1 = _mm512_setzero_ps();
+      auto s2 = _mm512_setzero_ps();
+      auto s3 = _mm512_setzero_ps();
+      for (int l = 0; l < k; l += 32) {
+        __mmask32 mask = k - l >= 32 ? 0xffffffff : (1u << (k - l)) - 1;
+        auto va = (__m512bh)_mm512_maskz_loadu_epi16(mask, a + l);
+        s0 = _mm512_dpbf16_ps(
+            s0, va, (__m512bh)_mm512_maskz_loadu_epi16(mask, b + l));
+        s1 = _mm512_dpbf16_ps(
+            s1, va, (__m512bh)_mm512_maskz_loadu_epi16(mask, b + k + l));
+        s2 = _mm512_dpbf16_ps(
+            s2, va, (__m512bh)_mm512_maskz_loadu_epi16(mask, b + 2 * k + l));
+        s3 = _mm512_dpbf16_ps(
+            s3, va, (__m512bh)_mm512_maskz_loadu_epi16(mask, b + 3 * k + l));
+      }
+      auto h = _mm256_hadd_ps(_mm256_hadd_ps(add_halves(s0), add_halves(s1)),
+                              _mm256_hadd_ps(add_halves(s2), add_halves(s3)));
+      _mm_storeu_ps(&mm[i * m + j], _mm_add_ps(_mm256_castps256_ps128(h),
+                                               _mm256_extractf128_ps(h, 1)));
+    }
+    for (; j < i; j++) {
+      mm[i * m + j] = ::vec::avx512_bf16::dot_ker(a, in + j * k, k);
     }
   }
-  // mm backward
-  mm_ker(in2, sum_buf, out);
 }
 
-static inline void mm_backward(at::BFloat16 *out, const at::BFloat16 *in1,
-                               const at::BFloat16 *in2, uint32_t vector_nums,
-                               uint32_t vector_size,
-                               libxsmm_smmfunction mm_ker) {
-  float tmp_in1[vector_nums * vector_nums];
-  float tmp_in2[vector_nums * vector_size];
-  float tmp_out[vector_nums * vector_size];
+}  // namespace avx512_bf16
+#endif
+
+#if defined(AMX_BF16)
+namespace amx_bf16 {
 
-  cvt_bf16_to_fp32(tmp_in1, in1, vector_nums * vector_nums);
-  cvt_bf16_to_fp32(tmp_in2, in2, vector_nums * vector_size);
-  // Calculate gy + gy'
-  for (int32_t j = 0; j < vector_nums; j++) {
-    for (int32_t k = 0; k < vector_nums; k++) {
-      tmp_in1[j * vector_nums + k] += tmp_in1[k * vector_nums + j];
+struct TileConfig {
+  uint8_t palette_id;
+  uint8_t start_row;
+  uint8_t reserved[14];
+  uint16_t colsb[16];
+  uint8_t rows[16];
+};
+
+// Tiles of interaction_mm_ker for m features: 0-2 the blocks (0, 0), (1, 0)
+// and (1, 1) of mm, 4-5 the row blocks of in and 6-7 the column blocks of its
+// transpose, a block being 16 features.
+IPEX_TARGET_AMX_BF16 static inline void interaction_tiles_config(int m) {
+  TileConfig cfg = {};
+  cfg.palette_id = 1;
+  int m0 = std::min(m, 16);
+  int m1 = m - m0;
+  auto set_tile = [&](int tile, int rows, int colsb) {
+    cfg.rows[tile] = rows;
+    cfg.colsb[tile] = colsb;
+  };
+  set_tile(0, m0, m0 * 4);
+  set_tile(4, m0, 64);
+  set_tile(6, 16, m0 * 4);
+  if (m1 > 0) {
+    set_tile(1, m1, m0 * 4);
+    set_tile(2, m1, m1 * 4);
+    set_tile(5, m1, 64);
+    set_tile(7, 16, m1 * 4);
+  }
+  // the ldtilecfg of older GCCs only tells the compiler it reads 8 bytes, the
+  // whole configuration has to be written before
+  __asm__ volatile("" : : "r"(&cfg) : "memory");
+  _tile_loadconfig(&cfg);
+}
+
+IPEX_TARGET_AMX_BF16 static inline void interaction_tiles_release() {
+  _tile_release();
+}
+
+// mm = in * in' of the m <= 32 rows of in, k values each with k a multiple of
+// 32, of which tr holds the pairs transposed, the pair p of the row j being
+// the element (p, j) of tr. The block above the diagonal is not computed.
+IPEX_TARGET_AMX_BF16 static inline void
+interaction_mm_ker(float *mm, const at::BFloat16 *in, const at::BFloat16 *tr,
+                   int m, int k) {
+  _tile_zero(0);
+  if (m > 16) {
+    _tile_zero(1);
+    _tile_zero(2);
+  }
+  for (int l = 0; l < k; l += 32) {
+    _tile_loadd(4, in + l, k * sizeof(at::BFloat16));
+    _tile_loadd(6, tr + l * m, m * 4);
+    _tile_dpbf16ps(0, 4, 6);
+    if (m > 16) {
+      _tile_loadd(5, in + 16 * k + l, k * sizeof(at::BFloat16));
+      _tile_loadd(7, tr + l * m + 32, m * 4);
+      _tile_dpbf16ps(1, 5, 6);
+      _tile_dpbf16ps(2, 5, 7);
     }
   }
-  // mm backward w/ fp32
-  mm_ker(tmp_in2, tmp_in1, tmp_out);
-  cvt_fp32_to_bf16(out, tmp_out, vector_nums * vector_size);
+  _tile_stored(0, mm, m * sizeof(float));
+  if (m > 16) {
+    _tile_stored(1, mm + 16 * m, m * sizeof(float));
+    _tile_stored(2, mm + 16 * m + 16, m * sizeof(float));
+  }
+}
+
+}  // namespace amx_bf16
+#endif
+}  // namespace vec
+
+// The AMX tiles are configured by every thread before its samples.
+static inline void interaction_tiles_begin(InteractionKernel kernel,
+                                           uint32_t vector_nums) {
+#if defined(AMX_BF16)
+  if (kernel == InteractionKernel::AMX) {
+    vec::amx_bf16::interaction_tiles_config(vector_nums);
+  }
+#endif
+}
+
+static inline void interaction_tiles_end(InteractionKernel kernel) {
+#if defined(AMX_BF16)
+  if (kernel == InteractionKernel::AMX) {
+    vec::amx_bf16::interaction_tiles_release();
+  }
+#endif
+}
+
+// mm = in * in' in fp32 by the native bf16 kernels, below the diagonal.
+static inline void interaction_mm_bf16(InteractionKernel kernel, float *mm,
+                                       const at::BFloat16 *in,
+                                       const at::BFloat16 *tr,
+                                       uint32_t vector_nums,
+                                       uint32_t vector_size) {
+#if defined(AMX_BF16)
+  if (kernel == InteractionKernel::AMX) {
+    return vec::amx_bf16::interaction_mm_ker(mm, in, tr, vector_nums,
+                                             vector_size);
+  }
+#endif
+#if defined(AVX512_BF16)
+  if (kernel == InteractionKernel::DPBF16) {
+    return vec::avx512_bf16::interaction_mm_ker(mm, in, vector_nums,
+                                                vector_size);
+  }
+#endif
+  TORCH_INTERNAL_ASSERT(false, "interaction: no native bf16 kernel");
 }
 
 template <typename T>
-inline at::Tensor _interaction_forward(const std::vector<at::Tensor> &input) {
+inline at::Tensor _interaction_forward(const std::vector<at::Tensor> &input,
+                                       bool triangle_only) {
 #if defined(IPEX_PROFILE_OP)
   RECORD_FUNCTION("_interaction_forward", std::vector<c10::IValue>({}));
 #endif
@@ -256,29 +555,77 @@ inline at::Tensor _interaction_forward(const std::vector<at::Tensor> &input) {
   auto vector_nums = total_feature_size / vector_size;
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(total_feature_size % vector_size == 0);
   auto interact_feature_size = vector_nums * (vector_nums - 1) / 2;
-  auto tr_vector_size = sizeof(T) == 4 ? vector_size : vector_size / 2;
-  auto out = at::empty({batch_size, interact_feature_size + vector_size},
-                       input[0].options());
+  // the dense features lead the output unless only the triangle is asked for
+  uint32_t dense_size = triangle_only ? 0 : vector_size;
+  auto out_feature_size = interact_feature_size + dense_size;
+  auto out = at::empty({batch_size, out_feature_size}, input[0].options());
   auto out_data = out.data_ptr<T>();
 
-  auto mm_kernel = get_mm_kernel<T>(vector_nums, vector_nums, vector_size);
+  auto kernel = interaction_kernel<T>(vector_nums, vector_size);
+  // AMX reads the bf16 pairs of a sample transposed, the batched GEMMs the
+  // fp32 features
+  uint32_t tr_vector_size =
+      kernel == InteractionKernel::AMX ? vector_size / 2 : vector_size;
   auto tr_kernel = get_tr_kernel(tr_vector_size, vector_nums, vector_nums);
 
-  at::parallel_for(0, batch_size, 0, [&](int64_t start, int64_t end) {
-    T cat_buf[vector_nums * vector_size];
-    T tr_buf[vector_nums * vector_size];
-    T mm_buf[vector_nums * vector_nums];
-    T flat_buf[interact_feature_size];
-    for (int64_t i = start; i < end; i++) {
-      cat<T>(cat_buf, input_data, feature_sizes, i);
-      tr_kernel(cat_buf, &tr_vector_size, tr_buf, &vector_nums);
-      mm_kernel((xsmm_dtype<T> *)tr_buf, (xsmm_dtype<T> *)cat_buf,
-                (xsmm_dtype<T> *)mm_buf);
-      flat_triangle<T>(mm_buf, flat_buf, vector_nums);
-      cat<T>(&input_data[0][i * vector_size], flat_buf,
-             &out_data[i * (interact_feature_size + vector_size)], vector_size,
-             interact_feature_size);
+  int64_t block_size = interaction_block_size(vector_nums, vector_size, sizeof(T));
+  int64_t num_blocks = (batch_size + block_size - 1) / block_size;
+  std::vector<libxsmm_blasint> sample_index, mm_index;
+  interaction_batch_index(sample_index, mm_index, block_size,
+                          total_feature_size, vector_nums);
+  at::parallel_for(0, num_blocks, 0, [&](int64_t start, int64_t end) {
+    InteractionScratch<T, 0> cat_scratch(block_size * total_feature_size);
+    InteractionScratch<float, 1> fp32_cat_scratch(
+        sizeof(T) == sizeof(float) ? 0 : block_size * total_feature_size);
+    InteractionScratch<float, 2> tr_scratch(block_size * total_feature_size);
+    InteractionScratch<float, 3> mm_scratch(block_size * vector_nums *
+                                            vector_nums);
+    T *cat_buf = cat_scratch.data();
+    float *tr_buf = tr_scratch.data();
+    float *mm_buf = mm_scratch.data();
+    interaction_tiles_begin(kernel, vector_nums);
+    for (int64_t block = start; block < end; block++) {
+      int64_t bs_start = block * block_size;
+      int64_t bs_end = std::min(bs_start + block_size, batch_size);
+      int64_t n = bs_end - bs_start;
+      cat_block<T>(cat_buf, input_data, feature_sizes, total_feature_size,
+                   bs_start, bs_end);
+      if (!triangle_only) {
+        for (int64_t i = bs_start; i < bs_end; i++) {
+          move_ker(&out_data[i * out_feature_size],
+                   &cat_buf[sample_index[i - bs_start]], vector_size);
+        }
+      }
+      if (kernel == InteractionKernel::XSMM) {
+        // one batched GEMM for all the samples of the block
+        const float *fp32_cat = fp32_block(cat_buf, fp32_cat_scratch.data(),
+                                           n * total_feature_size);
+        for (int64_t i = 0; i < n; i++) {
+          tr_kernel(&fp32_cat[sample_index[i]], &tr_vector_size,
+                    &tr_buf[sample_index[i]], &vector_nums);
+        }
+        interaction_mm_batch(mm_buf, tr_buf, fp32_cat, vector_nums,
+                             vector_nums, vector_size, sample_index.data(),
+                             sample_index.data(), mm_index.data(), n);
+      } else {
+        // the native bf16 kernels take a sample at a time
+        for (int64_t i = 0; i < n; i++) {
+          auto sample_buf = (at::BFloat16 *)&cat_buf[sample_index[i]];
+          auto sample_tr = (at::BFloat16 *)&tr_buf[sample_index[i]];
+          if (kernel == InteractionKernel::AMX) {
+            tr_kernel(sample_buf, &tr_vector_size, sample_tr, &vector_nums);
+          }
+          interaction_mm_bf16(kernel, &mm_buf[mm_index[i]], sample_buf,
+                              sample_tr, vector_nums, vector_size);
+        }
+      }
+      for (int64_t i = bs_start; i < bs_end; i++) {
+        flat_triangle(&mm_buf[mm_index[i - bs_start]],
+                      &out_data[i * out_feature_size + dense_size],
+                      vector_nums);
+      }
     }
+    interaction_tiles_end(kernel);
   });
 
   return out;
@@ -287,7 +634,8 @@ inline at::Tensor _interaction_forward(const std::vector<at::Tensor> &input) {
 template <typename T>
 inline std::vector<at::Tensor>
 _interaction_backward(const at::Tensor &grad_out,
-                      const std::vector<at::Tensor> &input) {
+                      const std::vector<at::Tensor> &input,
+                      bool triangle_only) {
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(grad_out.is_contiguous());
 #if defined(IPEX_PROFILE_OP)
   RECORD_FUNCTION("_interaction_backward",
@@ -311,21 +659,39 @@ _interaction_backward(const at::Tensor &grad_out,
   auto vector_nums = total_feature_size / vector_size;
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(total_feature_size % vector_size == 0);
   auto interact_feature_size = vector_nums * (vector_nums - 1) / 2;
+  uint32_t dense_size = triangle_only ? 0 : vector_size;
+  auto out_feature_size = interact_feature_size + dense_size;
   auto grad_out_data = grad_out.data_ptr<T>();
 
-  auto mm_kernel = get_mm_kernel<float>(vector_nums, vector_size, vector_nums);
-
-  at::parallel_for(0, batch_size, 0, [&](int64_t start, int64_t end) {
-    T grad_input0_buf[vector_size];
-    T grad_flat_buf[interact_feature_size];
-    T grad_mm_buf[vector_nums * vector_nums];
-    T grad_cat_buf[vector_nums * vector_size];
-    T cat_buf[vector_nums * vector_size];
-    for (int64_t i = start; i < end; i++) {
-      cat_backward<T>(&grad_out_data[i * (interact_feature_size + vector_size)],
-                      grad_input0_buf, grad_flat_buf, vector_size,
-                      interact_feature_size);
-      flat_triangle_backward<T>(grad_flat_buf, grad_mm_buf, vector_nums);
+  int64_t block_size = interaction_block_size(vector_nums, vector_size, sizeof(T));
+  int64_t num_blocks = (batch_size + block_size - 1) / block_size;
+  std::vector<libxsmm_blasint> sample_index, mm_index;
+  interaction_batch_index(sample_index, mm_index, block_size,
+                          total_feature_size, vector_nums);
+  int64_t fp32_size =
+      sizeof(T) == sizeof(float) ? 0 : block_size * total_feature_size;
+  at::parallel_for(0, num_blocks, 0, [&](int64_t start, int64_t end) {
+    InteractionScratch<T, 0> cat_scratch(block_size * total_feature_size);
+    InteractionScratch<T, 1> grad_cat_scratch(block_size * total_feature_size);
+    InteractionScratch<float, 2> fp32_cat_scratch(fp32_size);
+    InteractionScratch<float, 3> grad_mm_scratch(block_size * vector_nums *
+                                                 vector_nums);
+    InteractionScratch<float, 4> fp32_grad_cat_scratch(fp32_size);
+    T *cat_buf = cat_scratch.data();
+    T *grad_cat_buf = grad_cat_scratch.data();
+    float *grad_mm_buf = grad_mm_scratch.data();
+    for (int64_t block = start; block < end; block++) {
+      int64_t bs_start = block * block_size;
+      int64_t bs_end = std::min(bs_start + block_size, batch_size);
+      int64_t n = bs_end - bs_start;
+      // Calculate A
+      cat_block<T>(cat_buf, input_data, feature_sizes, total_feature_size,
+                   bs_start, bs_end);
+      for (int64_t i = bs_start; i < bs_end; i++) {
+        flat_triangle_backward(&grad_out_data[i * out_feature_size + dense_size],
+                               &grad_mm_buf[mm_index[i - bs_start]],
+                               vector_nums);
+      }
 
       // Special BMM characteristics in Interaction layer
       //  bmm(A, A'): two inputs are transposed to each other.
@@ -345,47 +711,68 @@ _interaction_backward(const at::Tensor &grad_out,
       //  Can be expanded and optimized as:
       //  gx: {gy, A}, gA': {A', gy}
       //  gA = gx + (gA')' = {gy, A} + {A', gy}' = {gy + gy', A}
-
-      // Calculate A
-      cat<T>(cat_buf, input_data, feature_sizes, i);
-      mm_backward(grad_cat_buf, grad_mm_buf, cat_buf, vector_nums, vector_size,
-                  mm_kernel);
-      cat_backward<T>(grad_cat_buf, output_data, feature_sizes, i);
-      add_ker(grad_input0_buf, &output_data[0][i * vector_size], vector_size);
+      const float *fp32_cat = fp32_block(cat_buf, fp32_cat_scratch.data(),
+                                         n * total_feature_size);
+      float *fp32_grad_cat =
+          fp32_block_out(grad_cat_buf, fp32_grad_cat_scratch.data());
+      interaction_mm_batch(fp32_grad_cat, fp32_cat, grad_mm_buf, vector_size,
+                           vector_nums, vector_nums, sample_index.data(),
+                           mm_index.data(), sample_index.data(), n);
+      store_fp32_block(grad_cat_buf, fp32_grad_cat, n * total_feature_size);
+      if (!triangle_only) {
+        // the dense features are also copied to the output as they are
+        for (int64_t i = bs_start; i < bs_end; i++) {
+          add_ker(&grad_cat_buf[sample_index[i - bs_start]],
+                  &grad_out_data[i * out_feature_size], vector_size);
+        }
+      }
+      cat_block_backward<T>(grad_cat_buf, output_data, feature_sizes,
+                            total_feature_size, bs_start, bs_end);
     }
   });
   return output;
 }
 
 at::Tensor
-AtenIpexTypeExt::interaction_forward(const std::vector<at::Tensor> &input) {
+AtenIpexTypeExt::interaction_forward(const std::vector<at::Tensor> &input,
+                                     bool triangle_only) {
   if (input[0].scalar_type() == at::kFloat) {
     for (auto &in : input) {
       cpu::dbl::comm::reorder_to_public(in);
       TORCH_INTERNAL_ASSERT_DEBUG_ONLY(in.scalar_type() == at::kFloat);
     }
-    return _interaction_forward<float>(input);
+    return _interaction_forward<float>(input, triangle_only);
   } else {
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(input[0].scalar_type() == at::kBFloat16);
     for (const auto &in : input) {
       TORCH_INTERNAL_ASSERT_DEBUG_ONLY(in.scalar_type() == at::kBFloat16);
     }
-    return _interaction_forward<at::BFloat16>(input);
+    // without the native bf16 kernels the blocks are multiplied in fp32
+    return _interaction_forward<at::BFloat16>(input, triangle_only);
   }
 }
 
 std::vector<at::Tensor>
 AtenIpexTypeExt::interaction_backward(const at::Tensor &grad_out,
-                                      const std::vector<at::Tensor> &input) {
+                                      const std::vector<at::Tensor> &input,
+                                      bool triangle_only) {
   if (grad_out.scalar_type() == at::kFloat) {
     cpu::dbl::comm::reorder_to_public(grad_out);
-    return _interaction_backward<float>(grad_out, input);
+    return _interaction_backward<float>(grad_out, input, triangle_only);
   } else {
     TORCH_INTERNAL_ASSERT_DEBUG_ONLY(grad_out.scalar_type() == at::kBFloat16);
-    return _interaction_backward<at::BFloat16>(grad_out, input);
+    return _interaction_backward<at::BFloat16>(grad_out, input, triangle_only);
   }
 }
 
+at::Tensor
+AtenIpexTypeExt::interaction(const std::vector<at::Tensor> &input,
+                             bool triangle_only) {
+  if (at::GradMode::is_enabled())
+    return NewInteractionOp::apply(input, triangle_only);
+  return NewInteractionOp::_forward(input, triangle_only);
+}
+
 std::vector<at::Tensor> AtenIpexTypeExt::embedding_bag(
     const at::Tensor &weight, const at::Tensor &indices,
     const at::Tensor &offsets, bool scale_grad_by_freq, int64_t mode,
@@ -410,6 +797,50 @@ std::vector<at::Tensor> AtenIpexTypeExt::embedding_bag(
   }
 }
 
+at::Tensor AtenIpexTypeExt::embedding_bag_batched_forward(
+    const std::vector<at::Tensor> &weights,
+    const std::vector<at::Tensor> &indices,
+    const std::vector<at::Tensor> &offsets, bool include_last_offset) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("embedding_bag_batched_forward", std::vector<c10::IValue>({}));
+#endif
+  return cpu::aten::embedding_bag::embedding_bag_batched_impl(
+      weights, indices, offsets, include_last_offset);
+}
+
+std::vector<at::Tensor> AtenIpexTypeExt::embedding_bag_batched_backward(
+    const at::Tensor &grad, const std::vector<at::Tensor> &weights,
+    const std::vector<at::Tensor> &indices,
+    const std::vector<at::Tensor> &offsets, bool sparse) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("embedding_bag_batched_backward", std::vector<c10::IValue>({}));
+#endif
+  return cpu::aten::embedding_bag::embedding_bag_batched_backward_impl(
+      grad, weights, indices, offsets, sparse);
+}
+
+at::Tensor
+AtenIpexTypeExt::embedding_bag_rowwise_quantize(const at::Tensor &weight,
+                                                int64_t bit_rate) {
+  return cpu::aten::embedding_bag::embedding_bag_rowwise_quantize(weight,
+                                                                  bit_rate);
+}
+
+at::Tensor AtenIpexTypeExt::embedding_bag_rowwise_quantized(
+    const at::Tensor &qweight, int64_t bit_rate, const at::Tensor &indices,
+    const at::Tensor &offsets, int64_t mode,
+    const c10::optional<at::Tensor> &per_sample_weights,
+    bool include_last_offset) {
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("embedding_bag_rowwise_quantized", std::vector<c10::IValue>({}));
+#endif
+  return cpu::aten::embedding_bag::embedding_bag_rowwise_quantized_impl(
+      qweight, bit_rate, indices, offsets, mode,
+      per_sample_weights.has_value() ? per_sample_weights.value()
+                                     : at::Tensor(),
+      include_last_offset);
+}
+
 at::Tensor AtenIpexTypeExt::linear(const at::Tensor &input,
                                    const at::Tensor &weight,
                                    const c10::optional<at::Tensor> &bias) {
@@ -481,6 +912,82 @@ std::vector<at::Tensor> rnn_layer(const at::Tensor& input,
     return NewRNNLayerOp::_forward(input, weights[0], weights[1], at::zeros(weights[0].sizes(), weights[0].options()), at::zeros(weights[1].sizes(), weights[1].options()), hx, cx, reverse, mode, hidden_size, num_layers, false, train, bidirectional, batch_sizes, scales, shift, quantized);
   }
 }
+
+// Runs a layer over a packed input, whose sequences are sorted by decreasing
+// length. The time steps of the same batch size are contiguous in the packed
+// input, so every run of them is a (steps, batch, input_size) input of one
+// oneDNN RNN, the first rows of the hidden state of the run before being its
+// hx, and the sequences ended by the run before keeping their hy. The reverse
+// direction walks the runs backward, the sequences starting with a run taking
+// their hx from the initial state.
+std::vector<at::Tensor> packed_rnn_layer(const at::Tensor& input,
+    at::TensorList weights, const at::Tensor& hx,
+    const at::Tensor& cx, bool reverse, int64_t mode,
+    int64_t hidden_size, int64_t num_layers, bool train,
+    bool bidirectional, at::IntArrayRef batch_sizes,
+    const std::vector<float>& scales,
+    const std::vector<int32_t>& shift,
+    bool quantized) {
+  // the offset in the packed input, the number of time steps and the batch
+  // size of every run
+  std::vector<std::tuple<int64_t, int64_t, int64_t>> runs;
+  int64_t offset = 0;
+  for (size_t t = 0; t < batch_sizes.size();) {
+    auto start = t;
+    while (t < batch_sizes.size() && batch_sizes[t] == batch_sizes[start]) {
+      t++;
+    }
+    auto steps = static_cast<int64_t>(t - start);
+    runs.emplace_back(offset, steps, batch_sizes[start]);
+    offset += steps * batch_sizes[start];
+  }
+
+  auto num_runs = static_cast<int64_t>(runs.size());
+  std::vector<at::Tensor> output(num_runs);
+  std::vector<at::Tensor> hy_rows, cy_rows;
+  at::Tensor run_hy, run_cy;
+  for (int64_t i = 0; i < num_runs; i++) {
+    auto run = reverse ? num_runs - 1 - i : i;
+    int64_t run_offset, steps, batch;
+    std::tie(run_offset, steps, batch) = runs[run];
+    auto run_input = input.narrow(0, run_offset, steps * batch).reshape({steps, batch, input.size(1)});
+    at::Tensor run_hx, run_cx;
+    if (i == 0) {
+      run_hx = hx.narrow(0, 0, batch);
+      run_cx = cx.narrow(0, 0, batch);
+    } else if (reverse) {
+      auto prev_batch = run_hy.size(0);
+      run_hx = at::cat({run_hy, hx.narrow(0, prev_batch, batch - prev_batch)}, 0);
+      run_cx = at::cat({run_cy, cx.narrow(0, prev_batch, batch - prev_batch)}, 0);
+    } else {
+      run_hx = run_hy.narrow(0, 0, batch);
+      run_cx = run_cy.narrow(0, 0, batch);
+    }
+    auto outputs = rnn_layer(run_input, weights, run_hx, run_cx, reverse, mode, hidden_size, num_layers, train, bidirectional, /*batch_sizes*/{}, scales, shift, quantized);
+    output[run] = outputs[0].reshape({steps * batch, hidden_size});
+    run_hy = outputs[1];
+    run_cy = outputs[2];
+    if (!reverse) {
+      auto next_batch = run + 1 < num_runs ? std::get<2>(runs[run + 1]) : 0;
+      hy_rows.push_back(run_hy.narrow(0, next_batch, batch - next_batch));
+      cy_rows.push_back(run_cy.narrow(0, next_batch, batch - next_batch));
+    }
+  }
+  if (reverse) {
+    return {at::cat(output, 0), run_hy, run_cy};
+  }
+  // the sequences ended by the last runs are the first rows of the state
+  std::reverse(hy_rows.begin(), hy_rows.end());
+  std::reverse(cy_rows.begin(), cy_rows.end());
+  return {at::cat(output, 0), at::cat(hy_rows, 0), at::cat(cy_rows, 0)};
+}
+
+at::Tensor rnn_dropout(const at::Tensor& input, double dropout_p) {
+  if (at::GradMode::is_enabled())
+    return NewDropoutOp::apply(input, dropout_p);
+  return NewDropoutOp::_forward(input, dropout_p);
+}
+
 // MKLDNN RNN integration notes:
 // I. Memory Formats
 //   a. mkldnn will use plain formats for input, hx/cx, output, hy/cy
@@ -492,9 +999,11 @@ std::vector<at::Tensor> rnn_layer(const at::Tensor& input,
 //   a. mkldnn rnn primitive doesn't support training with dropout or padded input sequence.
 //   b. here break a single RNN module into { num_layers * num_directions } mkldnn rnn primitives
 //      for future need to cover these feature gaps.
-//
-//TODO: a. training with dropout
-//   b. padded sequence input support
+//   c. a packed input sequence runs a mkldnn rnn primitive per run of time steps of the same
+//      batch size in every layer, see packed_rnn_layer. The inputs of many runs take the
+//      ATen CPU kernels instead, see packed_rnn_on_cpu.
+//   d. the training with dropout drops the output of every layer but the last one before
+//      feeding it to the next layer, see rnn_dropout.
 //
 std::vector<at::Tensor> rnn(
     const at::Tensor& input_, std::vector<at::Tensor> weight, int64_t weight_stride0,
@@ -502,8 +1011,6 @@ std::vector<at::Tensor> rnn(
     int64_t mode, int64_t hidden_size,
     int64_t num_layers, bool batch_first, double dropout_p,
     bool train, bool bidirectional, at::IntArrayRef batch_sizes) {
-  TORCH_CHECK(!train || dropout_p == 0.0, "mkldnn_rnn doesn't support dropout");
-  TORCH_CHECK(batch_sizes.size() == 0, "mkldnn_rnn doesn't support packed input");
 
   auto input = input_;
   bool is_input_packed = batch_sizes.size() != 0;
@@ -519,24 +1026,38 @@ std::vector<at::Tensor> rnn(
 
   auto num_directions = bidirectional ? 2 : 1;
 
-  // no need to do calibration for the output in lstm, will use the scale & zero point of the input
+  // no need to do calibration for the output in rnn, will use the scale & zero point of the input
   // to dequantize the output from u8 to f32, need to add an "output" here but actually unused
-  // For LSTM, we only need to calibrate the input to the first layer
-  // TODO: add int8 for gru and rnn.
-  if (check_auto_mix_int8_fp32() && check_int8_calibration() && static_cast<dil::rnn_kind>(mode) == dil::rnn_kind::LSTM) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
-    insert_or_updata_observer({input}, {input}, "lstm", num_ops_id, /*asymmetric*/true);
+  // For the rnn, we only need to calibrate the input to the first layer
+  static const char* op_names[] = {"rnn_relu", "rnn_tanh", "lstm", "gru"};
+  if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id(op_names[mode]);
+    insert_or_updata_observer({input}, {input}, op_names[mode], num_ops_id, /*asymmetric*/true);
   }
 
   bool quantized = false;
-  std::vector<std::vector<float>> scales = {};
-  std::vector<std::vector<int32_t>> shift = {};
-  if (check_auto_mix_int8_fp32() && !check_int8_calibration() && static_cast<dil::rnn_kind>(mode) == dil::rnn_kind::LSTM) {
-      int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+  // a single empty scale and zero point when not quantized
+  static const std::vector<std::vector<float>> fp32_scales(1);
+  static const std::vector<std::vector<int32_t>> fp32_shift(1);
+  const std::vector<std::vector<float>>* scales = &fp32_scales;
+  const std::vector<std::vector<int32_t>>* shift = &fp32_shift;
+  if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
+      int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id(op_names[mode]);
+      // the rnn modes oneDNN has no int8 inference for run in fp32
       quantized = torch_ipex::cpu::dbl::comm::get_int8_quantized_status(num_ops_id);
-      std::tie(scales, shift) = torch_ipex::cpu::dbl::comm::get_int8_asymmetric(num_ops_id);
-      IPEX_CHECK(scales.size() > 0, "incorrect scale size");
-      IPEX_CHECK(shift.size() > 0, "incorrect shift size");
+      if (quantized && !torch_ipex::cpu::dbl::rnn::is_int8_supported(mode)) {
+        static std::once_flag warned[4];
+        std::call_once(warned[mode], [&]() {
+          TORCH_WARN("oneDNN has no int8 inference for ", op_names[mode], ", it runs in fp32");
+        });
+        quantized = false;
+      }
+      // read in place from the frozen indicators, no copy per op
+      const auto& asymmetric = torch_ipex::cpu::dbl::comm::get_int8_asymmetric(num_ops_id);
+      scales = &std::get<0>(asymmetric);
+      shift = &std::get<1>(asymmetric);
+      IPEX_CHECK(scales->size() > 0, "incorrect scale size");
+      IPEX_CHECK(shift->size() > 0, "incorrect shift size");
   }
 
   auto layer_input = input;
@@ -550,13 +1071,18 @@ std::vector<at::Tensor> rnn(
       auto layer_hx = hx[index];
       auto layer_cx = cx[index];
       auto reverse = (direction > 0);
-      auto outputs = rnn_layer(layer_input, layer_weights, layer_hx, layer_cx, reverse, mode, hidden_size, num_layers, train, bidirectional, batch_sizes, scales[0], shift[0], quantized);
+      auto outputs = is_input_packed
+          ? packed_rnn_layer(layer_input, layer_weights, layer_hx, layer_cx, reverse, mode, hidden_size, num_layers, train, bidirectional, batch_sizes, (*scales)[0], (*shift)[0], quantized)
+          : rnn_layer(layer_input, layer_weights, layer_hx, layer_cx, reverse, mode, hidden_size, num_layers, train, bidirectional, batch_sizes, (*scales)[0], (*shift)[0], quantized);
       layer_output[direction] = outputs[0];
       layer_hy[index] = outputs[1];
       layer_cy[index] = outputs[2];
     }
     layer_input = num_directions == 1 ? layer_output[0]
                                       : at::cat(layer_output, /*output_channels*/-1);
+    if (train && dropout_p != 0 && layer < num_layers - 1) {
+      layer_input = rnn_dropout(layer_input, dropout_p);
+    }
   }
   auto output = layer_input;
   auto hy = at::stack(layer_hy, 0);
@@ -621,6 +1147,111 @@ std::vector<at::Tensor> AtenIpexTypeExt::gru(
   return {outputs[0], outputs[1]};
 }
 
+// A packed input of many distinct batch sizes runs a oneDNN primitive for
+// every run of them, each covering a few time steps only, so that creating the
+// primitives outweighs the steps. Such inputs take the ATen CPU kernels
+// instead. The int8 path keeps oneDNN to keep the ids of its ops in step with
+// the calibration.
+constexpr int64_t kPackedRnnMaxRuns = 16;
+
+static inline bool packed_rnn_on_cpu(const at::Tensor& batch_sizes) {
+  if (check_auto_mix_int8_fp32()) {
+    return false;
+  }
+  auto sizes = batch_sizes.data_ptr<int64_t>();
+  int64_t num_runs = 0;
+  for (int64_t t = 0; t < batch_sizes.size(0); t++) {
+    if (t == 0 || sizes[t] != sizes[t - 1]) {
+      num_runs++;
+    }
+  }
+  return num_runs > kPackedRnnMaxRuns;
+}
+
+static inline std::vector<at::Tensor> to_device(at::TensorList tensors, const at::Device& device) {
+  std::vector<at::Tensor> outputs;
+  outputs.reserve(tensors.size());
+  for (const auto& tensor : tensors) {
+    outputs.push_back(tensor.to(device));
+  }
+  return outputs;
+}
+
+std::vector<at::Tensor> AtenIpexTypeExt::lstm_packed(
+    const at::Tensor& data, const at::Tensor& batch_sizes, std::vector<at::Tensor> hidden, std::vector<at::Tensor> params,
+    bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+  auto batch_sizes_ = batch_sizes.contiguous();
+  if (packed_rnn_on_cpu(batch_sizes_)) {
+    auto outputs = at::lstm(data.to(at::kCPU), batch_sizes_, to_device(hidden, at::kCPU), to_device(params, at::kCPU),
+                            has_biases, num_layers, dropout_p, train, bidirectional);
+    return to_device({std::get<0>(outputs), std::get<1>(outputs), std::get<2>(outputs)}, data.device());
+  }
+  at::Tensor hx = hidden[0];
+  at::Tensor cx = hidden[1];
+  int64_t hidden_size = hx.size(2);
+  return rnn(
+      data, params, has_biases ? 4 : 2,
+      hx, cx, static_cast<int>(dil::rnn_kind::LSTM), hidden_size, num_layers, /*batch_first*/false, dropout_p,
+      train, bidirectional, {batch_sizes_.data_ptr<int64_t>(), static_cast<size_t>(batch_sizes_.size(0))});
+}
+
+std::vector<at::Tensor> AtenIpexTypeExt::rnn_tanh_packed(
+    const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params,
+    bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+  auto batch_sizes_ = batch_sizes.contiguous();
+  if (packed_rnn_on_cpu(batch_sizes_)) {
+    auto outputs = at::rnn_tanh(data.to(at::kCPU), batch_sizes_, hidden.to(at::kCPU), to_device(params, at::kCPU),
+                             has_biases, num_layers, dropout_p, train, bidirectional);
+    return to_device({std::get<0>(outputs), std::get<1>(outputs)}, data.device());
+  }
+  at::Tensor hx = hidden;
+  at::Tensor cx = at::zeros(hidden.sizes(), hidden.options());
+  int64_t hidden_size = hx.size(2);
+  auto outputs = rnn(
+      data, params, has_biases ? 4 : 2,
+      hx, cx, static_cast<int>(dil::rnn_kind::RNN_TANH), hidden_size, num_layers, /*batch_first*/false, dropout_p,
+      train, bidirectional, {batch_sizes_.data_ptr<int64_t>(), static_cast<size_t>(batch_sizes_.size(0))});
+  return {outputs[0], outputs[1]};
+}
+
+std::vector<at::Tensor> AtenIpexTypeExt::rnn_relu_packed(
+    const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params,
+    bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+  auto batch_sizes_ = batch_sizes.contiguous();
+  if (packed_rnn_on_cpu(batch_sizes_)) {
+    auto outputs = at::rnn_relu(data.to(at::kCPU), batch_sizes_, hidden.to(at::kCPU), to_device(params, at::kCPU),
+                             has_biases, num_layers, dropout_p, train, bidirectional);
+    return to_device({std::get<0>(outputs), std::get<1>(outputs)}, data.device());
+  }
+  at::Tensor hx = hidden;
+  at::Tensor cx = at::zeros(hidden.sizes(), hidden.options());
+  int64_t hidden_size = hx.size(2);
+  auto outputs = rnn(
+      data, params, has_biases ? 4 : 2,
+      hx, cx, static_cast<int>(dil::rnn_kind::RNN_RELU), hidden_size, num_layers, /*batch_first*/false, dropout_p,
+      train, bidirectional, {batch_sizes_.data_ptr<int64_t>(), static_cast<size_t>(batch_sizes_.size(0))});
+  return {outputs[0], outputs[1]};
+}
+
+std::vector<at::Tensor> AtenIpexTypeExt::gru_packed(
+    const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params,
+    bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+  auto batch_sizes_ = batch_sizes.contiguous();
+  if (packed_rnn_on_cpu(batch_sizes_)) {
+    auto outputs = at::gru(data.to(at::kCPU), batch_sizes_, hidden.to(at::kCPU), to_device(params, at::kCPU),
+                             has_biases, num_layers, dropout_p, train, bidirectional);
+    return to_device({std::get<0>(outputs), std::get<1>(outputs)}, data.device());
+  }
+  at::Tensor hx = hidden;
+  at::Tensor cx = at::zeros(hidden.sizes(), hidden.options());
+  int64_t hidden_size = hx.size(2);
+  auto outputs = rnn(
+      data, params, has_biases ? 4 : 2,
+      hx, cx, static_cast<int>(dil::rnn_kind::GRU), hidden_size, num_layers, /*batch_first*/false, dropout_p,
+      train, bidirectional, {batch_sizes_.data_ptr<int64_t>(), static_cast<size_t>(batch_sizes_.size(0))});
+  return {outputs[0], outputs[1]};
+}
+
 at::Tensor AtenIpexTypeExt::linear_relu(const at::Tensor &input,
                                    const at::Tensor &weight,
                                    const c10::optional<at::Tensor> &bias) {
@@ -695,6 +1326,10 @@ static auto dispatch =
                   weight, indices, offsets, scale_grad_by_freq, mode, sparse,
                   per_sample_weights, include_last_offset);
             })
+        .op("torch_ipex::embedding_bag_batched_forward", &torch_ipex::AtenIpexTypeExt::embedding_bag_batched_forward)
+        .op("torch_ipex::embedding_bag_batched_backward", &torch_ipex::AtenIpexTypeExt::embedding_bag_batched_backward)
+        .op("torch_ipex::embedding_bag_rowwise_quantize", &torch_ipex::AtenIpexTypeExt::embedding_bag_rowwise_quantize)
+        .op("torch_ipex::embedding_bag_rowwise_quantized", &torch_ipex::AtenIpexTypeExt::embedding_bag_rowwise_quantized)
         .op("torch_ipex::lstm",
             [](const at::Tensor& input, std::vector<at::Tensor> hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional, bool batch_first) {
               return torch_ipex::AtenIpexTypeExt::lstm(input, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional, batch_first);
@@ -711,8 +1346,28 @@ static auto dispatch =
             [](const at::Tensor& input, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional, bool batch_first) {
               return torch_ipex::AtenIpexTypeExt::gru(input, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional, batch_first);
             })
-        .op("torch_ipex::interaction_forward", &torch_ipex::AtenIpexTypeExt::interaction_forward)
-        .op("torch_ipex::interaction_backward", &torch_ipex::AtenIpexTypeExt::interaction_backward)
+        .op("torch_ipex::lstm_packed",
+            [](const at::Tensor& data, const at::Tensor& batch_sizes, std::vector<at::Tensor> hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+              return torch_ipex::AtenIpexTypeExt::lstm_packed(data, batch_sizes, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional);
+            })
+        .op("torch_ipex::rnn_tanh_packed",
+            [](const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+              return torch_ipex::AtenIpexTypeExt::rnn_tanh_packed(data, batch_sizes, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional);
+            })
+        .op("torch_ipex::rnn_relu_packed",
+            [](const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+              return torch_ipex::AtenIpexTypeExt::rnn_relu_packed(data, batch_sizes, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional);
+            })
+        .op("torch_ipex::gru_packed",
+            [](const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional) {
+              return torch_ipex::AtenIpexTypeExt::gru_packed(data, batch_sizes, hidden, params, has_biases, num_layers, dropout_p, train, bidirectional);
+            })
+        .op("torch_ipex::interaction_forward(Tensor[] input, bool triangle_only=False) -> Tensor",
+            &torch_ipex::AtenIpexTypeExt::interaction_forward)
+        .op("torch_ipex::interaction_backward(Tensor grad_out, Tensor[] input, bool triangle_only=False) -> Tensor[]",
+            &torch_ipex::AtenIpexTypeExt::interaction_backward)
+        .op("torch_ipex::interaction(Tensor[] input, bool triangle_only=False) -> Tensor",
+            &torch_ipex::AtenIpexTypeExt::interaction)
         .op("torch_ipex::frozen_batch_norm", &torch_ipex::AtenIpexTypeExt::frozen_batch_norm)
         .op("torch_ipex::layer_norm", &torch_ipex::AtenIpexTypeExt::layer_norm);
 }
@@ -8,9 +8,21 @@ namespace torch_ipex {
 class AtenIpexTypeExt {
  public:
   static void packed_add_(at::Tensor & top_half, at::Tensor & bot_half, const at::Tensor & grad, float alpha);
-  static at::Tensor interaction_forward(const std::vector<at::Tensor> & input);
-  static std::vector<at::Tensor> interaction_backward(const at::Tensor & grad_out, const std::vector<at::Tensor> & input);
+  static void sgd_step(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves, const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers, const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double dampening, double weight_decay, bool nesterov, bool first_step);
+  static void adagrad_step(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves, const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & state_sums, double clr, double weight_decay, double eps);
+  static void adam_step(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves, const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs, const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps, double weight_decay, bool adamw, int64_t step);
+  static void lamb_step(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves, const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs, const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps, double weight_decay, int64_t step);
+  static void lars_step(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves, const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers, const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double weight_decay, double trust_coefficient, double eps);
+  static at::Tensor multi_tensor_l2norm(const std::vector<at::Tensor> & tensors, const std::vector<at::Tensor> & bottom_halves);
+  static void multi_tensor_scale_(const std::vector<at::Tensor> & tensors, double scale);
+  static at::Tensor interaction_forward(const std::vector<at::Tensor> & input, bool triangle_only);
+  static std::vector<at::Tensor> interaction_backward(const at::Tensor & grad_out, const std::vector<at::Tensor> & input, bool triangle_only);
+  static at::Tensor interaction(const std::vector<at::Tensor> & input, bool triangle_only);
   static std::vector<at::Tensor> embedding_bag(const at::Tensor & weight, const at::Tensor & indices, const at::Tensor & offsets, bool scale_grad_by_freq, int64_t mode, bool sparse, const c10::optional<at::Tensor>& per_sample_weights, bool include_last_offset);
+  static at::Tensor embedding_bag_batched_forward(const std::vector<at::Tensor> & weights, const std::vector<at::Tensor> & indices, const std::vector<at::Tensor> & offsets, bool include_last_offset);
+  static std::vector<at::Tensor> embedding_bag_batched_backward(const at::Tensor & grad, const std::vector<at::Tensor> & weights, const std::vector<at::Tensor> & indices, const std::vector<at::Tensor> & offsets, bool sparse);
+  static at::Tensor embedding_bag_rowwise_quantize(const at::Tensor & weight, int64_t bit_rate);
+  static at::Tensor embedding_bag_rowwise_quantized(const at::Tensor & qweight, int64_t bit_rate, const at::Tensor & indices, const at::Tensor & offsets, int64_t mode, const c10::optional<at::Tensor>& per_sample_weights, bool include_last_offset);
   static at::Tensor linear(const at::Tensor& input, const at::Tensor& weight, const c10::optional<at::Tensor>& bias);
   static at::Tensor adaptive_avg_pool2d(at::Tensor const& input, at::IntArrayRef output_size);
   static at::Tensor max_pool2d(const at::Tensor& input, at::IntArrayRef kernel_size, at::IntArrayRef stride, at::IntArrayRef padding, at::IntArrayRef dilation, bool ceil_mode);
@@ -19,6 +31,10 @@ class AtenIpexTypeExt {
   static std::vector<at::Tensor> rnn_tanh(const at::Tensor& input, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional, bool batch_first);
   static std::vector<at::Tensor> rnn_relu(const at::Tensor& input, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional, bool batch_first);
   static std::vector<at::Tensor> gru(const at::Tensor& input, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional, bool batch_first);
+  static std::vector<at::Tensor> lstm_packed(const at::Tensor& data, const at::Tensor& batch_sizes, std::vector<at::Tensor> hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional);
+  static std::vector<at::Tensor> rnn_tanh_packed(const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional);
+  static std::vector<at::Tensor> rnn_relu_packed(const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional);
+  static std::vector<at::Tensor> gru_packed(const at::Tensor& data, const at::Tensor& batch_sizes, const at::Tensor& hidden, std::vector<at::Tensor> params, bool has_biases, int64_t num_layers, double dropout_p, bool train, bool bidirectional);
   static at::Tensor linear_relu(const at::Tensor &input, const at::Tensor &weight, const c10::optional<at::Tensor> &bias);
   static at::Tensor frozen_batch_norm(const at::Tensor& input, const at::Tensor& weight, const at::Tensor& bias, const at::Tensor& running_mean, const at::Tensor& running_var);
   static at::Tensor layer_norm(const at::Tensor & input, at::IntArrayRef normalized_shape, const c10::optional<at::Tensor> & weight, const c10::optional<at::Tensor> & bias, double eps);
@@ -24,6 +24,30 @@ class IpexExternal {
                                       const int width,
                                       const int sampling_ratio);
 
+  // Pools each ROI from the level of the feature pyramid the FPN rule assigns
+  // it to, all the levels at once.
+  static at::Tensor ROIAlign_multilevel_forward(const std::vector<at::Tensor>& inputs,
+                                                const at::Tensor& rois,
+                                                const std::vector<double>& spatial_scales,
+                                                const int pooled_height,
+                                                const int pooled_width,
+                                                const int sampling_ratio,
+                                                const double canonical_scale,
+                                                const int64_t canonical_level);
+
+  static std::vector<at::Tensor> ROIAlign_multilevel_backward(const at::Tensor& grad,
+                                                              const at::Tensor& rois,
+                                                              const std::vector<double>& spatial_scales,
+                                                              const int pooled_height,
+                                                              const int pooled_width,
+                                                              const int batch_size,
+                                                              const int channels,
+                                                              const std::vector<int64_t>& heights,
+                                                              const std::vector<int64_t>& widths,
+                                                              const int sampling_ratio,
+                                                              const double canonical_scale,
+                                                              const int64_t canonical_level);
+
   static at::Tensor nms(const at::Tensor& dets,
                         const at::Tensor& scores,
                         const float threshold);
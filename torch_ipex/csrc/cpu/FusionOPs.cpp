@@ -49,10 +49,10 @@ at::Tensor dil_convolution_outplace_fusion(
   bool quantized = false;
   std::vector<float> output_scale = {};
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id(op_name);
     quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       output_scale.push_back(scales[1][0]);
       dbl::comm::reorder_to_int8_for_mix_prec(input_contiguous, scales[0]);
@@ -112,7 +112,7 @@ at::Tensor dil_convolution_outplace_fusion(
   auto aten_output = dbl::comm::gen_aten_tensor_by(std::move(dil_output));
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input_contiguous}, {aten_output}, op_name,
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id(op_name));
   }
   return aten_output;
 }
@@ -145,10 +145,10 @@ static at::Tensor& dil_convolution_inplace_fusion(
   bool quantized = false;
   std::vector<float> output_scale = {};
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
-    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id();
+    int64_t num_ops_id = Int8OptConfig::fetch_and_add_ops_id(op_name);
     quantized = dbl::comm::get_int8_quantized_status(num_ops_id);
-    std::vector<std::vector<float>> scales = dbl::comm::get_int8_scales(
-        {input}, /*  uint8_used for output*/ false, num_ops_id);
+    const auto& scales = dbl::comm::get_int8_scales(
+        input, /*  uint8_used for output*/ false, num_ops_id);
     if (quantized) {
       output_scale.push_back(scales[1][0]);
       dbl::comm::reorder_to_int8_for_mix_prec(input_contiguous, scales[0]);
@@ -214,7 +214,7 @@ static at::Tensor& dil_convolution_inplace_fusion(
   dbl::comm::equip_dil_buffer(accumu, dil_output);
   if (check_auto_mix_int8_fp32() && check_int8_calibration()) {
     insert_or_updata_observer({input_contiguous}, {accumu}, op_name,
-                              Int8OptConfig::fetch_and_add_ops_id());
+                              Int8OptConfig::fetch_and_add_ops_id(op_name));
   }
   return accumu;
 }
@@ -1,4 +1,5 @@
 #include "MlpOPs.h"
+#include "torch_ipex/csrc/utils.h"
 
 #include <ATen/record_function.h>
 #include <torch/csrc/autograd/VariableTypeUtils.h>
@@ -126,6 +127,110 @@ std::vector<at::Tensor> AtenIpexTypeMLPExt::backward(
 }
 
 
+// Runs the layers of a tower one after the other in one parallel region. The
+// input of a layer is the activation of the previous one, preallocated in the
+// blocked layout of the outputs by the caller, and the last layer writes the
+// output.
+at::Tensor AtenIpexTypeMLPExt::forward_layers(
+    const std::vector<void *> &libxsmm_handles_,
+    const at::Tensor &input,
+    const std::vector<at::Tensor> &weights,
+    const std::vector<at::Tensor> &biases,
+    const std::vector<at::Tensor> &activations,
+    const at::Tensor &output) {
+  libxsmm_dnn_err_t global_status;
+  int64_t num_layers = libxsmm_handles_.size();
+  IPEX_CHECK(num_layers > 0 && weights.size() == num_layers && biases.size() == num_layers &&
+             activations.size() == num_layers - 1, "mlp layers expect a weight, a bias and an activation per layer");
+  std::vector<libxsmm_dnn_fullyconnected*> libxsmm_handles(num_layers);
+  for (int64_t l = 0; l < num_layers; l++) {
+    libxsmm_handles[l] = (libxsmm_dnn_fullyconnected*)libxsmm_handles_[l];
+    const auto &layer_input = l == 0 ? input : activations[l - 1];
+    const auto &layer_output = l == num_layers - 1 ? output : activations[l];
+    auto nbk = weights[l].size(0);
+    auto bk = weights[l].size(3);
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_INPUT, layer_input, "Input");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_FILTER, weights[l], "Weight");
+    if (biases[l].defined() && biases[l].numel() > 0) {
+      libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_CHANNEL_BIAS, biases[l].view({nbk, bk}), "Bias");
+    }
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_OUTPUT, layer_output, "Output");
+  }
+  {
+    RECORD_FUNCTION("ipex_mlp_layers_fwd", std::vector<c10::IValue>());
+    #ifdef _OPENMP
+    #pragma omp parallel
+    #endif
+    {
+      int tid = omp_get_thread_num();
+      for (int64_t l = 0; l < num_layers; l++) {
+        CHKERR_LIBXSMM_DNN( libxsmm_dnn_fullyconnected_execute_st(libxsmm_handles[l], LIBXSMM_DNN_COMPUTE_KIND_FWD, 0, tid) );
+        // the next layer reads the whole output of this one
+        #ifdef _OPENMP
+        #pragma omp barrier
+        #endif
+      }
+    }
+  }
+  return output;
+}
+
+// The backward of forward_layers from the last layer to the first one in one
+// parallel region. The gradients of the activations are preallocated by the
+// caller, returns the gradient of the input followed by the gradients of the
+// weights and the gradients of the biases of all the layers.
+std::vector<at::Tensor> AtenIpexTypeMLPExt::backward_layers(
+    const std::vector<void *> &libxsmm_handles_,
+    const at::Tensor &grad_output,
+    const at::Tensor &input,
+    const std::vector<at::Tensor> &weights,
+    const std::vector<at::Tensor> &activations,
+    const at::Tensor &output,
+    const std::vector<at::Tensor> &grad_activations) {
+  libxsmm_dnn_err_t global_status;
+  int64_t num_layers = libxsmm_handles_.size();
+  IPEX_CHECK(num_layers > 0 && weights.size() == num_layers && activations.size() == num_layers - 1 &&
+             grad_activations.size() == num_layers - 1, "mlp layers expect a weight and an activation per layer");
+  std::vector<libxsmm_dnn_fullyconnected*> libxsmm_handles(num_layers);
+  std::vector<at::Tensor> grads(2 * num_layers + 1);
+  grads[0] = at::empty(input.sizes(), input.options());
+  for (int64_t l = 0; l < num_layers; l++) {
+    libxsmm_handles[l] = (libxsmm_dnn_fullyconnected*)libxsmm_handles_[l];
+    const auto &layer_input = l == 0 ? input : activations[l - 1];
+    const auto &layer_output = l == num_layers - 1 ? output : activations[l];
+    const auto &layer_grad_input = l == 0 ? grads[0] : grad_activations[l - 1];
+    const auto &layer_grad_output = l == num_layers - 1 ? grad_output : grad_activations[l];
+    auto nbk = weights[l].size(0);
+    auto bk = weights[l].size(3);
+    grads[1 + l] = at::empty(weights[l].sizes(), weights[l].options());
+    grads[1 + num_layers + l] = at::empty({nbk * bk}, weights[l].options());
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_INPUT, layer_input, "Input");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_FILTER, weights[l], "Weight");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_REGULAR_OUTPUT, layer_output, "Output");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_GRADIENT_CHANNEL_BIAS, grads[1 + num_layers + l].view({nbk, bk}), "GradBias");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_GRADIENT_OUTPUT, layer_grad_output, "GradOutput");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_GRADIENT_INPUT, layer_grad_input, "GradInput");
+    libxsmm_dnn_fullyconnected_set_ptr_helper(libxsmm_handles[l], LIBXSMM_DNN_GRADIENT_FILTER, grads[1 + l], "GradWeight");
+  }
+
+  RECORD_FUNCTION("ipex_mlp_layers_bwdupd", std::vector<c10::IValue>());
+  #ifdef _OPENMP
+  #pragma omp parallel
+  #endif
+  {
+    int tid = omp_get_thread_num();
+    for (int64_t l = num_layers - 1; l >= 0; l--) {
+      CHKERR_LIBXSMM_DNN( libxsmm_dnn_fullyconnected_execute_st(libxsmm_handles[l], LIBXSMM_DNN_COMPUTE_KIND_BWDUPD, 0, tid) );
+      // the previous layer reads the whole gradient of its output
+      #ifdef _OPENMP
+      #pragma omp barrier
+      #endif
+    }
+  }
+  return grads;
+}
+
+
 void *AtenIpexTypeMLPExt::create_handle(int N, int C, int K, int bn, int bc, int bk, int dtype, int fuse_bias, int act_type) {
   libxsmm_dnn_fullyconnected_desc fullyconnected_desc;
   libxsmm_dnn_fullyconnected* libxsmm_handle;
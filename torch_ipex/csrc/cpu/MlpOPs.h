@@ -10,6 +10,8 @@ class AtenIpexTypeMLPExt {
  public:
   static at::Tensor forward(void *handle_, const at::Tensor &input, const at::Tensor &weight, const at::Tensor &bias);
   static std::vector<at::Tensor> backward(void *handle_, const at::Tensor &grad_output, const at::Tensor &input, const at::Tensor &weight);
+  static at::Tensor forward_layers(const std::vector<void *> &handles_, const at::Tensor &input, const std::vector<at::Tensor> &weights, const std::vector<at::Tensor> &biases, const std::vector<at::Tensor> &activations, const at::Tensor &output);
+  static std::vector<at::Tensor> backward_layers(const std::vector<void *> &handles_, const at::Tensor &grad_output, const at::Tensor &input, const std::vector<at::Tensor> &weights, const std::vector<at::Tensor> &activations, const at::Tensor &output, const std::vector<at::Tensor> &grad_activations);
   static void *create_handle(int N, int C, int K, int bn, int bc, int bk, int dtype, int fuse_bias, int act_type);
   static at::Tensor set_relu_mask(void *handle_);
   static void release_handle(void* handle_);
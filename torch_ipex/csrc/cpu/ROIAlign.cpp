@@ -1,7 +1,10 @@
 // Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 #include "ExternalOPs.h"
 #include "torch_ipex/csrc/aten_ipex_bridge.h"
+#include "ShadeDataContext.h"
 #include "aten/aten.hpp"
+#include "bf16/vec/bf16_vec_kernel.h"
+#include "dbl/Common.h"
 #include <ATen/Parallel.h>
 #include <ATen/record_function.h>
 #include <algorithm>
@@ -9,228 +12,377 @@
 #include <torch/csrc/autograd/function.h>
 namespace torch_ipex {
 
-// implementation taken from Caffe2
+// A 4-d feature map whose channels are grouped into blocks of contiguous
+// channels: a channel a block for nchw, all the channels for nhwc and 8 or 16
+// channels for the nChw8c and nChw16c dil tensors. Strides are in elements.
+struct FeatureLayout {
+  int64_t channels;
+  int64_t height;
+  int64_t width;
+  int64_t block;
+  int64_t batch_stride;
+  int64_t block_stride;
+  int64_t h_stride;
+  int64_t w_stride;
+};
+
+static FeatureLayout layout_of(const at::Tensor& input) {
+  FeatureLayout layout;
+  layout.channels = input.size(1);
+  layout.height = input.size(2);
+  layout.width = input.size(3);
+  layout.batch_stride = input.stride(0);
+  layout.h_stride = input.stride(2);
+  layout.w_stride = input.stride(3);
+  if (input.stride(1) == 1) {
+    layout.block = layout.channels;
+    layout.block_stride = 0;
+  } else {
+    layout.block = 1;
+    layout.block_stride = input.stride(1);
+  }
+  return layout;
+}
+
+// Whether the kernels read the dil tensor in place: a 4-d f32 or bf16 tensor
+// of a plain or a channel-blocked format.
+static bool is_supported_dil_tensor(const dil::tensor& input) {
+  if (input.ndims() != 4 || (input.get_data_type() != dil::data_type::f32 &&
+                             input.get_data_type() != dil::data_type::bf16)) {
+    return false;
+  }
+  auto desc = input.get_desc();
+  if (desc.data.format_kind != dnnl_blocked) {
+    return false;
+  }
+  const auto& blk = desc.data.format_desc.blocking;
+  return blk.inner_nblks == 0 || (blk.inner_nblks == 1 && blk.inner_idxs[0] == 1);
+}
+
+static FeatureLayout layout_of(const dil::tensor& input) {
+  auto desc = input.get_desc();
+  const auto& blk = desc.data.format_desc.blocking;
+  FeatureLayout layout;
+  layout.channels = desc.data.dims[1];
+  layout.height = desc.data.dims[2];
+  layout.width = desc.data.dims[3];
+  layout.batch_stride = blk.strides[0];
+  layout.h_stride = blk.strides[2];
+  layout.w_stride = blk.strides[3];
+  if (blk.inner_nblks == 1) {
+    layout.block = blk.inner_blks[0];
+    layout.block_stride = blk.strides[1];
+  } else if (blk.strides[1] == 1) {
+    layout.block = layout.channels;
+    layout.block_stride = 0;
+  } else {
+    layout.block = 1;
+    layout.block_stride = blk.strides[1];
+  }
+  return layout;
+}
+
+// The pooled_height x pooled_width bins of a ROI, each averaging
+// grid_h x grid_w bilinear samples.
+struct RoiBins {
+  int64_t batch;
+  float start_h;
+  float start_w;
+  float bin_h;
+  float bin_w;
+  int64_t grid_h;
+  int64_t grid_w;
+  float count;
+};
+
+// The feature map of a level of the pyramid, and the gradient of it
 template <typename T>
-struct PreCalc {
-  int pos1;
-  int pos2;
-  int pos3;
-  int pos4;
-  T w1;
-  T w2;
-  T w3;
-  T w4;
+struct FeatureLevel {
+  const T* data;
+  FeatureLayout layout;
+  float spatial_scale;
 };
 
 template <typename T>
-void pre_calc_for_bilinear_interpolate(
-    const int height,
-    const int width,
-    const int pooled_height,
-    const int pooled_width,
-    const int iy_upper,
-    const int ix_upper,
-    T roi_start_h,
-    T roi_start_w,
-    T bin_size_h,
-    T bin_size_w,
-    int roi_bin_grid_h,
-    int roi_bin_grid_w,
-    std::vector<PreCalc<T>>& pre_calc) {
-  int pre_calc_index = 0;
-  for (int ph = 0; ph < pooled_height; ph++) {
-    for (int pw = 0; pw < pooled_width; pw++) {
-      for (int iy = 0; iy < iy_upper; iy++) {
-        const T yy = roi_start_h + ph * bin_size_h +
-            static_cast<T>(iy + .5f) * bin_size_h /
-                static_cast<T>(roi_bin_grid_h); // e.g., 0.5, 1.5
-        for (int ix = 0; ix < ix_upper; ix++) {
-          const T xx = roi_start_w + pw * bin_size_w +
-              static_cast<T>(ix + .5f) * bin_size_w /
-                  static_cast<T>(roi_bin_grid_w);
-
-          T x = xx;
-          T y = yy;
-          // deal with: inverse elements are out of feature map boundary
-          if (y < -1.0 || y > height || x < -1.0 || x > width) {
-            // empty
-            PreCalc<T> pc;
-            pc.pos1 = 0;
-            pc.pos2 = 0;
-            pc.pos3 = 0;
-            pc.pos4 = 0;
-            pc.w1 = 0;
-            pc.w2 = 0;
-            pc.w3 = 0;
-            pc.w4 = 0;
-            pre_calc[pre_calc_index] = pc;
-            pre_calc_index += 1;
-            continue;
-          }
+struct GradLevel {
+  T* data;
+  int64_t height;
+  int64_t width;
+  float spatial_scale;
+};
 
-          if (y <= 0) {
-            y = 0;
-          }
-          if (x <= 0) {
-            x = 0;
-          }
+// The pyramid level of each ROI by the FPN rule: a ROI of canonical_scale
+// pixels a side goes to canonical_level, each doubling of its size moving it a
+// level up. The levels are indices into spatial_scales.
+static std::vector<int64_t> roi_levels_of(
+    const float* rois,
+    const int64_t num_rois,
+    const std::vector<double>& spatial_scales,
+    const double canonical_scale,
+    const int64_t canonical_level) {
+  const int64_t k_min = std::round(-std::log2(spatial_scales.front()));
+  const int64_t k_max = std::round(-std::log2(spatial_scales.back()));
+  TORCH_CHECK(k_max - k_min + 1 == (int64_t)spatial_scales.size(), "ROIAlign: the spatial scales should halve level by level");
+  std::vector<int64_t> roi_levels(num_rois);
+  for (int64_t n = 0; n < num_rois; n++) {
+    const float* roi = rois + n * 5;
+    const double size = std::sqrt((roi[3] - roi[1] + 1) * (roi[4] - roi[2] + 1));
+    const int64_t level = std::floor(canonical_level + std::log2(size / canonical_scale + 1e-6));
+    roi_levels[n] = std::min(std::max(level, k_min), k_max) - k_min;
+  }
+  return roi_levels;
+}
 
-          int y_low = (int)y;
-          int x_low = (int)x;
-          int y_high;
-          int x_high;
+// roi is (batch index, x1, y1, x2, y2)
+static RoiBins roi_bins_of(
+    const float* roi,
+    const float spatial_scale,
+    const int64_t pooled_height,
+    const int64_t pooled_width,
+    const int64_t sampling_ratio) {
+  RoiBins bins;
+  bins.batch = roi[0];
+
+  // Do not using rounding; this implementation detail is critical
+  bins.start_w = roi[1] * spatial_scale;
+  bins.start_h = roi[2] * spatial_scale;
+  float end_w = roi[3] * spatial_scale;
+  float end_h = roi[4] * spatial_scale;
+
+  // Force malformed ROIs to be 1x1
+  float roi_width = std::max(end_w - bins.start_w, 1.f);
+  float roi_height = std::max(end_h - bins.start_h, 1.f);
+  bins.bin_h = roi_height / pooled_height;
+  bins.bin_w = roi_width / pooled_width;
+
+  // We use roi_bin_grid to sample the grid and mimic integral
+  bins.grid_h = (sampling_ratio > 0) ? sampling_ratio : std::ceil(roi_height / pooled_height); // e.g., = 2
+  bins.grid_w = (sampling_ratio > 0) ? sampling_ratio : std::ceil(roi_width / pooled_width);
+
+  // We do average (integral) pooling inside a bin
+  bins.count = bins.grid_h * bins.grid_w; // e.g. = 4
+  return bins;
+}
 
-          if (y_low >= height - 1) {
-            y_high = y_low = height - 1;
-            y = (T)y_low;
-          } else {
-            y_high = y_low + 1;
-          }
+// The bilinear interpolation along an axis of the given size: the low and
+// high neighbours of v and their weights. Returns false for the samples out of
+// the feature map.
+static inline bool interpolate(
+    float v,
+    const int64_t size,
+    int64_t& low,
+    int64_t& high,
+    float& w_low,
+    float& w_high) {
+  // deal with: inverse elements are out of feature map boundary
+  if (v < -1.0 || v > size) {
+    return false;
+  }
+  if (v <= 0) {
+    v = 0;
+  }
+  low = (int64_t)v;
+  if (low >= size - 1) {
+    high = low = size - 1;
+    v = (float)low;
+  } else {
+    high = low + 1;
+  }
+  w_high = v - low;
+  w_low = 1. - w_high;
+  return true;
+}
 
-          if (x_low >= width - 1) {
-            x_high = x_low = width - 1;
-            x = (T)x_low;
-          } else {
-            x_high = x_low + 1;
+// Accumulates the average of the bin (ph, pw) of the ROI into acc, a fp32
+// value a channel. The samples are computed once for all the channels, which
+// are read a block of contiguous channels at a time.
+template <typename T>
+static void roi_align_bin(
+    const T* data,
+    const FeatureLayout& layout,
+    const RoiBins& bins,
+    const int64_t ph,
+    const int64_t pw,
+    float* acc) {
+  const T* batch_data = data + bins.batch * layout.batch_stride;
+  const int64_t num_blocks = (layout.channels + layout.block - 1) / layout.block;
+  for (int64_t iy = 0; iy < bins.grid_h; iy++) {
+    const float y = bins.start_h + ph * bins.bin_h + (iy + .5f) * bins.bin_h / bins.grid_h; // e.g., 0.5, 1.5
+    int64_t y_low, y_high;
+    float wy_low, wy_high;
+    if (!interpolate(y, layout.height, y_low, y_high, wy_low, wy_high)) {
+      continue;
+    }
+    for (int64_t ix = 0; ix < bins.grid_w; ix++) {
+      const float x = bins.start_w + pw * bins.bin_w + (ix + .5f) * bins.bin_w / bins.grid_w;
+      int64_t x_low, x_high;
+      float wx_low, wx_high;
+      if (!interpolate(x, layout.width, x_low, x_high, wx_low, wx_high)) {
+        continue;
+      }
+      const int64_t pos[4] = {
+          y_low * layout.h_stride + x_low * layout.w_stride,
+          y_low * layout.h_stride + x_high * layout.w_stride,
+          y_high * layout.h_stride + x_low * layout.w_stride,
+          y_high * layout.h_stride + x_high * layout.w_stride};
+      const float w[4] = {
+          wy_low * wx_low / bins.count,
+          wy_low * wx_high / bins.count,
+          wy_high * wx_low / bins.count,
+          wy_high * wx_high / bins.count};
+      for (int k = 0; k < 4; k++) {
+        if (layout.block == 1) {
+          // nchw: a channel a plane
+          const T* src = batch_data + pos[k];
+          for (int64_t c = 0; c < layout.channels; c++) {
+            acc[c] += w[k] * (float)src[c * layout.block_stride];
           }
-
-          T ly = y - y_low;
-          T lx = x - x_low;
-          T hy = 1. - ly, hx = 1. - lx;
-          T w1 = hy * hx, w2 = hy * lx, w3 = ly * hx, w4 = ly * lx;
-
-          // save weights and indices
-          PreCalc<T> pc;
-          pc.pos1 = y_low * width + x_low;
-          pc.pos2 = y_low * width + x_high;
-          pc.pos3 = y_high * width + x_low;
-          pc.pos4 = y_high * width + x_high;
-          pc.w1 = w1;
-          pc.w2 = w2;
-          pc.w3 = w3;
-          pc.w4 = w4;
-          pre_calc[pre_calc_index] = pc;
-
-          pre_calc_index += 1;
+          continue;
+        }
+        for (int64_t b = 0; b < num_blocks; b++) {
+          const int64_t len = std::min(layout.block, layout.channels - b * layout.block);
+          madd_ker(acc + b * layout.block, batch_data + b * layout.block_stride + pos[k], len, w[k]);
         }
       }
     }
   }
 }
 
+// Pools each ROI from the level of roi_levels into the nchw output, parallel
+// over the (ROI, bin) pairs so that a few ROIs still spread over all the
+// threads.
 template <typename T>
-void ROIAlignForward_cpu_kernel(
-    const int nthreads,
-    const T* bottom_data,
-    const T& spatial_scale,
-    const int channels,
-    const int height,
-    const int width,
-    const int pooled_height,
-    const int pooled_width,
-    const int sampling_ratio,
-    const T* bottom_rois,
-    //int roi_cols,
-    T* top_data) {
-  //AT_ASSERT(roi_cols == 4 || roi_cols == 5);
-  int roi_cols = 5;
-
-  int n_rois = nthreads / channels / pooled_width / pooled_height;
-  // (n, c, ph, pw) is an element in the pooled output
-  // can be parallelized using omp
-  // #pragma omp parallel for num_threads(32)
-#ifdef _OPENMP
-#if (_OPENMP >= 201307)
-# pragma omp parallel for simd
-#else
-# pragma omp parallel for schedule(static)
-#endif
-#endif
-  for (int n = 0; n < n_rois; n++) {
-    int index_n = n * channels * pooled_width * pooled_height;
-
-    // roi could have 4 or 5 columns
-    const T* offset_bottom_rois = bottom_rois + n * roi_cols;
-    int roi_batch_ind = 0;
-    if (roi_cols == 5) {
-      roi_batch_ind = offset_bottom_rois[0];
-      offset_bottom_rois++;
+static void roi_align_forward_kernel(
+    const std::vector<FeatureLevel<T>>& levels,
+    const float* rois,
+    const int64_t* roi_levels,
+    const int64_t num_rois,
+    const int64_t pooled_height,
+    const int64_t pooled_width,
+    const int64_t sampling_ratio,
+    T* output) {
+  const int64_t channels = levels[0].layout.channels;
+  const int64_t num_bins = pooled_height * pooled_width;
+  at::parallel_for(0, num_rois * num_bins, 0, [&](int64_t start, int64_t end) {
+    std::vector<float> acc(channels);
+    int64_t n = -1;
+    const FeatureLevel<T>* level = nullptr;
+    RoiBins bins;
+    for (int64_t i = start; i < end; i++) {
+      if (i / num_bins != n) {
+        n = i / num_bins;
+        level = &levels[roi_levels[n]];
+        bins = roi_bins_of(rois + n * 5, level->spatial_scale, pooled_height, pooled_width, sampling_ratio);
+      }
+      const int64_t bin = i % num_bins;
+      std::fill(acc.begin(), acc.end(), 0.f);
+      roi_align_bin(level->data, level->layout, bins, bin / pooled_width, bin % pooled_width, acc.data());
+      T* out = output + n * channels * num_bins + bin;
+      for (int64_t c = 0; c < channels; c++) {
+        out[c * num_bins] = acc[c];
+      }
     }
+  });
+}
 
-    // Do not using rounding; this implementation detail is critical
-    T roi_start_w = offset_bottom_rois[0] * spatial_scale;
-    T roi_start_h = offset_bottom_rois[1] * spatial_scale;
-    T roi_end_w = offset_bottom_rois[2] * spatial_scale;
-    T roi_end_h = offset_bottom_rois[3] * spatial_scale;
-    // T roi_start_w = round(offset_bottom_rois[0] * spatial_scale);
-    // T roi_start_h = round(offset_bottom_rois[1] * spatial_scale);
-    // T roi_end_w = round(offset_bottom_rois[2] * spatial_scale);
-    // T roi_end_h = round(offset_bottom_rois[3] * spatial_scale);
-
-    // Force malformed ROIs to be 1x1
-    T roi_width = std::max(roi_end_w - roi_start_w, (T)1.);
-    T roi_height = std::max(roi_end_h - roi_start_h, (T)1.);
-    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
-    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
-
-    // We use roi_bin_grid to sample the grid and mimic integral
-    int roi_bin_grid_h = (sampling_ratio > 0)
-        ? sampling_ratio
-        : ceil(roi_height / pooled_height); // e.g., = 2
-    int roi_bin_grid_w =
-        (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
-
-    // We do average (integral) pooling inside a bin
-    const T count = roi_bin_grid_h * roi_bin_grid_w; // e.g. = 4
-
-    // we want to precalculate indices and weights shared by all channels,
-    // this is the key point of optimization
-    std::vector<PreCalc<T>> pre_calc(
-        roi_bin_grid_h * roi_bin_grid_w * pooled_width * pooled_height);
-    pre_calc_for_bilinear_interpolate(
-        height,
-        width,
-        pooled_height,
-        pooled_width,
-        roi_bin_grid_h,
-        roi_bin_grid_w,
-        roi_start_h,
-        roi_start_w,
-        bin_size_h,
-        bin_size_w,
-        roi_bin_grid_h,
-        roi_bin_grid_w,
-        pre_calc);
-
-      for (int c = 0; c < channels; c++) {
-      int index_n_c = index_n + c * pooled_width * pooled_height;
-      const T* offset_bottom_data =
-          bottom_data + (roi_batch_ind * channels + c) * height * width;
-      int pre_calc_index = 0;
-
-      for (int ph = 0; ph < pooled_height; ph++) {
-        for (int pw = 0; pw < pooled_width; pw++) {
-          int index = index_n_c + ph * pooled_width + pw;
-
-          T output_val = 0.;
-          for (int iy = 0; iy < roi_bin_grid_h; iy++) {
-            for (int ix = 0; ix < roi_bin_grid_w; ix++) {
-              PreCalc<T> pc = pre_calc[pre_calc_index];
-              output_val += pc.w1 * offset_bottom_data[pc.pos1] +
-                  pc.w2 * offset_bottom_data[pc.pos2] +
-                  pc.w3 * offset_bottom_data[pc.pos3] +
-                  pc.w4 * offset_bottom_data[pc.pos4];
-
-              pre_calc_index += 1;
-            }
+// Accumulates into acc, the fp32 width x channels buffer of the row h of the
+// image of the ROI, the gradient the ROI passes to the row. grad holds the
+// channels of a bin contiguously.
+static void roi_align_backward_row(
+    const float* grad,
+    const RoiBins& bins,
+    const int64_t pooled_height,
+    const int64_t pooled_width,
+    const int64_t channels,
+    const int64_t height,
+    const int64_t width,
+    const int64_t h,
+    float* acc) {
+  // the samples lie in [start_h, start_h + pooled_height * bin_h]
+  if (h < std::floor(bins.start_h) - 1 || h > bins.start_h + pooled_height * bins.bin_h + 1) {
+    return;
+  }
+  for (int64_t ph = 0; ph < pooled_height; ph++) {
+    for (int64_t iy = 0; iy < bins.grid_h; iy++) {
+      const float y = bins.start_h + ph * bins.bin_h + (iy + .5f) * bins.bin_h / bins.grid_h;
+      int64_t y_low, y_high;
+      float wy_low, wy_high;
+      if (!interpolate(y, height, y_low, y_high, wy_low, wy_high) || (y_low != h && y_high != h)) {
+        continue;
+      }
+      const float wy = ((y_low == h) ? wy_low : 0.f) + ((y_high == h) ? wy_high : 0.f);
+      for (int64_t pw = 0; pw < pooled_width; pw++) {
+        const float* grad_bin = grad + (ph * pooled_width + pw) * channels;
+        for (int64_t ix = 0; ix < bins.grid_w; ix++) {
+          const float x = bins.start_w + pw * bins.bin_w + (ix + .5f) * bins.bin_w / bins.grid_w;
+          int64_t x_low, x_high;
+          float wx_low, wx_high;
+          if (!interpolate(x, width, x_low, x_high, wx_low, wx_high)) {
+            continue;
           }
-          output_val /= count;
+          madd_ker(acc + x_low * channels, grad_bin, channels, wy * wx_low / bins.count);
+          madd_ker(acc + x_high * channels, grad_bin, channels, wy * wx_high / bins.count);
+        }
+      }
+    }
+  }
+}
 
-          top_data[index] = output_val;
-        } // for pw
-      } // for ph
-    } // for c
-  } // for n
+// Computes the nchw gradients of the feature maps of the levels from the
+// gradient of the pooled ROIs, in the (ROI, bin, channel) order. The rows of
+// all the levels are split among the threads, each accumulating the rows it
+// owns in a private fp32 buffer, so that no two threads add to the same value.
+template <typename T>
+static void roi_align_backward_kernel(
+    const float* grad,
+    const float* rois,
+    const int64_t* roi_levels,
+    const int64_t num_rois,
+    const int64_t pooled_height,
+    const int64_t pooled_width,
+    const int64_t sampling_ratio,
+    const int64_t batch_size,
+    const int64_t channels,
+    const std::vector<GradLevel<T>>& levels) {
+  const int64_t num_levels = levels.size();
+  const int64_t grad_roi_size = pooled_height * pooled_width * channels;
+  // the ROIs of each image of each level, so that a row only visits the ROIs
+  // of its image and level
+  std::vector<RoiBins> roi_bins(num_rois);
+  std::vector<std::vector<int64_t>> image_rois(num_levels * batch_size);
+  for (int64_t n = 0; n < num_rois; n++) {
+    roi_bins[n] = roi_bins_of(rois + n * 5, levels[roi_levels[n]].spatial_scale, pooled_height, pooled_width, sampling_ratio);
+    TORCH_CHECK(roi_bins[n].batch >= 0 && roi_bins[n].batch < batch_size, "ROIAlign: the batch index of a roi is out of range");
+    image_rois[roi_levels[n] * batch_size + roi_bins[n].batch].push_back(n);
+  }
+
+  // the first row of each level among the rows of all the levels
+  std::vector<int64_t> level_rows(num_levels + 1, 0);
+  int64_t max_width = 0;
+  for (int64_t l = 0; l < num_levels; l++) {
+    level_rows[l + 1] = level_rows[l] + batch_size * levels[l].height;
+    max_width = std::max(max_width, levels[l].width);
+  }
+
+  at::parallel_for(0, level_rows.back(), 0, [&](int64_t start, int64_t end) {
+    std::vector<float> acc(max_width * channels);
+    for (int64_t i = start; i < end; i++) {
+      const int64_t l = std::upper_bound(level_rows.begin(), level_rows.end(), i) - level_rows.begin() - 1;
+      const auto& level = levels[l];
+      const int64_t b = (i - level_rows[l]) / level.height;
+      const int64_t h = (i - level_rows[l]) % level.height;
+      std::fill(acc.begin(), acc.begin() + level.width * channels, 0.f);
+      for (auto n : image_rois[l * batch_size + b]) {
+        roi_align_backward_row(grad + n * grad_roi_size, roi_bins[n], pooled_height, pooled_width, channels, level.height, level.width, h, acc.data());
+      }
+      T* row = level.data + b * channels * level.height * level.width + h * level.width;
+      for (int64_t c = 0; c < channels; c++) {
+        for (int64_t w = 0; w < level.width; w++) {
+          row[c * level.height * level.width + w] = acc[w * channels + c];
+        }
+      }
+    }
+  });
 }
 
 at::Tensor ROIAlign_forward_cpu(const at::Tensor& input,
@@ -244,219 +396,58 @@ at::Tensor ROIAlign_forward_cpu(const at::Tensor& input,
 
   auto num_rois = rois.size(0);
   auto channels = input.size(1);
-  auto height = input.size(2);
-  auto width = input.size(3);
 
   auto output = at::empty({num_rois, channels, pooled_height, pooled_width}, input.options());
-  auto output_size = num_rois * pooled_height * pooled_width * channels;
-
   if (output.numel() == 0) {
     return output;
   }
 
-  AT_DISPATCH_FLOATING_TYPES(input.type(), "ROIAlign_forward", [&] {
-    ROIAlignForward_cpu_kernel<scalar_t>(
-         output_size,
-         input.data<scalar_t>(),
-         spatial_scale,
-         channels,
-         height,
-         width,
+  // nchw, nhwc or any strides, with fp32 ROIs
+  auto layout = layout_of(input);
+  auto rois_ = rois.to(at::kFloat).contiguous();
+  std::vector<int64_t> roi_levels(num_rois, 0);
+  AT_DISPATCH_FLOATING_TYPES_AND(at::ScalarType::BFloat16, input.scalar_type(), "ROIAlign_forward", [&] {
+    roi_align_forward_kernel<scalar_t>(
+         {{input.data_ptr<scalar_t>(), layout, spatial_scale}},
+         rois_.data_ptr<float>(),
+         roi_levels.data(),
+         num_rois,
          pooled_height,
          pooled_width,
          sampling_ratio,
-         rois.data<scalar_t>(),
-         output.data<scalar_t>());
+         output.data_ptr<scalar_t>());
   });
   return output;
 }
 
-template <class T>
-inline void add(const T& val, T* address) {
-  *address += val;
-}
-
-template <typename T>
-void bilinear_interpolate_gradient(
-    const int height,
-    const int width,
-    T y,
-    T x,
-    T& w1,
-    T& w2,
-    T& w3,
-    T& w4,
-    int& x_low,
-    int& x_high,
-    int& y_low,
-    int& y_high,
-    const int /*index*/ /* index for debug only*/) {
-  // deal with cases that inverse elements are out of feature map boundary
-  if (y < -1.0 || y > height || x < -1.0 || x > width) {
-    // empty
-    w1 = w2 = w3 = w4 = 0.;
-    x_low = x_high = y_low = y_high = -1;
-    return;
-  }
-
-  if (y <= 0) {
-    y = 0;
-  }
-  if (x <= 0) {
-    x = 0;
-  }
-
-  y_low = (int)y;
-  x_low = (int)x;
-
-  if (y_low >= height - 1) {
-    y_high = y_low = height - 1;
-    y = (T)y_low;
-  } else {
-    y_high = y_low + 1;
-  }
-
-  if (x_low >= width - 1) {
-    x_high = x_low = width - 1;
-    x = (T)x_low;
+// Pools a f32 or bf16 dil tensor of a plain or channel-blocked format in
+// place, into a nchw dil tensor of the same data type.
+at::Tensor ROIAlign_forward_dil(const dil::tensor& input,
+                                const at::Tensor& rois,
+                                const float spatial_scale,
+                                const int pooled_height,
+                                const int pooled_width,
+                                const int sampling_ratio) {
+  auto num_rois = rois.size(0);
+  auto layout = layout_of(input);
+  dil::tensor output {{num_rois, layout.channels, pooled_height, pooled_width}, input.get_data_type()};
+
+  auto rois_ = rois.to(at::kFloat).contiguous();
+  std::vector<int64_t> roi_levels(num_rois, 0);
+  if (input.get_data_type() == dil::data_type::bf16) {
+    roi_align_forward_kernel<at::BFloat16>(
+        {{static_cast<at::BFloat16*>(input.get_data_handle()), layout, spatial_scale}}, rois_.data_ptr<float>(),
+        roi_levels.data(), num_rois, pooled_height, pooled_width, sampling_ratio,
+        static_cast<at::BFloat16*>(output.get_data_handle()));
   } else {
-    x_high = x_low + 1;
+    roi_align_forward_kernel<float>(
+        {{static_cast<float*>(input.get_data_handle()), layout, spatial_scale}}, rois_.data_ptr<float>(),
+        roi_levels.data(), num_rois, pooled_height, pooled_width, sampling_ratio,
+        static_cast<float*>(output.get_data_handle()));
   }
-
-  T ly = y - y_low;
-  T lx = x - x_low;
-  T hy = 1. - ly, hx = 1. - lx;
-
-  // reference in forward
-  // T v1 = bottom_data[y_low * width + x_low];
-  // T v2 = bottom_data[y_low * width + x_high];
-  // T v3 = bottom_data[y_high * width + x_low];
-  // T v4 = bottom_data[y_high * width + x_high];
-  // T val = (w1 * v1 + w2 * v2 + w3 * v3 + w4 * v4);
-
-  w1 = hy * hx, w2 = hy * lx, w3 = ly * hx, w4 = ly * lx;
-
-  return;
+  return cpu::dbl::comm::gen_aten_tensor_by(std::move(output));
 }
 
-
-
-template <typename T>
-void RoIAlignBackwardFeature_cpu_kernel(
-    const int nthreads,
-    const T* top_diff,
-    const int num_rois,
-    const T& spatial_scale,
-    const int channels,
-    const int height,
-    const int width,
-    const int pooled_height,
-    const int pooled_width,
-    const int sampling_ratio,
-    T* bottom_diff,
-    const T* bottom_rois) {
-  //DCHECK(rois_cols == 4 || rois_cols == 5);
-  int rois_cols = 5;
-#ifdef _OPENMP
-#if (_OPENMP >= 201307)
-# pragma omp parallel for simd
-#else
-# pragma omp parallel for schedule(static)
-#endif
-#endif
-  for (int index = 0; index < nthreads; index++) {
-    // (n, c, ph, pw) is an element in the pooled output
-    int pw = index % pooled_width;
-    int ph = (index / pooled_width) % pooled_height;
-    int c = (index / pooled_width / pooled_height) % channels;
-    int n = index / pooled_width / pooled_height / channels;
-
-    const T* offset_bottom_rois = bottom_rois + n * rois_cols;
-    int roi_batch_ind = 0;
-    if (rois_cols == 5) {
-      roi_batch_ind = offset_bottom_rois[0];
-      offset_bottom_rois++;
-    }
-
-    // Do not using rounding; this implementation detail is critical
-    T roi_start_w = offset_bottom_rois[0] * spatial_scale;
-    T roi_start_h = offset_bottom_rois[1] * spatial_scale;
-    T roi_end_w = offset_bottom_rois[2] * spatial_scale;
-    T roi_end_h = offset_bottom_rois[3] * spatial_scale;
-    // T roi_start_w = round(offset_bottom_rois[0] * spatial_scale);
-    // T roi_start_h = round(offset_bottom_rois[1] * spatial_scale);
-    // T roi_end_w = round(offset_bottom_rois[2] * spatial_scale);
-    // T roi_end_h = round(offset_bottom_rois[3] * spatial_scale);
-
-    // Force malformed ROIs to be 1x1
-    T roi_width = std::max(roi_end_w - roi_start_w, (T)1.);
-    T roi_height = std::max(roi_end_h - roi_start_h, (T)1.);
-    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
-    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
-
-    T* offset_bottom_diff =
-        bottom_diff + (roi_batch_ind * channels + c) * height * width;
-
-    int top_offset = (n * channels + c) * pooled_height * pooled_width;
-    const T* offset_top_diff = top_diff + top_offset;
-    const T top_diff_this_bin = offset_top_diff[ph * pooled_width + pw];
-
-    // We use roi_bin_grid to sample the grid and mimic integral
-    int roi_bin_grid_h = (sampling_ratio > 0)
-        ? sampling_ratio
-        : ceil(roi_height / pooled_height); // e.g., = 2
-    int roi_bin_grid_w =
-        (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
-
-    // We do average (integral) pooling inside a bin
-    const T count = roi_bin_grid_h * roi_bin_grid_w; // e.g. = 4
-
-    for (int iy = 0; iy < roi_bin_grid_h; iy++) {
-      const T y = roi_start_h + ph * bin_size_h +
-          static_cast<T>(iy + .5f) * bin_size_h /
-              static_cast<T>(roi_bin_grid_h); // e.g., 0.5, 1.5
-      for (int ix = 0; ix < roi_bin_grid_w; ix++) {
-        const T x = roi_start_w + pw * bin_size_w +
-            static_cast<T>(ix + .5f) * bin_size_w /
-                static_cast<T>(roi_bin_grid_w);
-
-        T w1, w2, w3, w4;
-        int x_low, x_high, y_low, y_high;
-
-        bilinear_interpolate_gradient(
-            height,
-            width,
-            y,
-            x,
-            w1,
-            w2,
-            w3,
-            w4,
-            x_low,
-            x_high,
-            y_low,
-            y_high,
-            index);
-
-        T g1 = top_diff_this_bin * w1 / count;
-        T g2 = top_diff_this_bin * w2 / count;
-        T g3 = top_diff_this_bin * w3 / count;
-        T g4 = top_diff_this_bin * w4 / count;
-
-        if (x_low >= 0 && x_high >= 0 && y_low >= 0 && y_high >= 0) {
-          // atomic add is not needed for now since it is single threaded
-          add(static_cast<T>(g1), offset_bottom_diff + y_low * width + x_low);
-          add(static_cast<T>(g2), offset_bottom_diff + y_low * width + x_high);
-          add(static_cast<T>(g3), offset_bottom_diff + y_high * width + x_low);
-          add(static_cast<T>(g4), offset_bottom_diff + y_high * width + x_high);
-        } // if
-      } // ix
-    } // iy
-  } // for
-} // ROIAlignBackward
-
-
-
 // TODO remove the dependency on input and use instead its sizes -> save memory
 at::Tensor ROIAlign_backward_cpu(const at::Tensor& grad,
                                  const at::Tensor& rois,
@@ -472,31 +463,179 @@ at::Tensor ROIAlign_backward_cpu(const at::Tensor& grad,
   AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
 
   auto num_rois = rois.size(0);
-  auto grad_input = at::zeros({batch_size, channels, height, width}, grad.options());
 
   // handle possibly empty gradients
   if (grad.numel() == 0) {
-    return grad_input;
+    return at::zeros({batch_size, channels, height, width}, grad.options());
   }
 
-  AT_DISPATCH_FLOATING_TYPES(grad.type(), "ROIAlign_backward", [&] {
-    RoIAlignBackwardFeature_cpu_kernel<scalar_t>(
-         grad.numel(),
-         grad.data<scalar_t>(),
+  // every value is written by the thread owning its row
+  auto grad_input = at::empty({batch_size, channels, height, width}, grad.options());
+
+  // the fp32 gradient of a bin holds its channels contiguously
+  auto grad_ = grad.to(at::kFloat).permute({0, 2, 3, 1}).contiguous();
+  auto rois_ = rois.to(at::kFloat).contiguous();
+  std::vector<int64_t> roi_levels(num_rois, 0);
+  AT_DISPATCH_FLOATING_TYPES_AND(at::ScalarType::BFloat16, grad.scalar_type(), "ROIAlign_backward", [&] {
+    roi_align_backward_kernel<scalar_t>(
+         grad_.data_ptr<float>(),
+         rois_.data_ptr<float>(),
+         roi_levels.data(),
          num_rois,
-         spatial_scale,
-         channels,
-         height,
-         width,
          pooled_height,
          pooled_width,
          sampling_ratio,
-         grad_input.data<scalar_t>(),
-         rois.data<scalar_t>());
+         batch_size,
+         channels,
+         {{grad_input.data_ptr<scalar_t>(), height, width, spatial_scale}});
   });
   return grad_input;
 }
 
+template <typename T>
+static void roi_align_levels_forward(
+    const std::vector<void*>& data,
+    const std::vector<FeatureLayout>& layouts,
+    const std::vector<double>& spatial_scales,
+    const float* rois,
+    const int64_t* roi_levels,
+    const int64_t num_rois,
+    const int64_t pooled_height,
+    const int64_t pooled_width,
+    const int64_t sampling_ratio,
+    void* output) {
+  std::vector<FeatureLevel<T>> levels;
+  for (size_t l = 0; l < data.size(); l++) {
+    levels.push_back({static_cast<const T*>(data[l]), layouts[l], static_cast<float>(spatial_scales[l])});
+  }
+  roi_align_forward_kernel<T>(levels, rois, roi_levels, num_rois, pooled_height, pooled_width, sampling_ratio, static_cast<T*>(output));
+}
+
+// Pools each ROI from the level of the feature pyramid the FPN rule assigns it
+// to, into a nchw dil tensor. The levels are read in place when they all are
+// supported dil tensors of a data type, and as public tensors of a common data
+// type otherwise.
+at::Tensor ROIAlign_multilevel_forward_impl(const std::vector<at::Tensor>& inputs,
+                                            const at::Tensor& rois,
+                                            const std::vector<double>& spatial_scales,
+                                            const int pooled_height,
+                                            const int pooled_width,
+                                            const int sampling_ratio,
+                                            const double canonical_scale,
+                                            const int64_t canonical_level) {
+  auto num_rois = rois.size(0);
+  auto rois_ = rois.to(at::kFloat).contiguous();
+  auto roi_levels = roi_levels_of(rois_.data_ptr<float>(), num_rois, spatial_scales, canonical_scale, canonical_level);
+
+  std::vector<dil::tensor> dil_inputs;
+  for (const auto& input : inputs) {
+    if (!cpu::ShadeDataContext::isDilTensor(input)) {
+      break;
+    }
+    auto dil_input = cpu::dbl::comm::try_gen_dil_tensor(input);
+    if (!is_supported_dil_tensor(dil_input) ||
+        (!dil_inputs.empty() && dil_input.get_data_type() != dil_inputs[0].get_data_type())) {
+      break;
+    }
+    dil_inputs.push_back(dil_input);
+  }
+
+  std::vector<at::Tensor> cpu_inputs;
+  std::vector<FeatureLayout> layouts;
+  std::vector<void*> data;
+  dil::data_type data_type;
+  if (dil_inputs.size() == inputs.size()) {
+    data_type = dil_inputs[0].get_data_type();
+    for (const auto& dil_input : dil_inputs) {
+      layouts.push_back(layout_of(dil_input));
+      data.push_back(dil_input.get_data_handle());
+    }
+  } else {
+    bool is_bf16 = true;
+    for (const auto& input : inputs) {
+      cpu_inputs.push_back(bridge::shallowFallbackToCPUTensor(input));
+      is_bf16 = is_bf16 && cpu_inputs.back().scalar_type() == at::kBFloat16;
+    }
+    data_type = is_bf16 ? dil::data_type::bf16 : dil::data_type::f32;
+    for (auto& cpu_input : cpu_inputs) {
+      cpu_input = cpu_input.to(is_bf16 ? at::kBFloat16 : at::kFloat);
+      layouts.push_back(layout_of(cpu_input));
+      data.push_back(cpu_input.data_ptr());
+    }
+  }
+
+  auto channels = layouts[0].channels;
+  for (const auto& layout : layouts) {
+    TORCH_CHECK(layout.channels == channels, "ROIAlign: the levels should have the same number of channels");
+  }
+
+  dil::tensor output {{num_rois, channels, pooled_height, pooled_width}, data_type};
+  if (data_type == dil::data_type::bf16) {
+    roi_align_levels_forward<at::BFloat16>(data, layouts, spatial_scales, rois_.data_ptr<float>(), roi_levels.data(),
+        num_rois, pooled_height, pooled_width, sampling_ratio, output.get_data_handle());
+  } else {
+    roi_align_levels_forward<float>(data, layouts, spatial_scales, rois_.data_ptr<float>(), roi_levels.data(),
+        num_rois, pooled_height, pooled_width, sampling_ratio, output.get_data_handle());
+  }
+  return cpu::dbl::comm::gen_aten_tensor_by(std::move(output));
+}
+
+std::vector<at::Tensor> ROIAlign_multilevel_backward_cpu(const at::Tensor& grad,
+                                                         const at::Tensor& rois,
+                                                         const std::vector<double>& spatial_scales,
+                                                         const int pooled_height,
+                                                         const int pooled_width,
+                                                         const int batch_size,
+                                                         const int channels,
+                                                         const std::vector<int64_t>& heights,
+                                                         const std::vector<int64_t>& widths,
+                                                         const int sampling_ratio,
+                                                         const double canonical_scale,
+                                                         const int64_t canonical_level) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto num_levels = spatial_scales.size();
+  std::vector<at::Tensor> grad_inputs;
+
+  // handle possibly empty gradients
+  if (grad.numel() == 0) {
+    for (size_t l = 0; l < num_levels; l++) {
+      grad_inputs.push_back(at::zeros({batch_size, channels, heights[l], widths[l]}, grad.options()));
+    }
+    return grad_inputs;
+  }
+
+  // every value is written by the thread owning its row
+  for (size_t l = 0; l < num_levels; l++) {
+    grad_inputs.push_back(at::empty({batch_size, channels, heights[l], widths[l]}, grad.options()));
+  }
+
+  // the fp32 gradient of a bin holds its channels contiguously
+  auto grad_ = grad.to(at::kFloat).permute({0, 2, 3, 1}).contiguous();
+  auto rois_ = rois.to(at::kFloat).contiguous();
+  auto roi_levels = roi_levels_of(rois_.data_ptr<float>(), num_rois, spatial_scales, canonical_scale, canonical_level);
+  AT_DISPATCH_FLOATING_TYPES_AND(at::ScalarType::BFloat16, grad.scalar_type(), "ROIAlign_multilevel_backward", [&] {
+    std::vector<GradLevel<scalar_t>> levels;
+    for (size_t l = 0; l < num_levels; l++) {
+      levels.push_back({grad_inputs[l].data_ptr<scalar_t>(), heights[l], widths[l], static_cast<float>(spatial_scales[l])});
+    }
+    roi_align_backward_kernel<scalar_t>(
+         grad_.data_ptr<float>(),
+         rois_.data_ptr<float>(),
+         roi_levels.data(),
+         num_rois,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         batch_size,
+         channels,
+         levels);
+  });
+  return grad_inputs;
+}
+
 at::Tensor IpexExternal::ROIAlign_forward(const at::Tensor& input,
                                 const at::Tensor& rois,
                                 const float spatial_scale,
@@ -511,6 +650,14 @@ at::Tensor IpexExternal::ROIAlign_forward(const at::Tensor& input,
 #endif
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(input.layout() == c10::kStrided);
   TORCH_INTERNAL_ASSERT_DEBUG_ONLY(rois.layout() == c10::kStrided);
+  // pool the blocked and bf16 dil tensors without reordering them to public fp32
+  if (cpu::ShadeDataContext::isDilTensor(input) && rois.size(0) > 0) {
+    auto dil_input = cpu::dbl::comm::try_gen_dil_tensor(input);
+    if (is_supported_dil_tensor(dil_input)) {
+      auto&& _ipex_rois = bridge::shallowFallbackToCPUTensor(rois);
+      return ROIAlign_forward_dil(dil_input, _ipex_rois, spatial_scale, pooled_height, pooled_width, sampling_ratio);
+    }
+  }
   auto&& _ipex_input = bridge::shallowFallbackToCPUTensor(input);
   auto&& _ipex_rois = bridge::shallowFallbackToCPUTensor(rois);
   auto&& _ipex_output = ROIAlign_forward_cpu(_ipex_input, _ipex_rois, spatial_scale, pooled_height, pooled_width, sampling_ratio);
@@ -543,5 +690,51 @@ at::Tensor IpexExternal::ROIAlign_backward(const at::Tensor& grad,
   return bridge::shallowUpgradeToDPCPPTensor(_ipex_grad_input);
 }
 
+at::Tensor IpexExternal::ROIAlign_multilevel_forward(const std::vector<at::Tensor>& inputs,
+                                                     const at::Tensor& rois,
+                                                     const std::vector<double>& spatial_scales,
+                                                     const int pooled_height,
+                                                     const int pooled_width,
+                                                     const int sampling_ratio,
+                                                     const double canonical_scale,
+                                                     const int64_t canonical_level) {
+#if defined(IPEX_DISP_OP)
+  printf("IpexExternal::ROIAlign_multilevel_forward\n");
+#endif
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("IpexExternal::ROIAlign_multilevel_forward", std::vector<c10::IValue>({}));
+#endif
+  TORCH_CHECK(!inputs.empty() && inputs.size() == spatial_scales.size(), "ROIAlign: a spatial scale is expected for each level");
+  if (rois.size(0) == 0) {
+    return at::empty({0, inputs[0].size(1), pooled_height, pooled_width}, inputs[0].options());
+  }
+  auto&& _ipex_rois = bridge::shallowFallbackToCPUTensor(rois);
+  return ROIAlign_multilevel_forward_impl(inputs, _ipex_rois, spatial_scales, pooled_height, pooled_width, sampling_ratio, canonical_scale, canonical_level);
 }
 
+std::vector<at::Tensor> IpexExternal::ROIAlign_multilevel_backward(const at::Tensor& grad,
+                                                                   const at::Tensor& rois,
+                                                                   const std::vector<double>& spatial_scales,
+                                                                   const int pooled_height,
+                                                                   const int pooled_width,
+                                                                   const int batch_size,
+                                                                   const int channels,
+                                                                   const std::vector<int64_t>& heights,
+                                                                   const std::vector<int64_t>& widths,
+                                                                   const int sampling_ratio,
+                                                                   const double canonical_scale,
+                                                                   const int64_t canonical_level) {
+#if defined(IPEX_DISP_OP)
+  printf("IpexExternal::ROIAlign_multilevel_backward\n");
+#endif
+#if defined(IPEX_PROFILE_OP)
+  RECORD_FUNCTION("IpexExternal::ROIAlign_multilevel_backward", std::vector<c10::IValue>({}));
+#endif
+  TORCH_CHECK(spatial_scales.size() == heights.size() && spatial_scales.size() == widths.size(), "ROIAlign: a spatial scale is expected for each level");
+  auto&& _ipex_grad = bridge::shallowFallbackToCPUTensor(grad);
+  auto&& _ipex_rois = bridge::shallowFallbackToCPUTensor(rois);
+  auto&& _ipex_grad_inputs = ROIAlign_multilevel_backward_cpu(_ipex_grad, _ipex_rois, spatial_scales, pooled_height, pooled_width, batch_size, channels, heights, widths, sampling_ratio, canonical_scale, canonical_level);
+  return bridge::shallowUpgradeToDPCPPTensorVec(_ipex_grad_inputs);
+}
+
+}
@@ -37,5 +37,7 @@
 #include <iostream>
 
 #include "operators/embedding_bag.hpp"
+#include "operators/multi_tensor.hpp"
+#include "operators/optimizer.hpp"
 
 #endif
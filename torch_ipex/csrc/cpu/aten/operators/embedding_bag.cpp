@@ -1,7 +1,14 @@
 #include "embedding_bag.hpp"
 #include "aten_ipex_bridge.h"
+#include "torch_ipex/csrc/utils.h"
+#include "torch_ipex/csrc/auto_opt_config.h"
 #include "cpu/bf16/vec/bf16_vec_kernel.h"
 
+#include <algorithm>
+#include <atomic>
+#include <cmath>
+#include <cstring>
+
 namespace torch_ipex {
 namespace cpu {
 namespace aten {
@@ -25,12 +32,129 @@ static inline bool is_bfloat16_tensor(const at::Tensor tensor_) {
   return false;
 }
 
-bool embedding_bag_fast_path_sum(const at::Tensor weight, const at::Tensor per_sample_weights, int64_t mode) {
-  if ((mode != MODE_SUM) || (weight.stride(1) != 1) || per_sample_weights.defined()) return false;
+bool embedding_bag_fast_path(const at::Tensor weight, const at::Tensor per_sample_weights, int64_t mode) {
+  if ((mode != MODE_SUM) && (mode != MODE_MEAN) && (mode != MODE_MAX)) return false;
+  if (weight.stride(1) != 1) return false;
   if ((weight.scalar_type() != at::kFloat) && (weight.scalar_type() != at::kBFloat16)) return false;
+  // per_sample_weights only weight the sum mode
+  if (per_sample_weights.defined() &&
+      ((mode != MODE_SUM) || (per_sample_weights.scalar_type() != weight.scalar_type()))) return false;
   return true;
 }
 
+// offsets is its own offset2bag only if every bag holds exactly one lookup,
+// which the sizes alone do not tell with empty bags or an included last offset.
+// The offsets are scanned in parallel, every thread stopping at the first bag
+// of another size found by any of them.
+static inline bool is_one_lookup_per_bag(const at::Tensor indices, const at::Tensor offsets) {
+  if (offsets.numel() != indices.numel()) return false;
+  auto offsets_ = offsets.contiguous();
+  auto offsets_data = offsets_.data_ptr<int64_t>();
+  std::atomic<bool> one_lookup_per_bag(true);
+  at::parallel_for(0, offsets.numel(), 4096, [&](int64_t start, int64_t end) {
+    for (int64_t i = start; i < end && one_lookup_per_bag.load(std::memory_order_relaxed); i += 4096) {
+      auto block_end = std::min(i + 4096, end);
+      for (int64_t j = i; j < block_end; j++) {
+        if (offsets_data[j] != j) {
+          one_lookup_per_bag.store(false, std::memory_order_relaxed);
+          return;
+        }
+      }
+    }
+  });
+  return one_lookup_per_bag.load();
+}
+
+static inline at::Tensor get_offset2bag(const at::Tensor indices, const at::Tensor offsets) {
+  if (is_one_lookup_per_bag(indices, offsets)) return offsets;
+  auto offset2bag = at::native::full({indices.sizes()[0] + 1}, 0, indices.options());
+  make_offset2bag(offsets, indices, offset2bag);
+  offset2bag.resize_({indices.sizes()[0]});
+  return offset2bag;
+}
+
+static inline void prefetch_row(const void* row, int64_t bytes) {
+  auto* ptr = reinterpret_cast<const char*>(row);
+  for (int64_t offset = 0; offset < bytes; offset += 64) {
+    _mm_prefetch(ptr + offset, _MM_HINT_T0);
+  }
+}
+
+// Accumulates the rows of the lookups [start, end) into out, scaled by their
+// weights if any. prefetch(s) is called before the row of the lookup s is read.
+template<typename F>
+static inline void bag_sum(float* out, float* src_data, const int64_t* indices_data, const float* weights_data,
+    int64_t start, int64_t end, int64_t ddim, const F& prefetch) {
+  for (int64_t s = start; s < end; s++) {
+    prefetch(s);
+    float* select_data_ptr = &src_data[indices_data[s] * ddim];
+    if (weights_data != nullptr) {
+      madd_ker(out, select_data_ptr, ddim, weights_data[s]);
+    } else {
+      add_ker(out, select_data_ptr, ddim);
+    }
+  }
+}
+
+// The bf16 rows are accumulated two at a time, AVX512_BF16 hosts multiply both
+// of them by their weights with one vdpbf16ps.
+template<typename F>
+static inline void bag_sum(float* out, at::BFloat16* src_data, const int64_t* indices_data,
+    const at::BFloat16* weights_data, int64_t start, int64_t end, int64_t ddim, const F& prefetch) {
+  const at::BFloat16 one(1.f);
+  int64_t s = start;
+  for (; s + 1 < end; s += 2) {
+    prefetch(s + 1);
+    madd2_ker(out, &src_data[indices_data[s] * ddim], &src_data[indices_data[s + 1] * ddim],
+              weights_data != nullptr ? weights_data[s] : one, weights_data != nullptr ? weights_data[s + 1] : one, ddim);
+  }
+  if (s < end) {
+    prefetch(s);
+    at::BFloat16* select_data_ptr = &src_data[indices_data[s] * ddim];
+    if (weights_data != nullptr) {
+      madd_ker(out, select_data_ptr, ddim, float(weights_data[s]));
+    } else {
+      add_ker(out, select_data_ptr, ddim);
+    }
+  }
+}
+
+static const auto no_prefetch = [](int64_t) {};
+
+// Sum the bags [start, end) visiting their lookups in index order, so that a
+// row shared by several bags is loaded from memory once and the duplicated
+// lookups of a hot row hit the cache.
+template<typename T>
+static inline void embedding_bag_sum_sorted(const int64_t* indices_data, T* src_data, T* output_data,
+    const int64_t* offsets_data, int64_t start, int64_t end, int64_t ddim, int64_t prefetch_distance) {
+  auto entries_start = offsets_data[start];
+  auto entries_end = offsets_data[end];
+  std::vector<std::pair<int64_t, int64_t>> lookups;
+  lookups.reserve(entries_end - entries_start);
+  for (int64_t i = start; i < end; i++) {
+    for (int64_t s = offsets_data[i]; s < offsets_data[i + 1]; s++) {
+      lookups.emplace_back(indices_data[s], i);
+    }
+  }
+  std::sort(lookups.begin(), lookups.end());
+  std::vector<float> temp_output((end - start) * ddim);
+  float* temp_output_data = temp_output.data();
+  zero_ker(temp_output_data, (end - start) * ddim);
+  int64_t num_lookups = lookups.size();
+  int64_t row_bytes = ddim * sizeof(T);
+  for (int64_t p = 0; p < num_lookups; p++) {
+    if (prefetch_distance > 0 && p + prefetch_distance < num_lookups &&
+        lookups[p + prefetch_distance].first != lookups[p + prefetch_distance - 1].first) {
+      prefetch_row(&src_data[lookups[p + prefetch_distance].first * ddim], row_bytes);
+    }
+    add_ker(&temp_output_data[(lookups[p].second - start) * ddim], &src_data[lookups[p].first * ddim], ddim);
+  }
+  for (int64_t i = start; i < end; i++) {
+    move_ker(&output_data[i * ddim], &temp_output_data[(i - start) * ddim], ddim);
+  }
+}
+
+// Sum of the bags, accumulated in fp32 whatever the type of the table.
 template<typename T>
 static inline at::Tensor _embedding_bag_index_add_select_fast(const at::Tensor select_indices,
     const at::Tensor src, const at::Tensor offsets,  bool include_last_offset) {
@@ -63,36 +187,119 @@ static inline at::Tensor _embedding_bag_index_add_select_fast(const at::Tensor s
 
   at::Tensor output = at::empty({output_size, src.size(1)}, src.options());
   auto* output_data = output.data_ptr<T>();
-  auto indices_accessor = select_indices.accessor<int64_t, 1>();
+  at::Tensor indices_ = select_indices.contiguous();
+  auto* indices_data = indices_.data_ptr<int64_t>();
+  auto& config = AutoOptConfig::singleton();
+  int64_t prefetch_distance = config.get_embedding_bag_prefetch_distance();
+  bool sort_indices = config.get_embedding_bag_sort_indices();
+  int64_t row_bytes = ddim * sizeof(T);
   at::parallel_for(0, output_size, 16, [&](int64_t start, int64_t end) {
+    // the lookups of a thread are the contiguous range of its bags
+    auto entries_start = offsets_data[start];
+    auto entries_end = offsets_data[end];
+    if (sort_indices) {
+      embedding_bag_sum_sorted(indices_data, src_data, output_data, offsets_data, start, end, ddim, prefetch_distance);
+      return;
+    }
+    // the prefetch stream runs ahead across the bag boundaries
+    int64_t prefetched = entries_start;
+    auto prefetch = [&](int64_t s) {
+      int64_t ahead = std::min(s + prefetch_distance, entries_end);
+      for (; prefetched < ahead; prefetched++) {
+        prefetch_row(&src_data[indices_data[prefetched] * ddim], row_bytes);
+      }
+    };
+    std::vector<float> temp_output(ddim);
+    float* out_data_ptr = temp_output.data();
+    for (int64_t i = start; i < end; i++) {
+      zero_ker(out_data_ptr, ddim);
+      bag_sum(out_data_ptr, src_data, indices_data, (T*)nullptr, offsets_data[i], offsets_data[i + 1], ddim, prefetch);
+      move_ker(&output_data[i * ddim], out_data_ptr, ddim);
+    }
+  });
+
+  return output;
+}
+
+// Mean, max or per_sample_weights weighted sum of the bags, accumulated in
+// fp32. Returns {output, offset2bag, bag_size, max_indices} like ATen, where
+// offset2bag is left empty and max_indices holds, for the max mode, the row
+// every output element comes from (0 for an empty bag).
+template<typename T>
+static inline std::vector<at::Tensor> _embedding_bag_index_reduce_fast(const at::Tensor select_indices,
+    const at::Tensor src, const at::Tensor offsets, bool include_last_offset, int64_t mode,
+    const at::Tensor per_sample_weights) {
+  int64_t ddim = src.size(1);
+  auto* src_data = src.data_ptr<T>();
+  int64_t indices_numel = select_indices.numel();
+  int64_t offsets_numel = offsets.numel();
+  int64_t output_size = include_last_offset ? offsets_numel - 1 : offsets_numel;
+  int64_t* offsets_data = offsets.data_ptr<int64_t>();
+  at::Tensor indices_ = select_indices.contiguous();
+  auto* indices_data = indices_.data_ptr<int64_t>();
+  at::Tensor weights_ = per_sample_weights.defined() ? per_sample_weights.contiguous() : per_sample_weights;
+  T* weights_data = weights_.defined() ? weights_.data_ptr<T>() : nullptr;
+
+  at::Tensor output = at::empty({output_size, ddim}, src.options());
+  at::Tensor bag_size = at::empty({output_size}, offsets.options());
+  at::Tensor max_indices = (mode == MODE_MAX) ? at::zeros({output_size, ddim}, offsets.options())
+                                              : at::empty({0}, offsets.options());
+  auto* output_data = output.data_ptr<T>();
+  auto* bag_size_data = bag_size.data_ptr<int64_t>();
+  auto* max_indices_data = (mode == MODE_MAX) ? max_indices.data_ptr<int64_t>() : nullptr;
+  at::parallel_for(0, output_size, 16, [&](int64_t start, int64_t end) {
+    std::vector<float> temp_output(ddim);
+    float* out_data_ptr = temp_output.data();
     for (int64_t i = start; i < end; i++) {
-      auto* out_data_ptr = &output_data[i * ddim];
-      zero_ker((T*)out_data_ptr, ddim);
       auto inputs_start = offsets_data[i];
-      auto inputs_end = offsets_data[i + 1];
-      for (int64_t s = inputs_start; s < inputs_end; s++) {
-        T* select_data_ptr = &src_data[indices_accessor[s] * ddim];
-        add_ker((T *)out_data_ptr, (T *)select_data_ptr, ddim);
+      auto inputs_end = (i + 1 < offsets_numel) ? offsets_data[i + 1] : indices_numel;
+      bag_size_data[i] = inputs_end - inputs_start;
+      zero_ker(out_data_ptr, ddim);
+      if (mode == MODE_MAX) {
+        if (inputs_end > inputs_start) {
+          auto* max_indices_ptr = &max_indices_data[i * ddim];
+          auto first = indices_data[inputs_start];
+          add_ker(out_data_ptr, (T*)&src_data[first * ddim], ddim);
+          std::fill(max_indices_ptr, max_indices_ptr + ddim, first);
+          for (int64_t s = inputs_start + 1; s < inputs_end; s++) {
+            auto index = indices_data[s];
+            max_ker(out_data_ptr, max_indices_ptr, &src_data[index * ddim], index, ddim);
+          }
+        }
+      } else {
+        bag_sum(out_data_ptr, src_data, indices_data, weights_data, inputs_start, inputs_end, ddim, no_prefetch);
+        if ((mode == MODE_MEAN) && (inputs_end > inputs_start)) {
+          scale_ker(out_data_ptr, 1.f / (inputs_end - inputs_start), ddim);
+        }
       }
+      move_ker((T*)&output_data[i * ddim], out_data_ptr, ddim);
     }
   });
 
-  return output;
+  return {output, at::empty({0}, offsets.options()), bag_size, max_indices};
 }
 
-at::Tensor embedding_bag_impl(const at::Tensor & weight, const at::Tensor & indices,
+std::vector<at::Tensor> embedding_bag_impl(const at::Tensor & weight, const at::Tensor & indices,
   const at::Tensor & offsets, bool scale_grad_by_freq, int64_t mode, bool sparse,
   const at::Tensor & per_sample_weights, bool include_last_offset) {
 
   at::Tensor offsets_ = offsets.is_contiguous()? offsets : offsets.contiguous();
 
+  if ((mode != MODE_SUM) || per_sample_weights.defined()) {
+    if (is_bfloat16_tensor(weight)) {
+      return _embedding_bag_index_reduce_fast<at::BFloat16>(indices, weight, offsets_, include_last_offset, mode, per_sample_weights);
+    } else {
+      return _embedding_bag_index_reduce_fast<float>(indices, weight, offsets_, include_last_offset, mode, per_sample_weights);
+    }
+  }
+
   at::Tensor output;
   if(is_bfloat16_tensor(weight)) {
       output = _embedding_bag_index_add_select_fast<at::BFloat16>(indices, weight, offsets_, include_last_offset);
   } else {
       output = _embedding_bag_index_add_select_fast<float>(indices, weight, offsets_, include_last_offset);
   }
-  return output;
+  return {output};
 }
 
 static inline at::Tensor expand_values_if_needed(const at::Tensor& values) {
@@ -115,146 +322,317 @@ at::Tensor _sparse_coo_tensor_unsafe(const at::Tensor& indices, const at::Tensor
   return at::native::new_with_dims_and_tensor_sparse(sparse_dim, dense_dim, size, indices, values, options.dtype().toScalarType(), at::kSparse);
 }
 
-template<typename T>
-static inline at::Tensor embedding_bag_sparse_backward_sum_fast(
-    const at::Tensor grad, const at::Tensor indices,
-    const at::Tensor offsets, int num_weights, int mode) {
-
-  assert((mode == MODE_SUM) && (grad.stride(1) == 1));
+// Splitters partitioning the rows of the entries into num_buckets ranges of
+// about the same number of entries, chosen from a regular sample of entries.
+// Equal rows always fall into the same range.
+template<typename RowOf>
+static inline std::vector<int64_t>
+sample_splitters(const RowOf& row_of, int64_t num_entries, int64_t num_buckets) {
+  const int64_t oversampling = 32;
+  int64_t sample_size = std::min(num_entries, num_buckets * oversampling);
+  std::vector<int64_t> sample(sample_size);
+  for (int64_t i = 0; i < sample_size; i++) {
+    sample[i] = row_of(i * num_entries / sample_size);
+  }
+  std::sort(sample.begin(), sample.end());
+  std::vector<int64_t> splitters(num_buckets - 1);
+  for (int64_t k = 1; k < num_buckets; k++) {
+    splitters[k - 1] = sample[k * sample_size / num_buckets];
+  }
+  return splitters;
+}
 
-  int64_t indices_size0 = indices.size(0);
-  int64_t ddim = grad.size(1);
-  at::Tensor index_grad = at::empty({indices_size0, ddim}, grad.options());
-  int grad_stride0 = grad.stride(0);
+// Row-sparse gradient of the weight, the sorted unique rows {1, unique} and
+// the accumulated gradient of their rows {unique, ddim}, from num_entries
+// entries each going to the row row_of(entry). The rows of the table which
+// are not used by the batch are never touched.
+//
+// The (row, entry) pairs are radix partitioned by row range into one bucket
+// per thread, and every thread sorts and reduces its own bucket, so each pair
+// is visited a constant number of times whatever the number of threads. The
+// gradient of a row is accumulated in fp32 by accumulate(temp_output, entry),
+// in the order of the entries.
+template<typename T, typename RowOf, typename Accumulate>
+static inline std::tuple<at::Tensor, at::Tensor> reduce_rows(int64_t num_entries, const RowOf& row_of,
+    int64_t ddim, const at::Tensor indices, const at::Tensor grad, const Accumulate& accumulate,
+    int64_t max_threads) {
 
-  auto offsets_accessor = offsets.accessor<int64_t, 1>();
-  auto offset_numel = offsets.numel();
+  if (num_entries == 0) {
+    return std::make_tuple(at::empty({1, 0}, indices.options()), at::empty({0, ddim}, grad.options()));
+  }
+  max_threads = (num_entries < max_threads) ? num_entries : max_threads;
+  auto splitters = sample_splitters(row_of, num_entries, max_threads);
+  auto bucket_of = [&](int64_t row) -> int64_t {
+    return std::upper_bound(splitters.begin(), splitters.end(), row) - splitters.begin();
+  };
 
-  T* gradout_data = index_grad.data_ptr<T>();
-  T* grad_data = grad.data_ptr<T>();
-  at::parallel_for(0, offset_numel, 16, [&](int64_t start, int64_t end) {
-    for(auto mb = start; mb < end; mb++) {
-      int64_t select_off_start = offsets_accessor[mb];
-      int64_t select_off_end = (mb < (offset_numel - 1) ? offsets_accessor[mb + 1] : indices_size0);
-      auto grad_block = grad_data + grad_stride0 * mb;
-      for (int64_t s = select_off_start; s < select_off_end; s++) {
-        move_ker((T*)(gradout_data + ddim * s), (T*)grad_block, ddim);
+  // count the pairs every thread sends to every bucket ...
+  std::vector<int64_t> chunk_sum_size(max_threads + 1);
+  for (int64_t t = 0; t <= max_threads; t++) {
+    chunk_sum_size[t] = t * num_entries / max_threads;
+  }
+  std::vector<int64_t> bucket_count(max_threads * max_threads, 0);
+  at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
+    for (int64_t t = start; t < end; t++) {
+      auto* count = &bucket_count[t * max_threads];
+      for (int64_t mb = chunk_sum_size[t]; mb < chunk_sum_size[t + 1]; mb++) {
+        count[bucket_of(row_of(mb))]++;
       }
     }
   });
+  // ... to know where it writes them, bucket by bucket
+  std::vector<int64_t> bucket_offset(max_threads * max_threads);
+  std::vector<int64_t> bucket_sum_size(max_threads + 1);
+  int64_t offset = 0;
+  for (int64_t k = 0; k < max_threads; k++) {
+    bucket_sum_size[k] = offset;
+    for (int64_t t = 0; t < max_threads; t++) {
+      bucket_offset[t * max_threads + k] = offset;
+      offset += bucket_count[t * max_threads + k];
+    }
+  }
+  bucket_sum_size[max_threads] = offset;
 
-  int64_t num_features = index_grad.size(-1);
-  auto weight_size = std::array<int64_t, 2>{{ num_weights, num_features }};
-  auto dense_options = index_grad.options();
+  std::vector<std::pair<int64_t, int64_t>> pairs(num_entries);
+  at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
+    for (int64_t t = start; t < end; t++) {
+      auto* dst = &bucket_offset[t * max_threads];
+      for (int64_t mb = chunk_sum_size[t]; mb < chunk_sum_size[t + 1]; mb++) {
+        auto row = row_of(mb);
+        pairs[dst[bucket_of(row)]++] = std::make_pair(row, mb);
+      }
+    }
+  });
 
-  if (index_grad.numel() == 0) {
-    return _sparse_coo_tensor_unsafe(at::empty({1, 0}, indices.options()),
-                                         at::empty({0, num_features}, dense_options),
-                                         weight_size);
+  // sort every bucket and count its unique rows
+  std::vector<int64_t> uniq_sum_size(max_threads + 1, 0);
+  at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
+    for (int64_t k = start; k < end; k++) {
+      auto first = pairs.begin() + bucket_sum_size[k];
+      auto last = pairs.begin() + bucket_sum_size[k + 1];
+      std::sort(first, last);
+      int64_t uniq = 0;
+      for (auto it = first; it != last; it++) {
+        uniq += (it == first || it->first != (it - 1)->first);
+      }
+      uniq_sum_size[k + 1] = uniq;
+    }
+  });
+  for (int64_t k = 0; k < max_threads; k++) {
+    uniq_sum_size[k + 1] += uniq_sum_size[k];
   }
+  int64_t unique_indices = uniq_sum_size[max_threads];
 
-  auto index = indices.reshape({1, -1});
-  auto values = index_grad.reshape({-1, num_features});
-
-  return _sparse_coo_tensor_unsafe(index, values, weight_size);
-}
+  at::Tensor rows = at::empty({1, unique_indices}, indices.options());
+  at::Tensor values = at::empty({unique_indices, ddim}, grad.options());
+  auto* rows_data = rows.data_ptr<int64_t>();
+  T* values_data = values.data_ptr<T>();
 
-static inline int64_t
-count_and_map_uniq(const at::TensorAccessor<int64_t, 1>& indices_accessor, int64_t indices_length, std::vector<int64_t>& indices_to_index, std::vector<int64_t>& index_to_indices) {
-  int64_t u = 0;
-  for (int64_t i = 0; i < indices_length; i++) {
-    int64_t indices = indices_accessor[i];
-    if (indices_to_index[indices] == -1ull) {
-      indices_to_index[indices] = u;
-      index_to_indices[u] = indices;
-      u++;
+  at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
+    std::vector<float> temp_grad_weight(ddim);
+    float* temp_output = temp_grad_weight.data();
+    for (int64_t k = start; k < end; k++) {
+      int64_t row = uniq_sum_size[k];
+      int64_t n = bucket_sum_size[k];
+      while (n < bucket_sum_size[k + 1]) {
+        auto index = pairs[n].first;
+        zero_ker(temp_output, ddim);
+        for (; n < bucket_sum_size[k + 1] && pairs[n].first == index; n++) {
+          accumulate(temp_output, pairs[n].second);
+        }
+        rows_data[row] = index;
+        move_ker((T*)(values_data + row * ddim), temp_output, ddim);
+        row++;
+      }
     }
-  }
-  return u;
+  });
+
+  return std::make_tuple(rows, values);
 }
 
+// Row-sparse gradient of the sum and mean modes, every entry of indices adds
+// the gradient of its bag to its row. The rows of grad are the bags, they may
+// be strided but their features must be contiguous. The mean mode scales
+// every entry by the inverse of its bag size and per_sample_weights by its
+// weight.
 template<typename T>
-static inline at::Tensor embedding_bag_dense_backward_sum_fast(const at::Tensor grad, const at::Tensor indices, const at::Tensor offsets, int num_weights, int mode) {
+static inline std::tuple<at::Tensor, at::Tensor> embedding_bag_backward_sum_rows(const at::Tensor grad, const at::Tensor indices, const at::Tensor offsets,
+    int64_t mode, const at::Tensor per_sample_weights, int64_t max_threads = at::get_num_threads()) {
 
   int64_t indices_numel = indices.numel();
-  assert((mode == MODE_SUM) && (grad.stride(1) == 1) && (indices_numel > 0));
   auto offset_numel = offsets.numel();
-  at::Tensor offset2bag_ ;
-  if (offset_numel != indices_numel) {
-    offset2bag_ = at::native::full({indices.sizes()[0] + 1}, 0, indices.options());
-    make_offset2bag(offsets, indices, offset2bag_);
-    offset2bag_.resize_({indices.sizes()[0]});
-  } else {
-    offset2bag_ = offsets;
-  }
+  at::Tensor offset2bag_ = get_offset2bag(indices, offsets);
   auto indices_accessor = indices.accessor<int64_t, 1>();
-  std::vector<int64_t> indices_to_index(num_weights, -1ull);
-  std::vector<int64_t> index_to_indices;
-  index_to_indices.reserve(num_weights);
-  int64_t unique_indices = count_and_map_uniq(indices_accessor, indices_numel, indices_to_index, index_to_indices);
+  auto offset2bag_accessor = offset2bag_.accessor<int64_t, 1>();
 
-  int max_threads = at::get_num_threads();
-  max_threads = (unique_indices < max_threads) ? unique_indices : max_threads;
-  int64_t avg_chunk_down = unique_indices / max_threads;
-  std::vector<int64_t> chuck_size(max_threads);
-  std::vector<int64_t> chuck_sum_size(max_threads + 1);
-  for (auto i = 0; i < max_threads; i++) {
-    chuck_size[i] = avg_chunk_down;
-  }
-  //make chunk balance among threads as 211
-  for (auto i = 0 ; i < unique_indices % max_threads ; i++) {
-    chuck_size[i] += 1;
+  std::vector<float> entry_scales;
+  if (per_sample_weights.defined()) {
+    auto weights_ = per_sample_weights.contiguous();
+    T* weights_data = weights_.data_ptr<T>();
+    entry_scales.resize(indices_numel);
+    for (int64_t mb = 0; mb < indices_numel; mb++) {
+      entry_scales[mb] = float(weights_data[mb]);
+    }
+  } else if (mode == MODE_MEAN) {
+    auto offsets_accessor = offsets.accessor<int64_t, 1>();
+    entry_scales.resize(indices_numel);
+    for (int64_t mb = 0; mb < indices_numel; mb++) {
+      auto bag = offset2bag_accessor[mb];
+      auto bag_end = (bag + 1 < offset_numel) ? offsets_accessor[bag + 1] : indices_numel;
+      entry_scales[mb] = 1.f / (bag_end - offsets_accessor[bag]);
+    }
   }
-  chuck_sum_size[0] = 0;
-  for (auto i = 1; i < max_threads; i++) {
-    chuck_sum_size[i] = chuck_sum_size[i - 1] + chuck_size[i - 1];
+
+  int64_t ddim = grad.size(1);
+  int64_t grad_stride0 = grad.stride(0);
+  T* grad_data = grad.data_ptr<T>();
+  auto row_of = [&](int64_t mb) { return indices_accessor[mb]; };
+  auto accumulate = [&](float* temp_output, int64_t mb) {
+    auto* grad_block = grad_data + offset2bag_accessor[mb] * grad_stride0;
+    if (entry_scales.empty()) {
+      add_ker(temp_output, (T*)grad_block, ddim);
+    } else {
+      madd_ker(temp_output, grad_block, ddim, entry_scales[mb]);
+    }
+  };
+  return reduce_rows<T>(indices_numel, row_of, ddim, indices, grad, accumulate, max_threads);
+}
+
+// Row-sparse gradient of the max mode, every element of the output gradient
+// goes to the row its forward value comes from, which is recorded in
+// max_indices. The elements are reduced like the entries of the sum mode,
+// keyed by their argmax row, so the rows are reduced in parallel.
+template<typename T>
+static inline std::tuple<at::Tensor, at::Tensor> embedding_bag_backward_max_rows(const at::Tensor grad, const at::Tensor indices,
+    const at::Tensor offsets, const at::Tensor max_indices, int64_t max_threads = at::get_num_threads()) {
+  int64_t indices_numel = indices.numel();
+  int64_t offset_numel = offsets.numel();
+  int64_t bags = grad.size(0);
+  int64_t ddim = grad.size(1);
+  int64_t grad_stride0 = grad.stride(0);
+  auto offsets_accessor = offsets.accessor<int64_t, 1>();
+  auto max_indices_ = max_indices.contiguous();
+  auto* max_indices_data = max_indices_.data_ptr<int64_t>();
+
+  // empty bags have no row to send their gradient to
+  std::vector<int64_t> nonempty_bags;
+  nonempty_bags.reserve(bags);
+  for (int64_t b = 0; b < bags; b++) {
+    auto bag_end = (b + 1 < offset_numel) ? offsets_accessor[b + 1] : indices_numel;
+    if (bag_end > offsets_accessor[b]) nonempty_bags.push_back(b);
   }
-  chuck_sum_size[max_threads] = unique_indices;
+
+  // the entry k * ddim + d is the feature d of the k-th nonempty bag
+  T* grad_data = grad.data_ptr<T>();
+  auto row_of = [&](int64_t entry) {
+    return max_indices_data[nonempty_bags[entry / ddim] * ddim + entry % ddim];
+  };
+  auto accumulate = [&](float* temp_output, int64_t entry) {
+    int64_t d = entry % ddim;
+    temp_output[d] += float(grad_data[nonempty_bags[entry / ddim] * grad_stride0 + d]);
+  };
+  return reduce_rows<T>(nonempty_bags.size() * ddim, row_of, ddim, indices, grad, accumulate, max_threads);
+}
+
+// Gradient of the weight from the row-sparse rows and values. The sparse
+// gradient is returned as is, the rows are unique and sorted, so it is already
+// coalesced and the optimizer and the allreduce can consume it without another
+// pass. A dense gradient has to cover the whole table, use sparse=True to get
+// the row-sparse gradient of a large table instead.
+template<typename T>
+static inline at::Tensor embedding_bag_backward_fast(const at::Tensor grad, const at::Tensor indices,
+    const at::Tensor offsets, const at::Tensor maximum_indices, int64_t num_weights, int64_t mode, bool sparse,
+    const at::Tensor per_sample_weights, int64_t max_threads = at::get_num_threads()) {
+
+  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(grad.stride(1) == 1);
 
   int64_t ddim = grad.size(1);
+  auto weight_size = std::array<int64_t, 2>{{ num_weights, ddim }};
+  if (indices.numel() == 0) {
+    if (sparse) {
+      return _sparse_coo_tensor_unsafe(at::empty({1, 0}, indices.options()),
+                                           at::empty({0, ddim}, grad.options()),
+                                           weight_size);
+    }
+    return at::zeros({num_weights, ddim}, grad.options());
+  }
+
+  at::Tensor rows, values;
+  if (mode == MODE_MAX) {
+    std::tie(rows, values) = embedding_bag_backward_max_rows<T>(grad, indices, offsets, maximum_indices, max_threads);
+  } else {
+    std::tie(rows, values) = embedding_bag_backward_sum_rows<T>(grad, indices, offsets, mode, per_sample_weights, max_threads);
+  }
+
+  if (sparse) {
+    auto index_grad = _sparse_coo_tensor_unsafe(rows, values, weight_size);
+    index_grad._coalesced_(true);
+    return index_grad;
+  }
 
   at::Tensor index_grad_weight = at::empty({num_weights, ddim}, grad.options());
   T* gradout_data = index_grad_weight.data_ptr<T>();
   zero_ker((T*)gradout_data, num_weights * ddim);
 
-  std::vector<float> temp_grad_weight(unique_indices * ddim);
-  float* temp_output = temp_grad_weight.data();
-  zero_ker(temp_output, unique_indices * ddim);
-
-  auto offset2bag_accessor = offset2bag_.accessor<int64_t, 1>();
-  T* grad_data = grad.data_ptr<T>();
-  at::parallel_for(0, max_threads, 0, [&](int64_t start, int64_t end) {
-    for(int k = start; k < end; k++) {
-      int64_t chunk_start = chuck_sum_size[k];
-      int64_t chunk_end = chuck_sum_size[k + 1];
-      for (int64_t mb = 0; mb < indices_numel; mb++) {
-        int64_t indices_num = indices_accessor[mb];
-        int64_t index = indices_to_index[indices_num];
-        if (index >= chunk_start && index < chunk_end) {
-          auto s = offset2bag_accessor[mb];
-          add_ker((float*)(temp_output + index * ddim), (T*)(grad_data + s * ddim), ddim);
-        }
-      }
-      for (int64_t index = chunk_start; index < chunk_end; index++) {
-        auto indices = index_to_indices[index];
-        move_ker((T*)(gradout_data + indices * ddim), (float*)(temp_output + index * ddim), ddim);
-      }
+  int64_t unique_indices = values.size(0);
+  auto rows_data = rows.data_ptr<int64_t>();
+  T* values_data = values.data_ptr<T>();
+  at::parallel_for(0, unique_indices, 16, [&](int64_t start, int64_t end) {
+    for (int64_t index = start; index < end; index++) {
+      move_ker((T*)(gradout_data + rows_data[index] * ddim), (T*)(values_data + index * ddim), ddim);
     }
   });
 
   return index_grad_weight;
 }
 
-bool embedding_bag_backward_fast_path_sum(const at::Tensor grad, const at::Tensor indices, const at::Tensor offset2bag, const at::Tensor per_sample_weights, bool scale_grad_by_freq, int64_t mode) {
+bool embedding_bag_backward_fast_path(const at::Tensor grad, const at::Tensor indices, const at::Tensor offset2bag, const at::Tensor per_sample_weights, bool scale_grad_by_freq, int64_t mode) {
 
   if ((grad.scalar_type() != at::kFloat) && (grad.scalar_type() != at::kBFloat16)) return false;
-  if ((mode != MODE_SUM) || (grad.stride(1) != 1)) return false;
+  if ((mode != MODE_SUM) && (mode != MODE_MEAN) && (mode != MODE_MAX)) return false;
+  if (grad.stride(1) != 1) return false;
   if ((indices.numel() == 0) || (offset2bag.numel() != 0)) return false;
-  if (per_sample_weights.defined() || scale_grad_by_freq) return false;
+  if (scale_grad_by_freq) return false;
+  if (per_sample_weights.defined() &&
+      ((mode != MODE_SUM) || (per_sample_weights.scalar_type() != grad.scalar_type()))) return false;
 
   return true;
 }
 
+template<typename T>
+static inline at::Tensor embedding_bag_per_sample_weights_backward_fast(const at::Tensor grad,
+    const at::Tensor weight, const at::Tensor indices, const at::Tensor offsets) {
+  int64_t indices_numel = indices.numel();
+  int64_t ddim = grad.size(1);
+  int64_t grad_stride0 = grad.stride(0);
+  auto offset2bag_ = get_offset2bag(indices, offsets);
+  auto indices_accessor = indices.accessor<int64_t, 1>();
+  auto offset2bag_accessor = offset2bag_.accessor<int64_t, 1>();
+  T* grad_data = grad.data_ptr<T>();
+  T* weight_data = weight.data_ptr<T>();
+
+  at::Tensor output = at::empty({indices_numel}, grad.options());
+  T* output_data = output.data_ptr<T>();
+  at::parallel_for(0, indices_numel, 64, [&](int64_t start, int64_t end) {
+    for (int64_t mb = start; mb < end; mb++) {
+      output_data[mb] = dot_ker(grad_data + offset2bag_accessor[mb] * grad_stride0,
+                                weight_data + indices_accessor[mb] * ddim, ddim);
+    }
+  });
+  return output;
+}
+
+at::Tensor embedding_bag_per_sample_weights_backward_impl(const at::Tensor & grad, const at::Tensor & weight,
+  const at::Tensor & indices, const at::Tensor & offsets, int64_t mode) {
+  TORCH_INTERNAL_ASSERT_DEBUG_ONLY(mode == MODE_SUM);
+  auto grad_c = grad.contiguous();
+  if (is_bfloat16_tensor(grad)) {
+    return embedding_bag_per_sample_weights_backward_fast<at::BFloat16>(grad_c, weight, indices, offsets);
+  } else {
+    return embedding_bag_per_sample_weights_backward_fast<float>(grad_c, weight, indices, offsets);
+  }
+}
+
 at::Tensor
 embedding_bag_get_offset2bag(const at::Tensor indices, const at::Tensor & offsets, const at::Tensor & offset2bag)
 {
@@ -274,20 +652,387 @@ at::Tensor embedding_bag_backward_impl(const at::Tensor & grad, const at::Tensor
   const at::Tensor & offsets, const at::Tensor & offset2bag, const at::Tensor & bag_size, const at::Tensor & maximum_indices,
   int64_t num_weights, bool scale_grad_by_freq, int64_t mode, bool sparse,
   const at::Tensor & per_sample_weights) {
-  if (sparse) {
-    if (is_bfloat16_tensor(grad)) {
-      return embedding_bag_sparse_backward_sum_fast<at::BFloat16>(grad, indices, offsets, num_weights, mode);
-    } else {
-      return embedding_bag_sparse_backward_sum_fast<float>(grad, indices, offsets, num_weights, mode);
-    } 
+  auto grad_c = grad.contiguous();
+  if (is_bfloat16_tensor(grad)) {
+    return embedding_bag_backward_fast<at::BFloat16>(grad_c, indices, offsets, maximum_indices, num_weights, mode, sparse, per_sample_weights);
   } else {
-    auto grad_c = grad.contiguous();
-    if (is_bfloat16_tensor(grad)) {
-      return embedding_bag_dense_backward_sum_fast<at::BFloat16>(grad_c, indices, offsets, num_weights, mode);
+    return embedding_bag_backward_fast<float>(grad_c, indices, offsets, maximum_indices, num_weights, mode, sparse, per_sample_weights);
+  }
+}
+
+bool embedding_bag_batched_fast_path_sum(const std::vector<at::Tensor> & weights) {
+  if (weights.empty()) return false;
+  for (const auto& weight : weights) {
+    if (!embedding_bag_fast_path(weight, at::Tensor(), MODE_SUM)) return false;
+    if ((weight.scalar_type() != weights[0].scalar_type()) || (weight.size(1) != weights[0].size(1))) return false;
+  }
+  return true;
+}
+
+// Sum pooling of every table into its own columns of one {batch, tables * ddim}
+// output, which is the concatenated layout interaction consumes. All the bags
+// of all the tables are reduced in a single parallel region.
+template<typename T>
+static inline at::Tensor _embedding_bag_batched_index_add_select_fast(const std::vector<at::Tensor> & weights,
+    const std::vector<at::Tensor> & indices, const std::vector<at::Tensor> & offsets, bool include_last_offset) {
+  int64_t num_tables = weights.size();
+  int64_t ddim = weights[0].size(1);
+  int64_t batch_size = include_last_offset ? offsets[0].numel() - 1 : offsets[0].numel();
+
+  std::vector<at::Tensor> indices_(num_tables), offsets_(num_tables);
+  std::vector<T*> weights_data(num_tables);
+  std::vector<int64_t*> indices_data(num_tables), offsets_data(num_tables);
+  for (int64_t t = 0; t < num_tables; t++) {
+    IPEX_CHECK((include_last_offset ? offsets[t].numel() - 1 : offsets[t].numel()) == batch_size,
+      "embedding_bag_batched: all the tables need the same batch size");
+    indices_[t] = indices[t].contiguous();
+    offsets_[t] = offsets[t].contiguous();
+    weights_data[t] = weights[t].data_ptr<T>();
+    indices_data[t] = indices_[t].data_ptr<int64_t>();
+    offsets_data[t] = offsets_[t].data_ptr<int64_t>();
+  }
+
+  at::Tensor output = at::empty({batch_size, num_tables * ddim}, weights[0].options());
+  auto* output_data = output.data_ptr<T>();
+  at::parallel_for(0, num_tables * batch_size, 16, [&](int64_t start, int64_t end) {
+    std::vector<float> temp_output(ddim);
+    float* out_data_ptr = temp_output.data();
+    for (int64_t i = start; i < end; i++) {
+      int64_t t = i / batch_size;
+      int64_t b = i % batch_size;
+      zero_ker(out_data_ptr, ddim);
+      auto inputs_start = offsets_data[t][b];
+      auto inputs_end = (b + 1 < offsets_[t].numel()) ? offsets_data[t][b + 1] : indices_[t].numel();
+      bag_sum(out_data_ptr, weights_data[t], indices_data[t], (T*)nullptr, inputs_start, inputs_end, ddim, no_prefetch);
+      move_ker(&output_data[(b * num_tables + t) * ddim], out_data_ptr, ddim);
+    }
+  });
+
+  return output;
+}
+
+at::Tensor embedding_bag_batched_impl(const std::vector<at::Tensor> & weights,
+  const std::vector<at::Tensor> & indices, const std::vector<at::Tensor> & offsets, bool include_last_offset) {
+  IPEX_CHECK(embedding_bag_batched_fast_path_sum(weights),
+    "embedding_bag_batched: expect fp32 or bf16 tables of the same dtype and dim");
+  IPEX_CHECK(weights.size() == indices.size() && weights.size() == offsets.size(),
+    "embedding_bag_batched: expect the indices and offsets of every table");
+  if (is_bfloat16_tensor(weights[0])) {
+    return _embedding_bag_batched_index_add_select_fast<at::BFloat16>(weights, indices, offsets, include_last_offset);
+  } else {
+    return _embedding_bag_batched_index_add_select_fast<float>(weights, indices, offsets, include_last_offset);
+  }
+}
+
+std::vector<at::Tensor> embedding_bag_batched_backward_impl(const at::Tensor & grad,
+  const std::vector<at::Tensor> & weights, const std::vector<at::Tensor> & indices,
+  const std::vector<at::Tensor> & offsets, bool sparse) {
+  int64_t num_tables = weights.size();
+  int64_t ddim = weights[0].size(1);
+  IPEX_CHECK(grad.dim() == 2 && grad.size(1) == num_tables * ddim,
+    "embedding_bag_batched: expect the gradient of the concatenated output");
+  auto grad_c = grad.contiguous();
+  std::vector<at::Tensor> indices_(num_tables);
+  int64_t indices_numel = 0;
+  for (int64_t t = 0; t < num_tables; t++) {
+    indices_[t] = indices[t].contiguous();
+    indices_numel += indices_[t].numel();
+  }
+
+  std::vector<at::Tensor> weight_grads(num_tables);
+  auto table_backward = [&](int64_t t, int64_t max_threads) {
+    auto table_grad = grad_c.narrow(1, t * ddim, ddim);
+    if (is_bfloat16_tensor(grad_c)) {
+      weight_grads[t] = embedding_bag_backward_fast<at::BFloat16>(table_grad, indices_[t], offsets[t], at::Tensor(), weights[t].size(0), MODE_SUM, sparse, at::Tensor(), max_threads);
     } else {
-      return embedding_bag_dense_backward_sum_fast<float>(grad_c, indices, offsets, num_weights, mode);
+      weight_grads[t] = embedding_bag_backward_fast<float>(table_grad, indices_[t], offsets[t], at::Tensor(), weights[t].size(0), MODE_SUM, sparse, at::Tensor(), max_threads);
+    }
+  };
+
+  // Small batches spend most of their time entering parallel regions, so the
+  // tables are reduced side by side in one region. Large batches keep all the
+  // threads on every table to balance the work.
+  const int64_t kBatchedBackwardIndices = 1 << 16;
+  if (num_tables >= at::get_num_threads() || indices_numel <= kBatchedBackwardIndices) {
+    at::parallel_for(0, num_tables, 1, [&](int64_t start, int64_t end) {
+      for (int64_t t = start; t < end; t++) {
+        table_backward(t, 1);
+      }
+    });
+  } else {
+    for (int64_t t = 0; t < num_tables; t++) {
+      table_backward(t, at::get_num_threads());
     }
   }
+  return weight_grads;
+}
+
+// A row of an 8-bit or 4-bit rowwise quantized table holds the quantized
+// values, two 4-bit values per byte with the even one in the low nibble,
+// followed by the fp32 scale and bias of the row: x = scale * q + bias.
+static const int64_t kRowwiseScaleBiasBytes = 2 * sizeof(float);
+
+static inline int64_t rowwise_quantized_row_bytes(int64_t ddim, int64_t bit_rate) {
+  return (ddim * bit_rate + 7) / 8 + kRowwiseScaleBiasBytes;
+}
+
+namespace vec {
+namespace avx512 {
+
+// out += alpha * (scale * q + bias) for a row of 8-bit values
+IPEX_TARGET_AVX512 static inline void dequant_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  auto vScale = _mm512_set1_ps(alpha * scale);
+  auto vBias = _mm512_set1_ps(alpha * bias);
+  int64_t i;
+  for (i = 0; i < len - 15; i += 16) {
+    auto q = _mm512_cvtepi32_ps(_mm512_cvtepu8_epi32(_mm_loadu_si128((__m128i*)(in + i))));
+    auto out1 = _mm512_add_ps(_mm512_loadu_ps(out + i), vBias);
+    _mm512_storeu_ps(out + i, _mm512_fmadd_ps(vScale, q, out1));
+  }
+
+  if (i < len) {
+    __mmask16 mask = (1 << (len - i)) - 1;
+    auto q = _mm512_cvtepi32_ps(_mm512_cvtepu8_epi32(_mm_maskz_loadu_epi8(mask, in + i)));
+    auto out1 = _mm512_add_ps(_mm512_maskz_loadu_ps(mask, out + i), vBias);
+    _mm512_mask_storeu_ps(out + i, mask, _mm512_fmadd_ps(vScale, q, out1));
+  }
+}
+
+// out += alpha * (scale * q + bias) for a row of 4-bit values
+IPEX_TARGET_AVX512 static inline void dequant_4bit_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  auto vScale = _mm512_set1_ps(alpha * scale);
+  auto vBias = _mm512_set1_ps(alpha * bias);
+  auto vNibble = _mm_set1_epi8(0x0f);
+  int64_t i;
+  for (i = 0; i < len - 15; i += 16) {
+    auto packed = _mm_loadl_epi64((__m128i*)(in + i / 2));
+    auto low = _mm_and_si128(packed, vNibble);
+    auto high = _mm_and_si128(_mm_srli_epi16(packed, 4), vNibble);
+    auto q = _mm512_cvtepi32_ps(_mm512_cvtepu8_epi32(_mm_unpacklo_epi8(low, high)));
+    auto out1 = _mm512_add_ps(_mm512_loadu_ps(out + i), vBias);
+    _mm512_storeu_ps(out + i, _mm512_fmadd_ps(vScale, q, out1));
+  }
+
+  for (; i < len; i++) {
+    uint8_t q = (in[i / 2] >> ((i % 2) * 4)) & 0x0f;
+    out[i] += alpha * (scale * q + bias);
+  }
+}
+
+// out += alpha * in for a row of fp16 values
+IPEX_TARGET_AVX512 static inline void half_madd_ker(float *out, const at::Half *in, int64_t len, float alpha) {
+  auto vAlpha = _mm512_set1_ps(alpha);
+  int64_t i;
+  for (i = 0; i < len - 15; i += 16) {
+    auto in1 = _mm512_cvtph_ps(_mm256_loadu_si256((__m256i*)(in + i)));
+    _mm512_storeu_ps(out + i, _mm512_fmadd_ps(vAlpha, in1, _mm512_loadu_ps(out + i)));
+  }
+
+  if (i < len) {
+    __mmask16 mask = (1 << (len - i)) - 1;
+    auto in1 = _mm512_cvtph_ps(_mm256_maskz_loadu_epi16(mask, in + i));
+    _mm512_mask_storeu_ps(out + i, mask, _mm512_fmadd_ps(vAlpha, in1, _mm512_maskz_loadu_ps(mask, out + i)));
+  }
+}
+
+}  // namespace avx512
+
+namespace avx2 {
+
+IPEX_TARGET_AVX2 static inline void dequant_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  auto vScale = _mm256_set1_ps(alpha * scale);
+  auto vBias = _mm256_set1_ps(alpha * bias);
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto q = _mm256_cvtepi32_ps(_mm256_cvtepu8_epi32(_mm_loadl_epi64((__m128i*)(in + i))));
+    auto out1 = _mm256_add_ps(_mm256_loadu_ps(out + i), vBias);
+    _mm256_storeu_ps(out + i, _mm256_fmadd_ps(vScale, q, out1));
+  }
+
+  for (; i < len; i++) {
+    out[i] += alpha * (scale * in[i] + bias);
+  }
+}
+
+IPEX_TARGET_AVX2 static inline void dequant_4bit_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  auto vScale = _mm256_set1_ps(alpha * scale);
+  auto vBias = _mm256_set1_ps(alpha * bias);
+  auto vNibble = _mm_set1_epi8(0x0f);
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    int32_t bytes;
+    std::memcpy(&bytes, in + i / 2, sizeof(bytes));
+    auto packed = _mm_cvtsi32_si128(bytes);
+    auto low = _mm_and_si128(packed, vNibble);
+    auto high = _mm_and_si128(_mm_srli_epi16(packed, 4), vNibble);
+    auto q = _mm256_cvtepi32_ps(_mm256_cvtepu8_epi32(_mm_unpacklo_epi8(low, high)));
+    auto out1 = _mm256_add_ps(_mm256_loadu_ps(out + i), vBias);
+    _mm256_storeu_ps(out + i, _mm256_fmadd_ps(vScale, q, out1));
+  }
+
+  for (; i < len; i++) {
+    uint8_t q = (in[i / 2] >> ((i % 2) * 4)) & 0x0f;
+    out[i] += alpha * (scale * q + bias);
+  }
+}
+
+IPEX_TARGET_AVX2 static inline void half_madd_ker(float *out, const at::Half *in, int64_t len, float alpha) {
+  auto vAlpha = _mm256_set1_ps(alpha);
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto in1 = _mm256_cvtph_ps(_mm_loadu_si128((__m128i*)(in + i)));
+    _mm256_storeu_ps(out + i, _mm256_fmadd_ps(vAlpha, in1, _mm256_loadu_ps(out + i)));
+  }
+
+  for (; i < len; i++) {
+    out[i] += alpha * (float)in[i];
+  }
+}
+
+}  // namespace avx2
+
+namespace scalar {
+
+static inline void dequant_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  for (int64_t i = 0; i < len; i++) {
+    out[i] += alpha * (scale * in[i] + bias);
+  }
+}
+
+static inline void dequant_4bit_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  for (int64_t i = 0; i < len; i++) {
+    uint8_t q = (in[i / 2] >> ((i % 2) * 4)) & 0x0f;
+    out[i] += alpha * (scale * q + bias);
+  }
+}
+
+static inline void half_madd_ker(float *out, const at::Half *in, int64_t len, float alpha) {
+  for (int64_t i = 0; i < len; i++) {
+    out[i] += alpha * (float)in[i];
+  }
+}
+
+}  // namespace scalar
+}  // namespace vec
+
+// out += alpha * (scale * q + bias) for a row of 8-bit values
+static inline void dequant_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  IPEX_VEC_DISPATCH(dequant_madd_ker, out, in, len, scale, bias, alpha);
+}
+
+// out += alpha * (scale * q + bias) for a row of 4-bit values
+static inline void dequant_4bit_madd_ker(float *out, const uint8_t *in, int64_t len, float scale, float bias, float alpha) {
+  IPEX_VEC_DISPATCH(dequant_4bit_madd_ker, out, in, len, scale, bias, alpha);
+}
+
+// out += alpha * in for a row of fp16 values
+static inline void half_madd_ker(float *out, const at::Half *in, int64_t len, float alpha) {
+  IPEX_VEC_DISPATCH(half_madd_ker, out, in, len, alpha);
+}
+
+at::Tensor embedding_bag_rowwise_quantize(const at::Tensor & weight, int64_t bit_rate) {
+  IPEX_CHECK(weight.dim() == 2, "embedding_bag_rowwise_quantize: expect a 2D table");
+  IPEX_CHECK(bit_rate == 4 || bit_rate == 8 || bit_rate == 16,
+    "embedding_bag_rowwise_quantize: bit_rate should be 4, 8 or 16");
+  if (bit_rate == 16) {
+    return weight.to(at::kHalf).contiguous();
+  }
+  int64_t num_rows = weight.size(0);
+  int64_t ddim = weight.size(1);
+  IPEX_CHECK(bit_rate == 8 || ddim % 2 == 0,
+    "embedding_bag_rowwise_quantize: 4-bit tables need an even embedding dim");
+  auto weight_ = weight.to(at::kFloat).contiguous();
+  auto* weight_data = weight_.data_ptr<float>();
+  int64_t row_bytes = rowwise_quantized_row_bytes(ddim, bit_rate);
+  at::Tensor qweight = at::empty({num_rows, row_bytes}, weight.options().dtype(at::kByte));
+  auto* qweight_data = qweight.data_ptr<uint8_t>();
+  const float levels = (1 << bit_rate) - 1;
+
+  at::parallel_for(0, num_rows, 64, [&](int64_t start, int64_t end) {
+    for (int64_t r = start; r < end; r++) {
+      const float* row = weight_data + r * ddim;
+      uint8_t* qrow = qweight_data + r * row_bytes;
+      float min = ddim > 0 ? *std::min_element(row, row + ddim) : 0.f;
+      float max = ddim > 0 ? *std::max_element(row, row + ddim) : 0.f;
+      float scale = (max - min) / levels;
+      float inverse_scale = scale > 0 ? 1.f / scale : 0.f;
+      if (bit_rate == 4) {
+        std::fill(qrow, qrow + ddim / 2, 0);
+      }
+      for (int64_t d = 0; d < ddim; d++) {
+        auto q = (uint8_t)std::min(std::max(std::nearbyint((row[d] - min) * inverse_scale), 0.f), levels);
+        if (bit_rate == 8) {
+          qrow[d] = q;
+        } else {
+          qrow[d / 2] |= q << ((d % 2) * 4);
+        }
+      }
+      float* scale_bias = (float*)(qrow + row_bytes - kRowwiseScaleBiasBytes);
+      scale_bias[0] = scale;
+      scale_bias[1] = min;
+    }
+  });
+  return qweight;
+}
+
+// Sum or mean pooling of a rowwise quantized or fp16 table into a fp32
+// output, every row is dequantized while it is accumulated.
+at::Tensor embedding_bag_rowwise_quantized_impl(const at::Tensor & qweight, int64_t bit_rate,
+  const at::Tensor & indices, const at::Tensor & offsets, int64_t mode,
+  const at::Tensor & per_sample_weights, bool include_last_offset) {
+  IPEX_CHECK(mode == MODE_SUM || mode == MODE_MEAN,
+    "embedding_bag_rowwise_quantized: only the sum and the mean modes are supported");
+  IPEX_CHECK(!per_sample_weights.defined() || mode == MODE_SUM,
+    "embedding_bag_rowwise_quantized: per_sample_weights are only supported by the sum mode");
+  IPEX_CHECK(bit_rate == 4 || bit_rate == 8 || bit_rate == 16,
+    "embedding_bag_rowwise_quantized: bit_rate should be 4, 8 or 16");
+  IPEX_CHECK(qweight.scalar_type() == (bit_rate == 16 ? at::kHalf : at::kByte),
+    "embedding_bag_rowwise_quantized: the table does not match the bit_rate");
+  auto qweight_ = qweight.contiguous();
+  int64_t row_bytes = qweight_.size(1);
+  int64_t ddim = bit_rate == 16 ? row_bytes
+                                : (row_bytes - kRowwiseScaleBiasBytes) * 8 / bit_rate;
+  auto indices_ = indices.contiguous();
+  auto offsets_ = offsets.contiguous();
+  auto* indices_data = indices_.data_ptr<int64_t>();
+  auto* offsets_data = offsets_.data_ptr<int64_t>();
+  int64_t indices_numel = indices_.numel();
+  int64_t offsets_numel = offsets_.numel();
+  int64_t output_size = include_last_offset ? offsets_numel - 1 : offsets_numel;
+  at::Tensor weights_ = per_sample_weights.defined() ? per_sample_weights.to(at::kFloat).contiguous() : per_sample_weights;
+  float* weights_data = weights_.defined() ? weights_.data_ptr<float>() : nullptr;
+
+  const at::Half* half_data = bit_rate == 16 ? qweight_.data_ptr<at::Half>() : nullptr;
+  const uint8_t* qweight_data = bit_rate == 16 ? nullptr : qweight_.data_ptr<uint8_t>();
+  auto row_madd = [&](float* out, int64_t index, float alpha) {
+    if (bit_rate == 16) {
+      half_madd_ker(out, half_data + index * ddim, ddim, alpha);
+      return;
+    }
+    const uint8_t* qrow = qweight_data + index * row_bytes;
+    const float* scale_bias = (const float*)(qrow + row_bytes - kRowwiseScaleBiasBytes);
+    if (bit_rate == 8) {
+      dequant_madd_ker(out, qrow, ddim, scale_bias[0], scale_bias[1], alpha);
+    } else {
+      dequant_4bit_madd_ker(out, qrow, ddim, scale_bias[0], scale_bias[1], alpha);
+    }
+  };
+
+  at::Tensor output = at::empty({output_size, ddim}, qweight_.options().dtype(at::kFloat));
+  auto* output_data = output.data_ptr<float>();
+  at::parallel_for(0, output_size, 16, [&](int64_t start, int64_t end) {
+    for (int64_t i = start; i < end; i++) {
+      auto* out_data_ptr = &output_data[i * ddim];
+      zero_ker(out_data_ptr, ddim);
+      auto inputs_start = offsets_data[i];
+      auto inputs_end = (i + 1 < offsets_numel) ? offsets_data[i + 1] : indices_numel;
+      float alpha = (mode == MODE_MEAN && inputs_end > inputs_start) ? 1.f / (inputs_end - inputs_start) : 1.f;
+      for (int64_t s = inputs_start; s < inputs_end; s++) {
+        row_madd(out_data_ptr, indices_data[s], weights_data != nullptr ? weights_data[s] : alpha);
+      }
+    }
+  });
+  return output;
 }
 
 }  // namespace embedding_bag
@@ -13,7 +13,7 @@ namespace cpu {
 namespace aten {
 namespace embedding_bag {
 
-at::Tensor embedding_bag_impl(const at::Tensor & weight, const at::Tensor & indices,
+std::vector<at::Tensor> embedding_bag_impl(const at::Tensor & weight, const at::Tensor & indices,
   const at::Tensor & offsets, bool scale_grad_by_freq, int64_t mode, bool sparse,
   const at::Tensor & per_sample_weights, bool include_last_offset);
 
@@ -24,9 +24,29 @@ at::Tensor embedding_bag_backward_impl(const at::Tensor & grad, const at::Tensor
 
 at::Tensor embedding_bag_get_offset2bag(const at::Tensor indices, const at::Tensor & offsets, const at::Tensor & offset2bag);
 
-bool embedding_bag_backward_fast_path_sum(const at::Tensor grad, const at::Tensor indices, const at::Tensor offset2bag, const at::Tensor per_sample_weights, bool scale_grad_by_freq, int64_t mode);
+at::Tensor embedding_bag_per_sample_weights_backward_impl(const at::Tensor & grad, const at::Tensor & weight,
+  const at::Tensor & indices, const at::Tensor & offsets, int64_t mode);
 
-bool embedding_bag_fast_path_sum(const at::Tensor weight, const at::Tensor per_sample_weights, int64_t mode);
+bool embedding_bag_backward_fast_path(const at::Tensor grad, const at::Tensor indices, const at::Tensor offset2bag, const at::Tensor per_sample_weights, bool scale_grad_by_freq, int64_t mode);
+
+bool embedding_bag_fast_path(const at::Tensor weight, const at::Tensor per_sample_weights, int64_t mode);
+
+bool embedding_bag_batched_fast_path_sum(const std::vector<at::Tensor> & weights);
+
+at::Tensor embedding_bag_batched_impl(const std::vector<at::Tensor> & weights,
+  const std::vector<at::Tensor> & indices, const std::vector<at::Tensor> & offsets, bool include_last_offset);
+
+std::vector<at::Tensor> embedding_bag_batched_backward_impl(const at::Tensor & grad,
+  const std::vector<at::Tensor> & weights, const std::vector<at::Tensor> & indices,
+  const std::vector<at::Tensor> & offsets, bool sparse);
+
+// Convert a fp32 or bf16 table to the rowwise quantized format of bit_rate 8
+// or 4, or to fp16 for bit_rate 16.
+at::Tensor embedding_bag_rowwise_quantize(const at::Tensor & weight, int64_t bit_rate);
+
+at::Tensor embedding_bag_rowwise_quantized_impl(const at::Tensor & qweight, int64_t bit_rate,
+  const at::Tensor & indices, const at::Tensor & offsets, int64_t mode,
+  const at::Tensor & per_sample_weights, bool include_last_offset);
 
 }  // namespace embedding_bag
 }  // namespace aten
@@ -0,0 +1,145 @@
+#include "multi_tensor.hpp"
+
+#include <cmath>
+
+namespace torch_ipex {
+namespace cpu {
+namespace aten {
+namespace multi_tensor {
+
+namespace vec {
+namespace avx512 {
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline float sum_of_squares_ker(const T* data, at::BFloat16* bottom_half, int64_t len) {
+  SplitView<T> v(const_cast<T*>(data), bottom_half);
+  auto sum = _mm512_setzero_ps();
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vx = v.load(i, mask);
+    sum = _mm512_fmadd_ps(vx, vx, sum);
+  }
+  return _mm512_reduce_add_ps(sum);
+}
+
+IPEX_TARGET_AVX512 static inline float sum_of_squares_ker(const at::BFloat16* data, int64_t len) {
+  auto sum = _mm512_setzero_ps();
+  for (int64_t i = 0; i < len; i += 16) {
+    auto vx = maskz_load_fp32(tail_mask(len, i), data + i);
+    sum = _mm512_fmadd_ps(vx, vx, sum);
+  }
+  return _mm512_reduce_add_ps(sum);
+}
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void scale_ker(T* data, int64_t len, float scale) {
+  auto vscale = _mm512_set1_ps(scale);
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    store_fp32(data + i, _mm512_mul_ps(vscale, maskz_load_fp32(mask, data + i)), mask);
+  }
+}
+
+}  // namespace avx512
+
+namespace scalar {
+
+template<typename T>
+static inline float sum_of_squares_ker(const T* data, at::BFloat16* bottom_half, int64_t len) {
+  SplitView<T> v(const_cast<T*>(data), bottom_half);
+  float sum = 0.f;
+  for (int64_t i = 0; i < len; i++) {
+    sum += v.get(i) * v.get(i);
+  }
+  return sum;
+}
+
+static inline float sum_of_squares_ker(const at::BFloat16* data, int64_t len) {
+  float sum = 0.f;
+  for (int64_t i = 0; i < len; i++) {
+    sum += (float)data[i] * (float)data[i];
+  }
+  return sum;
+}
+
+template<typename T>
+static inline void scale_ker(T* data, int64_t len, float scale) {
+  for (int64_t i = 0; i < len; i++) {
+    data[i] = scale * (float)data[i];
+  }
+}
+
+}  // namespace scalar
+}  // namespace vec
+
+template<typename T>
+static inline float sum_of_squares_ker(const T* data, at::BFloat16* bottom_half, int64_t len) {
+  IPEX_VEC_DISPATCH_AVX512(sum_of_squares_ker<T>, data, bottom_half, len);
+}
+
+static inline float sum_of_squares_ker(const at::BFloat16* data, int64_t len) {
+  IPEX_VEC_DISPATCH_AVX512(sum_of_squares_ker, data, len);
+}
+
+template<typename T>
+static inline void scale_ker(T* data, int64_t len, float scale) {
+  IPEX_VEC_DISPATCH_AVX512(scale_ker<T>, data, len, scale);
+}
+
+static inline void check_dtype(const at::Tensor & tensor) {
+  auto dtype = tensor.scalar_type();
+  IPEX_CHECK(dtype == at::kFloat || dtype == at::kBFloat16, "multi tensor apply supports fp32 and bf16 tensors only");
+}
+
+at::Tensor l2norm_impl(const std::vector<at::Tensor> & tensors, const std::vector<at::Tensor> & bottom_halves) {
+  int64_t num = tensors.size();
+  TensorChunks chunks(tensors);
+  auto bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  for (int64_t t = 0; t < num; t++) {
+    check_dtype(tensors[t]);
+    IPEX_CHECK(bottom[t] == nullptr || bottom_halves[t].numel() == tensors[t].numel(),
+               "l2norm expects bottom halves of the tensor sizes");
+  }
+
+  ThreadSums sums(num, 1);
+  multi_tensor_apply(chunks, [&](int64_t t, int64_t offset, int64_t value_offset, int64_t len) {
+    auto& tensor = chunks.values[t];
+    float sum;
+    if (tensor.scalar_type() == at::kFloat) {
+      sum = sum_of_squares_ker<float>(tensor.data_ptr<float>() + offset, nullptr, len);
+    } else if (bottom[t] != nullptr) {
+      sum = sum_of_squares_ker<at::BFloat16>(tensor.data_ptr<at::BFloat16>() + offset, bottom[t] + offset, len);
+    } else {
+      sum = sum_of_squares_ker(tensor.data_ptr<at::BFloat16>() + offset, len);
+    }
+    sums.add(t, 0, sum);
+  });
+
+  auto norms = at::empty({num}, at::kFloat);
+  auto norms_data = norms.data_ptr<float>();
+  for (int64_t t = 0; t < num; t++) {
+    norms_data[t] = std::sqrt(sums.total(t, 0));
+  }
+  return norms;
+}
+
+void scale_impl(const std::vector<at::Tensor> & tensors, double scale) {
+  TensorChunks chunks(tensors);
+  for (auto& tensor : tensors) {
+    check_dtype(tensor);
+  }
+
+  multi_tensor_apply(chunks, [&](int64_t t, int64_t offset, int64_t value_offset, int64_t len) {
+    auto& tensor = chunks.values[t];
+    if (tensor.scalar_type() == at::kFloat) {
+      scale_ker<float>(tensor.data_ptr<float>() + offset, len, scale);
+    } else {
+      scale_ker<at::BFloat16>(tensor.data_ptr<at::BFloat16>() + offset, len, scale);
+    }
+  });
+}
+
+}  // namespace multi_tensor
+}  // namespace aten
+}  // namespace cpu
+}  // namespace torch_ipex
@@ -0,0 +1,273 @@
+#pragma once
+
+#include <ATen/ATen.h>
+#include <ATen/Parallel.h>
+#include <c10/core/ScalarType.h>
+
+#include "torch_ipex/csrc/utils.h"
+#include "cpu/bf16/vec/bf16_vec_kernel.h"
+
+#include <algorithm>
+#include <vector>
+
+
+namespace torch_ipex {
+namespace cpu {
+namespace aten {
+namespace multi_tensor {
+
+// Elements of a dense tensor, or of the rows of a sparse gradient, updated by
+// a call of the function applied.
+constexpr int64_t kChunkSize = 4096;
+
+static inline __mmask16 tail_mask(int64_t len, int64_t i) {
+  return (len - i >= 16) ? 0xffff : (1 << (len - i)) - 1;
+}
+
+// fp32 values of a fp32 tensor, or of a bf16 tensor split into the top half
+// and the bottom half holding the low 16 bits of the fp32 values.
+template<typename T>
+struct SplitView {};
+
+// load and store take 16 values with AVX-512, load8 and store8 8 values with
+// AVX2, get and set one value.
+template<>
+struct SplitView<float> {
+  SplitView(float* data, at::BFloat16* bottom_half) : data(data) {}
+
+  IPEX_TARGET_AVX512 inline __m512 load(int64_t i, __mmask16 mask) const {
+    return _mm512_maskz_loadu_ps(mask, data + i);
+  }
+
+  IPEX_TARGET_AVX512 inline void store(int64_t i, __m512 value, __mmask16 mask) {
+    _mm512_mask_storeu_ps(data + i, mask, value);
+  }
+
+  IPEX_TARGET_AVX2 inline __m256 load8(int64_t i) const {
+    return _mm256_loadu_ps(data + i);
+  }
+
+  IPEX_TARGET_AVX2 inline void store8(int64_t i, __m256 value) {
+    _mm256_storeu_ps(data + i, value);
+  }
+
+  inline float get(int64_t i) const {
+    return data[i];
+  }
+
+  inline void set(int64_t i, float value) {
+    data[i] = value;
+  }
+
+  float* data;
+};
+
+template<>
+struct SplitView<at::BFloat16> {
+  SplitView(at::BFloat16* top_half, at::BFloat16* bottom_half) : top_half(top_half), bottom_half(bottom_half) {}
+
+  IPEX_TARGET_AVX512 inline __m512 load(int64_t i, __mmask16 mask) const {
+    return pack_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, top_half + i),
+                             _mm256_maskz_loadu_epi16(mask, bottom_half + i));
+  }
+
+  IPEX_TARGET_AVX512 inline void store(int64_t i, __m512 value, __mmask16 mask) {
+    _mm256_mask_storeu_epi16(top_half + i, mask, trunc_fp32_to_bf16(value));
+    _mm256_mask_storeu_epi16(bottom_half + i, mask, _mm512_cvtepi32_epi16(_mm512_castps_si512(value)));
+  }
+
+  IPEX_TARGET_AVX2 inline __m256 load8(int64_t i) const {
+    return pack_bf16_to_fp32(_mm_loadu_si128((__m128i*)(top_half + i)), _mm_loadu_si128((__m128i*)(bottom_half + i)));
+  }
+
+  IPEX_TARGET_AVX2 inline void store8(int64_t i, __m256 value) {
+    _mm_storeu_si128((__m128i*)(top_half + i), trunc_fp32_to_bf16(value));
+    _mm_storeu_si128((__m128i*)(bottom_half + i), bottom_half_of_fp32(value));
+  }
+
+  inline float get(int64_t i) const {
+    return pack_bf16_to_fp32(top_half[i], bottom_half[i]);
+  }
+
+  inline void set(int64_t i, float value) {
+    split_fp32_to_bf16(value, top_half[i], bottom_half[i]);
+  }
+
+  at::BFloat16* top_half;
+  at::BFloat16* bottom_half;
+};
+
+IPEX_TARGET_AVX512 static inline void store_fp32(float* out, __m512 value, __mmask16 mask) {
+  _mm512_mask_storeu_ps(out, mask, value);
+}
+
+IPEX_TARGET_AVX512 static inline void store_fp32(at::BFloat16* out, __m512 value, __mmask16 mask) {
+  _mm256_mask_storeu_epi16(out, mask, cvt_fp32_to_bf16(value));
+}
+
+IPEX_TARGET_AVX2 static inline void store8_fp32(float* out, __m256 value) {
+  _mm256_storeu_ps(out, value);
+}
+
+IPEX_TARGET_AVX2 static inline void store8_fp32(at::BFloat16* out, __m256 value) {
+  _mm_storeu_si128((__m128i*)out, cvt_fp32_to_bf16(value));
+}
+
+template<typename T>
+static inline T* data_or_null(const at::Tensor & tensor) {
+  return (tensor.defined() && tensor.numel() > 0) ? tensor.data_ptr<T>() : nullptr;
+}
+
+template<typename T>
+static inline std::vector<T*> data_ptrs(const std::vector<at::Tensor> & tensors, int64_t size) {
+  std::vector<T*> ptrs(size, nullptr);
+  for (int64_t t = 0; t < tensors.size(); t++) {
+    ptrs[t] = data_or_null<T>(tensors[t]);
+  }
+  return ptrs;
+}
+
+// The chunks of a list of tensors. Dense tensors are cut into chunks of
+// kChunkSize elements. The parameters updated by sparse gradients are cut
+// into the rows the coalesced gradients hold, whose values are kept here.
+struct TensorChunks {
+  explicit TensorChunks(const std::vector<at::Tensor> & tensors) {
+    for (int64_t t = 0; t < tensors.size(); t++) {
+      IPEX_CHECK(tensors[t].is_contiguous(), "multi tensor apply expects contiguous tensors");
+      add_dense(tensors[t]);
+    }
+  }
+
+  TensorChunks(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & grads) {
+    IPEX_CHECK(params.size() == grads.size(), "optimizer step expects a gradient per parameter");
+    for (int64_t t = 0; t < params.size(); t++) {
+      auto grad = grads[t];
+      IPEX_CHECK(params[t].is_contiguous(), "optimizer step expects contiguous parameters");
+      if (grad.is_sparse()) {
+        IPEX_CHECK(grad.sparse_dim() == 1, "optimizer step expects row sparse gradients");
+        if (!grad.is_coalesced()) {
+          grad = grad.coalesce();
+        }
+        values.push_back(grad._values().contiguous());
+        indices.push_back(grad._indices().contiguous());
+        rows.push_back(indices.back().data_ptr<int64_t>());
+        num_rows.push_back(grad._nnz());
+        row_sizes.push_back(params[t].size(0) > 0 ? params[t].numel() / params[t].size(0) : 0);
+        numels.push_back(params[t].numel());
+      } else {
+        IPEX_CHECK(grad.sizes() == params[t].sizes(), "optimizer step expects gradients of the parameter sizes");
+        add_dense(grad.contiguous());
+      }
+      IPEX_CHECK(values.back().scalar_type() == params[t].scalar_type(),
+                 "optimizer step expects gradients of the parameter dtype");
+    }
+  }
+
+  int64_t size() const {
+    return values.size();
+  }
+
+  std::vector<at::Tensor> values;
+  std::vector<at::Tensor> indices;
+  std::vector<const int64_t*> rows;
+  std::vector<int64_t> num_rows;
+  std::vector<int64_t> row_sizes;
+  std::vector<int64_t> numels;
+
+ private:
+  void add_dense(const at::Tensor & tensor) {
+    values.push_back(tensor);
+    indices.push_back(at::Tensor());
+    rows.push_back(nullptr);
+    num_rows.push_back((tensor.numel() + kChunkSize - 1) / kChunkSize);
+    row_sizes.push_back(kChunkSize);
+    numels.push_back(tensor.numel());
+  }
+};
+
+// Runs f(t, offset, value_offset, len) over all the chunks of all the tensors
+// in one parallel region. offset is the offset of the chunk in the t-th
+// tensor, or parameter, and value_offset its offset in the t-th values. The
+// chunks are grouped into tasks of about kChunkSize elements, and the tasks
+// are split between the threads by their number of elements so small and
+// large tensors are balanced.
+template<typename F>
+void multi_tensor_apply(const TensorChunks & chunks, const F & f) {
+  struct Task { int64_t t; int64_t row_start; int64_t row_end; };
+  std::vector<Task> tasks;
+  // elements before each task, and in all of them at the end
+  std::vector<int64_t> task_offsets(1, 0);
+  for (int64_t t = 0; t < chunks.size(); t++) {
+    auto row_size = chunks.row_sizes[t];
+    int64_t rows_per_task = std::max<int64_t>(1, kChunkSize / std::max<int64_t>(row_size, 1));
+    for (int64_t r = 0; r < chunks.num_rows[t]; r += rows_per_task) {
+      auto row_end = std::min(r + rows_per_task, chunks.num_rows[t]);
+      auto len = chunks.rows[t] != nullptr ? (row_end - r) * row_size
+                                           : std::min(row_end * kChunkSize, chunks.numels[t]) - r * kChunkSize;
+      tasks.push_back({t, r, row_end});
+      task_offsets.push_back(task_offsets.back() + len);
+    }
+  }
+  if (tasks.empty()) {
+    return;
+  }
+
+  int64_t num_parts = std::min<int64_t>(at::get_num_threads(), tasks.size());
+  auto total = task_offsets.back();
+  at::parallel_for(0, num_parts, 1, [&](int64_t start, int64_t end) {
+    for (int64_t part = start; part < end; part++) {
+      // the tasks starting in the part-th share of the elements
+      auto first = std::lower_bound(task_offsets.begin(), task_offsets.end() - 1, total * part / num_parts);
+      auto last = std::lower_bound(task_offsets.begin(), task_offsets.end() - 1, total * (part + 1) / num_parts);
+      if (part == num_parts - 1) {
+        last = task_offsets.end() - 1;
+      }
+      for (auto i = first - task_offsets.begin(); i < last - task_offsets.begin(); i++) {
+        auto t = tasks[i].t;
+        for (int64_t r = tasks[i].row_start; r < tasks[i].row_end; r++) {
+          if (chunks.rows[t] != nullptr) {
+            f(t, chunks.rows[t][r] * chunks.row_sizes[t], r * chunks.row_sizes[t], chunks.row_sizes[t]);
+          } else {
+            int64_t offset = r * kChunkSize;
+            f(t, offset, offset, std::min(kChunkSize, chunks.numels[t] - offset));
+          }
+        }
+      }
+    }
+  });
+}
+
+// Sums per tensor accumulated by the threads of multi_tensor_apply, every
+// thread into its own slots.
+struct ThreadSums {
+  ThreadSums(int64_t num_tensors, int64_t num_sums)
+      : num_tensors(num_tensors), num_sums(num_sums), sums(at::get_num_threads() * num_tensors * num_sums, 0.) {}
+
+  inline void add(int64_t t, int64_t k, double value) {
+    sums[(at::get_thread_num() * num_tensors + t) * num_sums + k] += value;
+  }
+
+  double total(int64_t t, int64_t k) const {
+    double sum = 0.;
+    for (int64_t i = 0; i < sums.size(); i += num_tensors * num_sums) {
+      sum += sums[i + t * num_sums + k];
+    }
+    return sum;
+  }
+
+  int64_t num_tensors;
+  int64_t num_sums;
+  std::vector<double> sums;
+};
+
+// The l2 norms of fp32 or bf16 tensors as a fp32 tensor, a bf16 tensor with
+// a bottom half is taken as the split fp32 values.
+at::Tensor l2norm_impl(const std::vector<at::Tensor> & tensors, const std::vector<at::Tensor> & bottom_halves);
+
+// Multiplies fp32 or bf16 tensors by scale in place.
+void scale_impl(const std::vector<at::Tensor> & tensors, double scale);
+
+}  // namespace multi_tensor
+}  // namespace aten
+}  // namespace cpu
+}  // namespace torch_ipex
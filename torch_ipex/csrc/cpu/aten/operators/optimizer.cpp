@@ -0,0 +1,666 @@
+#include "optimizer.hpp"
+#include "multi_tensor.hpp"
+
+#include <cmath>
+
+namespace torch_ipex {
+namespace cpu {
+namespace aten {
+namespace optimizer {
+
+using namespace multi_tensor;
+
+namespace vec {
+namespace avx512 {
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void sgd_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float dampening,
+    float weight_decay, bool nesterov, bool first_step) {
+  SplitView<T> p(param, param_bottom_half);
+  SplitView<T> b(buf, buf_bottom_half);
+  auto vlr = _mm512_set1_ps(lr);
+  auto vmomentum = _mm512_set1_ps(momentum);
+  auto vdampening = _mm512_set1_ps(1.f - dampening);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = maskz_load_fp32(mask, grad + i);
+    if (weight_decay != 0) {
+      vg = _mm512_fmadd_ps(vweight_decay, vp, vg);
+    }
+    if (buf != nullptr) {
+      auto vb = first_step ? vg : _mm512_fmadd_ps(vmomentum, b.load(i, mask), _mm512_mul_ps(vdampening, vg));
+      b.store(i, vb, mask);
+      vg = nesterov ? _mm512_fmadd_ps(vmomentum, vb, vg) : vb;
+    }
+    p.store(i, _mm512_fnmadd_ps(vlr, vg, vp), mask);
+  }
+}
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void adagrad_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* state_sum,
+    int64_t len, float clr, float weight_decay, float eps) {
+  SplitView<T> p(param, param_bottom_half);
+  auto vclr = _mm512_set1_ps(clr);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  auto veps = _mm512_set1_ps(eps);
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = maskz_load_fp32(mask, grad + i);
+    if (weight_decay != 0) {
+      vg = _mm512_fmadd_ps(vweight_decay, vp, vg);
+    }
+    auto vsum = _mm512_fmadd_ps(vg, vg, maskz_load_fp32(mask, state_sum + i));
+    store_fp32(state_sum + i, vsum, mask);
+    auto vstd = _mm512_add_ps(_mm512_sqrt_ps(vsum), veps);
+    p.store(i, _mm512_fnmadd_ps(vclr, _mm512_div_ps(vg, vstd), vp), mask);
+  }
+}
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void adam_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float lr, float beta1, float beta2, float eps, float weight_decay,
+    bool adamw, float bias_correction1, float bias_correction2) {
+  SplitView<T> p(param, param_bottom_half);
+  auto vbeta1 = _mm512_set1_ps(beta1);
+  auto vbeta1_1 = _mm512_set1_ps(1.f - beta1);
+  auto vbeta2 = _mm512_set1_ps(beta2);
+  auto vbeta2_1 = _mm512_set1_ps(1.f - beta2);
+  auto veps = _mm512_set1_ps(eps);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  auto vdecay = _mm512_set1_ps(1.f - lr * weight_decay);
+  auto vstep_size = _mm512_set1_ps(lr / bias_correction1);
+  auto vbias_correction2 = _mm512_set1_ps(1.f / std::sqrt(bias_correction2));
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = maskz_load_fp32(mask, grad + i);
+    if (adamw) {
+      vp = _mm512_mul_ps(vp, vdecay);
+    } else if (weight_decay != 0) {
+      vg = _mm512_fmadd_ps(vweight_decay, vp, vg);
+    }
+    auto vm = _mm512_fmadd_ps(vbeta1, maskz_load_fp32(mask, exp_avg + i), _mm512_mul_ps(vbeta1_1, vg));
+    auto vv = _mm512_fmadd_ps(vbeta2, maskz_load_fp32(mask, exp_avg_sq + i),
+                              _mm512_mul_ps(vbeta2_1, _mm512_mul_ps(vg, vg)));
+    store_fp32(exp_avg + i, vm, mask);
+    store_fp32(exp_avg_sq + i, vv, mask);
+    auto vdenom = _mm512_fmadd_ps(_mm512_sqrt_ps(vv), vbias_correction2, veps);
+    p.store(i, _mm512_fnmadd_ps(vstep_size, _mm512_div_ps(vm, vdenom), vp), mask);
+  }
+}
+
+// The LAMB update of the parameters, from their moments.
+IPEX_TARGET_AVX512 static inline __m512 lamb_update(__m512 vp, __m512 vm, __m512 vv, __m512 vbias_correction1,
+    __m512 vbias_correction2, __m512 veps, __m512 vweight_decay) {
+  auto vdenom = _mm512_fmadd_ps(_mm512_sqrt_ps(vv), vbias_correction2, veps);
+  return _mm512_fmadd_ps(vweight_decay, vp, _mm512_div_ps(_mm512_mul_ps(vm, vbias_correction1), vdenom));
+}
+
+// Updates the LAMB moments and accumulates the squares of the parameters and
+// of their updates.
+template<typename T>
+IPEX_TARGET_AVX512 static inline void lamb_moments_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float beta1, float beta2, float eps, float weight_decay,
+    float bias_correction1, float bias_correction2, float& param_sq, float& update_sq) {
+  SplitView<T> p(param, param_bottom_half);
+  auto vbeta1 = _mm512_set1_ps(beta1);
+  auto vbeta1_1 = _mm512_set1_ps(1.f - beta1);
+  auto vbeta2 = _mm512_set1_ps(beta2);
+  auto vbeta2_1 = _mm512_set1_ps(1.f - beta2);
+  auto veps = _mm512_set1_ps(eps);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  auto vbias_correction1 = _mm512_set1_ps(1.f / bias_correction1);
+  auto vbias_correction2 = _mm512_set1_ps(1.f / std::sqrt(bias_correction2));
+  auto vparam_sq = _mm512_setzero_ps();
+  auto vupdate_sq = _mm512_setzero_ps();
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = maskz_load_fp32(mask, grad + i);
+    auto vm = _mm512_fmadd_ps(vbeta1, maskz_load_fp32(mask, exp_avg + i), _mm512_mul_ps(vbeta1_1, vg));
+    auto vv = _mm512_fmadd_ps(vbeta2, maskz_load_fp32(mask, exp_avg_sq + i),
+                              _mm512_mul_ps(vbeta2_1, _mm512_mul_ps(vg, vg)));
+    store_fp32(exp_avg + i, vm, mask);
+    store_fp32(exp_avg_sq + i, vv, mask);
+    auto vu = lamb_update(vp, vm, vv, vbias_correction1, vbias_correction2, veps, vweight_decay);
+    vparam_sq = _mm512_fmadd_ps(vp, vp, vparam_sq);
+    vupdate_sq = _mm512_fmadd_ps(vu, vu, vupdate_sq);
+  }
+  param_sq = _mm512_reduce_add_ps(vparam_sq);
+  update_sq = _mm512_reduce_add_ps(vupdate_sq);
+}
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void lamb_update_ker(T* param, at::BFloat16* param_bottom_half, const float* exp_avg,
+    const float* exp_avg_sq, int64_t len, float lr, float eps, float weight_decay, float bias_correction1,
+    float bias_correction2) {
+  SplitView<T> p(param, param_bottom_half);
+  auto vlr = _mm512_set1_ps(lr);
+  auto veps = _mm512_set1_ps(eps);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  auto vbias_correction1 = _mm512_set1_ps(1.f / bias_correction1);
+  auto vbias_correction2 = _mm512_set1_ps(1.f / std::sqrt(bias_correction2));
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vu = lamb_update(vp, maskz_load_fp32(mask, exp_avg + i), maskz_load_fp32(mask, exp_avg_sq + i),
+                          vbias_correction1, vbias_correction2, veps, vweight_decay);
+    p.store(i, _mm512_fnmadd_ps(vlr, vu, vp), mask);
+  }
+}
+
+// Accumulates the squares of the parameters and of their gradients.
+template<typename T>
+IPEX_TARGET_AVX512 static inline void lars_norms_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, int64_t len,
+    float& param_sq, float& grad_sq) {
+  SplitView<T> p(param, param_bottom_half);
+  auto vparam_sq = _mm512_setzero_ps();
+  auto vgrad_sq = _mm512_setzero_ps();
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = maskz_load_fp32(mask, grad + i);
+    vparam_sq = _mm512_fmadd_ps(vp, vp, vparam_sq);
+    vgrad_sq = _mm512_fmadd_ps(vg, vg, vgrad_sq);
+  }
+  param_sq = _mm512_reduce_add_ps(vparam_sq);
+  grad_sq = _mm512_reduce_add_ps(vgrad_sq);
+}
+
+template<typename T>
+IPEX_TARGET_AVX512 static inline void lars_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float weight_decay,
+    float trust_ratio) {
+  SplitView<T> p(param, param_bottom_half);
+  SplitView<T> b(buf, buf_bottom_half);
+  auto vlr = _mm512_set1_ps(lr);
+  auto vmomentum = _mm512_set1_ps(momentum);
+  auto vweight_decay = _mm512_set1_ps(weight_decay);
+  auto vtrust_ratio = _mm512_set1_ps(trust_ratio);
+  for (int64_t i = 0; i < len; i += 16) {
+    auto mask = tail_mask(len, i);
+    auto vp = p.load(i, mask);
+    auto vg = _mm512_mul_ps(vtrust_ratio, _mm512_fmadd_ps(vweight_decay, vp, maskz_load_fp32(mask, grad + i)));
+    if (buf != nullptr) {
+      vg = _mm512_fmadd_ps(vmomentum, b.load(i, mask), vg);
+      b.store(i, vg, mask);
+    }
+    p.store(i, _mm512_fnmadd_ps(vlr, vg, vp), mask);
+  }
+}
+
+}  // namespace avx512
+
+namespace avx2 {
+
+template<typename T>
+IPEX_TARGET_AVX2 static inline void sgd_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float dampening,
+    float weight_decay, bool nesterov, bool first_step) {
+  SplitView<T> p(param, param_bottom_half);
+  SplitView<T> b(buf, buf_bottom_half);
+  auto vlr = _mm256_set1_ps(lr);
+  auto vmomentum = _mm256_set1_ps(momentum);
+  auto vdampening = _mm256_set1_ps(1.f - dampening);
+  auto vweight_decay = _mm256_set1_ps(weight_decay);
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto vp = p.load8(i);
+    auto vg = load8_fp32(grad + i);
+    if (weight_decay != 0) {
+      vg = _mm256_fmadd_ps(vweight_decay, vp, vg);
+    }
+    if (buf != nullptr) {
+      auto vb = first_step ? vg : _mm256_fmadd_ps(vmomentum, b.load8(i), _mm256_mul_ps(vdampening, vg));
+      b.store8(i, vb);
+      vg = nesterov ? _mm256_fmadd_ps(vmomentum, vb, vg) : vb;
+    }
+    p.store8(i, _mm256_fnmadd_ps(vlr, vg, vp));
+  }
+  for (; i < len; i++) {
+    float g = grad[i];
+    if (weight_decay != 0) {
+      g += weight_decay * p.get(i);
+    }
+    if (buf != nullptr) {
+      float m = first_step ? g : momentum * b.get(i) + (1.f - dampening) * g;
+      b.set(i, m);
+      g = nesterov ? g + momentum * m : m;
+    }
+    p.set(i, p.get(i) - lr * g);
+  }
+}
+
+}  // namespace avx2
+
+// The reference kernels of the hosts without AVX-512, the optimizers other
+// than SGD have no AVX2 variant.
+namespace scalar {
+
+template<typename T>
+static inline void sgd_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float dampening,
+    float weight_decay, bool nesterov, bool first_step) {
+  SplitView<T> p(param, param_bottom_half);
+  SplitView<T> b(buf, buf_bottom_half);
+  for (int64_t i = 0; i < len; i++) {
+    float g = grad[i];
+    if (weight_decay != 0) {
+      g += weight_decay * p.get(i);
+    }
+    if (buf != nullptr) {
+      float m = first_step ? g : momentum * b.get(i) + (1.f - dampening) * g;
+      b.set(i, m);
+      g = nesterov ? g + momentum * m : m;
+    }
+    p.set(i, p.get(i) - lr * g);
+  }
+}
+
+template<typename T>
+static inline void adagrad_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* state_sum,
+    int64_t len, float clr, float weight_decay, float eps) {
+  SplitView<T> p(param, param_bottom_half);
+  for (int64_t i = 0; i < len; i++) {
+    float g = grad[i];
+    if (weight_decay != 0) {
+      g += weight_decay * p.get(i);
+    }
+    float sum = state_sum[i] + g * g;
+    state_sum[i] = sum;
+    p.set(i, p.get(i) - clr * g / (std::sqrt(sum) + eps));
+  }
+}
+
+template<typename T>
+static inline void adam_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float lr, float beta1, float beta2, float eps, float weight_decay,
+    bool adamw, float bias_correction1, float bias_correction2) {
+  SplitView<T> p(param, param_bottom_half);
+  float step_size = lr / bias_correction1;
+  float inv_bias_correction2 = 1.f / std::sqrt(bias_correction2);
+  for (int64_t i = 0; i < len; i++) {
+    float param_value = p.get(i);
+    float g = grad[i];
+    if (adamw) {
+      param_value *= 1.f - lr * weight_decay;
+    } else if (weight_decay != 0) {
+      g += weight_decay * param_value;
+    }
+    float m = beta1 * exp_avg[i] + (1.f - beta1) * g;
+    float v = beta2 * exp_avg_sq[i] + (1.f - beta2) * g * g;
+    exp_avg[i] = m;
+    exp_avg_sq[i] = v;
+    p.set(i, param_value - step_size * m / (std::sqrt(v) * inv_bias_correction2 + eps));
+  }
+}
+
+static inline float lamb_update(float p, float m, float v, float bias_correction1, float bias_correction2,
+    float eps, float weight_decay) {
+  return m / bias_correction1 / (std::sqrt(v) / std::sqrt(bias_correction2) + eps) + weight_decay * p;
+}
+
+template<typename T>
+static inline void lamb_moments_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float beta1, float beta2, float eps, float weight_decay,
+    float bias_correction1, float bias_correction2, float& param_sq, float& update_sq) {
+  SplitView<T> p(param, param_bottom_half);
+  param_sq = 0.f;
+  update_sq = 0.f;
+  for (int64_t i = 0; i < len; i++) {
+    float param_value = p.get(i);
+    float g = grad[i];
+    exp_avg[i] = beta1 * exp_avg[i] + (1.f - beta1) * g;
+    exp_avg_sq[i] = beta2 * exp_avg_sq[i] + (1.f - beta2) * g * g;
+    float u = lamb_update(param_value, exp_avg[i], exp_avg_sq[i], bias_correction1, bias_correction2, eps,
+                          weight_decay);
+    param_sq += param_value * param_value;
+    update_sq += u * u;
+  }
+}
+
+template<typename T>
+static inline void lamb_update_ker(T* param, at::BFloat16* param_bottom_half, const float* exp_avg,
+    const float* exp_avg_sq, int64_t len, float lr, float eps, float weight_decay, float bias_correction1,
+    float bias_correction2) {
+  SplitView<T> p(param, param_bottom_half);
+  for (int64_t i = 0; i < len; i++) {
+    float param_value = p.get(i);
+    p.set(i, param_value - lr * lamb_update(param_value, exp_avg[i], exp_avg_sq[i], bias_correction1,
+                                            bias_correction2, eps, weight_decay));
+  }
+}
+
+template<typename T>
+static inline void lars_norms_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, int64_t len,
+    float& param_sq, float& grad_sq) {
+  SplitView<T> p(param, param_bottom_half);
+  param_sq = 0.f;
+  grad_sq = 0.f;
+  for (int64_t i = 0; i < len; i++) {
+    float param_value = p.get(i);
+    float g = grad[i];
+    param_sq += param_value * param_value;
+    grad_sq += g * g;
+  }
+}
+
+template<typename T>
+static inline void lars_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float weight_decay,
+    float trust_ratio) {
+  SplitView<T> p(param, param_bottom_half);
+  SplitView<T> b(buf, buf_bottom_half);
+  for (int64_t i = 0; i < len; i++) {
+    float param_value = p.get(i);
+    float g = trust_ratio * ((float)grad[i] + weight_decay * param_value);
+    if (buf != nullptr) {
+      g += momentum * b.get(i);
+      b.set(i, g);
+    }
+    p.set(i, param_value - lr * g);
+  }
+}
+
+}  // namespace scalar
+}  // namespace vec
+
+template<typename T>
+static inline void sgd_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float dampening,
+    float weight_decay, bool nesterov, bool first_step) {
+  IPEX_VEC_DISPATCH(sgd_ker<T>, param, param_bottom_half, grad, buf, buf_bottom_half, len, lr, momentum, dampening,
+                    weight_decay, nesterov, first_step);
+}
+
+template<typename T>
+static inline void adagrad_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* state_sum,
+    int64_t len, float clr, float weight_decay, float eps) {
+  IPEX_VEC_DISPATCH_AVX512(adagrad_ker<T>, param, param_bottom_half, grad, state_sum, len, clr, weight_decay, eps);
+}
+
+template<typename T>
+static inline void adam_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float lr, float beta1, float beta2, float eps, float weight_decay,
+    bool adamw, float bias_correction1, float bias_correction2) {
+  IPEX_VEC_DISPATCH_AVX512(adam_ker<T>, param, param_bottom_half, grad, exp_avg, exp_avg_sq, len, lr, beta1, beta2,
+                           eps, weight_decay, adamw, bias_correction1, bias_correction2);
+}
+
+template<typename T>
+static inline void lamb_moments_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, float* exp_avg,
+    float* exp_avg_sq, int64_t len, float beta1, float beta2, float eps, float weight_decay,
+    float bias_correction1, float bias_correction2, float& param_sq, float& update_sq) {
+  IPEX_VEC_DISPATCH_AVX512(lamb_moments_ker<T>, param, param_bottom_half, grad, exp_avg, exp_avg_sq, len, beta1,
+                           beta2, eps, weight_decay, bias_correction1, bias_correction2, param_sq, update_sq);
+}
+
+template<typename T>
+static inline void lamb_update_ker(T* param, at::BFloat16* param_bottom_half, const float* exp_avg,
+    const float* exp_avg_sq, int64_t len, float lr, float eps, float weight_decay, float bias_correction1,
+    float bias_correction2) {
+  IPEX_VEC_DISPATCH_AVX512(lamb_update_ker<T>, param, param_bottom_half, exp_avg, exp_avg_sq, len, lr, eps,
+                           weight_decay, bias_correction1, bias_correction2);
+}
+
+template<typename T>
+static inline void lars_norms_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, int64_t len,
+    float& param_sq, float& grad_sq) {
+  IPEX_VEC_DISPATCH_AVX512(lars_norms_ker<T>, param, param_bottom_half, grad, len, param_sq, grad_sq);
+}
+
+template<typename T>
+static inline void lars_ker(T* param, at::BFloat16* param_bottom_half, const T* grad, T* buf,
+    at::BFloat16* buf_bottom_half, int64_t len, float lr, float momentum, float weight_decay,
+    float trust_ratio) {
+  IPEX_VEC_DISPATCH_AVX512(lars_ker<T>, param, param_bottom_half, grad, buf, buf_bottom_half, len, lr, momentum,
+                           weight_decay, trust_ratio);
+}
+
+// Pointers of the parameters, their bottom halves and their states, taken by
+// the dtype of the parameter.
+struct SplitParams {
+  SplitParams(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves)
+      : is_bf16(params.size()) {
+    for (int64_t t = 0; t < params.size(); t++) {
+      auto dtype = params[t].scalar_type();
+      IPEX_CHECK(dtype == at::kFloat || dtype == at::kBFloat16, "optimizer step supports fp32 and bf16 parameters only");
+      is_bf16[t] = dtype == at::kBFloat16;
+      if (is_bf16[t]) {
+        IPEX_CHECK(t < bottom_halves.size() && bottom_halves[t].numel() == params[t].numel(),
+                   "optimizer step expects the bottom half of a bf16 parameter");
+      }
+    }
+  }
+
+  std::vector<bool> is_bf16;
+};
+
+void sgd_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers,
+  const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double dampening,
+  double weight_decay, bool nesterov, bool first_step) {
+  int64_t num = params.size();
+  SplitParams split(params, bottom_halves);
+  TensorChunks grad_chunks(params, grads);
+  auto param_bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  auto buf_bottom = data_ptrs<at::BFloat16>(momentum_bottom_halves, num);
+  std::vector<void*> param_data(num), grad_data(num), buf_data(num, nullptr);
+  for (int64_t t = 0; t < num; t++) {
+    param_data[t] = params[t].data_ptr();
+    grad_data[t] = grad_chunks.values[t].data_ptr();
+    if (t < momentum_buffers.size() && momentum_buffers[t].numel() > 0) {
+      IPEX_CHECK(momentum_buffers[t].scalar_type() == params[t].scalar_type(),
+                 "sgd step expects momentum buffers of the parameter dtype");
+      IPEX_CHECK(!split.is_bf16[t] || buf_bottom[t] != nullptr,
+                 "sgd step expects the bottom half of a bf16 momentum buffer");
+      buf_data[t] = momentum_buffers[t].data_ptr();
+    }
+  }
+
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    if (split.is_bf16[t]) {
+      auto* buf = (at::BFloat16*)buf_data[t];
+      sgd_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, buf ? buf + param_offset : nullptr,
+          buf ? buf_bottom[t] + param_offset : nullptr, len, lr, momentum, dampening, weight_decay,
+          nesterov, first_step);
+    } else {
+      auto* buf = (float*)buf_data[t];
+      sgd_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          buf ? buf + param_offset : nullptr, nullptr, len, lr, momentum, dampening, weight_decay,
+          nesterov, first_step);
+    }
+  });
+}
+
+void adagrad_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & state_sums, double clr,
+  double weight_decay, double eps) {
+  int64_t num = params.size();
+  IPEX_CHECK(state_sums.size() == num, "adagrad step expects a state sum per parameter");
+  SplitParams split(params, bottom_halves);
+  TensorChunks grad_chunks(params, grads);
+  auto param_bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  std::vector<void*> param_data(num), grad_data(num), sum_data(num);
+  for (int64_t t = 0; t < num; t++) {
+    IPEX_CHECK(state_sums[t].scalar_type() == at::kFloat, "adagrad step expects fp32 states");
+    param_data[t] = params[t].data_ptr();
+    grad_data[t] = grad_chunks.values[t].data_ptr();
+    sum_data[t] = state_sums[t].data_ptr();
+  }
+
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    if (split.is_bf16[t]) {
+      adagrad_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, (float*)sum_data[t] + param_offset, len, clr,
+          weight_decay, eps);
+    } else {
+      adagrad_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          (float*)sum_data[t] + param_offset, len, clr, weight_decay, eps);
+    }
+  });
+}
+
+void adam_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs,
+  const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps,
+  double weight_decay, bool adamw, int64_t step) {
+  int64_t num = params.size();
+  IPEX_CHECK(exp_avgs.size() == num && exp_avg_sqs.size() == num, "adam step expects the moments of every parameter");
+  SplitParams split(params, bottom_halves);
+  TensorChunks grad_chunks(params, grads);
+  auto param_bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  std::vector<void*> param_data(num), grad_data(num), exp_avg_data(num), exp_avg_sq_data(num);
+  for (int64_t t = 0; t < num; t++) {
+    IPEX_CHECK(exp_avgs[t].scalar_type() == at::kFloat && exp_avg_sqs[t].scalar_type() == at::kFloat,
+               "adam step expects fp32 states");
+    param_data[t] = params[t].data_ptr();
+    grad_data[t] = grad_chunks.values[t].data_ptr();
+    exp_avg_data[t] = exp_avgs[t].data_ptr();
+    exp_avg_sq_data[t] = exp_avg_sqs[t].data_ptr();
+  }
+  float bias_correction1 = 1. - std::pow(beta1, step);
+  float bias_correction2 = 1. - std::pow(beta2, step);
+
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    if (split.is_bf16[t]) {
+      adam_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, (float*)exp_avg_data[t] + param_offset,
+          (float*)exp_avg_sq_data[t] + param_offset, len, lr, beta1, beta2, eps, weight_decay, adamw,
+          bias_correction1, bias_correction2);
+    } else {
+      adam_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          (float*)exp_avg_data[t] + param_offset, (float*)exp_avg_sq_data[t] + param_offset, len, lr, beta1,
+          beta2, eps, weight_decay, adamw, bias_correction1, bias_correction2);
+    }
+  });
+}
+
+void lamb_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs,
+  const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps,
+  double weight_decay, int64_t step) {
+  int64_t num = params.size();
+  IPEX_CHECK(exp_avgs.size() == num && exp_avg_sqs.size() == num, "lamb step expects the moments of every parameter");
+  SplitParams split(params, bottom_halves);
+  TensorChunks grad_chunks(params, grads);
+  auto param_bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  std::vector<void*> param_data(num), grad_data(num), exp_avg_data(num), exp_avg_sq_data(num);
+  for (int64_t t = 0; t < num; t++) {
+    IPEX_CHECK(!grads[t].is_sparse(), "lamb step expects dense gradients");
+    IPEX_CHECK(exp_avgs[t].scalar_type() == at::kFloat && exp_avg_sqs[t].scalar_type() == at::kFloat,
+               "lamb step expects fp32 states");
+    param_data[t] = params[t].data_ptr();
+    grad_data[t] = grad_chunks.values[t].data_ptr();
+    exp_avg_data[t] = exp_avgs[t].data_ptr();
+    exp_avg_sq_data[t] = exp_avg_sqs[t].data_ptr();
+  }
+  float bias_correction1 = 1. - std::pow(beta1, step);
+  float bias_correction2 = 1. - std::pow(beta2, step);
+
+  // the moments, with the norms of the parameters and of their updates
+  ThreadSums sums(num, 2);
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    float param_sq, update_sq;
+    if (split.is_bf16[t]) {
+      lamb_moments_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, (float*)exp_avg_data[t] + param_offset,
+          (float*)exp_avg_sq_data[t] + param_offset, len, beta1, beta2, eps, weight_decay,
+          bias_correction1, bias_correction2, param_sq, update_sq);
+    } else {
+      lamb_moments_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          (float*)exp_avg_data[t] + param_offset, (float*)exp_avg_sq_data[t] + param_offset, len, beta1, beta2,
+          eps, weight_decay, bias_correction1, bias_correction2, param_sq, update_sq);
+    }
+    sums.add(t, 0, param_sq);
+    sums.add(t, 1, update_sq);
+  });
+
+  std::vector<float> step_sizes(num);
+  for (int64_t t = 0; t < num; t++) {
+    auto param_norm = std::sqrt(sums.total(t, 0));
+    auto update_norm = std::sqrt(sums.total(t, 1));
+    step_sizes[t] = (param_norm > 0 && update_norm > 0) ? lr * param_norm / update_norm : lr;
+  }
+
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    if (split.is_bf16[t]) {
+      lamb_update_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (float*)exp_avg_data[t] + param_offset, (float*)exp_avg_sq_data[t] + param_offset, len,
+          step_sizes[t], eps, weight_decay, bias_correction1, bias_correction2);
+    } else {
+      lamb_update_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)exp_avg_data[t] + param_offset,
+          (float*)exp_avg_sq_data[t] + param_offset, len, step_sizes[t], eps, weight_decay, bias_correction1,
+          bias_correction2);
+    }
+  });
+}
+
+void lars_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers,
+  const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double weight_decay,
+  double trust_coefficient, double eps) {
+  int64_t num = params.size();
+  SplitParams split(params, bottom_halves);
+  TensorChunks grad_chunks(params, grads);
+  auto param_bottom = data_ptrs<at::BFloat16>(bottom_halves, num);
+  auto buf_bottom = data_ptrs<at::BFloat16>(momentum_bottom_halves, num);
+  std::vector<void*> param_data(num), grad_data(num), buf_data(num, nullptr);
+  for (int64_t t = 0; t < num; t++) {
+    IPEX_CHECK(!grads[t].is_sparse(), "lars step expects dense gradients");
+    param_data[t] = params[t].data_ptr();
+    grad_data[t] = grad_chunks.values[t].data_ptr();
+    if (t < momentum_buffers.size() && momentum_buffers[t].numel() > 0) {
+      IPEX_CHECK(momentum_buffers[t].scalar_type() == params[t].scalar_type(),
+                 "lars step expects momentum buffers of the parameter dtype");
+      IPEX_CHECK(!split.is_bf16[t] || buf_bottom[t] != nullptr,
+                 "lars step expects the bottom half of a bf16 momentum buffer");
+      buf_data[t] = momentum_buffers[t].data_ptr();
+    }
+  }
+
+  ThreadSums sums(num, 2);
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    float param_sq, grad_sq;
+    if (split.is_bf16[t]) {
+      lars_norms_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, len, param_sq, grad_sq);
+    } else {
+      lars_norms_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          len, param_sq, grad_sq);
+    }
+    sums.add(t, 0, param_sq);
+    sums.add(t, 1, grad_sq);
+  });
+
+  std::vector<float> trust_ratios(num);
+  for (int64_t t = 0; t < num; t++) {
+    auto param_norm = std::sqrt(sums.total(t, 0));
+    auto grad_norm = std::sqrt(sums.total(t, 1));
+    trust_ratios[t] = (param_norm > 0 && grad_norm > 0)
+        ? trust_coefficient * param_norm / (grad_norm + weight_decay * param_norm + eps) : 1.;
+  }
+
+  multi_tensor_apply(grad_chunks, [&](int64_t t, int64_t param_offset, int64_t grad_offset, int64_t len) {
+    if (split.is_bf16[t]) {
+      auto* buf = (at::BFloat16*)buf_data[t];
+      lars_ker<at::BFloat16>((at::BFloat16*)param_data[t] + param_offset, param_bottom[t] + param_offset,
+          (at::BFloat16*)grad_data[t] + grad_offset, buf ? buf + param_offset : nullptr,
+          buf ? buf_bottom[t] + param_offset : nullptr, len, lr, momentum, weight_decay, trust_ratios[t]);
+    } else {
+      auto* buf = (float*)buf_data[t];
+      lars_ker<float>((float*)param_data[t] + param_offset, nullptr, (float*)grad_data[t] + grad_offset,
+          buf ? buf + param_offset : nullptr, nullptr, len, lr, momentum, weight_decay, trust_ratios[t]);
+    }
+  });
+}
+
+}  // namespace optimizer
+}  // namespace aten
+}  // namespace cpu
+}  // namespace torch_ipex
@@ -0,0 +1,61 @@
+#pragma once
+
+#include <ATen/ATen.h>
+#include <ATen/Parallel.h>
+#include <c10/core/ScalarType.h>
+
+#include <vector>
+
+
+namespace torch_ipex {
+namespace cpu {
+namespace aten {
+namespace optimizer {
+
+// Fused optimizer steps over all the parameters of a group in one parallel
+// region. A bf16 parameter is the top half of a split fp32 master weight whose
+// low 16 bits are kept in the bf16 bottom half, a fp32 parameter has an empty
+// bottom half. Sparse gradients update the rows they hold only.
+
+// SGD with momentum, dampening, weight decay and nesterov. The momentum buffer
+// of a bf16 parameter is split as well. first_step initializes the buffers to
+// the gradients.
+void sgd_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers,
+  const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double dampening,
+  double weight_decay, bool nesterov, bool first_step);
+
+// Adagrad, the sums of squares are kept in the dtype of the parameters.
+void adagrad_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & state_sums, double clr,
+  double weight_decay, double eps);
+
+// Adam, or AdamW with decoupled weight decay, the moments are kept in the
+// dtype of the parameters.
+void adam_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs,
+  const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps,
+  double weight_decay, bool adamw, int64_t step);
+
+// LAMB, the moments are kept in the dtype of the parameters. The norms of the
+// parameters and of their updates are taken while the moments are updated,
+// and every parameter is then updated by its own trust ratio. Gradients must
+// be dense.
+void lamb_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & exp_avgs,
+  const std::vector<at::Tensor> & exp_avg_sqs, double lr, double beta1, double beta2, double eps,
+  double weight_decay, int64_t step);
+
+// LARS, SGD with the gradients of every parameter scaled by its trust ratio
+// trust_coefficient * |param| / (|grad| + weight_decay * |param|). The
+// momentum buffers start from zero, the buffer of a bf16 parameter is split.
+// Gradients must be dense.
+void lars_step_impl(const std::vector<at::Tensor> & params, const std::vector<at::Tensor> & bottom_halves,
+  const std::vector<at::Tensor> & grads, const std::vector<at::Tensor> & momentum_buffers,
+  const std::vector<at::Tensor> & momentum_bottom_halves, double lr, double momentum, double weight_decay,
+  double trust_coefficient, double eps);
+
+}  // namespace optimizer
+}  // namespace aten
+}  // namespace cpu
+}  // namespace torch_ipex
@@ -1,15 +1,75 @@
+#pragma once
+
 #include <immintrin.h>
+#include <cstring>
 #include "vec_type_cvt.h"
 
-inline __m512 pack_bf16_to_fp32(const __m256i top, const __m256i bot) {
+// The vector kernels have an AVX-512, an AVX2 and a scalar variant, some of
+// them an AVX512_BF16 one as well. The kernels outside of the vec namespace
+// dispatch to the variant of the ISA the host runs, see cpu/isa/cpu_feature.hpp.
+
+IPEX_TARGET_AVX512 inline __m512 pack_bf16_to_fp32(const __m256i top, const __m256i bot) {
   auto x1 = _mm512_cvtepu16_epi32(top);
   auto x2 = _mm512_cvtepu16_epi32(bot);
   auto y = _mm512_add_epi32(_mm512_bslli_epi128(x1, 2), x2);
   return _mm512_castsi512_ps(y);
 }
 
-// Only support AVX512 impl at current stage. Will expand this impl to cover AVX2 and other cases.
-inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16 *b, int len, float alpha) {
+IPEX_TARGET_AVX2 inline __m256 pack_bf16_to_fp32(const __m128i top, const __m128i bot) {
+  auto x1 = _mm256_cvtepu16_epi32(top);
+  auto x2 = _mm256_cvtepu16_epi32(bot);
+  return _mm256_castsi256_ps(_mm256_add_epi32(_mm256_slli_epi32(x1, 16), x2));
+}
+
+// The low 16 bits of fp32 values, the bottom halves of the split values.
+IPEX_TARGET_AVX2 inline __m128i bottom_half_of_fp32(const __m256 src) {
+  return pack_epi32_to_epi16(_mm256_and_si256(_mm256_castps_si256(src), _mm256_set1_epi32(0xffff)));
+}
+
+IPEX_TARGET_AVX512 static inline __m512 load_fp32(const float *in) {
+  return _mm512_loadu_ps(in);
+}
+
+IPEX_TARGET_AVX512 static inline __m512 load_fp32(const at::BFloat16 *in) {
+  return cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)in));
+}
+
+IPEX_TARGET_AVX512 static inline __m512 maskz_load_fp32(__mmask16 mask, const float *in) {
+  return _mm512_maskz_loadu_ps(mask, in);
+}
+
+IPEX_TARGET_AVX512 static inline __m512 maskz_load_fp32(__mmask16 mask, const at::BFloat16 *in) {
+  return cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in));
+}
+
+// Loads of 8 fp32 values by the AVX2 variants.
+IPEX_TARGET_AVX2 static inline __m256 load8_fp32(const float *in) {
+  return _mm256_loadu_ps(in);
+}
+
+IPEX_TARGET_AVX2 static inline __m256 load8_fp32(const at::BFloat16 *in) {
+  return cvt_bf16_to_fp32(_mm_loadu_si128((__m128i*)in));
+}
+
+// fp32 value of a split bf16 value, and the split of a fp32 one.
+static inline float pack_bf16_to_fp32(at::BFloat16 top, at::BFloat16 bot) {
+  uint32_t bits = ((uint32_t)top.x << 16) | bot.x;
+  float value;
+  std::memcpy(&value, &bits, sizeof(value));
+  return value;
+}
+
+static inline void split_fp32_to_bf16(float value, at::BFloat16 &top, at::BFloat16 &bot) {
+  uint32_t bits;
+  std::memcpy(&bits, &value, sizeof(bits));
+  top.x = bits >> 16;
+  bot.x = bits & 0xffff;
+}
+
+namespace vec {
+namespace avx512 {
+
+IPEX_TARGET_AVX512 inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16 *b, int len, float alpha) {
   auto vAlpha = _mm512_set1_ps(alpha);
   int i = 0;
   for (; i < len - 15; i += 16) {
@@ -18,7 +78,7 @@ inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16
     auto y1 = _mm256_loadu_si256((__m256i *)(b + i));
 
     auto z1 = pack_bf16_to_fp32(x1, x2);
-    auto z2 = cvt_bf16_to_fp32(y1);
+    auto z2 = ::cvt_bf16_to_fp32(y1);
     z1 = _mm512_fmadd_ps(vAlpha, z2, z1);
     // Update result back to split input tensors.
     _mm256_storeu_si256((__m256i *)(a1 + i), trunc_fp32_to_bf16(z1));
@@ -32,7 +92,7 @@ inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16
     auto y1 = _mm256_maskz_loadu_epi16(mask, b + i);
 
     auto z1 = pack_bf16_to_fp32(x1, x2);
-    auto z2 = cvt_bf16_to_fp32(y1);
+    auto z2 = ::cvt_bf16_to_fp32(y1);
     z1 = _mm512_fmadd_ps(vAlpha, z2, z1);
     // Update result back to split input tensors.
     _mm256_mask_storeu_epi16(a1 + i, mask, trunc_fp32_to_bf16(z1));
@@ -40,38 +100,38 @@ inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16
   }
 }
 
-inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
+IPEX_TARGET_AVX512 inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
   int i;
   #pragma unroll(2)
   for(i = 0; i < len - 31; i += 32) {
-    auto inout1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
-    auto inout2 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i + 16)));
-    auto in1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
-    auto in2 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i + 16)));
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
+    auto inout2 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i + 16)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    auto in2 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i + 16)));
     inout1 = _mm512_add_ps(inout1, in1);
     inout2 = _mm512_add_ps(inout2, in2);
-    _mm256_storeu_si256((__m256i*)(inout + i), cvt_fp32_to_bf16(inout1));
-    _mm256_storeu_si256((__m256i*)(inout + i + 16), cvt_fp32_to_bf16(inout2));
+    _mm256_storeu_si256((__m256i*)(inout + i), ::cvt_fp32_to_bf16(inout1));
+    _mm256_storeu_si256((__m256i*)(inout + i + 16), ::cvt_fp32_to_bf16(inout2));
   }
 
   if (i < len - 15) {
-    auto inout1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
-    auto in1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
     inout1 = _mm512_add_ps(inout1, in1);
-    _mm256_storeu_si256((__m256i*)(inout + i), cvt_fp32_to_bf16(inout1));
+    _mm256_storeu_si256((__m256i*)(inout + i), ::cvt_fp32_to_bf16(inout1));
     i += 16;
   }
 
   if(i < len) {
     auto mask = (1 << (len - i)) - 1;
-    auto inout1 = cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, inout + i));
-    auto in1 = cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in + i));
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, inout + i));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in + i));
     inout1 = _mm512_add_ps(inout1, in1);
-    _mm256_mask_storeu_epi16(inout + i, mask, cvt_fp32_to_bf16(inout1));
+    _mm256_mask_storeu_epi16(inout + i, mask, ::cvt_fp32_to_bf16(inout1));
   }
 }
 
-static inline void add_ker(float *inout, float *in, int len) {
+IPEX_TARGET_AVX512 static inline void add_ker(float *inout, float *in, int len) {
   int i;
   #pragma unroll(2)
   for(i = 0; i < len - 31; i += 32) {
@@ -100,12 +160,12 @@ static inline void add_ker(float *inout, float *in, int len) {
   }
 }
 
-static inline void add_ker(float *inout, at::BFloat16 *in, int len) {
+IPEX_TARGET_AVX512 static inline void add_ker(float *inout, at::BFloat16 *in, int len) {
   int i;
   #pragma unroll(2)
   for(i = 0; i < len - 31; i += 32) {
-    auto in1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
-    auto in2 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i + 16)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    auto in2 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i + 16)));
     auto inout1 = _mm512_loadu_ps(inout + i);
     auto inout2 = _mm512_loadu_ps(inout + i + 16);
     inout1 = _mm512_add_ps(inout1, in1);
@@ -115,7 +175,7 @@ static inline void add_ker(float *inout, at::BFloat16 *in, int len) {
   }
 
   if (i < len - 15) {
-    auto in1 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
     auto inout1 = _mm512_loadu_ps(inout + i);
     inout1 = _mm512_add_ps(inout1, in1);
     _mm512_storeu_ps(inout + i, inout1);
@@ -124,37 +184,136 @@ static inline void add_ker(float *inout, at::BFloat16 *in, int len) {
 
   if(i < len) {
     auto mask = (1 << (len - i)) - 1;
-    auto in1 = cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in + i));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in + i));
     auto inout1 = _mm512_maskz_loadu_ps(mask, inout + i);
     inout1 = _mm512_add_ps(inout1, in1);
     _mm512_mask_storeu_ps(inout + i, mask, inout1);
   }
 }
 
-static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
+// inout += alpha * in
+template <typename T>
+IPEX_TARGET_AVX512 static inline void madd_ker(float *inout, const T *in, int len, float alpha) {
+  auto vAlpha = _mm512_set1_ps(alpha);
+  int i;
+  #pragma unroll(2)
+  for (i = 0; i < len - 31; i += 32) {
+    auto inout1 = _mm512_fmadd_ps(vAlpha, load_fp32(in + i), _mm512_loadu_ps(inout + i));
+    auto inout2 = _mm512_fmadd_ps(vAlpha, load_fp32(in + i + 16), _mm512_loadu_ps(inout + i + 16));
+    _mm512_storeu_ps(inout + i, inout1);
+    _mm512_storeu_ps(inout + i + 16, inout2);
+  }
+
+  if (i < len - 15) {
+    auto inout1 = _mm512_fmadd_ps(vAlpha, load_fp32(in + i), _mm512_loadu_ps(inout + i));
+    _mm512_storeu_ps(inout + i, inout1);
+    i += 16;
+  }
+
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    auto inout1 = _mm512_fmadd_ps(vAlpha, maskz_load_fp32(mask, in + i), _mm512_maskz_loadu_ps(mask, inout + i));
+    _mm512_mask_storeu_ps(inout + i, mask, inout1);
+  }
+}
+
+// inout += alpha1 * in1 + alpha2 * in2
+IPEX_TARGET_AVX512 static inline void madd2_ker(float *inout, const at::BFloat16 *in1, const at::BFloat16 *in2,
+                                                at::BFloat16 alpha1, at::BFloat16 alpha2, int len) {
+  auto vAlpha1 = _mm512_set1_ps(alpha1);
+  auto vAlpha2 = _mm512_set1_ps(alpha2);
+  int i;
+  for (i = 0; i < len - 15; i += 16) {
+    auto inout1 = _mm512_fmadd_ps(vAlpha1, load_fp32(in1 + i), _mm512_loadu_ps(inout + i));
+    _mm512_storeu_ps(inout + i, _mm512_fmadd_ps(vAlpha2, load_fp32(in2 + i), inout1));
+  }
+
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    auto inout1 = _mm512_fmadd_ps(vAlpha1, maskz_load_fp32(mask, in1 + i), _mm512_maskz_loadu_ps(mask, inout + i));
+    _mm512_mask_storeu_ps(inout + i, mask, _mm512_fmadd_ps(vAlpha2, maskz_load_fp32(mask, in2 + i), inout1));
+  }
+}
+
+// inout *= alpha
+IPEX_TARGET_AVX512 static inline void scale_ker(float *inout, float alpha, int64_t len) {
+  auto vAlpha = _mm512_set1_ps(alpha);
+  int64_t i;
+  #pragma unroll(4)
+  for (i = 0; i < len - 15; i += 16) {
+    _mm512_storeu_ps(inout + i, _mm512_mul_ps(vAlpha, _mm512_loadu_ps(inout + i)));
+  }
+
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    _mm512_mask_storeu_ps(inout + i, mask, _mm512_mul_ps(vAlpha, _mm512_maskz_loadu_ps(mask, inout + i)));
+  }
+}
+
+// Element-wise maximum of inout and in, the elements of inout_idx are set to
+// idx where in is the greater one.
+template <typename T>
+IPEX_TARGET_AVX512 static inline void max_ker(float *inout, int64_t *inout_idx, const T *in, int64_t idx, int len) {
+  auto vIdx = _mm512_set1_epi64(idx);
+  int i;
+  for (i = 0; i < len - 15; i += 16) {
+    auto in1 = load_fp32(in + i);
+    __mmask16 greater = _mm512_cmp_ps_mask(in1, _mm512_loadu_ps(inout + i), _CMP_GT_OQ);
+    _mm512_mask_storeu_ps(inout + i, greater, in1);
+    _mm512_mask_storeu_epi64(inout_idx + i, (__mmask8)greater, vIdx);
+    _mm512_mask_storeu_epi64(inout_idx + i + 8, (__mmask8)(greater >> 8), vIdx);
+  }
+
+  if (i < len) {
+    __mmask16 mask = (1 << (len - i)) - 1;
+    auto in1 = maskz_load_fp32(mask, in + i);
+    __mmask16 greater = _mm512_mask_cmp_ps_mask(mask, in1, _mm512_maskz_loadu_ps(mask, inout + i), _CMP_GT_OQ);
+    _mm512_mask_storeu_ps(inout + i, greater, in1);
+    _mm512_mask_storeu_epi64(inout_idx + i, (__mmask8)greater, vIdx);
+    _mm512_mask_storeu_epi64(inout_idx + i + 8, (__mmask8)(greater >> 8), vIdx);
+  }
+}
+
+// sum(a * b) accumulated in fp32
+template <typename T>
+IPEX_TARGET_AVX512 static inline float dot_ker(const T *a, const T *b, int len) {
+  auto sum = _mm512_setzero_ps();
+  int i;
+  for (i = 0; i < len - 15; i += 16) {
+    sum = _mm512_fmadd_ps(load_fp32(a + i), load_fp32(b + i), sum);
+  }
+
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    sum = _mm512_fmadd_ps(maskz_load_fp32(mask, a + i), maskz_load_fp32(mask, b + i), sum);
+  }
+  return _mm512_reduce_add_ps(sum);
+}
+
+IPEX_TARGET_AVX512 static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
   int64_t i;
   #pragma unroll(4)
   for (i = 0; i < len - 31; i += 32) {
-    auto in0 = cvt_fp32_to_bf16(_mm512_loadu_ps(in + i));
-    auto in1 = cvt_fp32_to_bf16(_mm512_loadu_ps(in + i + 16));
+    auto in0 = ::cvt_fp32_to_bf16(_mm512_loadu_ps(in + i));
+    auto in1 = ::cvt_fp32_to_bf16(_mm512_loadu_ps(in + i + 16));
     _mm256_storeu_si256((__m256i *)(out + i), in0);
     _mm256_storeu_si256((__m256i *)(out + i + 16), in1);
   }
 
   if (i < len - 15) {
-    auto in0 = cvt_fp32_to_bf16(_mm512_loadu_ps(in + i));
+    auto in0 = ::cvt_fp32_to_bf16(_mm512_loadu_ps(in + i));
     _mm256_storeu_si256((__m256i *)(out + i), in0);
     i += 16;
   }
 
   if (i < len) {
     auto mask = ((1 << (len - i)) - 1);
-    auto in0 = cvt_fp32_to_bf16(_mm512_maskz_loadu_ps(mask, in + i));
+    auto in0 = ::cvt_fp32_to_bf16(_mm512_maskz_loadu_ps(mask, in + i));
     _mm256_mask_storeu_epi16((__m256i *)(out + i), mask, in0);
   }
 }
 
-static inline void move_ker(float *out, const float *in, int64_t len) {
+IPEX_TARGET_AVX512 static inline void move_ker(float *out, const float *in, int64_t len) {
   int64_t i;
   #pragma unroll(4)
   for (i = 0; i < len - 15 ; i += 16) {
@@ -169,7 +328,7 @@ static inline void move_ker(float *out, const float *in, int64_t len) {
   }
 }
 
-static inline void move_ker(at::BFloat16 *out, const at::BFloat16 *in, int64_t len) {
+IPEX_TARGET_AVX512 static inline void move_ker(at::BFloat16 *out, const at::BFloat16 *in, int64_t len) {
   int64_t i;
   #pragma unroll(4)
   for (i = 0; i < len - 31; i += 32) {
@@ -184,7 +343,7 @@ static inline void move_ker(at::BFloat16 *out, const at::BFloat16 *in, int64_t l
   }
 }
 
-static inline void move_ker(int64_t *out, int64_t *in, int64_t len) {
+IPEX_TARGET_AVX512 static inline void move_ker(int64_t *out, int64_t *in, int64_t len) {
   int64_t i;
   #pragma unroll(4)
   for (i = 0; i < len - 7 ; i += 8) {
@@ -199,7 +358,7 @@ static inline void move_ker(int64_t *out, int64_t *in, int64_t len) {
   }
 }
 
-static inline void move_ker(int32_t *out, const int32_t *in, int64_t len) {
+IPEX_TARGET_AVX512 static inline void move_ker(int32_t *out, const int32_t *in, int64_t len) {
   int64_t i;
   #pragma unroll(4)
   for (i = 0; i < len - 15 ; i += 16) {
@@ -214,7 +373,7 @@ static inline void move_ker(int32_t *out, const int32_t *in, int64_t len) {
   }
 }
 
-static inline void zero_ker(float *out, int64_t len) {
+IPEX_TARGET_AVX512 static inline void zero_ker(float *out, int64_t len) {
   int64_t i;
   __m512 zero_512 = _mm512_setzero_ps();
   #pragma unroll(4)
@@ -228,7 +387,7 @@ static inline void zero_ker(float *out, int64_t len) {
   }
 }
 
-static inline void zero_ker(at::BFloat16 *out, int64_t len) {
+IPEX_TARGET_AVX512 static inline void zero_ker(at::BFloat16 *out, int64_t len) {
   int64_t i;
   __m512i zero_512 = _mm512_setzero_si512();
   #pragma unroll(4)
@@ -241,3 +400,383 @@ static inline void zero_ker(at::BFloat16 *out, int64_t len) {
     _mm512_mask_storeu_epi16(out + i, mask, zero_512);
   }
 }
+
+}  // namespace avx512
+
+#if defined(AVX512_BF16)
+// The kernels rounding fp32 values to bf16 with vcvtne2ps2bf16, and
+// multiplying bf16 values with vdpbf16ps.
+namespace avx512_bf16 {
+
+IPEX_TARGET_AVX512_BF16 inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
+  int i;
+  for (i = 0; i < len - 31; i += 32) {
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
+    auto inout2 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i + 16)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    auto in2 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i + 16)));
+    _mm512_storeu_si512(inout + i, cvt2_fp32_to_bf16(_mm512_add_ps(inout1, in1), _mm512_add_ps(inout2, in2)));
+  }
+
+  if (i < len - 15) {
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(inout + i)));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i*)(in + i)));
+    _mm256_storeu_si256((__m256i*)(inout + i), cvt_fp32_to_bf16(_mm512_add_ps(inout1, in1)));
+    i += 16;
+  }
+
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    auto inout1 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, inout + i));
+    auto in1 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, in + i));
+    _mm256_mask_storeu_epi16(inout + i, mask, cvt_fp32_to_bf16(_mm512_add_ps(inout1, in1)));
+  }
+}
+
+IPEX_TARGET_AVX512_BF16 static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
+  cvt_fp32_to_bf16(out, in, len);
+}
+
+// The pairs of bf16 values of in1 and in2, the ones of the elements [0, 16)
+// of a 32-element block in lo and the ones of the elements [16, 32) in hi.
+IPEX_TARGET_AVX512_BF16 static inline void interleave_bf16(__m512i in1, __m512i in2, __m512i &lo, __m512i &hi) {
+  const auto vIdxLo = _mm512_set_epi16(47, 15, 46, 14, 45, 13, 44, 12, 43, 11, 42, 10, 41, 9, 40, 8,
+                                       39, 7, 38, 6, 37, 5, 36, 4, 35, 3, 34, 2, 33, 1, 32, 0);
+  const auto vIdxHi = _mm512_set_epi16(63, 31, 62, 30, 61, 29, 60, 28, 59, 27, 58, 26, 57, 25, 56, 24,
+                                       55, 23, 54, 22, 53, 21, 52, 20, 51, 19, 50, 18, 49, 17, 48, 16);
+  lo = _mm512_permutex2var_epi16(in1, vIdxLo, in2);
+  hi = _mm512_permutex2var_epi16(in1, vIdxHi, in2);
+}
+
+// inout += alpha1 * in1 + alpha2 * in2, with one vdpbf16ps for the products of
+// both inputs. The products of bf16 values are exact in fp32.
+IPEX_TARGET_AVX512_BF16 static inline void madd2_ker(float *inout, const at::BFloat16 *in1, const at::BFloat16 *in2,
+                                                     at::BFloat16 alpha1, at::BFloat16 alpha2, int len) {
+  auto vAlpha = (__m512bh)_mm512_set1_epi32(((uint32_t)alpha2.x << 16) | alpha1.x);
+  int i;
+  for (i = 0; i < len - 31; i += 32) {
+    __m512i lo, hi;
+    interleave_bf16(_mm512_loadu_si512(in1 + i), _mm512_loadu_si512(in2 + i), lo, hi);
+    _mm512_storeu_ps(inout + i, _mm512_dpbf16_ps(_mm512_loadu_ps(inout + i), (__m512bh)lo, vAlpha));
+    _mm512_storeu_ps(inout + i + 16, _mm512_dpbf16_ps(_mm512_loadu_ps(inout + i + 16), (__m512bh)hi, vAlpha));
+  }
+
+  for (; i < len; i += 16) {
+    __mmask16 mask = len - i >= 16 ? 0xffff : (1 << (len - i)) - 1;
+    auto x1 = _mm512_cvtepu16_epi32(_mm256_maskz_loadu_epi16(mask, in1 + i));
+    auto x2 = _mm512_cvtepu16_epi32(_mm256_maskz_loadu_epi16(mask, in2 + i));
+    auto pairs = (__m512bh)_mm512_or_si512(x1, _mm512_slli_epi32(x2, 16));
+    auto inout1 = _mm512_dpbf16_ps(_mm512_maskz_loadu_ps(mask, inout + i), pairs, vAlpha);
+    _mm512_mask_storeu_ps(inout + i, mask, inout1);
+  }
+}
+
+// sum(a * b) accumulated in fp32, two products per lane and instruction
+IPEX_TARGET_AVX512_BF16 static inline float dot_ker(const at::BFloat16 *a, const at::BFloat16 *b, int len) {
+  auto sum = _mm512_setzero_ps();
+  int i;
+  for (i = 0; i < len - 31; i += 32) {
+    sum = _mm512_dpbf16_ps(sum, (__m512bh)_mm512_loadu_si512(a + i), (__m512bh)_mm512_loadu_si512(b + i));
+  }
+
+  if (i < len) {
+    __mmask32 mask = (1u << (len - i)) - 1;
+    auto a1 = (__m512bh)_mm512_maskz_loadu_epi16(mask, a + i);
+    sum = _mm512_dpbf16_ps(sum, a1, (__m512bh)_mm512_maskz_loadu_epi16(mask, b + i));
+  }
+  return _mm512_reduce_add_ps(sum);
+}
+
+}  // namespace avx512_bf16
+#endif
+
+namespace avx2 {
+
+IPEX_TARGET_AVX2 inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16 *b, int len, float alpha) {
+  auto vAlpha = _mm256_set1_ps(alpha);
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto z1 = pack_bf16_to_fp32(_mm_loadu_si128((__m128i *)(a1 + i)), _mm_loadu_si128((__m128i *)(a2 + i)));
+    z1 = _mm256_fmadd_ps(vAlpha, load8_fp32(b + i), z1);
+    _mm_storeu_si128((__m128i *)(a1 + i), trunc_fp32_to_bf16(z1));
+    _mm_storeu_si128((__m128i *)(a2 + i), bottom_half_of_fp32(z1));
+  }
+  for (; i < len; i++) {
+    split_fp32_to_bf16(pack_bf16_to_fp32(a1[i], a2[i]) + alpha * (float)b[i], a1[i], a2[i]);
+  }
+}
+
+IPEX_TARGET_AVX2 inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto inout1 = _mm256_add_ps(load8_fp32(inout + i), load8_fp32(in + i));
+    _mm_storeu_si128((__m128i *)(inout + i), ::cvt_fp32_to_bf16(inout1));
+  }
+  for (; i < len; i++) {
+    inout[i] = (float)inout[i] + (float)in[i];
+  }
+}
+
+template <typename T>
+IPEX_TARGET_AVX2 static inline void add_ker(float *inout, T *in, int len) {
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    _mm256_storeu_ps(inout + i, _mm256_add_ps(_mm256_loadu_ps(inout + i), load8_fp32(in + i)));
+  }
+  for (; i < len; i++) {
+    inout[i] += (float)in[i];
+  }
+}
+
+template <typename T>
+IPEX_TARGET_AVX2 static inline void madd_ker(float *inout, const T *in, int len, float alpha) {
+  auto vAlpha = _mm256_set1_ps(alpha);
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    _mm256_storeu_ps(inout + i, _mm256_fmadd_ps(vAlpha, load8_fp32(in + i), _mm256_loadu_ps(inout + i)));
+  }
+  for (; i < len; i++) {
+    inout[i] += alpha * (float)in[i];
+  }
+}
+
+IPEX_TARGET_AVX2 static inline void madd2_ker(float *inout, const at::BFloat16 *in1, const at::BFloat16 *in2,
+                                              at::BFloat16 alpha1, at::BFloat16 alpha2, int len) {
+  auto vAlpha1 = _mm256_set1_ps(alpha1);
+  auto vAlpha2 = _mm256_set1_ps(alpha2);
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto inout1 = _mm256_fmadd_ps(vAlpha1, load8_fp32(in1 + i), _mm256_loadu_ps(inout + i));
+    _mm256_storeu_ps(inout + i, _mm256_fmadd_ps(vAlpha2, load8_fp32(in2 + i), inout1));
+  }
+  for (; i < len; i++) {
+    inout[i] += (float)alpha1 * (float)in1[i] + (float)alpha2 * (float)in2[i];
+  }
+}
+
+IPEX_TARGET_AVX2 static inline void scale_ker(float *inout, float alpha, int64_t len) {
+  auto vAlpha = _mm256_set1_ps(alpha);
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    _mm256_storeu_ps(inout + i, _mm256_mul_ps(vAlpha, _mm256_loadu_ps(inout + i)));
+  }
+  for (; i < len; i++) {
+    inout[i] *= alpha;
+  }
+}
+
+template <typename T>
+IPEX_TARGET_AVX2 static inline void max_ker(float *inout, int64_t *inout_idx, const T *in, int64_t idx, int len) {
+  auto vIdx = _mm256_set1_epi64x(idx);
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    auto in1 = load8_fp32(in + i);
+    auto inout1 = _mm256_loadu_ps(inout + i);
+    auto greater = _mm256_castps_si256(_mm256_cmp_ps(in1, inout1, _CMP_GT_OQ));
+    _mm256_storeu_ps(inout + i, _mm256_blendv_ps(inout1, in1, _mm256_castsi256_ps(greater)));
+    // the 32-bit lanes of the comparison widened to the 64-bit indices
+    _mm256_maskstore_epi64((long long *)(inout_idx + i), _mm256_cvtepi32_epi64(_mm256_castsi256_si128(greater)), vIdx);
+    _mm256_maskstore_epi64((long long *)(inout_idx + i + 4), _mm256_cvtepi32_epi64(_mm256_extracti128_si256(greater, 1)), vIdx);
+  }
+  for (; i < len; i++) {
+    if ((float)in[i] > inout[i]) {
+      inout[i] = in[i];
+      inout_idx[i] = idx;
+    }
+  }
+}
+
+template <typename T>
+IPEX_TARGET_AVX2 static inline float dot_ker(const T *a, const T *b, int len) {
+  auto sum = _mm256_setzero_ps();
+  int i;
+  for (i = 0; i < len - 7; i += 8) {
+    sum = _mm256_fmadd_ps(load8_fp32(a + i), load8_fp32(b + i), sum);
+  }
+  auto sum4 = _mm_add_ps(_mm256_castps256_ps128(sum), _mm256_extractf128_ps(sum, 1));
+  sum4 = _mm_hadd_ps(sum4, sum4);
+  float result = _mm_cvtss_f32(_mm_hadd_ps(sum4, sum4));
+  for (; i < len; i++) {
+    result += (float)a[i] * (float)b[i];
+  }
+  return result;
+}
+
+IPEX_TARGET_AVX2 static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
+  int64_t i;
+  for (i = 0; i < len - 7; i += 8) {
+    _mm_storeu_si128((__m128i *)(out + i), ::cvt_fp32_to_bf16(_mm256_loadu_ps(in + i)));
+  }
+  for (; i < len; i++) {
+    out[i] = in[i];
+  }
+}
+
+template <typename T>
+static inline void move_ker(T *out, const T *in, int64_t len) {
+  std::memcpy(out, in, len * sizeof(T));
+}
+
+template <typename T>
+static inline void zero_ker(T *out, int64_t len) {
+  std::memset(out, 0, len * sizeof(T));
+}
+
+}  // namespace avx2
+
+namespace scalar {
+
+static inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16 *b, int len, float alpha) {
+  for (int i = 0; i < len; i++) {
+    split_fp32_to_bf16(pack_bf16_to_fp32(a1[i], a2[i]) + alpha * (float)b[i], a1[i], a2[i]);
+  }
+}
+
+static inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
+  for (int i = 0; i < len; i++) {
+    inout[i] = (float)inout[i] + (float)in[i];
+  }
+}
+
+template <typename T>
+static inline void add_ker(float *inout, T *in, int len) {
+  for (int i = 0; i < len; i++) {
+    inout[i] += (float)in[i];
+  }
+}
+
+template <typename T>
+static inline void madd_ker(float *inout, const T *in, int len, float alpha) {
+  for (int i = 0; i < len; i++) {
+    inout[i] += alpha * (float)in[i];
+  }
+}
+
+static inline void madd2_ker(float *inout, const at::BFloat16 *in1, const at::BFloat16 *in2,
+                             at::BFloat16 alpha1, at::BFloat16 alpha2, int len) {
+  for (int i = 0; i < len; i++) {
+    inout[i] += (float)alpha1 * (float)in1[i] + (float)alpha2 * (float)in2[i];
+  }
+}
+
+static inline void scale_ker(float *inout, float alpha, int64_t len) {
+  for (int64_t i = 0; i < len; i++) {
+    inout[i] *= alpha;
+  }
+}
+
+template <typename T>
+static inline void max_ker(float *inout, int64_t *inout_idx, const T *in, int64_t idx, int len) {
+  for (int i = 0; i < len; i++) {
+    if ((float)in[i] > inout[i]) {
+      inout[i] = in[i];
+      inout_idx[i] = idx;
+    }
+  }
+}
+
+template <typename T>
+static inline float dot_ker(const T *a, const T *b, int len) {
+  float sum = 0.f;
+  for (int i = 0; i < len; i++) {
+    sum += (float)a[i] * (float)b[i];
+  }
+  return sum;
+}
+
+static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
+  for (int64_t i = 0; i < len; i++) {
+    out[i] = in[i];
+  }
+}
+
+template <typename T>
+static inline void move_ker(T *out, const T *in, int64_t len) {
+  std::memcpy(out, in, len * sizeof(T));
+}
+
+template <typename T>
+static inline void zero_ker(T *out, int64_t len) {
+  std::memset(out, 0, len * sizeof(T));
+}
+
+}  // namespace scalar
+}  // namespace vec
+
+inline void packed_bf16_add_ker(at::BFloat16 *a1, at::BFloat16 *a2, at::BFloat16 *b, int len, float alpha) {
+  IPEX_VEC_DISPATCH(packed_bf16_add_ker, a1, a2, b, len, alpha);
+}
+
+inline void add_ker(at::BFloat16 *inout, at::BFloat16 *in, int len) {
+  IPEX_VEC_DISPATCH_BF16(add_ker, inout, in, len);
+}
+
+static inline void add_ker(float *inout, float *in, int len) {
+  IPEX_VEC_DISPATCH(add_ker, inout, in, len);
+}
+
+static inline void add_ker(float *inout, at::BFloat16 *in, int len) {
+  IPEX_VEC_DISPATCH(add_ker, inout, in, len);
+}
+
+// inout += alpha * in
+template <typename T>
+static inline void madd_ker(float *inout, const T *in, int len, float alpha) {
+  IPEX_VEC_DISPATCH(madd_ker<T>, inout, in, len, alpha);
+}
+
+// inout += alpha1 * in1 + alpha2 * in2
+static inline void madd2_ker(float *inout, const at::BFloat16 *in1, const at::BFloat16 *in2,
+                             at::BFloat16 alpha1, at::BFloat16 alpha2, int len) {
+  IPEX_VEC_DISPATCH_BF16(madd2_ker, inout, in1, in2, alpha1, alpha2, len);
+}
+
+// inout *= alpha
+static inline void scale_ker(float *inout, float alpha, int64_t len) {
+  IPEX_VEC_DISPATCH(scale_ker, inout, alpha, len);
+}
+
+// Element-wise maximum of inout and in, the elements of inout_idx are set to
+// idx where in is the greater one.
+template <typename T>
+static inline void max_ker(float *inout, int64_t *inout_idx, const T *in, int64_t idx, int len) {
+  IPEX_VEC_DISPATCH(max_ker<T>, inout, inout_idx, in, idx, len);
+}
+
+// sum(a * b) accumulated in fp32
+template <typename T>
+static inline float dot_ker(const T *a, const T *b, int len) {
+  IPEX_VEC_DISPATCH(dot_ker<T>, a, b, len);
+}
+
+static inline float dot_ker(const at::BFloat16 *a, const at::BFloat16 *b, int len) {
+  IPEX_VEC_DISPATCH_BF16(dot_ker, a, b, len);
+}
+
+static inline void move_ker(at::BFloat16 *out, float *in, int64_t len) {
+  IPEX_VEC_DISPATCH_BF16(move_ker, out, in, len);
+}
+
+static inline void move_ker(float *out, const float *in, int64_t len) {
+  IPEX_VEC_DISPATCH(move_ker, out, in, len);
+}
+
+static inline void move_ker(at::BFloat16 *out, const at::BFloat16 *in, int64_t len) {
+  IPEX_VEC_DISPATCH(move_ker, out, in, len);
+}
+
+static inline void move_ker(int64_t *out, int64_t *in, int64_t len) {
+  IPEX_VEC_DISPATCH(move_ker, out, in, len);
+}
+
+static inline void move_ker(int32_t *out, const int32_t *in, int64_t len) {
+  IPEX_VEC_DISPATCH(move_ker, out, in, len);
+}
+
+static inline void zero_ker(float *out, int64_t len) {
+  IPEX_VEC_DISPATCH(zero_ker, out, len);
+}
+
+static inline void zero_ker(at::BFloat16 *out, int64_t len) {
+  IPEX_VEC_DISPATCH(zero_ker, out, len);
+}
@@ -1,47 +1,201 @@
+#pragma once
+
 #include <immintrin.h>
+#include <c10/util/BFloat16.h>
+
+#include "../../isa/cpu_feature.hpp"
+
+// Conversions between fp32 and bf16 registers of the AVX-512 and AVX2
+// variants, and of arrays dispatched to the variant of the host. fp32 values
+// are rounded to the nearest even bf16 like at::BFloat16 does.
 
-// Conversion from BF16 to FP32
-inline __m512 cvt_bf16_to_fp32(const __m256i src) {
+// AVX-512 conversion from BF16 to FP32
+IPEX_TARGET_AVX512 inline __m512 cvt_bf16_to_fp32(const __m256i src) {
   auto y = _mm512_cvtepu16_epi32(src);
   return _mm512_castsi512_ps(_mm512_bslli_epi128(y, 2));
 }
 
-inline void cvt_bf16_to_fp32(float *dst, const at::BFloat16 *src, int len) {
+// AVX-512 conversions from FP32 to BF16
+IPEX_TARGET_AVX512 inline __m256i trunc_fp32_to_bf16(const __m512 src) {
+  auto y = _mm512_bsrli_epi128(_mm512_castps_si512(src), 2);
+  return _mm512_cvtepi32_epi16(y);
+}
+
+IPEX_TARGET_AVX512 inline __m256i cvt_fp32_to_bf16(const __m512 src) {
+  auto x = _mm512_castps_si512(src);
+  auto lsb = _mm512_and_si512(_mm512_srli_epi32(x, 16), _mm512_set1_epi32(1));
+  auto y = _mm512_srli_epi32(_mm512_add_epi32(x, _mm512_add_epi32(lsb, _mm512_set1_epi32(0x7fff))), 16);
+  // NaNs are kept quiet NaNs rather than rounded
+  auto nan = _mm512_cmp_ps_mask(src, src, _CMP_UNORD_Q);
+  y = _mm512_mask_blend_epi32(nan, y, _mm512_set1_epi32(0x7fc0));
+  return _mm512_cvtepi32_epi16(y);
+}
+
+// AVX2 conversion from BF16 to FP32
+IPEX_TARGET_AVX2 inline __m256 cvt_bf16_to_fp32(const __m128i src) {
+  auto y = _mm256_cvtepu16_epi32(src);
+  return _mm256_castsi256_ps(_mm256_slli_epi32(y, 16));
+}
+
+// AVX2 conversions from FP32 to BF16, the 32-bit lanes holding the bf16 values
+// are packed into 16-bit ones.
+IPEX_TARGET_AVX2 inline __m128i pack_epi32_to_epi16(const __m256i src) {
+  return _mm_packus_epi32(_mm256_castsi256_si128(src), _mm256_extracti128_si256(src, 1));
+}
+
+IPEX_TARGET_AVX2 inline __m128i trunc_fp32_to_bf16(const __m256 src) {
+  return pack_epi32_to_epi16(_mm256_srli_epi32(_mm256_castps_si256(src), 16));
+}
+
+IPEX_TARGET_AVX2 inline __m128i cvt_fp32_to_bf16(const __m256 src) {
+  auto x = _mm256_castps_si256(src);
+  auto lsb = _mm256_and_si256(_mm256_srli_epi32(x, 16), _mm256_set1_epi32(1));
+  auto y = _mm256_srli_epi32(_mm256_add_epi32(x, _mm256_add_epi32(lsb, _mm256_set1_epi32(0x7fff))), 16);
+  auto nan = _mm256_castps_si256(_mm256_cmp_ps(src, src, _CMP_UNORD_Q));
+  y = _mm256_blendv_epi8(y, _mm256_set1_epi32(0x7fc0), nan);
+  return pack_epi32_to_epi16(y);
+}
+
+namespace vec {
+namespace avx512 {
+
+IPEX_TARGET_AVX512 inline void cvt_bf16_to_fp32(float *dst, const at::BFloat16 *src, int len) {
   int i = 0;
   for (; i < len - 15; i += 16) {
-    auto f32 = cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i *)(src + i)));
+    auto f32 = ::cvt_bf16_to_fp32(_mm256_loadu_si256((__m256i *)(src + i)));
     _mm512_storeu_ps(dst + i, f32);
   }
   if (i < len) {
-    auto  mask = (1 << (len - i)) - 1;
-    auto f32 = cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, src + i));
+    auto mask = (1 << (len - i)) - 1;
+    auto f32 = ::cvt_bf16_to_fp32(_mm256_maskz_loadu_epi16(mask, src + i));
     _mm512_mask_storeu_ps(dst + i, mask, f32);
   }
 }
 
-// Conversion from FP32 to BF16
-inline __m256i trunc_fp32_to_bf16(const __m512 src) {
-  auto y = _mm512_bsrli_epi128(_mm512_castps_si512(src), 2);
-  return _mm512_cvtepi32_epi16(y);
+IPEX_TARGET_AVX512 inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
+  int i = 0;
+  for (; i < len - 15; i += 16) {
+    auto f32 = _mm512_loadu_ps(src + i);
+    _mm256_storeu_si256((__m256i *)(dst + i), ::cvt_fp32_to_bf16(f32));
+  }
+  if (i < len) {
+    auto mask = (1 << (len - i)) - 1;
+    auto f32 = _mm512_maskz_loadu_ps(mask, src + i);
+    _mm256_mask_storeu_epi16(dst + i, mask, ::cvt_fp32_to_bf16(f32));
+  }
 }
 
-inline __m256i cvt_fp32_to_bf16(const __m512 src) {
+}  // namespace avx512
+
 #if defined(AVX512_BF16)
-  return _mm512_cvtneps_pbh(src);
-#else
-  return trunc_fp32_to_bf16(src);
-#endif
+namespace avx512_bf16 {
+
+// Converts 32 fp32 values to bf16 with one vcvtne2ps2bf16.
+IPEX_TARGET_AVX512_BF16 inline __m512i cvt2_fp32_to_bf16(const __m512 lo, const __m512 hi) {
+  return (__m512i)_mm512_cvtne2ps_pbh(hi, lo);
 }
 
-inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
+IPEX_TARGET_AVX512_BF16 inline __m256i cvt_fp32_to_bf16(const __m512 src) {
+  return (__m256i)_mm512_cvtneps_pbh(src);
+}
+
+IPEX_TARGET_AVX512_BF16 inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
   int i = 0;
-  for (; i < len - 15; i += 16) {
-    auto f32 = _mm512_loadu_ps(src + i);
-    _mm256_storeu_si256((__m256i *)(dst + i), cvt_fp32_to_bf16(f32));
+  for (; i < len - 31; i += 32) {
+    auto bf16 = cvt2_fp32_to_bf16(_mm512_loadu_ps(src + i), _mm512_loadu_ps(src + i + 16));
+    _mm512_storeu_si512(dst + i, bf16);
+  }
+  if (i < len - 15) {
+    _mm256_storeu_si256((__m256i *)(dst + i), cvt_fp32_to_bf16(_mm512_loadu_ps(src + i)));
+    i += 16;
   }
   if (i < len) {
-    auto mask = (1 << (len - i )) - 1;
+    auto mask = (1 << (len - i)) - 1;
     auto f32 = _mm512_maskz_loadu_ps(mask, src + i);
     _mm256_mask_storeu_epi16(dst + i, mask, cvt_fp32_to_bf16(f32));
   }
 }
+
+}  // namespace avx512_bf16
+#endif
+
+namespace avx2 {
+
+IPEX_TARGET_AVX2 inline void cvt_bf16_to_fp32(float *dst, const at::BFloat16 *src, int len) {
+  int i = 0;
+  for (; i < len - 7; i += 8) {
+    _mm256_storeu_ps(dst + i, ::cvt_bf16_to_fp32(_mm_loadu_si128((__m128i *)(src + i))));
+  }
+  for (; i < len; i++) {
+    dst[i] = src[i];
+  }
+}
+
+IPEX_TARGET_AVX2 inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
+  int i = 0;
+  for (; i < len - 7; i += 8) {
+    _mm_storeu_si128((__m128i *)(dst + i), ::cvt_fp32_to_bf16(_mm256_loadu_ps(src + i)));
+  }
+  for (; i < len; i++) {
+    dst[i] = src[i];
+  }
+}
+
+}  // namespace avx2
+
+namespace scalar {
+
+inline void cvt_bf16_to_fp32(float *dst, const at::BFloat16 *src, int len) {
+  for (int i = 0; i < len; i++) {
+    dst[i] = src[i];
+  }
+}
+
+inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
+  for (int i = 0; i < len; i++) {
+    dst[i] = src[i];
+  }
+}
+
+}  // namespace scalar
+}  // namespace vec
+
+// Calls the variant of a kernel for the ISA the kernels dispatch to. The
+// AVX512_BF16 and AMX-BF16 hosts run the AVX-512 variant of the kernels
+// without one of their own.
+#define IPEX_VEC_DISPATCH(ker, ...)                          \
+  switch (torch_ipex::cpu::isa::current_isa()) {            \
+    case torch_ipex::cpu::isa::ISA::AVX512_CORE_AMX:        \
+    case torch_ipex::cpu::isa::ISA::AVX512_CORE_BF16:       \
+    case torch_ipex::cpu::isa::ISA::AVX512_CORE:            \
+      return vec::avx512::ker(__VA_ARGS__);                 \
+    case torch_ipex::cpu::isa::ISA::AVX2:                   \
+      return vec::avx2::ker(__VA_ARGS__);                   \
+    default:                                                \
+      return vec::scalar::ker(__VA_ARGS__);                 \
+  }
+
+// The kernels without an AVX2 variant run the scalar one on AVX2 hosts.
+#define IPEX_VEC_DISPATCH_AVX512(ker, ...)                   \
+  if (torch_ipex::cpu::isa::has_avx512()) {                 \
+    return vec::avx512::ker(__VA_ARGS__);                   \
+  }                                                         \
+  return vec::scalar::ker(__VA_ARGS__);
+
+#if defined(AVX512_BF16)
+#define IPEX_VEC_DISPATCH_BF16(ker, ...)                   \
+  if (torch_ipex::cpu::isa::has_avx512_bf16()) {            \
+    return vec::avx512_bf16::ker(__VA_ARGS__);              \
+  }                                                         \
+  IPEX_VEC_DISPATCH(ker, __VA_ARGS__)
+#else
+#define IPEX_VEC_DISPATCH_BF16(ker, ...) IPEX_VEC_DISPATCH(ker, __VA_ARGS__)
+#endif
+
+inline void cvt_bf16_to_fp32(float *dst, const at::BFloat16 *src, int len) {
+  IPEX_VEC_DISPATCH(cvt_bf16_to_fp32, dst, src, len);
+}
+
+inline void cvt_fp32_to_bf16(at::BFloat16 *dst, const float *src, int len) {
+  IPEX_VEC_DISPATCH_BF16(cvt_fp32_to_bf16, dst, src, len);
+}
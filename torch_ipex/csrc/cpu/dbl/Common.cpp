@@ -181,19 +181,15 @@ dil::tensor reorder_dil_tensor_to_dtype(const dil::tensor &dil_tensor, dil::data
   return dst;
 }
 
-std::vector<std::vector<float>> get_int8_scales(const at::TensorList &inputs,
-                                                bool uint8_used,
-                                                const int64_t ops_id) {
+const std::vector<std::vector<float>>& get_int8_scales(const at::Tensor &input,
+                                                       bool uint8_used,
+                                                       const int64_t ops_id) {
   IPEX_CHECK(check_auto_mix_int8_fp32(),
              "Need enable auto mix_int8 _p32 to query int8 scales");
   IPEX_CHECK(!check_int8_calibration(),
              "Should query int8 scales after calibration");
-  std::vector<bool> inputs_uint8_used;
-  for (auto i = 0; i < inputs.size(); i++) {
-    auto src_dil_type = try_gen_dil_tensor(inputs[i]).get_data_type();
-    inputs_uint8_used.push_back(src_dil_type == dil::data_type::u8);
-  }
-  return get_indicator_scales(inputs_uint8_used, {uint8_used}, ops_id);
+  auto src_dil_type = try_gen_dil_tensor(input).get_data_type();
+  return get_indicator_scales(src_dil_type == dil::data_type::u8, uint8_used, ops_id);
 }
 
 bool get_int8_quantized_status(const int64_t ops_id) {
@@ -202,15 +198,17 @@ bool get_int8_quantized_status(const int64_t ops_id) {
   return false;
 }
 
-std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> get_int8_asymmetric(const int64_t ops_id) {
+std::tuple<const std::vector<std::vector<float>>&, const std::vector<std::vector<int32_t>>&> get_int8_asymmetric(const int64_t ops_id) {
   if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
     return get_indicator_asymmetric(ops_id);
   } else {
-    return std::make_tuple(std::vector<std::vector<float>>(), std::vector<std::vector<int32_t>>());
+    static const std::vector<std::vector<float>> empty_scales;
+    static const std::vector<std::vector<int32_t>> empty_zero_points;
+    return std::forward_as_tuple(empty_scales, empty_zero_points);
   }
 }
 
-void reorder_to_int8_for_mix_prec(const at::Tensor& tensor, std::vector<float> scales, bool uint8_used, std::vector<int32_t> shift) {
+void reorder_to_int8_for_mix_prec(const at::Tensor& tensor, const std::vector<float>& scales, bool uint8_used, std::vector<int32_t> shift) {
   if (!check_auto_mix_int8_fp32() || check_int8_calibration())
     return;
 
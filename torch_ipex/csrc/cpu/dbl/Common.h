@@ -18,15 +18,16 @@ namespace comm {
  */
 void reorder_to_bf16_for_mix_prec(const at::Tensor& tensor, bool not_reorder_for_training = false);
 
-std::vector<std::vector<float>>
-get_int8_scales(const at::TensorList &tensor, bool uint8_used, int64_t ops_id);
+const std::vector<std::vector<float>>&
+get_int8_scales(const at::Tensor &input, bool uint8_used, int64_t ops_id);
 
 bool get_int8_quantized_status(const int64_t ops_id);
 
-// for asymmetric quantization
-std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> get_int8_asymmetric(const int64_t ops_id);
+// for asymmetric quantization, the scales and zero points are references into
+// the frozen indicators
+std::tuple<const std::vector<std::vector<float>>&, const std::vector<std::vector<int32_t>>&> get_int8_asymmetric(const int64_t ops_id);
 
-void reorder_to_int8_for_mix_prec(const at::Tensor& tensor, std::vector<float> scales, bool uint8_used = false, std::vector<int32_t> shift = {});
+void reorder_to_int8_for_mix_prec(const at::Tensor& tensor, const std::vector<float>& scales, bool uint8_used = false, std::vector<int32_t> shift = {});
 
 /**
  * Reorder the input tensor to the specified scalar type.
@@ -5,6 +5,11 @@
 #include <ATen/NativeFunctions.h>
 #include <ATen/TensorUtils.h>
 #include <c10/util/Exception.h>
+#include <c10/util/intrusive_ptr.h>
+
+#include <functional>
+#include <mutex>
+#include <unordered_map>
 
 #include "RNN.h"
 #include "Common.h"
@@ -139,8 +144,38 @@ at::Tensor _shuffle_bias(const at::Tensor& bias_ih, const at::Tensor& bias_hh, i
   return bias_ih + bias_hh;
 };
 
-void prepack_lstm_weights(
-  const at::Tensor& weight_ih, 
+std::tuple<dil::tensor::desc, dil::tensor::desc> expected_weights_desc(
+  const dil::dims& output_sizes,
+  const dil::tensor& src_layer,
+  const dil::tensor& src_iter,
+  const dil::tensor& src_iter_c,
+  const dil::tensor& w1,
+  const dil::tensor& w2,
+  const dil::tensor& bias,
+  dil::rnn_kind _rnn_kind,
+  const bool reverse,
+  dil::prop_kind aprop,
+  const std::vector<float>& data_scale,
+  const std::vector<int32_t>& data_shift,
+  const int weights_scale_mask,
+  const std::vector<float>& weights_scales,
+  const dil::engine& aengine = dil::engine::cpu_engine()) {
+  if (_rnn_kind == dil::rnn_kind::LSTM) {
+    return dil::lstm_forward::expected_weights_desc(output_sizes, src_layer, src_iter, src_iter_c, w1, w2, bias,
+        reverse, aprop, data_scale, data_shift, weights_scale_mask, weights_scales, aengine);
+  } else if (_rnn_kind == dil::rnn_kind::GRU) {
+    return dil::lbr_gru_forward::expected_weights_desc(output_sizes, src_layer, src_iter, w1, w2, bias,
+        reverse, aprop, data_scale, data_shift, weights_scale_mask, weights_scales, aengine);
+  }
+  TORCH_CHECK(_rnn_kind == dil::rnn_kind::RNN_RELU || _rnn_kind == dil::rnn_kind::RNN_TANH,
+        "mkldnn_rnn: unsuppored rnn mode: ", _rnn_kind);
+  return dil::rnn_forward::expected_weights_desc(output_sizes, src_layer, src_iter, w1, w2, bias, _rnn_kind,
+      reverse, aprop, data_scale, data_shift, weights_scale_mask, weights_scales, aengine);
+}
+
+// Packs weight_ih and weight_hh into the formats expected by the forward
+std::tuple<dil::tensor, dil::tensor> pack_rnn_weights(
+  const at::Tensor& weight_ih,
   const at::Tensor& weight_hh,
   int64_t input_size,
   int64_t num_gates,
@@ -158,15 +193,10 @@ void prepack_lstm_weights(
   const int weights_scale_mask = -1,
   const std::vector<float>& weights_scales = dil::scale_t(),
   const dil::engine& aengine = dil::engine::cpu_engine()) {
-  if (cpu::ShadeDataContext::isPackedTensor(weight_ih) && cpu::ShadeDataContext::isPackedTensor(weight_hh)) {
-      return;
-  }
-
   dil::tensor w1, w2;
   dil::tensor::desc expected_weights_layer_desc, expected_weights_iter_desc;
 
-  // TODO: add int8 for gru and rnn
-  if (src_layer.get_data_type() == dil::data_type::u8 && _rnn_kind == dil::rnn_kind::LSTM) {
+  if (src_layer.get_data_type() == dil::data_type::u8) {
     auto weight_ih_ = weight_ih.reshape({1, 1, num_gates, hidden_size, input_size}).permute({0, 1, 4, 2, 3}).contiguous();
     auto weight_hh_ = weight_hh.reshape({1, 1, num_gates, hidden_size, hidden_size}).permute({0, 1, 4, 2, 3}).contiguous();
 
@@ -186,7 +216,7 @@ void prepack_lstm_weights(
     w1 = dbl::comm::try_gen_dil_tensor(weight_ih_, weight_ih_.sizes().vec(), dil::format_tag::abcde);
     w2 = dbl::comm::try_gen_dil_tensor(weight_hh_, weight_hh_.sizes().vec(), dil::format_tag::abcde);
 
-    std::tie(expected_weights_layer_desc, expected_weights_iter_desc) = dil::lstm_forward::expected_weights_desc(
+    std::tie(expected_weights_layer_desc, expected_weights_iter_desc) = expected_weights_desc(
                         output_sizes,
                         src_layer,
                         src_iter,
@@ -194,6 +224,7 @@ void prepack_lstm_weights(
                         w1,
                         w2,
                         bias,
+                        _rnn_kind,
                         reverse,
                         aprop,
                         data_scale,
@@ -214,17 +245,12 @@ void prepack_lstm_weights(
     expected_weight_ih.set_scale(weights_scales);
     expected_weight_hh.set_scale(weights_scales);
 
-    dbl::comm::equip_dil_buffer(weight_ih, expected_weight_ih, /*padding_size*/expected_weight_ih.get_padding_size());
-    dbl::comm::equip_dil_buffer(weight_hh, expected_weight_hh, /*padding_size*/expected_weight_hh.get_padding_size());
-      
+    return std::make_tuple(expected_weight_ih, expected_weight_hh);
   } else {
     w1 = dbl::comm::try_gen_dil_tensor(weight_ih, {1, 1, input_size, num_gates, hidden_size}, dil::format_tag::ldgoi);
     w2 = dbl::comm::try_gen_dil_tensor(weight_hh, {1, 1, hidden_size, num_gates, hidden_size}, dil::format_tag::ldgoi);
 
-
-    // TODO: add prepack of GRU
-    if (_rnn_kind == dil::rnn_kind::LSTM) {
-      std::tie(expected_weights_layer_desc, expected_weights_iter_desc) = dil::lstm_forward::expected_weights_desc(
+    std::tie(expected_weights_layer_desc, expected_weights_iter_desc) = expected_weights_desc(
                         output_sizes,
                         src_layer,
                         src_iter,
@@ -232,6 +258,7 @@ void prepack_lstm_weights(
                         w1,
                         w2,
                         bias,
+                        _rnn_kind,
                         reverse,
                         aprop,
                         data_scale,
@@ -239,22 +266,6 @@ void prepack_lstm_weights(
                         weights_scale_mask,
                         weights_scales,
                         aengine);
-    } else {
-      TORCH_CHECK(_rnn_kind == dil::rnn_kind::RNN_RELU || _rnn_kind == dil::rnn_kind::RNN_TANH,
-            "mkldnn_rnn: unsuppored rnn mode: ", _rnn_kind);
-      // TODO: add int8 input for rnn
-      std::tie(expected_weights_layer_desc, expected_weights_iter_desc) = dil::rnn_forward::expected_weights_desc(
-                          output_sizes,
-                          src_layer,
-                          src_iter,
-                          w1,
-                          w2,
-                          bias,
-                          _rnn_kind,
-                          reverse,
-                          aprop,
-                          aengine);
-    }
 
     dil::tensor expected_weight_ih {expected_weights_layer_desc};
     dil::tensor expected_weight_hh {expected_weights_iter_desc};
@@ -262,15 +273,108 @@ void prepack_lstm_weights(
     expected_weight_ih.feed_from(w1);
     expected_weight_hh.feed_from(w2);
 
-    dbl::comm::equip_dil_buffer(weight_ih, expected_weight_ih, /*padding_size*/expected_weight_ih.get_padding_size());
-    dbl::comm::equip_dil_buffer(weight_hh, expected_weight_hh, /*padding_size*/expected_weight_hh.get_padding_size());
+    return std::make_tuple(expected_weight_ih, expected_weight_hh);
+  }
+}
+
+// Prepacks the weights into the buffers of the weight1 and weight2 parameters
+void prepack_rnn_weights(const at::Tensor& weight1, const at::Tensor& weight2,
+    const std::function<std::tuple<dil::tensor, dil::tensor>()>& pack) {
+  if (cpu::ShadeDataContext::isPackedTensor(weight1) && cpu::ShadeDataContext::isPackedTensor(weight2)) {
+      return;
+  }
+
+  dil::tensor expected_weight_ih, expected_weight_hh;
+  std::tie(expected_weight_ih, expected_weight_hh) = pack();
+  dbl::comm::equip_dil_buffer(weight1, expected_weight_ih, /*padding_size*/expected_weight_ih.get_padding_size());
+  dbl::comm::equip_dil_buffer(weight2, expected_weight_hh, /*padding_size*/expected_weight_hh.get_padding_size());
+
+  cpu::ShadeDataContext::setPackedTensor(weight1, true);
+  cpu::ShadeDataContext::setPackedTensor(weight2, true);
+}
+
+using WeakTensorImpl = c10::weak_intrusive_ptr<c10::TensorImpl, c10::UndefinedTensorImpl>;
+
+struct PackedGRUWeights {
+  WeakTensorImpl weight1;
+  WeakTensorImpl weight2;
+  uint32_t version1;
+  uint32_t version2;
+  bool quantized;
+  dil::tensor w1;
+  dil::tensor w2;
+};
+
+// The GRU weights are packed with their gates shuffled, so they cannot be
+// equipped into the buffers of the parameters, which would then read back in
+// the (zt, rt, nt) order. They are cached aside instead, keyed by the
+// parameters, and packed again once the parameters are modified in place.
+std::tuple<dil::tensor, dil::tensor> packed_gru_weights(const at::Tensor& weight1, const at::Tensor& weight2,
+    bool quantized, const std::function<std::tuple<dil::tensor, dil::tensor>()>& pack) {
+  static std::mutex mutex;
+  static std::unordered_map<c10::TensorImpl*, PackedGRUWeights> cache;
+  auto version = [](const at::Tensor& weight) {
+    return weight.unsafeGetTensorImpl()->version_counter().current_version();
+  };
+
+  auto key = weight1.unsafeGetTensorImpl();
+  {
+    std::lock_guard<std::mutex> lock(mutex);
+    auto it = cache.find(key);
+    if (it != cache.end() && it->second.weight2.lock().get() == weight2.unsafeGetTensorImpl() &&
+        it->second.version1 == version(weight1) && it->second.version2 == version(weight2) &&
+        it->second.quantized == quantized) {
+      return std::make_tuple(it->second.w1, it->second.w2);
+    }
+  }
+
+  // Pack outside the lock so that the hits of the other parameters do not wait
+  dil::tensor w1, w2;
+  std::tie(w1, w2) = pack();
+
+  std::lock_guard<std::mutex> lock(mutex);
+  // Drop the weights of the freed parameters, only when inserting
+  for (auto it = cache.begin(); it != cache.end();) {
+    it = it->second.weight1.expired() ? cache.erase(it) : std::next(it);
   }
+  cache.erase(key);
+  cache.emplace(key, PackedGRUWeights {
+    WeakTensorImpl(weight1.getIntrusivePtr()), WeakTensorImpl(weight2.getIntrusivePtr()),
+    version(weight1), version(weight2), quantized, w1, w2});
+  return std::make_tuple(w1, w2);
+}
 
-  cpu::ShadeDataContext::setPackedTensor(weight_ih, true);
-  cpu::ShadeDataContext::setPackedTensor(weight_hh, true);
+// Probes whether oneDNN implements the int8 inference of the rnn kind, so that
+// the kinds without one stay in fp32.
+static bool probe_int8(dil::rnn_kind _rnn_kind) {
+  int64_t num_gates = _rnn_kind == dil::rnn_kind::GRU ? 3 : 1;
+  int64_t num_bias_gates = _rnn_kind == dil::rnn_kind::GRU ? 4 : 1;
+  using desc = dil::tensor::desc;
+  dil::tensor src_layer {desc({1, 1, 1}, dil::data_type::u8, dil::format_tag::tnc)};
+  dil::tensor src_iter {desc({1, 1, 1, 1}, dil::data_type::f32, dil::format_tag::ldnc)};
+  dil::tensor w1 {desc({1, 1, 1, num_gates, 1}, dil::data_type::f32, dil::format_tag::ldigo)};
+  dil::tensor w2 {desc({1, 1, 1, num_gates, 1}, dil::data_type::f32, dil::format_tag::ldigo)};
+  dil::tensor bias {desc({1, 1, num_bias_gates, 1}, dil::data_type::f32, dil::format_tag::ldgo)};
+  try {
+    expected_weights_desc({1, 1, 1}, src_layer, src_iter, src_iter, w1, w2, bias, _rnn_kind,
+                          /*reverse*/false, dil::prop_kind::forward_inference, {1.0f}, {0},
+                          (1 << 3) + (1 << 4), std::vector<float>(num_gates, 1.0f));
+  } catch (std::exception& e) {
+    return false;
+  }
+  return true;
 }
 
-std::vector<float> compute_lstm_weight_scales(const at::Tensor& weight_ih, const at::Tensor& weight_hh) {
+bool is_int8_supported(int64_t mode) {
+  static const bool supported[] = {
+    probe_int8(dil::rnn_kind::RNN_RELU),
+    probe_int8(dil::rnn_kind::RNN_TANH),
+    /*LSTM*/true,
+    probe_int8(dil::rnn_kind::GRU)};
+  return supported[mode];
+}
+
+std::vector<float> compute_rnn_weight_scales(const at::Tensor& weight_ih, const at::Tensor& weight_hh) {
   IPEX_CHECK(weight_ih.size(0) == weight_hh.size(0), "size(0) of weight_ih and weight_hh should equal.")
   std::vector<float> weights_scales = {};
   
@@ -310,7 +414,7 @@ std::vector<at::Tensor> mkldnn_rnn_layer(const at::Tensor& input, const at::Tens
   int weights_scale_mask = -1;
   std::vector<float> weights_scales = {};
 
-  if (check_auto_mix_int8_fp32() && !check_int8_calibration() && static_cast<dil::rnn_kind>(rnn.mode) == dil::rnn_kind::LSTM) {
+  if (check_auto_mix_int8_fp32() && !check_int8_calibration()) {
     if (quantized) {
       if (ShadeDataContext::isTensorMixPrecision(input, MIX_PREC_TYPE::MIX_INT8_FP32)) {
         // TODO: add check (do we fallback here if not satisfied?), should enforce the input to have scale and zero point here.
@@ -337,7 +441,7 @@ std::vector<at::Tensor> mkldnn_rnn_layer(const at::Tensor& input, const at::Tens
         if (ShadeDataContext::isDilTensor(weight_ih)) {
           IPEX_CHECK(cpu::ShadeDataContext::getDilStorage(weight_ih).ndims() == 2, "weight in int8 reference should not have been prepacked before");
         }
-        weights_scales = compute_lstm_weight_scales(weight_ih, weight_hh);
+        weights_scales = compute_rnn_weight_scales(weight_ih, weight_hh);
       }
       dbl::comm::reorder_to_dtype(hx_, at::kFloat);
     } else {
@@ -377,40 +481,43 @@ std::vector<at::Tensor> mkldnn_rnn_layer(const at::Tensor& input, const at::Tens
   dil::tensor w1, w2;
 
   auto _rnn_kind = static_cast<dil::rnn_kind>(rnn.mode);
-  // TODO: only implemented prepack for fp32 & bf16 inference of LSTM cell
   // We only do the weight prepack during the inference since 
-  // the format of the weight in the FW and BW of the LSTM is different:
+  // the format of the weight in the FW and BW of the RNN is different:
   // FW weight format: ldigo
   // BW weight format: ldgoi
-
-  // TODO: prepack for GRU inference: GRU need to shuffle weight
-  // We need to design how to sync the shape of the dil tensor and the aten tensor
-  // during FW and BW
+  // The GRU weight is prepacked with its gates shuffled, aside from the parameter.
 
   // Do not prepack during int8 calibration
-  if (!train && _rnn_kind != dil::rnn_kind::GRU && !check_int8_calibration()) {
-    prepack_lstm_weights(
-      weight_ih,
-      weight_hh,
-      input_size,
-      rnn.num_gates,
-      rnn.hidden_size,
-      {output_size.cbegin(), output_size.cend()},
-      x,
-      hx,
-      cx,
-      b,
-      _rnn_kind,
-      reverse,
-      aprop_kind,
-      data_scale,
-      data_shift,
-      weights_scale_mask,
-      weights_scales
-    );
-
-    w1 = dbl::comm::try_gen_dil_tensor(weight_ih);
-    w2 = dbl::comm::try_gen_dil_tensor(weight_hh);
+  if (!train && !check_int8_calibration()) {
+    auto pack = [&]() {
+      return pack_rnn_weights(
+        weight_ih,
+        weight_hh,
+        input_size,
+        rnn.num_gates,
+        rnn.hidden_size,
+        {output_size.cbegin(), output_size.cend()},
+        x,
+        hx,
+        cx,
+        b,
+        _rnn_kind,
+        reverse,
+        aprop_kind,
+        data_scale,
+        data_shift,
+        weights_scale_mask,
+        weights_scales
+      );
+    };
+
+    if (_rnn_kind == dil::rnn_kind::GRU) {
+      std::tie(w1, w2) = packed_gru_weights(weight1, weight2, src_type == dil::data_type::u8, pack);
+    } else {
+      prepack_rnn_weights(weight1, weight2, pack);
+      w1 = dbl::comm::try_gen_dil_tensor(weight1);
+      w2 = dbl::comm::try_gen_dil_tensor(weight2);
+    }
   } else {
     w1 = dbl::comm::try_gen_dil_tensor(weight_ih, {1, 1, input_size, rnn.num_gates, rnn.hidden_size}, dil::format_tag::ldgoi);
     w2 = dbl::comm::try_gen_dil_tensor(weight_hh, {1, 1, rnn.hidden_size, rnn.num_gates, rnn.hidden_size}, dil::format_tag::ldgoi);
@@ -424,12 +531,12 @@ std::vector<at::Tensor> mkldnn_rnn_layer(const at::Tensor& input, const at::Tens
     dil::lstm_forward::compute({output_size.cbegin(), output_size.cend()}, x, hx, cx, w1, w2, b, y, hy, cy, reverse, aprop_kind, data_scale, data_shift, weights_scale_mask, weights_scales);
     return {dbl::comm::gen_aten_tensor_by(std::move(y)), dbl::comm::gen_aten_tensor_by(std::move(hy)).reshape(hx_.sizes()), dbl::comm::gen_aten_tensor_by(std::move(cy)).reshape(cx_.sizes())};
   } else if (_rnn_kind == dil::rnn_kind::GRU) {
-    dil::lbr_gru_forward::compute({output_size.cbegin(), output_size.cend()}, x, hx, w1, w2, b, y, hy, reverse);
+    dil::lbr_gru_forward::compute({output_size.cbegin(), output_size.cend()}, x, hx, w1, w2, b, y, hy, reverse, aprop_kind, data_scale, data_shift, weights_scale_mask, weights_scales);
     return {dbl::comm::gen_aten_tensor_by(std::move(y)), dbl::comm::gen_aten_tensor_by(std::move(hy)).reshape(hx_.sizes()), at::zeros(hx_.sizes(), hx_.options())};
   } else {
     TORCH_CHECK(_rnn_kind == dil::rnn_kind::RNN_RELU || _rnn_kind == dil::rnn_kind::RNN_TANH,
                 "mkldnn_rnn: unsuppored rnn mode: ", rnn.mode);
-    dil::rnn_forward::compute({output_size.cbegin(), output_size.cend()}, x, hx, w1, w2, b, y, hy, rnn.mode, reverse);
+    dil::rnn_forward::compute({output_size.cbegin(), output_size.cend()}, x, hx, w1, w2, b, y, hy, rnn.mode, reverse, aprop_kind, data_scale, data_shift, weights_scale_mask, weights_scales);
     return {dbl::comm::gen_aten_tensor_by(std::move(y)), dbl::comm::gen_aten_tensor_by(std::move(hy)).reshape(hx_.sizes()), at::zeros(hx_.sizes(), hx_.options())};
   }
 }
@@ -3,21 +3,44 @@
 
 namespace dil {
 
+// The mask of a bf16 src is a f32 tensor, the scale 1 / (1 - ratio) not being
+// exact in bf16. The bf16 values are converted with the integer operations the
+// loops vectorize, rounding to the nearest even and keeping NaNs quiet.
+inline float dropout_bf16_to_f32(uint16_t src) {
+  uint32_t bits = static_cast<uint32_t>(src) << 16;
+  float dst;
+  std::memcpy(&dst, &bits, sizeof(dst));
+  return dst;
+}
+
+inline uint16_t dropout_f32_to_bf16(float src) {
+  uint32_t bits;
+  std::memcpy(&bits, &src, sizeof(bits));
+  if (src != src) {
+    return 0x7fc0;
+  }
+  return static_cast<uint16_t>((bits + 0x7fff + ((bits >> 16) & 1)) >> 16);
+}
+
 struct dropout_forward {
+  // A negative seed draws the mask from a random stream.
   static void compute(const tensor& src, float ratio, tensor& dst,
-                      tensor& mask) {
+                      tensor& mask, long seed = -1) {
     switch (src.get_data_type()) {
       case data_type::f32:
-        compute_impl<float>(src, ratio, dst, mask);
+        compute_impl<float>(src, ratio, dst, mask, seed);
+        break;
+      case data_type::bf16:
+        compute_bf16_impl(src, ratio, dst, mask, seed);
         break;
       case data_type::s32:
-        compute_impl<int32_t>(src, ratio, dst, mask);
+        compute_impl<int32_t>(src, ratio, dst, mask, seed);
         break;
       case data_type::s8:
-        compute_impl<int8_t>(src, ratio, dst, mask);
+        compute_impl<int8_t>(src, ratio, dst, mask, seed);
         break;
       case data_type::u8:
-        compute_impl<uint8_t>(src, ratio, dst, mask);
+        compute_impl<uint8_t>(src, ratio, dst, mask, seed);
         break;
       default:
         throw error(dnnl_invalid_arguments, "Unsupported dnnl data type");
@@ -25,19 +48,24 @@ struct dropout_forward {
   }
 
  private:
+  // A ratio of 1 drops everything rather than scaling by infinity.
+  static float scale_of(float ratio) {
+    return ratio < 1.0 ? 1.0 / (1.0 - ratio) : 0.0;
+  }
+
   template <typename T>
   static void compute_impl(const tensor& src, float ratio, tensor& dst,
-                           tensor& mask) {
+                           tensor& mask, long seed) {
     mask.reinit_if_possible(src.get_desc());
     dst.reinit_if_possible(src.get_desc());
     if (src.has_scale()) {
       dst.set_scale(src.get_scale());
     }
 
-    const auto scale = 1.0 / (1.0 - ratio);
+    const auto scale = scale_of(ratio);
     const auto size = src.get_size() / sizeof(T);
     std::unique_ptr<int[]> bernouli_nums(new int[size]);
-    utils::bernoulli_generate(size, 1.0 - ratio, bernouli_nums.get());
+    utils::bernoulli_generate(size, 1.0 - ratio, bernouli_nums.get(), seed);
 
     const auto src_data = static_cast<T*>(src.get_data_handle());
     const auto mask_data = static_cast<T*>(mask.get_data_handle());
@@ -54,6 +82,32 @@ struct dropout_forward {
       dst_data[i] = mask_data[i] * src_data[i];
     }
   }
+
+  static void compute_bf16_impl(const tensor& src, float ratio, tensor& dst,
+                                tensor& mask, long seed) {
+    mask.reinit_if_possible(src.get_desc().to_type(data_type::f32));
+    dst.reinit_if_possible(src.get_desc());
+
+    const auto scale = scale_of(ratio);
+    const auto size = src.get_size() / sizeof(uint16_t);
+    std::unique_ptr<int[]> bernouli_nums(new int[size]);
+    utils::bernoulli_generate(size, 1.0 - ratio, bernouli_nums.get(), seed);
+
+    const auto src_data = static_cast<uint16_t*>(src.get_data_handle());
+    const auto mask_data = static_cast<float*>(mask.get_data_handle());
+    const auto dst_data = static_cast<uint16_t*>(dst.get_data_handle());
+#ifdef _OPENMP
+#if (_OPENMP >= 201307)
+# pragma omp parallel for simd
+#else
+# pragma omp parallel for schedule(static)
+#endif
+#endif
+    for (auto i = 0; i < size; i++) {
+      mask_data[i] = bernouli_nums[i] * scale;
+      dst_data[i] = dropout_f32_to_bf16(mask_data[i] * dropout_bf16_to_f32(src_data[i]));
+    }
+  }
 };
 
 struct dropout_backward {
@@ -63,6 +117,9 @@ struct dropout_backward {
       case data_type::f32:
         compute_impl<float>(mask, diff_dst, diff_src);
         break;
+      case data_type::bf16:
+        compute_bf16_impl(mask, diff_dst, diff_src);
+        break;
       case data_type::s32:
         compute_impl<int32_t>(mask, diff_dst, diff_src);
         break;
@@ -94,8 +151,24 @@ struct dropout_backward {
       diff_src_data[i] = mask_data[i] * diff_dst_data[i];
     }
   }
+
+  static void compute_bf16_impl(const tensor& mask, const tensor& diff_dst,
+                                tensor& diff_src) {
+    diff_src.reinit_if_possible(diff_dst.get_desc());
+
+    const auto size = mask.get_size() / sizeof(float);
+    const auto mask_data = static_cast<float*>(mask.get_data_handle());
+    const auto diff_dst_data = static_cast<uint16_t*>(diff_dst.get_data_handle());
+    const auto diff_src_data = static_cast<uint16_t*>(diff_src.get_data_handle());
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static)
+#endif
+    for (auto i = 0; i < size; i++) {
+      diff_src_data[i] = dropout_f32_to_bf16(mask_data[i] * dropout_bf16_to_f32(diff_dst_data[i]));
+    }
+  }
 };
 
 }  // namespace dil
 
-#endif
\ No newline at end of file
+#endif
@@ -18,6 +18,10 @@ struct rnn_forward : public dnnl::vanilla_rnn_forward {
                       const rnn_kind akind,
                       const bool reverse = false,
                       prop_kind aprop = prop_kind::forward,
+                      const std::vector<float>& data_scale = scale_t(),
+                      const std::vector<int32_t>& data_shift = {},
+                      const int weights_scale_mask = -1,
+                      const std::vector<float>& weights_scales = scale_t(),
                       const engine& aengine = engine::cpu_engine()) {
 
     bool with_workspace = aprop == prop_kind::forward_training;
@@ -25,8 +29,14 @@ struct rnn_forward : public dnnl::vanilla_rnn_forward {
     auto direction = reverse ? rnn_direction::unidirectional_right2left
                              : rnn_direction::unidirectional_left2right;
     auto src_layer_desc = src_layer.get_desc();
-    auto src_iter_desc = src_iter.get_desc().to_type(src_layer.get_data_type());
-    
+
+    auto src_iter_desc = src_iter.get_desc();
+    // for fp32 and int8, src_iter_desc should be fp32
+    // for bf16, src_iter_desc should be bf16
+    if (src_layer.get_data_type() == data_type::bf16) {
+      src_iter_desc = src_iter_desc.to_type(src_layer.get_data_type());
+    }
+
     auto weights_layer_desc = weights_layer.get_desc();
     auto weights_iter_desc = weights_iter.get_desc();
     
@@ -42,18 +52,36 @@ struct rnn_forward : public dnnl::vanilla_rnn_forward {
       weights_iter_desc = weights_iter_desc.to_format_any().to_type(src_layer.get_data_type());
     }
 
+    // When creating int8 RNN pd, weight desc cannot be the prepacked s8 block format,
+    // thus, we need to do to_format_any() here.
+    if (weights_layer_desc.get_data_type() == dil::data_type::s8) {
+      weights_layer_desc = weights_layer_desc.to_format_any();
+    }
+    if (weights_iter_desc.get_data_type() == dil::data_type::s8) {
+      weights_iter_desc = weights_iter_desc.to_format_any();
+    }
+
     auto bias_desc = bias.get_desc();
     tensor::desc dst_layer_desc(output_sizes, src_layer.get_data_type(), tag::tnc);
 
+    attr_t attr;
+    DIL_ENFORCE((data_scale.size() == 1 && data_shift.size() == 1 && weights_scale_mask > -1 && !weights_scales.empty())
+      || (data_scale.empty() && data_shift.empty() && weights_scale_mask == -1 && weights_scales.empty()), "Incorrect size for scale or zero point");
+
+    if (!data_scale.empty()) {
+      attr.set_rnn_data_qparams(data_scale[0], data_shift[0]);
+      attr.set_rnn_weights_qparams(weights_scale_mask, weights_scales);
+    }
+
     auto pd = primitive_desc(
         {aprop, activation, direction, src_layer_desc, src_iter_desc,
          weights_layer_desc, weights_iter_desc, bias_desc,
          dst_layer_desc, src_iter_desc},
-        aengine);
+        attr, aengine);
 
     auto expected_src_iter = src_iter.reorder_if_differ_in(pd.src_iter_desc()); 
-    auto expected_weights_layer = weights_layer.reorder_if_differ_in(pd.weights_desc());
-    auto expected_weights_iter = weights_iter.reorder_if_differ_in(pd.weights_iter_desc());
+    auto expected_weights_layer = weights_layer.reorder_if_differ_in(pd.weights_desc(), attr);
+    auto expected_weights_iter = weights_iter.reorder_if_differ_in(pd.weights_iter_desc(), attr);
 
     dst_layer.reinit_if_possible(pd.dst_layer_desc());
     dst_iter.reinit_if_possible(pd.dst_iter_desc());
@@ -71,6 +99,13 @@ struct rnn_forward : public dnnl::vanilla_rnn_forward {
       args.insert({DNNL_ARG_WORKSPACE, dst_layer.get_workspace()});
     }
 
+    if (!data_scale.empty()) {
+      dst_layer.set_scale(data_scale);
+    }
+    if (!data_shift.empty()) {
+      dst_layer.set_zero_point(data_shift);
+    }
+
     super(pd).execute(stream::default_stream(), args);
   }
   static std::tuple<tensor::desc, tensor::desc> expected_weights_desc(const dims& output_sizes,
@@ -82,25 +117,49 @@ struct rnn_forward : public dnnl::vanilla_rnn_forward {
                       const rnn_kind akind,
                       const bool reverse = false,
                       prop_kind aprop = prop_kind::forward,
+                      const std::vector<float>& data_scale = scale_t(),
+                      const std::vector<int32_t>& data_shift = {},
+                      const int weights_scale_mask = -1,
+                      const std::vector<float>& weights_scales = scale_t(),
                       const engine& aengine = engine::cpu_engine()) {
     
     auto activation = utils::rnn_kind_to_activation(akind);
     auto direction = reverse ? rnn_direction::unidirectional_right2left
                              : rnn_direction::unidirectional_left2right;
     auto src_layer_desc = src_layer.get_desc();
-    auto src_iter_desc = src_iter.get_desc().to_type(src_layer.get_data_type());
+
+    auto src_iter_desc = src_iter.get_desc();
+    // for fp32 and int8, src_iter_desc should be fp32
+    // for bf16, src_iter_desc should be bf16
+    if (src_layer.get_data_type() == data_type::bf16) {
+      src_iter_desc = src_iter_desc.to_type(src_layer.get_data_type());
+    }
 
     auto weights_layer_desc = weights_layer.get_desc().to_format_any();
     auto weights_iter_desc = weights_iter.get_desc().to_format_any();
+
+    if (src_layer.get_data_type() == data_type::u8) {
+      weights_layer_desc = weights_layer_desc.to_type(data_type::s8);
+      weights_iter_desc = weights_iter_desc.to_type(data_type::s8);
+    }
     
     auto bias_desc = bias.get_desc();
     tensor::desc dst_layer_desc(output_sizes, src_layer.get_data_type(), tag::tnc);
 
+    attr_t attr;
+    DIL_ENFORCE((data_scale.size() == 1 && data_shift.size() == 1 && weights_scale_mask > -1 && !weights_scales.empty())
+      || (data_scale.empty() && data_shift.empty() && weights_scale_mask == -1 && weights_scales.empty()), "Incorrect size for scale or zero point");
+
+    if (!data_scale.empty()) {
+      attr.set_rnn_data_qparams(data_scale[0], data_shift[0]);
+      attr.set_rnn_weights_qparams(weights_scale_mask, weights_scales);
+    }
+
     auto pd = primitive_desc(
         {aprop, activation, direction, src_layer_desc, src_iter_desc,
          weights_layer_desc, weights_iter_desc, bias_desc,
          dst_layer_desc, src_iter_desc},
-        aengine);
+        attr, aengine);
     
     auto expected_weights_layer = pd.weights_layer_desc();
     auto expected_weights_iter = pd.weights_iter_desc();
@@ -30,12 +30,15 @@
 namespace dil {
 namespace utils {
 
-static void bernoulli_generate(const long n, const double p, int* r) {
-#ifndef DIL_USE_MKL
-  DIL_ENFORCE(0, "can not use bernoulli_generate without MKL support");
-#else
-  std::srand(time(nullptr));
-  const int seed = 17 + std::rand() % 4096;
+// Draws n Bernoulli numbers of probability p. Every thread draws a chunk of
+// them from a stream seeded by seed, which is a random one if negative. The
+// MKL stream skips ahead to the chunk, so the numbers do not depend on the
+// number of threads, unlike the std::mt19937 streams seeded by chunk.
+static void bernoulli_generate(const long n, const double p, int* r, long seed = -1) {
+  if (seed < 0) {
+    std::srand(time(nullptr));
+    seed = 17 + std::rand() % 4096;
+  }
 
   int nthr = omp_get_max_threads();
 #ifdef _OPENMP
@@ -48,14 +51,22 @@ static void bernoulli_generate(const long n, const double p, int* r) {
     const long my_amount = std::min(my_offset + avg_amount, n) - my_offset;
 
     if (my_amount > 0) {
+#ifdef DIL_USE_MKL
       VSLStreamStatePtr stream;
       vslNewStream(&stream, VSL_BRNG_MCG31, seed);
       vslSkipAheadStream(stream, my_offset);
       viRngBernoulli(VSL_RNG_METHOD_BERNOULLI_ICDF, stream, my_amount, r + my_offset, p);
       vslDeleteStream(&stream);
+#else
+      std::seed_seq seq{seed, static_cast<long>(ithr)};
+      std::mt19937 stream(seq);
+      std::bernoulli_distribution bernoulli(p);
+      for (long i = 0; i < my_amount; i++) {
+        r[my_offset + i] = bernoulli(stream);
+      }
+#endif
     }
   }
-#endif
 }
 
 template <typename F, typename T,
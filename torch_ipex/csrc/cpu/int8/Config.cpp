@@ -1,5 +1,8 @@
+#include <algorithm>
+
 #include "utils.h"
 #include "Config.h"
+#include "Histogram.h"
 #include "cpu/int8/quantization/Observer.h"
 
 namespace torch_ipex {
@@ -7,8 +10,10 @@ using namespace torch_ipex::cpu::lp::int8;
 
 void Int8OptConfig::insert_or_updata_observer(
     std::string op_name, std::vector<std::vector<float>> i_min_max_values,
-    std::vector<std::vector<float>> o_min_max_values, int64_t ops_id, bool asymmetric) {
-  if (observers_.size() <= ops_id) {
+    std::vector<std::vector<float>> o_min_max_values,
+    std::vector<Histogram> i_histograms, std::vector<Histogram> o_histograms,
+    int64_t ops_id, bool asymmetric) {
+  if (observers_.size() <= ops_id || observers_[ops_id].name.empty()) {
     // this path is that to set int8 op's configure, using default configures if
     // user not set it.
     std::string observer_algorithm = "min_max";
@@ -21,7 +26,7 @@ void Int8OptConfig::insert_or_updata_observer(
     std::vector<bool> inputs_dtype_uint8(nums_input, uint8_used);
     std::vector<bool> outputs_dtype_uint8(nums_output, uint8_used);
     bool quantized = true;
-    if (!indicators_.empty()) {
+    if (ops_id < indicators_.size()) {
       observer_algorithm = indicators_[ops_id].get_indicator_algorithm();
       weight_granularity =
           indicators_[ops_id].get_indicator_weight_granularity();
@@ -38,8 +43,13 @@ void Int8OptConfig::insert_or_updata_observer(
                              weight_granularity,
                              inputs_dtype_uint8,
                              outputs_dtype_uint8,
-                             quantized};
-    observers_.push_back(new_observer);
+                             quantized,
+                             i_histograms,
+                             o_histograms};
+    // keyed ops may be observed out of the order of their ids
+    if (observers_.size() <= ops_id)
+      observers_.resize(ops_id + 1);
+    observers_[ops_id] = new_observer;
   } else {
     // user has set configure or have run one interation
     auto inputs_pre = observers_[ops_id].inputs_min_max_values;
@@ -71,16 +81,63 @@ void Int8OptConfig::insert_or_updata_observer(
         observers_[ops_id].outputs_min_max_values[j][1] =
             (1 - c) * outputs_pre[j][1] + c * o_min_max_values[j][1];
       }
+    } else if (is_histogram_algorithm(observers_[ops_id].algorithm)) {
+      // the min/max values are still tracked, the histograms only decide the
+      // clipping range at add_indicators time.
+      for (auto i = 0; i < i_min_max_values.size(); i++) {
+        observers_[ops_id].inputs_min_max_values[i][0] =
+            std::min(inputs_pre[i][0], i_min_max_values[i][0]);
+        observers_[ops_id].inputs_min_max_values[i][1] =
+            std::max(inputs_pre[i][1], i_min_max_values[i][1]);
+      }
+      for (auto j = 0; j < o_min_max_values.size(); j++) {
+        observers_[ops_id].outputs_min_max_values[j][0] =
+            std::min(outputs_pre[j][0], o_min_max_values[j][0]);
+        observers_[ops_id].outputs_min_max_values[j][1] =
+            std::max(outputs_pre[j][1], o_min_max_values[j][1]);
+      }
+      auto &inputs_histogram = observers_[ops_id].inputs_histogram;
+      auto &outputs_histogram = observers_[ops_id].outputs_histogram;
+      inputs_histogram.resize(i_histograms.size());
+      outputs_histogram.resize(o_histograms.size());
+      for (auto i = 0; i < i_histograms.size(); i++) {
+        combine_histogram(inputs_histogram[i], i_histograms[i]);
+      }
+      for (auto j = 0; j < o_histograms.size(); j++) {
+        combine_histogram(outputs_histogram[j], o_histograms[j]);
+      }
     }
   }
 }
 
-void Int8OptConfig::clear_indicators() { indicators_.clear(); }
+std::string Int8OptConfig::get_observer_algorithm(int64_t ops_id) {
+  if (observers_.size() > ops_id && !observers_[ops_id].name.empty()) {
+    return observers_[ops_id].algorithm;
+  } else if (ops_id < indicators_.size()) {
+    return indicators_[ops_id].get_indicator_algorithm();
+  }
+  return "min_max";
+}
 
-void Int8OptConfig::add_indicators() {
+void Int8OptConfig::clear_indicators() {
   indicators_.clear();
+  frozen_indicators_.clear();
+  ops_index_.clear();
+  ops_keys_.clear();
+  freeze_indicators();
+}
+
+void Int8OptConfig::add_indicators() {
+  std::vector<Indicator> pre_indicators;
+  pre_indicators.swap(indicators_);
   // default used is s8
   for (auto i = 0; i < observers_.size(); i++) {
+    if (observers_[i].name.empty()) {
+      // the keyed op is not run in this calibration, keep its configure
+      if (i < pre_indicators.size())
+        indicators_.push_back(pre_indicators[i]);
+      continue;
+    }
     std::vector<float> inputs_scale, outputs_scale;
     std::vector<int32_t> inputs_zero_point, outputs_zero_point;
     std::vector<std::vector<float>> inputs_values =
@@ -91,6 +148,29 @@ void Int8OptConfig::add_indicators() {
     std::vector<bool> inputs_dtype_uint8 = observers_[i].inputs_dtype_uint8;
     std::vector<bool> outputs_dtype_uint8 = observers_[i].outputs_dtype_uint8;
 
+    // the histogram based algorithms clip the min/max values to the range
+    // which minimizes the quantization error of the collected distribution,
+    // the symmetric ones to [-max, max] as their histograms are of |x|.
+    const std::string &algorithm = observers_[i].algorithm;
+    if (is_histogram_algorithm(algorithm)) {
+      const auto &inputs_histogram = observers_[i].inputs_histogram;
+      const auto &outputs_histogram = observers_[i].outputs_histogram;
+      for (auto k = 0; k < inputs_histogram.size(); k++) {
+        float min, max;
+        std::tie(min, max) = compute_calibration_range(
+            algorithm, inputs_histogram[k], inputs_values[k][2]);
+        inputs_values[k][0] = inputs_values[k][2] ? min : std::min(std::max(inputs_values[k][0], -max), max);
+        inputs_values[k][1] = max;
+      }
+      for (auto k = 0; k < outputs_histogram.size(); k++) {
+        float min, max;
+        std::tie(min, max) = compute_calibration_range(
+            algorithm, outputs_histogram[k], outputs_values[k][2]);
+        outputs_values[k][0] = outputs_values[k][2] ? min : std::min(std::max(outputs_values[k][0], -max), max);
+        outputs_values[k][1] = max;
+      }
+    }
+
     for (auto i = 0; i < inputs_values.size(); i++) {
       if (inputs_values[i][2]) {
         // asymmetric quantization
@@ -144,62 +224,115 @@ void Int8OptConfig::add_indicators() {
         observers_[i].id, observers_[i].name, observers_[i].algorithm,
         observers_[i].weight_granularity, inputs_scale, outputs_scale,
         observers_[i].inputs_dtype_uint8, observers_[i].outputs_dtype_uint8,
-        observers_[i].quantized, inputs_zero_point, outputs_zero_point);
+        observers_[i].quantized, inputs_zero_point, outputs_zero_point,
+        i < ops_keys_.size() ? ops_keys_[i] : "");
     indicators_.push_back(new_indicator);
   }
   observers_.clear();
+  freeze_indicators();
 }
 
-std::vector<std::vector<float>>
-Int8OptConfig::get_indicator_scales(std::vector<bool> i_uint8_used,
-                                    std::vector<bool> o_uint8_used,
-                                    int64_t ops_id) {
-  std::vector<float> inputs_scale, outputs_scale;
-  std::vector<bool> inputs_uint8_used, outputs_uint8_used;
-  std::tie(inputs_uint8_used, outputs_uint8_used) =
-      indicators_[ops_id].get_indicator_uint8_status();
-  std::tie(inputs_scale, outputs_scale) =
-      indicators_[ops_id].get_indicator_scales();
-  bool scale_update = false;
-  for (auto i = 0; i < i_uint8_used.size(); i++) {
-    if (!inputs_uint8_used[i] && i_uint8_used[i]) {
-      // update zero_point and scales
-      inputs_scale[i] /= 127.5;
-      inputs_scale[i] *= 255.5;
-      scale_update = true;
-    } else if (inputs_uint8_used[i] && !i_uint8_used[i]) {
-      // update zero_point and scales
-      inputs_scale[i] /= 255.5;
-      inputs_scale[i] *= 127.5;
-      scale_update = true;
-    }
+// convert a scale calibrated for s8 (or u8) to the scale of u8 (or s8)
+static float convert_scale(float scale, bool uint8_calibrated,
+                           bool uint8_used) {
+  if (!uint8_calibrated && uint8_used) {
+    return scale / 127.5 * 255.5;
+  } else if (uint8_calibrated && !uint8_used) {
+    return scale / 255.5 * 127.5;
   }
-  for (auto j = 0; j < o_uint8_used.size(); j++) {
-    if (!outputs_uint8_used[j] && o_uint8_used[j]) {
-      // update zero_point and scales
-      outputs_scale[j] /= 127.5;
-      outputs_scale[j] *= 255.5;
-      scale_update = true;
-    } else if (outputs_uint8_used[j] && !o_uint8_used[j]) {
-      // update zero_point and scales
-      outputs_scale[j] /= 255.5;
-      outputs_scale[j] *= 127.5;
-      scale_update = true;
-    }
+  return scale;
+}
+
+void Int8OptConfig::freeze_indicators() {
+  // resolve the keys "<scope>:<op name>:<occurrence>" to the integer ids
+  // looked up by the inference, the scope may contain ':' but not the others.
+  scope_ids_.clear();
+  scope_ops_ids_.clear();
+  scope_ids_.emplace(root_scope.scope, kRootScopeId);
+  scope_ops_ids_.emplace_back();
+  for (auto i = 0; i < ops_keys_.size(); i++) {
+    const auto &key = ops_keys_[i];
+    auto occurrence_pos = key.rfind(':');
+    auto op_name_pos = key.rfind(':', occurrence_pos - 1);
+    IPEX_CHECK(occurrence_pos != std::string::npos && op_name_pos != std::string::npos,
+               "invalid int8 configure key ", key);
+    auto scope = scope_ids_.emplace(key.substr(0, op_name_pos), scope_ops_ids_.size());
+    if (scope.second)
+      scope_ops_ids_.emplace_back();
+    auto op_name_id = intern_op_name(
+        key.substr(op_name_pos + 1, occurrence_pos - op_name_pos - 1));
+    auto occurrence = std::stoll(key.substr(occurrence_pos + 1));
+    auto &ops_ids = scope_ops_ids_[scope.first->second];
+    if (ops_ids.size() <= op_name_id)
+      ops_ids.resize(op_name_id + 1);
+    if (ops_ids[op_name_id].size() <= occurrence)
+      ops_ids[op_name_id].resize(occurrence + 1, kFp32OpsId);
+    ops_ids[op_name_id][occurrence] = i;
   }
-  if (scale_update) {
-    indicators_[ops_id].set_indicator_scales(inputs_scale, outputs_scale);
-    indicators_[ops_id].set_indicator_uint8_status(inputs_uint8_used,
-                                                   outputs_uint8_used);
+  scoped_ = scope_ids_.size() > 1;
+  // the frames of the threads resolved against the previous ids are reset
+  generation_++;
+
+  frozen_indicators_.clear();
+  frozen_indicators_.resize(indicators_.size());
+  for (auto i = 0; i < indicators_.size(); i++) {
+    auto &frozen = frozen_indicators_[i];
+    std::vector<float> inputs_scale, outputs_scale;
+    std::vector<bool> inputs_uint8_used, outputs_uint8_used;
+    std::vector<int32_t> inputs_zero_point, outputs_zero_point;
+    std::tie(inputs_scale, outputs_scale) =
+        indicators_[i].get_indicator_scales();
+    std::tie(inputs_uint8_used, outputs_uint8_used) =
+        indicators_[i].get_indicator_uint8_status();
+    std::tie(inputs_zero_point, outputs_zero_point) =
+        indicators_[i].get_indicator_zero_point();
+
+    frozen.quantized = indicators_[i].get_indicator_quantized_status();
+    frozen.asymmetric_scales = {inputs_scale, outputs_scale};
+    frozen.zero_points = {inputs_zero_point, outputs_zero_point};
+    for (auto k = 0; k < 4; k++) {
+      bool i_uint8_used = k >> 1, o_uint8_used = k & 1;
+      std::vector<float> i_scale = inputs_scale, o_scale = outputs_scale;
+      if (!i_scale.empty() && !inputs_uint8_used.empty()) {
+        i_scale[0] =
+            convert_scale(i_scale[0], inputs_uint8_used[0], i_uint8_used);
+      }
+      if (!o_scale.empty() && !outputs_uint8_used.empty()) {
+        o_scale[0] =
+            convert_scale(o_scale[0], outputs_uint8_used[0], o_uint8_used);
+      }
+      frozen.scales[k] = {i_scale, o_scale};
+    }
   }
-  std::vector<std::vector<float>> input_output_scale = {inputs_scale,
-                                                        outputs_scale};
-  return input_output_scale;
+}
+
+const Int8OptConfig::FrozenIndicator &
+Int8OptConfig::get_frozen_indicator(int64_t ops_id) {
+  // the ops without configure, e.g. not run during calibration, stay in fp32
+  static const FrozenIndicator fp32_indicator = [] {
+    FrozenIndicator frozen;
+    frozen.quantized = false;
+    for (auto k = 0; k < 4; k++)
+      frozen.scales[k] = std::vector<std::vector<float>>(2);
+    frozen.asymmetric_scales = std::vector<std::vector<float>>(2);
+    frozen.zero_points = std::vector<std::vector<int32_t>>(2);
+    return frozen;
+  }();
+  if (ops_id < 0 || ops_id >= frozen_indicators_.size())
+    return fp32_indicator;
+  return frozen_indicators_[ops_id];
+}
+
+const std::vector<std::vector<float>> &
+Int8OptConfig::get_indicator_scales(bool i_uint8_used, bool o_uint8_used,
+                                    int64_t ops_id) {
+  return get_frozen_indicator(ops_id).scales[(i_uint8_used << 1) | o_uint8_used];
 }
 
 bool Int8OptConfig::get_indicator_quantized_status(int64_t ops_id) {
-  return indicators_[ops_id].get_indicator_quantized_status();
+  return get_frozen_indicator(ops_id).quantized;
 }
+
 void Int8OptConfig::set_indicators(std::vector<Indicator> indicators) {
   // avoid to use copy assignment since the copy assignment for indicator with rw_mutex
   // have not been handdled properly
@@ -208,33 +341,145 @@ void Int8OptConfig::set_indicators(std::vector<Indicator> indicators) {
   for (auto i: indicators){
     indicators_.emplace_back(i);
   }
+  // ops are looked up by key only if all of them have been calibrated with
+  // their module scope
+  ops_index_.clear();
+  ops_keys_.clear();
+  bool keyed = std::all_of(indicators_.begin(), indicators_.end(),
+                           [](Indicator &i) { return !i.get_indicator_key().empty(); });
+  if (keyed) {
+    for (auto i = 0; i < indicators_.size(); i++) {
+      ops_keys_.push_back(indicators_[i].get_indicator_key());
+      ops_index_.emplace(ops_keys_.back(), i);
+    }
+  }
+  freeze_indicators();
 }
 
-std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> Int8OptConfig::get_indicator_asymmetric(int64_t ops_id) {
-    std::vector<float> inputs_scale, outputs_scale;
-    std::vector<int32_t> inputs_zero_point, outputs_zero_point;
-    std::tie(inputs_scale, outputs_scale) = indicators_[ops_id].get_indicator_scales();
-    std::tie(inputs_zero_point, outputs_zero_point) = indicators_[ops_id].get_indicator_zero_point();
-
-    std::vector<std::vector<float>> input_output_scale = {inputs_scale, outputs_scale};
-    std::vector<std::vector<int32_t>> input_output_zero_point = {inputs_zero_point, outputs_zero_point};
-
-    return std::make_tuple(input_output_scale, input_output_zero_point);
+std::tuple<const std::vector<std::vector<float>> &,
+           const std::vector<std::vector<int32_t>> &>
+Int8OptConfig::get_indicator_asymmetric(int64_t ops_id) {
+  const auto &frozen = get_frozen_indicator(ops_id);
+  return std::forward_as_tuple(frozen.asymmetric_scales, frozen.zero_points);
 }
 
 std::vector<Indicator> Int8OptConfig::get_indicators() { return indicators_; }
 
 int64_t Int8OptConfig::get_indicators_size() { return indicators_.size(); }
 
-void Int8OptConfig::calibration_reset() { current_ops_id = 0; }
+void Int8OptConfig::calibration_reset() {
+  current_ops_id = 0;
+  scopes_depth = 0;
+  std::fill(root_scope.ops_count.begin(), root_scope.ops_count.end(), 0);
+}
+
+void Int8OptConfig::enter_scope(const std::string &scope) {
+  auto &config = Int8OptConfig::get_config();
+  if (scopes_depth == scopes.size())
+    scopes.emplace_back();
+  auto &frame = scopes[scopes_depth++];
+  frame.scope.assign(scope);
+  std::fill(frame.ops_count.begin(), frame.ops_count.end(), 0);
+  frame.generation = config.generation_;
+  // without scoped configures the ops of the scope are counted in the root
+  // scope, the scope does not even need to be resolved
+  frame.scope_id = check_int8_calibration() || !config.scoped_
+                       ? kRootScopeId
+                       : config.find_scope_id(scope);
+}
+
+void Int8OptConfig::exit_scope() {
+  if (scopes_depth > 0)
+    scopes_depth--;
+}
+
+int64_t Int8OptConfig::find_scope_id(const std::string &scope) {
+  auto it = scope_ids_.find(scope);
+  return it == scope_ids_.end() ? -1 : it->second;
+}
 
-int64_t Int8OptConfig::fetch_and_add_ops_id() {
-  int64_t ops_id = current_ops_id++;
-  int64_t indicator_size = Int8OptConfig::get_config().get_indicators_size();
-  if (current_ops_id == indicator_size)
-    current_ops_id = 0;
+int64_t Int8OptConfig::intern_op_name(const std::string &op_name) {
+  return op_names_.emplace(op_name, op_names_.size()).first->second;
+}
+
+int64_t Int8OptConfig::get_ops_id(const std::string &key) {
+  auto it = ops_index_.find(key);
+  if (it != ops_index_.end())
+    return it->second;
+  int64_t ops_id = ops_keys_.size();
+  ops_index_.emplace(key, ops_id);
+  ops_keys_.push_back(key);
   return ops_id;
 }
 
+int64_t Int8OptConfig::fetch_and_add_ops_id(const std::string &op_name) {
+  auto &config = Int8OptConfig::get_config();
+  bool calibration = check_int8_calibration();
+  // configures saved without keys are matched by the execution order
+  if (!calibration && config.ops_keys_.empty()) {
+    int64_t ops_id = current_ops_id++;
+    int64_t indicator_size = config.get_indicators_size();
+    if (current_ops_id == indicator_size)
+      current_ops_id = 0;
+    return ops_id;
+  }
+
+  if (calibration) {
+    // the keys are built and indexed under the lock, calibration only
+    auto &frame = scopes_depth > 0 ? scopes[scopes_depth - 1] : root_scope;
+    std::lock_guard<std::mutex> lock(config.ops_index_mutex_);
+    auto op_name_id = config.intern_op_name(op_name);
+    if (frame.ops_count.size() <= op_name_id)
+      frame.ops_count.resize(op_name_id + 1, 0);
+    int64_t occurrence = frame.ops_count[op_name_id]++;
+    return config.get_ops_id(frame.scope + ":" + op_name + ":" +
+                             std::to_string(occurrence));
+  }
+
+  // the ids are read-only out of calibration, no lock, key or allocation
+  // once the counts of the frame have grown to the interned op names
+  auto *frame = &root_scope;
+  if (scopes_depth > 0) {
+    auto &scope_frame = scopes[scopes_depth - 1];
+    if (scope_frame.generation != config.generation_) {
+      std::fill(scope_frame.ops_count.begin(), scope_frame.ops_count.end(), 0);
+      scope_frame.generation = config.generation_;
+      scope_frame.scope_id = config.scoped_ ? config.find_scope_id(scope_frame.scope)
+                                            : kRootScopeId;
+    }
+    if (scope_frame.scope_id != kRootScopeId)
+      frame = &scope_frame;
+  }
+  if (root_scope.generation != config.generation_) {
+    std::fill(root_scope.ops_count.begin(), root_scope.ops_count.end(), 0);
+    root_scope.generation = config.generation_;
+  }
+  // an op of a scope or with a name not run during calibration runs in fp32
+  if (frame->scope_id < 0)
+    return kFp32OpsId;
+  auto it = config.op_names_.find(op_name);
+  if (it == config.op_names_.end())
+    return kFp32OpsId;
+  auto op_name_id = it->second;
+  const auto &scope_ops_ids = config.scope_ops_ids_[frame->scope_id];
+  if (op_name_id >= scope_ops_ids.size() || scope_ops_ids[op_name_id].empty())
+    return kFp32OpsId;
+  const auto &ops_ids = scope_ops_ids[op_name_id];
+  if (frame->ops_count.size() <= op_name_id)
+    frame->ops_count.resize(config.op_names_.size(), 0);
+  int64_t occurrence = frame->ops_count[op_name_id]++;
+  // the root scope is never exited, its occurrences wrap around those of the
+  // calibration like the execution order
+  if (frame == &root_scope && frame->ops_count[op_name_id] == ops_ids.size())
+    frame->ops_count[op_name_id] = 0;
+  return occurrence < ops_ids.size() ? ops_ids[occurrence] : kFp32OpsId;
+}
+
+constexpr int64_t Int8OptConfig::kFp32OpsId;
+constexpr int64_t Int8OptConfig::kRootScopeId;
+
 thread_local int64_t Int8OptConfig::current_ops_id = 0;
-} // namespace torch_ipex
\ No newline at end of file
+thread_local std::vector<Int8OptConfig::ScopeFrame> Int8OptConfig::scopes = {};
+thread_local int64_t Int8OptConfig::scopes_depth = 0;
+thread_local Int8OptConfig::ScopeFrame Int8OptConfig::root_scope = {"<root>", Int8OptConfig::kRootScopeId, -1, {}};
+} // namespace torch_ipex
@@ -1,4 +1,7 @@
 #pragma once
+#include <mutex>
+#include <unordered_map>
+
 #include "cpu/int8/quantization/Observer.h"
 
 namespace torch_ipex {
@@ -15,21 +18,26 @@ public:
 public:
   void insert_or_updata_observer(
       std::string op_name, std::vector<std::vector<float>> i_min_max_values,
-      std::vector<std::vector<float>> o_min_max_values, int64_t ops_id, bool asymmetric);
+      std::vector<std::vector<float>> o_min_max_values,
+      std::vector<Histogram> i_histograms, std::vector<Histogram> o_histograms,
+      int64_t ops_id, bool asymmetric);
+
+  std::string get_observer_algorithm(int64_t ops_id);
 
   void clear_indicators();
 
   void add_indicators();
 
-  std::vector<std::vector<float>>
-  get_indicator_scales(std::vector<bool> i_uint8_used,
-                       std::vector<bool> o_uint8_used, int64_t ops_id);
+  const std::vector<std::vector<float>> &
+  get_indicator_scales(bool i_uint8_used, bool o_uint8_used, int64_t ops_id);
 
   bool get_indicator_quantized_status(int64_t ops_id);
 
   void set_indicators(std::vector<Indicator> indicators);
 
-  std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> get_indicator_asymmetric(int64_t ops_id);
+  std::tuple<const std::vector<std::vector<float>> &,
+             const std::vector<std::vector<int32_t>> &>
+  get_indicator_asymmetric(int64_t ops_id);
 
   std::vector<Indicator> get_indicators();
 
@@ -37,10 +45,64 @@ public:
 
   static void calibration_reset();
 
-  static int64_t fetch_and_add_ops_id();
+  // Ops run inside a module scope are identified by the scope, their name and
+  // their occurrence in the scope instead of the execution order, so that the
+  // configure does not depend on the control flow and is looked up
+  // concurrently from many threads. The ops out of any module scope are in the
+  // "<root>" scope, so every op of a calibration has a key. The keys are only
+  // built during calibration, the inference resolves them to integer ids when
+  // the indicators are frozen.
+  static void enter_scope(const std::string &scope);
+
+  static void exit_scope();
+
+  static int64_t fetch_and_add_ops_id(const std::string &op_name);
+
+  // the id of the ops without configure, which run in fp32
+  static constexpr int64_t kFp32OpsId = -1;
+
+private:
+  // The calibrated parameters of an op, frozen when the indicators are set so
+  // that the int8 ops of the inference path query them without any lock,
+  // copy or allocation.
+  struct FrozenIndicator {
+    bool quantized;
+    // {inputs_scale, outputs_scale} for the first input and output being
+    // s8 or u8, indexed by (inputs_uint8_used << 1 | outputs_uint8_used).
+    std::vector<std::vector<float>> scales[4];
+    // the calibrated scales and zero points for asymmetric quantization
+    std::vector<std::vector<float>> asymmetric_scales;
+    std::vector<std::vector<int32_t>> zero_points;
+  };
+
+  void freeze_indicators();
+
+  const FrozenIndicator &get_frozen_indicator(int64_t ops_id);
+
+  int64_t get_ops_id(const std::string &key);
+
+  int64_t intern_op_name(const std::string &op_name);
+
+  int64_t find_scope_id(const std::string &scope);
+
+  // the id of the root scope, whose ops are counted out of any module scope
+  static constexpr int64_t kRootScopeId = 0;
+
+  struct ScopeFrame {
+    std::string scope;
+    // the scope resolved out of calibration, -1 if it has no configure
+    int64_t scope_id;
+    // the frozen indicators the scope was resolved against
+    int64_t generation;
+    // the occurrences of the ops in the scope, by interned op name
+    std::vector<int64_t> ops_count;
+  };
 
 private:
-  Int8OptConfig() : observers_{}, indicators_{} {}
+  Int8OptConfig()
+      : observers_{}, indicators_{}, frozen_indicators_{}, ops_index_{},
+        ops_keys_{}, op_names_{}, scope_ids_{}, scope_ops_ids_{},
+        scoped_(false), generation_(0) {}
   ~Int8OptConfig() = default;
   Int8OptConfig(const Int8OptConfig &) = default;
   Int8OptConfig &operator=(const Int8OptConfig &) = default;
@@ -48,7 +110,25 @@ private:
 private:
   std::vector<Observer> observers_;
   std::vector<Indicator> indicators_;
+  std::vector<FrozenIndicator> frozen_indicators_;
+  // op key -> ops id, only modified during calibration, read-only afterwards
+  std::unordered_map<std::string, int64_t> ops_index_;
+  std::vector<std::string> ops_keys_;
+  // the keys resolved when the indicators are frozen: op name -> interned id,
+  // scope -> scope id and [scope id][op name id][occurrence] -> ops id
+  std::unordered_map<std::string, int64_t> op_names_;
+  std::unordered_map<std::string, int64_t> scope_ids_;
+  std::vector<std::vector<std::vector<int64_t>>> scope_ops_ids_;
+  // whether any op is keyed in a module scope other than the root one
+  bool scoped_;
+  int64_t generation_;
+  std::mutex ops_index_mutex_;
   thread_local static int64_t current_ops_id;
+  // the frames are kept when their scope is exited, so that entering a scope
+  // reuses their buffers
+  thread_local static std::vector<ScopeFrame> scopes;
+  thread_local static int64_t scopes_depth;
+  thread_local static ScopeFrame root_scope;
 };
 
 } // namespace torch_ipex
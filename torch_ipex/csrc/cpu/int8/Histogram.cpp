@@ -0,0 +1,244 @@
+#include "Histogram.h"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+
+namespace torch_ipex {
+namespace cpu {
+namespace lp {
+namespace int8 {
+
+namespace {
+
+// quantization levels of a symmetric (s8 of the absolute value) and an
+// asymmetric (u8) range
+constexpr int64_t kSymmetricLevels = 128;
+constexpr int64_t kAsymmetricLevels = 256;
+
+std::vector<float> rebin(const Histogram &src, int64_t bins, float min,
+                         float max) {
+  std::vector<float> dst(bins, 0.);
+  const int64_t src_bins = src.bins.size();
+  const float dst_width = (max - min) / bins;
+  const float src_width =
+      src_bins > 0 ? (src.max - src.min) / src_bins : 0.;
+  auto bin_of = [&](float v) {
+    int64_t idx = dst_width > 0 ? (int64_t)((v - min) / dst_width) : 0;
+    return std::min(std::max(idx, (int64_t)0), bins - 1);
+  };
+  for (auto j = 0; j < src_bins; j++) {
+    float count = src.bins[j];
+    if (count == 0)
+      continue;
+    float lo = src.min + j * src_width;
+    float hi = lo + src_width;
+    int64_t k_lo = bin_of(lo), k_hi = bin_of(hi);
+    if (src_width <= 0 || k_lo == k_hi) {
+      dst[k_lo] += count;
+      continue;
+    }
+    // split the count by the overlap, the last bin takes the remainder so
+    // that the total count is preserved.
+    float left = count;
+    for (auto k = k_lo; k < k_hi; k++) {
+      float overlap = std::min(hi, min + (k + 1) * dst_width) -
+                      std::max(lo, min + k * dst_width);
+      float part = std::min(left, count * std::max(overlap, 0.f) / src_width);
+      dst[k] += part;
+      left -= part;
+    }
+    dst[k_hi] += left;
+  }
+  return dst;
+}
+
+// Expected squared quantization error of a histogram clipped to the bins
+// [start, end), computed in O(1) from the prefix sums of n, n * c and n * c^2
+// where c is the center of a bin.
+struct HistogramError {
+  HistogramError(const Histogram &hist, int64_t levels)
+      : min(hist.min), levels(levels) {
+    const int64_t bins = hist.bins.size();
+    width = (hist.max - hist.min) / bins;
+    s0.assign(bins + 1, 0.);
+    s1.assign(bins + 1, 0.);
+    s2.assign(bins + 1, 0.);
+    for (auto k = 0; k < bins; k++) {
+      double n = hist.bins[k];
+      double c = hist.min + (k + 0.5) * width;
+      s0[k + 1] = s0[k] + n;
+      s1[k + 1] = s1[k] + n * c;
+      s2[k + 1] = s2[k] + n * c * c;
+    }
+  }
+
+  double operator()(int64_t start, int64_t end) const {
+    const int64_t bins = s0.size() - 1;
+    double lo = min + start * width;
+    double hi = min + end * width;
+    double delta = (hi - lo) / (levels - 1);
+    // rounding error of the values inside the range
+    double error = (s0[end] - s0[start]) * delta * delta / 12.;
+    // clipping error of the values outside the range, sum(n * (c - t)^2)
+    error += s2[start] - 2 * lo * s1[start] + lo * lo * s0[start];
+    error += (s2[bins] - s2[end]) - 2 * hi * (s1[bins] - s1[end]) +
+             hi * hi * (s0[bins] - s0[end]);
+    return error;
+  }
+
+  float min;
+  float width;
+  int64_t levels;
+  std::vector<double> s0, s1, s2;
+};
+
+std::tuple<float, float> percentile_range(const Histogram &hist,
+                                          bool asymmetric) {
+  const int64_t bins = hist.bins.size();
+  const float width = (hist.max - hist.min) / bins;
+  double total = 0.;
+  for (auto n : hist.bins)
+    total += n;
+  // the dropped values are split over both tails for asymmetric ranges
+  double dropped = total * (100. - kPercentile) / 100.;
+  double tail = asymmetric ? dropped / 2 : dropped;
+
+  int64_t start = 0;
+  if (asymmetric) {
+    double cumsum = 0.;
+    while (start < bins - 1 && cumsum + hist.bins[start] <= tail)
+      cumsum += hist.bins[start++];
+  }
+  int64_t end = bins;
+  double cumsum = 0.;
+  while (end > start + 1 && cumsum + hist.bins[end - 1] <= tail)
+    cumsum += hist.bins[--end];
+  return std::make_tuple(hist.min + start * width, hist.min + end * width);
+}
+
+std::tuple<float, float> mse_range(const Histogram &hist, bool asymmetric) {
+  const int64_t bins = hist.bins.size();
+  const float width = (hist.max - hist.min) / bins;
+  HistogramError error(hist,
+                       asymmetric ? kAsymmetricLevels : kSymmetricLevels);
+  double best_error = std::numeric_limits<double>::max();
+  int64_t best_start = 0, best_end = bins;
+  // a symmetric range always starts from 0
+  const int64_t max_start = asymmetric ? bins - 1 : 0;
+  for (auto start = 0; start <= max_start; start++) {
+    for (auto end = start + 1; end <= bins; end++) {
+      double e = error(start, end);
+      if (e < best_error) {
+        best_error = e;
+        best_start = start;
+        best_end = end;
+      }
+    }
+  }
+  return std::make_tuple(hist.min + best_start * width,
+                         hist.min + best_end * width);
+}
+
+std::tuple<float, float> kl_range(const Histogram &hist) {
+  const int64_t bins = hist.bins.size();
+  const float width = (hist.max - hist.min) / bins;
+  const int64_t levels = kSymmetricLevels;
+  if (bins <= levels)
+    return std::make_tuple(hist.min, hist.max);
+
+  double best_kl = std::numeric_limits<double>::max();
+  int64_t best_end = bins;
+  std::vector<double> p(bins), q(bins);
+  for (auto end = levels; end <= bins; end++) {
+    // reference distribution, values outside the range are clipped to the
+    // last bin.
+    double outliers = 0.;
+    for (auto k = end; k < bins; k++)
+      outliers += hist.bins[k];
+    for (auto k = 0; k < end; k++)
+      p[k] = hist.bins[k];
+    p[end - 1] += outliers;
+
+    // candidate distribution, the range quantized to levels bins and expanded
+    // back over the non-empty bins.
+    const int64_t merged = end / levels;
+    for (auto j = 0; j < levels; j++) {
+      int64_t first = j * merged;
+      int64_t last = j == levels - 1 ? end : first + merged;
+      double total = 0.;
+      int64_t nonzeros = 0;
+      for (auto k = first; k < last; k++) {
+        total += hist.bins[k];
+        nonzeros += hist.bins[k] != 0;
+      }
+      for (auto k = first; k < last; k++)
+        q[k] = (hist.bins[k] != 0 && nonzeros > 0) ? total / nonzeros : 0.;
+    }
+
+    double p_sum = 0., q_sum = 0.;
+    for (auto k = 0; k < end; k++) {
+      p_sum += p[k];
+      q_sum += q[k];
+    }
+    if (p_sum == 0 || q_sum == 0)
+      continue;
+    double kl = 0.;
+    for (auto k = 0; k < end; k++) {
+      if (p[k] == 0)
+        continue;
+      double pk = p[k] / p_sum;
+      // smooth the empty bins of the candidate distribution
+      double qk = q[k] != 0 ? q[k] / q_sum : 1e-4 / q_sum;
+      kl += pk * std::log(pk / qk);
+    }
+    if (kl < best_kl) {
+      best_kl = kl;
+      best_end = end;
+    }
+  }
+  return std::make_tuple(hist.min, hist.min + best_end * width);
+}
+
+} // namespace
+
+bool is_histogram_algorithm(const std::string &algorithm) {
+  return algorithm == "percentile" || algorithm == "kl" || algorithm == "mse";
+}
+
+void combine_histogram(Histogram &hist, const Histogram &new_hist) {
+  if (hist.bins.empty()) {
+    hist = new_hist;
+    return;
+  }
+  const int64_t bins = hist.bins.size();
+  float min = std::min(hist.min, new_hist.min);
+  float max = std::max(hist.max, new_hist.max);
+  std::vector<float> merged = (min == hist.min && max == hist.max)
+                                  ? hist.bins
+                                  : rebin(hist, bins, min, max);
+  std::vector<float> added = rebin(new_hist, bins, min, max);
+  for (auto k = 0; k < bins; k++)
+    merged[k] += added[k];
+  hist.bins = std::move(merged);
+  hist.min = min;
+  hist.max = max;
+}
+
+std::tuple<float, float> compute_calibration_range(const std::string &algorithm,
+                                                   const Histogram &hist,
+                                                   bool asymmetric) {
+  if (hist.bins.empty() || hist.max <= hist.min)
+    return std::make_tuple(hist.min, hist.max);
+  if (algorithm == "percentile") {
+    return percentile_range(hist, asymmetric);
+  } else if (algorithm == "kl" && !asymmetric) {
+    return kl_range(hist);
+  }
+  return mse_range(hist, asymmetric);
+}
+
+} // namespace int8
+} // namespace lp
+} // namespace cpu
+} // namespace torch_ipex
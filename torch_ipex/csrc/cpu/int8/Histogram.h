@@ -0,0 +1,40 @@
+#pragma once
+
+#include <string>
+#include <tuple>
+#include <vector>
+
+#include "cpu/int8/quantization/Observer.h"
+
+namespace torch_ipex {
+namespace cpu {
+namespace lp {
+namespace int8 {
+
+// number of bins of the histograms collected during calibration
+constexpr int64_t kHistogramBins = 2048;
+// the percentage of values kept by the percentile algorithm
+constexpr float kPercentile = 99.99;
+
+// percentile, kl and mse choose the scales from a histogram of the tensor
+bool is_histogram_algorithm(const std::string &algorithm);
+
+// Merge the histogram of a new calibration batch into the accumulated one.
+// The result covers the union of the two ranges, the counts of each histogram
+// are redistributed into the new bins assuming an uniform density in a bin.
+void combine_histogram(Histogram &hist, const Histogram &new_hist);
+
+// Choose the clipping range {min, max} of a tensor from its histogram using
+// the given algorithm:
+//   percentile: drop the (100 - kPercentile)% most extreme values.
+//   kl: minimize the KL divergence between the fp32 and the int8 distributions
+//       (entropy calibration), symmetric only, asymmetric falls back to mse.
+//   mse: minimize the expected quantization (rounding + clipping) error.
+std::tuple<float, float> compute_calibration_range(const std::string &algorithm,
+                                                   const Histogram &hist,
+                                                   bool asymmetric);
+
+} // namespace int8
+} // namespace lp
+} // namespace cpu
+} // namespace torch_ipex
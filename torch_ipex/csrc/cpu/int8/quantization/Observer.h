@@ -6,6 +6,14 @@ namespace cpu {
 namespace lp {
 namespace int8 {
 
+// Streaming histogram of a tensor collected during calibration. For symmetric
+// quantization the histogram is built on the absolute values, i.e. min is 0.
+struct Histogram {
+  std::vector<float> bins;
+  float min = 0.;
+  float max = 0.;
+};
+
 struct Observer {
   int64_t id;
   std::string name;
@@ -13,7 +21,8 @@ struct Observer {
   std::vector<std::vector<float>> outputs_min_max_values;
   // default uising min/max to compute the quantization parameters,
   // only support min_max, MovingAverageMinMax and other none per_channel
-  // merthod
+  // merthod, the histogram based methods percentile, kl and mse are also
+  // supported for symmetric and asymmetric quantization.
   std::string algorithm = "min_max";
   float averaging_constant = 0.01; // for MovingAverage method
   // only useful for conv, onednn only support per_channel foo conv's weight,
@@ -23,6 +32,9 @@ struct Observer {
   std::vector<bool> inputs_dtype_uint8 = {false};
   std::vector<bool> outputs_dtype_uint8 = {false};
   bool quantized = true;
+  // only collected for the histogram based algorithms
+  std::vector<Histogram> inputs_histogram = {};
+  std::vector<Histogram> outputs_histogram = {};
 };
 
 class Indicator {
@@ -32,11 +44,13 @@ public:
             std::vector<float> o_scale = {1},
             std::vector<bool> i_uint8_used = {false},
             std::vector<bool> o_uint8_used = {false}, bool quant = true, 
-            std::vector<int32_t> i_zero_point = {0}, std::vector<int32_t> o_zero_point = {0})
+            std::vector<int32_t> i_zero_point = {0}, std::vector<int32_t> o_zero_point = {0},
+            std::string k = "")
       : id(i), name(n), algorithm(alg), weight_granularity(granu),
         inputs_scale(i_scale), outputs_scale(o_scale),
         inputs_uint8_used(i_uint8_used), outputs_uint8_used(o_uint8_used),
-        quantized(quant), inputs_zero_point(i_zero_point), outputs_zero_point(o_zero_point) {}
+        quantized(quant), inputs_zero_point(i_zero_point), outputs_zero_point(o_zero_point),
+        key(k) {}
 
     Indicator(const Indicator& other){
       UniqueReadLock<ReadWriteMutex> lock(rwmutex);
@@ -51,12 +65,15 @@ public:
       quantized = other.quantized;
       inputs_zero_point = other.inputs_zero_point;
       outputs_zero_point = other.outputs_zero_point;
+      key = other.key;
     }
 
   int64_t get_indicator_id() { return id; }
 
   std::string get_indicator_name() { return name; }
 
+  std::string get_indicator_key() { return key; }
+
   std::string get_indicator_algorithm() { return algorithm; }
 
   std::string get_indicator_weight_granularity() { return weight_granularity; }
@@ -108,6 +125,9 @@ private:
   std::vector<int32_t> inputs_zero_point;
   std::vector<int32_t> outputs_zero_point;
   bool quantized;
+  // stable identity of the op, "<module scope>:<op name>:<occurrence>", empty
+  // if the op is identified by its execution order.
+  std::string key;
   mutable ReadWriteMutex rwmutex;
 };
 
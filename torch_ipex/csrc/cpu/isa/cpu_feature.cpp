@@ -0,0 +1,143 @@
+#include "cpu_feature.hpp"
+
+#include <cpuid.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+#include <atomic>
+#include <cstdint>
+#include <cstdlib>
+#include <string>
+
+#include <c10/util/Exception.h>
+
+#include "torch_ipex/csrc/utils.h"
+
+namespace torch_ipex {
+namespace cpu {
+namespace isa {
+
+static const char* kNames[] = {"scalar", "avx2", "avx512_core", "avx512_core_bf16", "avx512_core_amx"};
+
+// The state components enabled by the OS in XCR0.
+static uint64_t xcr0() {
+  uint32_t eax, edx;
+  __asm__ volatile("xgetbv" : "=a"(eax), "=d"(edx) : "c"(0));
+  return ((uint64_t)edx << 32) | eax;
+}
+
+#if defined(AMX_BF16)
+// Linux hands the tile data state to the processes asking for it only.
+static bool request_tile_data() {
+  const int ARCH_REQ_XCOMP_PERM = 0x1023;
+  const int XFEATURE_XTILEDATA = 18;
+  return syscall(SYS_arch_prctl, ARCH_REQ_XCOMP_PERM, XFEATURE_XTILEDATA) == 0;
+}
+#endif
+
+static ISA detect_isa() {
+  unsigned int eax, ebx, ecx, edx;
+  unsigned int max_leaf = __get_cpuid_max(0, nullptr);
+  if (max_leaf < 7 || !__get_cpuid(1, &eax, &ebx, &ecx, &edx)) {
+    return ISA::SCALAR;
+  }
+  bool osxsave = ecx & (1 << 27);
+  bool fma = ecx & (1 << 12);
+  bool f16c = ecx & (1 << 29);
+  // the OS saves the ymm registers, and the zmm and mask ones
+  bool ymm_state = osxsave && (xcr0() & 0x6) == 0x6;
+  bool zmm_state = osxsave && (xcr0() & 0xe6) == 0xe6;
+
+  __cpuid_count(7, 0, eax, ebx, ecx, edx);
+  unsigned int max_subleaf = eax;
+  bool avx2 = ebx & (1 << 5);
+  bool avx512 = (ebx & (1 << 16)) && (ebx & (1 << 30)) && (ebx & (1u << 31));
+#if defined(AMX_BF16)
+  bool amx_bf16 = (edx & (1 << 22)) && (edx & (1 << 24));
+  // the OS saves the tile configuration and data
+  bool tile_state = osxsave && (xcr0() & 0x60000) == 0x60000;
+#endif
+  bool avx512_bf16 = false;
+  if (max_subleaf >= 1) {
+    __cpuid_count(7, 1, eax, ebx, ecx, edx);
+    avx512_bf16 = eax & (1 << 5);
+  }
+
+  if (!(ymm_state && avx2 && fma && f16c)) {
+    return ISA::SCALAR;
+  }
+  if (!(zmm_state && avx512)) {
+    return ISA::AVX2;
+  }
+#if defined(AMX_BF16)
+  if (avx512_bf16 && amx_bf16 && tile_state && request_tile_data()) {
+    return ISA::AVX512_CORE_AMX;
+  }
+#endif
+#if defined(AVX512_BF16)
+  if (avx512_bf16) {
+    return ISA::AVX512_CORE_BF16;
+  }
+#endif
+  return ISA::AVX512_CORE;
+}
+
+ISA host_isa() {
+  static ISA isa = detect_isa();
+  return isa;
+}
+
+// The host instruction set, lowered to the one named by IPEX_CPU_ISA if any.
+// The environment is read at the first dispatch, maybe within a kernel, so an
+// unknown or unsupported name warns and keeps the host instruction set.
+static ISA initial_isa() {
+  auto isa = host_isa();
+  const char* name = std::getenv("IPEX_CPU_ISA");
+  if (name == nullptr) {
+    return isa;
+  }
+  for (int i = 0; i <= (int)ISA::AVX512_CORE_AMX; i++) {
+    if (std::string(name) == kNames[i]) {
+      if (i > (int)isa) {
+        TORCH_WARN("IPEX_CPU_ISA=", name, " is not supported by the host, using ", isa_name(isa));
+        return isa;
+      }
+      return (ISA)i;
+    }
+  }
+  TORCH_WARN("unknown IPEX_CPU_ISA=", name, ", expected one of scalar, avx2, avx512_core, avx512_core_bf16 "
+             "and avx512_core_amx, using ", isa_name(isa));
+  return isa;
+}
+
+static std::atomic<ISA>& dispatch_isa() {
+  static std::atomic<ISA> isa(initial_isa());
+  return isa;
+}
+
+ISA current_isa() {
+  return dispatch_isa().load(std::memory_order_relaxed);
+}
+
+void set_current_isa(ISA isa) {
+  IPEX_CHECK(isa <= host_isa(), "the host does not support ", isa_name(isa), ", the most capable ISA is ",
+             isa_name(host_isa()));
+  dispatch_isa().store(isa, std::memory_order_relaxed);
+}
+
+const char* isa_name(ISA isa) {
+  return kNames[(int)isa];
+}
+
+ISA isa_from_name(const std::string & name) {
+  for (int i = 0; i <= (int)ISA::AVX512_CORE_AMX; i++) {
+    if (name == kNames[i]) {
+      return (ISA)i;
+    }
+  }
+  IPEX_CHECK(false, "unknown ISA ", name, ", expected one of scalar, avx2, avx512_core, avx512_core_bf16 and avx512_core_amx");
+  return ISA::SCALAR;
+}
+
+}  // namespace isa
+}  // namespace cpu
+}  // namespace torch_ipex
@@ -0,0 +1,62 @@
+#pragma once
+
+#include <string>
+
+namespace torch_ipex {
+namespace cpu {
+namespace isa {
+
+// Instruction sets the vector kernels are built for, from the least to the
+// most capable one, named like the oneDNN ones.
+enum class ISA {
+  SCALAR = 0,
+  AVX2,
+  AVX512_CORE,
+  AVX512_CORE_BF16,
+  AVX512_CORE_AMX,
+};
+
+// The most capable instruction set supported by both the host and the build.
+ISA host_isa();
+
+// The instruction set the kernels dispatch to. It is the host one unless it is
+// lowered by set_current_isa or by the IPEX_CPU_ISA environment variable.
+ISA current_isa();
+
+// Dispatches the kernels to isa, which must be supported by the host, so the
+// fallbacks can be run on a more capable host.
+void set_current_isa(ISA isa);
+
+const char* isa_name(ISA isa);
+ISA isa_from_name(const std::string & name);
+
+static inline bool has_avx2() {
+  return current_isa() >= ISA::AVX2;
+}
+
+static inline bool has_avx512() {
+  return current_isa() >= ISA::AVX512_CORE;
+}
+
+static inline bool has_avx512_bf16() {
+  return current_isa() >= ISA::AVX512_CORE_BF16;
+}
+
+static inline bool has_amx_bf16() {
+  return current_isa() >= ISA::AVX512_CORE_AMX;
+}
+
+}  // namespace isa
+}  // namespace cpu
+}  // namespace torch_ipex
+
+// The library is built for the baseline instruction set, the vector kernels
+// are built for the instruction set of their variant with these attributes.
+#define IPEX_TARGET_AVX2 __attribute__((target("avx2,fma,f16c")))
+#define IPEX_TARGET_AVX512 __attribute__((target("avx2,fma,f16c,avx512f,avx512bw,avx512vl")))
+#if defined(AVX512_BF16)
+#define IPEX_TARGET_AVX512_BF16 __attribute__((target("avx2,fma,f16c,avx512f,avx512bw,avx512vl,avx512bf16")))
+#endif
+#if defined(AMX_BF16)
+#define IPEX_TARGET_AMX_BF16 __attribute__((target("avx2,fma,f16c,avx512f,avx512bw,avx512vl,avx512bf16,amx-tile,amx-bf16")))
+#endif
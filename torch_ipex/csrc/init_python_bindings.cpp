@@ -23,11 +23,13 @@
 
 #include "cpu/dil/dil.hpp"
 #include "cpu/dbl/Common.h"
+#include "cpu/dbl/RNN.h"
 #include "cpu/ShadeDataContext.h"
 #include "cpu/ExtendOPs.h"
 #include "cpu/MlpOPs.h"
 #include "cpu/ExternalOPs.h"
 #include "cpu/FusionOPs.h"
+#include "cpu/isa/cpu_feature.hpp"
 #include "cpu/int8/Config.h"
 #include "cpu/int8/quantization/Observer.h"
 #include "ProcessGroupCCL.hpp"
@@ -125,8 +127,17 @@ void InitIpexModuleBindings(py::module m) {
            const at::Tensor &grad, float alpha) {
           AtenIpexTypeExt::packed_add_(top_half, bot_half, grad, alpha);
         });
+  m.def("sgd_step", &AtenIpexTypeExt::sgd_step);
+  m.def("adagrad_step", &AtenIpexTypeExt::adagrad_step);
+  m.def("adam_step", &AtenIpexTypeExt::adam_step);
+  m.def("lamb_step", &AtenIpexTypeExt::lamb_step);
+  m.def("lars_step", &AtenIpexTypeExt::lars_step);
+  m.def("multi_tensor_l2norm", &AtenIpexTypeExt::multi_tensor_l2norm);
+  m.def("multi_tensor_scale_", &AtenIpexTypeExt::multi_tensor_scale_);
   m.def("mlp_forward", &AtenIpexTypeMLPExt::forward);
   m.def("mlp_backward", &AtenIpexTypeMLPExt::backward);
+  m.def("mlp_forward_layers", &AtenIpexTypeMLPExt::forward_layers);
+  m.def("mlp_backward_layers", &AtenIpexTypeMLPExt::backward_layers);
   m.def("mlp_create_handle", &AtenIpexTypeMLPExt::create_handle);
   m.def("mlp_set_relu_mask", &AtenIpexTypeMLPExt::set_relu_mask);
   m.def("mlp_release_handle", &AtenIpexTypeMLPExt::release_handle);
@@ -144,6 +155,18 @@ void InitIpexModuleBindings(py::module m) {
   m.def("get_jit_opt", []() { return AutoOptConfig::singleton().get_jit_fuse(); });
   m.def("set_execution_mode", [](bool train) { AutoOptConfig::singleton().set_train(train); }, py::arg("train"));
   m.def("get_train", []() { return AutoOptConfig::singleton().get_train(); });
+  m.def("set_embedding_bag_prefetch_distance", [](int64_t distance) {
+        IPEX_CHECK(distance >= 0, "embedding_bag prefetch distance must be non-negative");
+        AutoOptConfig::singleton().set_embedding_bag_prefetch_distance(distance); }, py::arg("distance"));
+  m.def("get_embedding_bag_prefetch_distance", []() { return AutoOptConfig::singleton().get_embedding_bag_prefetch_distance(); });
+  m.def("enable_embedding_bag_sort_indices", []() { AutoOptConfig::singleton().set_embedding_bag_sort_indices(true); });
+  m.def("disable_embedding_bag_sort_indices", []() { AutoOptConfig::singleton().set_embedding_bag_sort_indices(false); });
+  m.def("get_embedding_bag_sort_indices", []() { return AutoOptConfig::singleton().get_embedding_bag_sort_indices(); });
+  m.def("get_cpu_isa", []() { return std::string(cpu::isa::isa_name(cpu::isa::current_isa())); });
+  m.def("get_host_cpu_isa", []() { return std::string(cpu::isa::isa_name(cpu::isa::host_isa())); });
+  m.def("set_cpu_isa", [](const std::string &isa) {
+    cpu::isa::set_current_isa(cpu::isa::isa_from_name(isa));
+  }, py::arg("isa"));
 
   // int8 path
 
@@ -155,6 +178,13 @@ void InitIpexModuleBindings(py::module m) {
   m.def("get_int8_calibration",
         []() { AutoOptConfig::singleton().get_int8_calibration(); });
   m.def("calibration_reset", []() { Int8OptConfig::calibration_reset(); });
+  m.def("enter_int8_scope",
+        [](const std::string &scope) { Int8OptConfig::enter_scope(scope); });
+  m.def("exit_int8_scope", []() { Int8OptConfig::exit_scope(); });
+  // mode follows the rnn modes of aten: 0 rnn_relu, 1 rnn_tanh, 2 lstm, 3 gru
+  m.def("is_int8_rnn_supported", [](int64_t mode) {
+        IPEX_CHECK(mode >= 0 && mode < 4, "unknown rnn mode ", mode);
+        return cpu::dbl::rnn::is_int8_supported(mode); }, py::arg("mode"));
   m.def("add_indicators",
         []() { Int8OptConfig::get_config().add_indicators(); });
   m.def("clear_indicators",
@@ -168,6 +198,7 @@ void InitIpexModuleBindings(py::module m) {
         py::dict d;
         d["id"] = indicator.get_indicator_id();
         d["name"] = indicator.get_indicator_name();
+        d["key"] = indicator.get_indicator_key();
         d["algorithm"] = indicator.get_indicator_algorithm();
         d["weight_granularity"] = indicator.get_indicator_weight_granularity();
         std::vector<float> i_scale, o_scale;
@@ -217,8 +248,13 @@ void InitIpexModuleBindings(py::module m) {
       std::vector<bool> o_uint8_used =
           py::cast<std::vector<bool>>(i["outputs_uint8_used"]);
       bool quantized = py::cast<bool>(i["quantized"]);
+      std::string key = "";
+      if (i.contains("key")) {
+        key = py::cast<std::string>(i["key"]);
+      }
       Indicator temp(id, op_name, algorithm, weight_granularity, i_scale,
-                     o_scale, i_uint8_used, o_uint8_used, quantized, i_zero_point, o_zero_point);
+                     o_scale, i_uint8_used, o_uint8_used, quantized, i_zero_point, o_zero_point,
+                     key);
       indicators.push_back(temp);
     }
     Int8OptConfig::get_config().set_indicators(indicators);
@@ -241,6 +277,8 @@ void InitIpexModuleBindings(py::module m) {
   // external OPs
   m.def("roi_align_forward", &IpexExternal::ROIAlign_forward);
   m.def("roi_align_backward", &IpexExternal::ROIAlign_backward);
+  m.def("roi_align_multilevel_forward", &IpexExternal::ROIAlign_multilevel_forward);
+  m.def("roi_align_multilevel_backward", &IpexExternal::ROIAlign_multilevel_backward);
   m.def("nms", &IpexExternal::nms);
   m.def("batch_score_nms", &IpexExternal::batch_score_nms);
   m.def("linear_relu", &AtenIpexTypeExt::linear_relu);
@@ -5,6 +5,7 @@
 
 #include "auto_opt_config.h"
 #include "cpu/int8/Config.h"
+#include "cpu/int8/Histogram.h"
 
 namespace torch_ipex {
 
@@ -129,16 +130,43 @@ bool check_int8_calibration() {
   return AutoOptConfig::singleton().get_int8_calibration();
 }
 
+static Histogram compute_histogram(const at::Tensor &tensor, float min,
+                                   float max, bool asymmetric) {
+  // symmetric quantization only cares about the absolute values
+  Histogram hist;
+  hist.min = asymmetric ? min : 0.;
+  hist.max = max;
+  hist.bins.assign(kHistogramBins, 0.);
+  if (hist.max <= hist.min) {
+    hist.bins[0] = tensor.numel();
+    return hist;
+  }
+  auto values = asymmetric ? tensor : tensor.abs();
+  auto counts = at::histc(values.to(at::kCPU).to(at::kFloat).contiguous(),
+                          kHistogramBins, hist.min, hist.max);
+  auto counts_ptr = counts.data_ptr<float>();
+  std::copy(counts_ptr, counts_ptr + kHistogramBins, hist.bins.begin());
+  return hist;
+}
+
 void insert_or_updata_observer(const at::TensorList &inputs,
                                const at::TensorList &outputs,
                                std::string op_name, int64_t ops_id, bool asymmetric) {
   std::vector<std::vector<float>> inputs_min_max_values, outputs_min_max_values;
+  std::vector<Histogram> inputs_histogram, outputs_histogram;
+  bool use_histogram = is_histogram_algorithm(
+      Int8OptConfig::get_config().get_observer_algorithm(ops_id));
   for (auto i = 0; i < inputs.size(); i++) {
     if (asymmetric) {
       inputs_min_max_values.push_back({inputs[i].min().item<float>(), inputs[i].max().item<float>(), /*asymmetric*/true});
     } else {
       inputs_min_max_values.push_back({inputs[i].abs().min().item<float>(), inputs[i].abs().max().item<float>(), /*asymmetric*/false});
     }
+    if (use_histogram) {
+      inputs_histogram.push_back(compute_histogram(
+          inputs[i], inputs_min_max_values[i][0], inputs_min_max_values[i][1],
+          asymmetric));
+    }
   }
   for (auto j = 0; j < outputs.size(); j++) {
     if (asymmetric) {
@@ -146,14 +174,20 @@ void insert_or_updata_observer(const at::TensorList &inputs,
     } else {
       outputs_min_max_values.push_back({outputs[j].abs().min().item<float>(), outputs[j].abs().max().item<float>(), /*asymmetric*/false});
     }
+    if (use_histogram) {
+      outputs_histogram.push_back(compute_histogram(
+          outputs[j], outputs_min_max_values[j][0],
+          outputs_min_max_values[j][1], asymmetric));
+    }
   }
   Int8OptConfig::get_config().insert_or_updata_observer(
-      op_name, inputs_min_max_values, outputs_min_max_values, ops_id, asymmetric);
+      op_name, inputs_min_max_values, outputs_min_max_values, inputs_histogram,
+      outputs_histogram, ops_id, asymmetric);
 }
 
-std::vector<std::vector<float>>
-get_indicator_scales(std::vector<bool> i_uint8_used,
-                     std::vector<bool> o_uint8_used, const int64_t ops_id) {
+const std::vector<std::vector<float>> &
+get_indicator_scales(bool i_uint8_used, bool o_uint8_used,
+                     const int64_t ops_id) {
   return Int8OptConfig::get_config().get_indicator_scales(i_uint8_used,
                                                           o_uint8_used, ops_id);
 }
@@ -162,7 +196,7 @@ bool get_indicator_quantized_status(const int64_t ops_id) {
   return Int8OptConfig::get_config().get_indicator_quantized_status(ops_id);
 }
 
-std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> get_indicator_asymmetric(const int64_t ops_id) {
+std::tuple<const std::vector<std::vector<float>>&, const std::vector<std::vector<int32_t>>&> get_indicator_asymmetric(const int64_t ops_id) {
   return Int8OptConfig::get_config().get_indicator_asymmetric(ops_id);
 }
 
@@ -45,14 +45,14 @@ void insert_or_updata_observer(
   int64_t ops_id,
   bool asymmetric = false);
 
-std::vector<std::vector<float>> get_indicator_scales(
-  std::vector<bool> i_uint8_used,
-  std::vector<bool> o_uint8_used,
+const std::vector<std::vector<float>>& get_indicator_scales(
+  bool i_uint8_used,
+  bool o_uint8_used,
   const int64_t ops_id);
 
 bool get_indicator_quantized_status(const int64_t ops_id);
 
-std::tuple<std::vector<std::vector<float>>, std::vector<std::vector<int32_t>>> get_indicator_asymmetric(
+std::tuple<const std::vector<std::vector<float>>&, const std::vector<std::vector<int32_t>>&> get_indicator_asymmetric(
   const int64_t ops_id);
 // >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 